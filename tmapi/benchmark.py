@@ -0,0 +1,309 @@
+# Copyright 2011 Jamie Norrish (jamie@artefact.org.nz)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module providing a benchmark of TMAPI operations on synthetic
+topic maps.
+
+A topic map of configurable size is generated from a seeded random
+number generator, so that runs with the same parameters work on the
+same data, and each benchmarked operation is then called a number of
+times, recording the wall time taken and the number of queries made
+(including those made in evaluating a returned `QuerySet`).
+
+Results may be saved as a baseline, and later results compared with
+it to find regressions. The benchmark is run with the
+`tmapi_benchmark` management command, which uses a test database
+created for the purpose.
+
+"""
+
+import random
+import time
+
+from django.db import connection
+
+from tmapi.constants import BACKEND_PROPERTY_STRING, DATABASE_BACKEND
+# The indices can only be imported once the models have been.
+from tmapi.models import TopicMapSystemFactory
+from tmapi.indices import LiteralIndex, ScopedIndex, TypeInstanceIndex
+
+
+BASE_ADDRESS = 'http://www.example.org/benchmark/'
+
+# The default parameters of a benchmark run.
+DEFAULT_PARAMETERS = {
+    'backend': DATABASE_BACKEND,
+    'topics': 200,
+    'names': 2,
+    'associations': 2,
+    'fan_out': 10,
+    'operations': 20,
+    'seed': 0,
+    }
+
+# The proportion by which the time per call of an operation may
+# exceed that of the baseline before it is reported as a regression.
+DEFAULT_THRESHOLD = 0.25
+
+# The methods of each index that are benchmarked, with the kind of
+# argument they are called with.
+INDEX_METHODS = (
+    (LiteralIndex, (('get_names', 'name_value'),
+                    ('get_occurrences', 'occurrence_value'),
+                    ('get_variants', 'variant_value'))),
+    (ScopedIndex, (('get_associations', 'themes'),
+                   ('get_association_themes', None),
+                   ('get_names', 'themes'),
+                   ('get_name_themes', None),
+                   ('get_occurrences', 'themes'),
+                   ('get_occurrence_themes', None),
+                   ('get_variants', 'themes'),
+                   ('get_variant_themes', None))),
+    (TypeInstanceIndex, (('get_associations', 'type'),
+                         ('get_association_types', None),
+                         ('get_names', 'type'),
+                         ('get_name_types', None),
+                         ('get_occurrences', 'type'),
+                         ('get_occurrence_types', None),
+                         ('get_roles', 'type'),
+                         ('get_role_types', None),
+                         ('get_topics', 'types'),
+                         ('get_topic_types', None))),
+    )
+
+
+def compare_results (results, baseline, threshold=DEFAULT_THRESHOLD):
+    """Returns a description of each regression in `results` from
+    `baseline`.
+
+    An operation has regressed if it makes more queries per call
+    than in the baseline, or if its time per call exceeds that of the
+    baseline by more than the proportion `threshold`. Operations
+    missing from the baseline are ignored.
+
+    :param results: the results of a benchmark run
+    :type results: dictionary
+    :param baseline: the results of an earlier run with the same
+      parameters
+    :type baseline: dictionary
+    :param threshold: the proportion by which the time per call may
+      increase
+    :type threshold: float
+    :rtype: list of strings
+
+    """
+    regressions = []
+    for name in sorted(results):
+        if name not in baseline:
+            continue
+        queries, elapsed = _get_per_call(results[name])
+        base_queries, base_elapsed = _get_per_call(baseline[name])
+        if queries > base_queries:
+            regressions.append('%s: %.1f queries per call (baseline %.1f)'
+                               % (name, queries, base_queries))
+        if elapsed > base_elapsed * (1 + threshold):
+            regressions.append(
+                '%s: %.6fs per call (baseline %.6fs)' %
+                (name, elapsed, base_elapsed))
+    return regressions
+
+def format_results (results):
+    """Returns a line describing the result of each benchmarked
+    operation.
+
+    :param results: the results of a benchmark run
+    :type results: dictionary
+    :rtype: list of strings
+
+    """
+    lines = []
+    for name in sorted(results):
+        queries, elapsed = _get_per_call(results[name])
+        lines.append('%-60s %5d calls %10.6fs/call %8.1f queries/call' %
+                     (name, results[name]['calls'], elapsed, queries))
+    return lines
+
+def generate_topic_map (topic_map, topics, names, associations, fan_out,
+                        rng):
+    """Populates `topic_map` with a synthetic topic map.
+
+    `fan_out` topics are created to serve as types and as themes. Each
+    of `topics` topics has a subject identifier, a type, `names` names
+    (each with a type and a theme, and the first with a variant if
+    there is more than one theme), an
+    occurrence, and plays a role in `associations` associations.
+
+    Returns the types, the themes and the other topics.
+
+    :param topic_map: the topic map to populate
+    :type topic_map: `TopicMap`
+    :param topics: the number of topics
+    :type topics: integer
+    :param names: the number of names per topic
+    :type names: integer
+    :param associations: the number of associations per topic
+    :type associations: integer
+    :param fan_out: the number of types, and of themes
+    :type fan_out: integer
+    :param rng: the random number generator
+    :type rng: `random.Random`
+    :rtype: tuple of lists of `Topic`s
+
+    """
+    with topic_map.batch():
+        types = [topic_map.create_topic_by_subject_identifier(
+                topic_map.create_locator('%stype/%d' % (BASE_ADDRESS, i)))
+                 for i in range(fan_out)]
+        themes = [topic_map.create_topic_by_subject_identifier(
+                topic_map.create_locator('%stheme/%d' % (BASE_ADDRESS, i)))
+                  for i in range(fan_out)]
+        instances = []
+        for i in range(topics):
+            topic = topic_map.create_topic_by_subject_identifier(
+                topic_map.create_locator('%stopic/%d' % (BASE_ADDRESS, i)))
+            topic.add_type(rng.choice(types))
+            theme_indices = [rng.randrange(fan_out) for j in range(names)]
+            created = topic.create_names(
+                [('Name %d %d' % (i, j), rng.choice(types),
+                  [themes[theme_index]]) for j, theme_index
+                 in enumerate(theme_indices)])
+            if created and fan_out > 1:
+                # A variant's scope must be a true superset of its
+                # name's.
+                created[0].create_variant(
+                    'Variant %d' % i,
+                    [themes[(theme_indices[0] + 1) % fan_out]])
+            topic.create_occurrence(rng.choice(types), 'Value %d' % i,
+                                    [rng.choice(themes)])
+            instances.append(topic)
+        specs = []
+        for topic in instances:
+            for i in range(associations):
+                specs.append((rng.choice(types), [rng.choice(themes)],
+                              [(types[0], topic),
+                               (types[-1], rng.choice(instances))]))
+        topic_map.create_associations(specs)
+    return types, themes, instances
+
+def run_benchmarks (**parameters):
+    """Runs the benchmark, returning the number of calls, and the
+    total time and queries, of each operation.
+
+    The parameters (see DEFAULT_PARAMETERS) are the backend to use,
+    the number of topics, names per topic and associations per topic
+    to generate, the number of types and themes (fan_out), the number
+    of times each operation is called, and the random seed.
+
+    :rtype: dictionary
+
+    """
+    parameters = dict(DEFAULT_PARAMETERS, **parameters)
+    rng = random.Random(parameters['seed'])
+    operations = parameters['operations']
+    factory = TopicMapSystemFactory.new_instance()
+    factory.set_property(BACKEND_PROPERTY_STRING, parameters['backend'])
+    system = factory.new_topic_map_system()
+    topic_map = system.create_topic_map('%smap' % BASE_ADDRESS)
+    types, themes, instances = generate_topic_map(
+        topic_map, parameters['topics'], parameters['names'],
+        parameters['associations'], parameters['fan_out'], rng)
+    results = {}
+    debug_cursor = connection.use_debug_cursor
+    connection.use_debug_cursor = True
+    try:
+        arguments = {
+            'name_value': lambda: 'Name %d 0' % rng.randrange(len(instances)),
+            'occurrence_value': lambda: 'Value %d' %
+            rng.randrange(len(instances)),
+            'variant_value': lambda: 'Variant %d' %
+            rng.randrange(len(instances)),
+            'themes': lambda: [rng.choice(themes)],
+            'type': lambda: rng.choice(types),
+            'types': lambda: [rng.choice(types)],
+            }
+        for index_class, methods in INDEX_METHODS:
+            index = topic_map.get_index(index_class)
+            for name, argument in methods:
+                method = getattr(index, name)
+                for i in range(operations):
+                    args = ()
+                    if argument is not None:
+                        args = (arguments[argument](),)
+                    _measure(results, '%s.%s' % (index_class.__name__, name),
+                             method, *args)
+        for i in range(operations):
+            _measure(results, 'TopicMap.create_topic_by_subject_identifier '
+                     '(existing)', topic_map.create_topic_by_subject_identifier,
+                     topic_map.create_locator('%stopic/%d' % (
+                        BASE_ADDRESS, rng.randrange(len(instances)))))
+            _measure(results, 'TopicMap.create_topic_by_subject_identifier '
+                     '(new)', topic_map.create_topic_by_subject_identifier,
+                     topic_map.create_locator('%snew/%d' % (BASE_ADDRESS, i)))
+        target = system.create_topic_map('%scopy' % BASE_ADDRESS)
+        _measure(results, 'TopicMap.merge_in', target.merge_in, topic_map)
+        new_topics = [_measure(results, 'TopicMap.create_topic',
+                               topic_map.create_topic)
+                      for i in range(operations)]
+        for topic in new_topics:
+            _measure(results, 'Topic.remove', topic.remove)
+        rng.shuffle(instances)
+        for i in range(min(operations, len(instances) // 2)):
+            target, source = instances[2*i], instances[2*i+1]
+            _measure(results, 'Topic.merge_in', target.merge_in, source)
+    finally:
+        connection.use_debug_cursor = debug_cursor
+    return results
+
+def _get_per_call (operation_results):
+    """Returns the number of queries and the time per call of an
+    operation.
+
+    :param operation_results: the results of the operation
+    :type operation_results: dictionary
+    :rtype: tuple of floats
+
+    """
+    calls = float(operation_results['calls']) or 1.0
+    return (operation_results['queries'] / calls,
+            operation_results['time'] / calls)
+
+def _measure (results, name, function, *args):
+    """Calls `function` with `args`, adding the time taken and
+    queries made to `results` under `name`, and returns its result.
+
+    A returned `QuerySet` (or other iterable) is evaluated as part of
+    the call.
+
+    :param results: the results of the benchmark run
+    :type results: dictionary
+    :param name: the name of the operation
+    :type name: string
+    :param function: the operation
+    :type function: callable
+
+    """
+    count = len(connection.queries)
+    start = time.time()
+    result = function(*args)
+    if hasattr(result, '__iter__'):
+        list(result)
+    elapsed = time.time() - start
+    queries = len(connection.queries) - count
+    del connection.queries[count:]
+    operation_results = results.setdefault(
+        name, {'calls': 0, 'time': 0.0, 'queries': 0})
+    operation_results['calls'] += 1
+    operation_results['time'] += elapsed
+    operation_results['queries'] += queries
+    return result
@@ -15,11 +15,22 @@
 # Datatype URIs.
 XSD = 'http://www.w3.org/2001/XMLSchema#'
 XSD_ANY_URI = XSD + 'anyURI'
+XSD_DATE = XSD + 'date'
+XSD_DATE_TIME = XSD + 'dateTime'
+XSD_DECIMAL = XSD + 'decimal'
 XSD_FLOAT = XSD + 'float'
 XSD_INT = XSD + 'int'
+XSD_INTEGER = XSD + 'integer'
 XSD_LONG = XSD + 'long'
 XSD_STRING = XSD + 'string'
 
+# Topic Maps - Data Model subject identifiers.
+TMDM = 'http://psi.topicmaps.org/iso13250/model/'
+DEFAULT_NAME_TYPE = TMDM + 'topic-name'
+SUBTYPE = TMDM + 'subtype'
+SUPERTYPE = TMDM + 'supertype'
+SUPERTYPE_SUBTYPE = TMDM + 'supertype-subtype'
+
 # TMAPI feature strings.
 TMAPI_FEATURE_STRING_BASE = 'http://tmapi.org/features/'
 AUTOMERGE_FEATURE_STRING = TMAPI_FEATURE_STRING_BASE + 'automerge'
@@ -28,3 +39,8 @@ MERGE_BY_TOPIC_NAME_FEATURE_STRING = TMAPI_FEATURE_STRING_BASE + \
 READ_ONLY_FEATURE_STRING = TMAPI_FEATURE_STRING_BASE + 'readOnly'
 TYPE_INSTANCE_ASSOCIATIONS_FEATURE_STRING = TMAPI_FEATURE_STRING_BASE + \
     'type-instance-associations'
+
+# Properties recognised by this implementation.
+BACKEND_PROPERTY_STRING = 'tmapi.backend'
+DATABASE_BACKEND = 'database'
+MEMORY_BACKEND = 'memory'
@@ -0,0 +1,437 @@
+# Copyright 2011 Jamie Norrish (jamie@artefact.org.nz)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module providing a deferred facade over topic maps, topics and
+indices, which batches lookups made by independent callers.
+
+Each method `get_x` of a wrapped `TopicMap`, `Topic` or index is
+available on its facade as `aget_x`, returning a `Deferred` rather
+than the result. No query is made until the `result()` of a deferred
+is requested. At that point every lookup deferred in the current
+thread, by any facade, is resolved, and lookups of the same kind are
+resolved together:
+
+* subject identifier and item identifier lookups with a single query
+  per chunk of identifiers (see `TopicMap.resolve_identities`);
+
+* subject locator lookups with a single query per chunk;
+
+* the names, occurrences and types of topics with a query per chunk
+  of topics.
+
+Fan-out resolvers (eg, those of a GraphQL field on a list of items)
+can therefore first request the deferred results for every item and
+then collect them, at the cost of one query per kind rather than one
+per item. Other methods are called individually when their result is
+requested. Results that are `QuerySet`s are returned as lists.
+
+A `DeferredTopicMap` should be used for a single request, since the
+deferred results are not updated by later changes to the topic map.
+
+"""
+
+import sys
+import threading
+
+from django.db.models.query import QuerySet
+
+from tmapi.models import Locator, Name, Occurrence, Topic, TopicMap
+from tmapi.models.batch import CHUNK_SIZE
+from tmapi.models.subject_locator import SubjectLocator
+
+
+_local = threading.local()
+
+
+class Deferred (object):
+
+    """The result of a TMAPI call that is made, possibly together
+    with other calls of the same kind, when the result is first
+    requested."""
+
+    def __init__ (self, function=None):
+        """Initialises a deferred result.
+
+        :param function: the function returning the result, or None
+          if the result is set by a `Loader`
+        :type function: callable
+
+        """
+        self._function = function
+        self._resolved = False
+        self._result = None
+        self._exc_info = None
+
+    def is_resolved (self):
+        """Returns True if the result of this deferred is available.
+
+        :rtype: boolean
+
+        """
+        return self._resolved
+
+    def result (self):
+        """Returns the result, first resolving every lookup deferred
+        in the current thread, if it is not yet available.
+
+        If the call raised an exception, it is raised again.
+
+        :rtype: object
+
+        """
+        if not self._resolved:
+            dispatch()
+        if not self._resolved:
+            try:
+                self._set_result(_evaluate(self._function()))
+            except Exception:
+                self._set_exception(sys.exc_info())
+        if self._exc_info is not None:
+            raise self._exc_info[0], self._exc_info[1], self._exc_info[2]
+        return self._result
+
+    def then (self, function):
+        """Returns a `Deferred` whose result is that of `function`
+        called with the result of this deferred.
+
+        :param function: the function to call
+        :type function: callable
+        :rtype: `Deferred`
+
+        """
+        return Deferred(lambda: function(self.result()))
+
+    def _set_exception (self, exc_info):
+        self._exc_info = exc_info
+        self._resolved = True
+
+    def _set_result (self, result):
+        self._result = result
+        self._resolved = True
+
+
+class Loader (object):
+
+    """Collects the keys requested of it and loads them together.
+
+    `batch_function` is called with a list of distinct keys, and
+    returns a dictionary of results keyed by key; keys missing from
+    the dictionary have a result of None.
+
+    """
+
+    def __init__ (self, batch_function):
+        self._batch_function = batch_function
+        self._pending = {}
+
+    def dispatch (self):
+        """Loads all of the keys requested since the last dispatch."""
+        pending = self._pending
+        self._pending = {}
+        if not pending:
+            return
+        try:
+            results = self._batch_function(pending.keys())
+        except Exception:
+            exc_info = sys.exc_info()
+            for deferred in pending.values():
+                deferred._set_exception(exc_info)
+            return
+        for key, deferred in pending.items():
+            deferred._set_result(results.get(key))
+
+    def load (self, key):
+        """Returns a `Deferred` for the result of `key`.
+
+        :param key: the key to load
+        :type key: hashable object
+        :rtype: `Deferred`
+
+        """
+        deferred = self._pending.get(key)
+        if deferred is None:
+            deferred = self._pending[key] = Deferred()
+            _get_loaders().add(self)
+        return deferred
+
+
+class _Facade (object):
+
+    """Base class of the facades, making each method `get_x` of the
+    wrapped object available as `aget_x`."""
+
+    def __init__ (self, wrapped):
+        self._wrapped = wrapped
+
+    def __getattr__ (self, name):
+        if not name.startswith('aget_'):
+            return getattr(self._wrapped, name)
+        method = getattr(self._wrapped, name[1:])
+        def defer (*args, **kwargs):
+            return Deferred(lambda: method(*args, **kwargs))
+        defer.__name__ = name
+        return defer
+
+
+class DeferredIndex (_Facade):
+
+    """Deferred facade over an index."""
+
+
+class DeferredTopic (_Facade):
+
+    """Deferred facade over a `Topic`, obtained from
+    `DeferredTopicMap.get_topic`."""
+
+    def __init__ (self, topic, topic_map):
+        super(DeferredTopic, self).__init__(topic)
+        self._topic_map = topic_map
+
+    def aget_names (self, name_type=None):
+        """Returns a `Deferred` list of the names of this topic.
+
+        Without a `name_type`, the names are loaded together with
+        those of other topics.
+
+        :param name_type: the type of the names to be returned
+        :type name_type: `Topic`
+        :rtype: `Deferred`
+
+        """
+        if name_type is not None:
+            return Deferred(lambda: self._wrapped.get_names(name_type))
+        return self._topic_map._load('names', self._wrapped)
+
+    def aget_occurrences (self, occurrence_type=None):
+        """Returns a `Deferred` list of the occurrences of this topic.
+
+        Without an `occurrence_type`, the occurrences are loaded
+        together with those of other topics.
+
+        :param occurrence_type: the type of the occurrences to be
+          returned
+        :type occurrence_type: `Topic`
+        :rtype: `Deferred`
+
+        """
+        if occurrence_type is not None:
+            return Deferred(lambda: self._wrapped.get_occurrences(
+                    occurrence_type))
+        return self._topic_map._load('occurrences', self._wrapped)
+
+    def aget_types (self):
+        """Returns a `Deferred` list of the types of this topic,
+        loaded together with those of other topics.
+
+        :rtype: `Deferred`
+
+        """
+        return self._topic_map._load('types', self._wrapped)
+
+
+class DeferredTopicMap (_Facade):
+
+    """Deferred facade over a `TopicMap`."""
+
+    def __init__ (self, topic_map):
+        super(DeferredTopicMap, self).__init__(topic_map)
+        self._indices = {}
+        self._loaders = {
+            'identities': Loader(self._load_identities),
+            'names': Loader(self._load_names),
+            'occurrences': Loader(self._load_occurrences),
+            'subject_locators': Loader(self._load_subject_locators),
+            'types': Loader(self._load_types),
+            }
+
+    def aget_construct_by_item_identifier (self, item_identifier):
+        """Returns a `Deferred` construct with `item_identifier`,
+        resolved together with other identity lookups.
+
+        :param item_identifier: the item identifier
+        :type item_identifier: `Locator`
+        :rtype: `Deferred`
+
+        """
+        return self._loaders['identities'].load(
+            item_identifier.to_external_form()).then(lambda match: match[1])
+
+    def aget_topic_by_subject_identifier (self, subject_identifier):
+        """Returns a `Deferred` topic with `subject_identifier`,
+        resolved together with other identity lookups.
+
+        :param subject_identifier: the subject identifier
+        :type subject_identifier: `Locator`
+        :rtype: `Deferred`
+
+        """
+        return self._loaders['identities'].load(
+            subject_identifier.to_external_form()).then(
+            lambda match: match[0])
+
+    def aget_topic_by_subject_locator (self, subject_locator):
+        """Returns a `Deferred` topic with `subject_locator`, resolved
+        together with other subject locator lookups.
+
+        :param subject_locator: the subject locator
+        :type subject_locator: `Locator`
+        :rtype: `Deferred`
+
+        """
+        return self._loaders['subject_locators'].load(
+            subject_locator.to_external_form())
+
+    def get_index (self, index_interface):
+        """Returns a deferred facade over the specified index.
+
+        :param index_interface: the index to return
+        :type index_interface: class
+        :rtype: `DeferredIndex`
+
+        """
+        if index_interface not in self._indices:
+            self._indices[index_interface] = DeferredIndex(
+                self._wrapped.get_index(index_interface))
+        return self._indices[index_interface]
+
+    def get_topic (self, topic):
+        """Returns a deferred facade over `topic`, whose lookups are
+        batched with those of the other topics of this topic map.
+
+        :param topic: the topic
+        :type topic: `Topic`
+        :rtype: `DeferredTopic`
+
+        """
+        return DeferredTopic(topic, self)
+
+    def _is_database (self):
+        """Returns True if the wrapped topic map is held in the
+        database, so that lookups can be batched.
+
+        :rtype: boolean
+
+        """
+        return isinstance(self._wrapped, TopicMap)
+
+    def _load (self, kind, topic):
+        """Returns a `Deferred` for the `kind` characteristics of
+        `topic`.
+
+        :param kind: 'names', 'occurrences' or 'types'
+        :type kind: string
+        :param topic: the topic
+        :type topic: `Topic`
+        :rtype: `Deferred`
+
+        """
+        if not self._is_database():
+            return Deferred(getattr(topic, 'get_%s' % kind))
+        return self._loaders[kind].load(topic)
+
+    def _load_characteristics (self, model, topics):
+        """Returns the instances of `model` belonging to each of
+        `topics`, as a dictionary keyed by topic.
+
+        :param model: `Name` or `Occurrence`
+        :type model: class
+        :param topics: the topics
+        :type topics: list of `Topic`s
+        :rtype: dictionary
+
+        """
+        results = dict([(topic, []) for topic in topics])
+        by_id = dict([(topic.pk, topic) for topic in topics])
+        ids = by_id.keys()
+        for start in range(0, len(ids), CHUNK_SIZE):
+            for construct in model.objects.filter(
+                topic__in=ids[start:start+CHUNK_SIZE]):
+                results[by_id[construct.topic_id]].append(construct)
+        return results
+
+    def _load_identities (self, addresses):
+        return self._wrapped.resolve_identities(
+            [Locator(address) for address in addresses])
+
+    def _load_names (self, topics):
+        return self._load_characteristics(Name, topics)
+
+    def _load_occurrences (self, topics):
+        return self._load_characteristics(Occurrence, topics)
+
+    def _load_subject_locators (self, addresses):
+        if not self._is_database():
+            return dict([(address, self._wrapped.get_topic_by_subject_locator(
+                            Locator(address))) for address in addresses])
+        results = {}
+        for start in range(0, len(addresses), CHUNK_SIZE):
+            for subject_locator in SubjectLocator.objects.filter(
+                containing_topic_map=self._wrapped,
+                address__in=addresses[start:start+CHUNK_SIZE]).select_related(
+                'topic'):
+                results[subject_locator.address] = subject_locator.topic
+        return results
+
+    def _load_types (self, topics):
+        field = Topic._meta.get_field('types')
+        source_name = field.m2m_field_name()
+        target_name = field.m2m_reverse_field_name()
+        by_id = dict([(topic.pk, topic) for topic in topics])
+        ids = by_id.keys()
+        rows = []
+        for start in range(0, len(ids), CHUNK_SIZE):
+            rows.extend(field.rel.through.objects.filter(**{
+                        '%s__in' % source_name: ids[start:start+CHUNK_SIZE]})
+                        .values_list(source_name, target_name))
+        type_ids = list(set([type_id for topic_id, type_id in rows]))
+        types = {}
+        for start in range(0, len(type_ids), CHUNK_SIZE):
+            types.update([(topic_type.pk, topic_type) for topic_type in
+                          Topic.objects.filter(
+                        pk__in=type_ids[start:start+CHUNK_SIZE])])
+        results = dict([(topic, []) for topic in topics])
+        for topic_id, type_id in rows:
+            results[by_id[topic_id]].append(types[type_id])
+        return results
+
+
+def dispatch ():
+    """Resolves every lookup deferred in the current thread."""
+    loaders = _get_loaders()
+    while loaders:
+        loaders.pop().dispatch()
+
+def _evaluate (result):
+    """Returns `result`, as a list if it is a `QuerySet`.
+
+    :param result: the result of a TMAPI call
+    :type result: object
+    :rtype: object
+
+    """
+    if isinstance(result, QuerySet):
+        return list(result)
+    return result
+
+def _get_loaders ():
+    """Returns the set of loaders with pending lookups in the current
+    thread.
+
+    :rtype: set
+
+    """
+    loaders = getattr(_local, 'loaders', None)
+    if loaders is None:
+        loaders = _local.loaders = set()
+    return loaders
@@ -174,6 +174,37 @@ class MalformedIRIException (TMAPIRuntimeException):
         super(MalformedIRIException, self).__init__(message)
 
 
+class ParseException (TMAPIRuntimeException):
+
+    """Thrown to indicate that a serialised topic map is not well
+    formed."""
+
+    def __init__ (self, message, line=None):
+        """Constructs a `ParseException` with the specified detail
+        message.
+
+        :param message: the detail message
+        :type message: string
+        :param line: the number of the line at which the error was
+          found
+        :type line: integer
+
+        """
+        if line is not None:
+            message = '%s (line %d)' % (message, line)
+        super(ParseException, self).__init__(message)
+        self._line = line
+
+    def get_line (self):
+        """Returns the number of the line at which the error was
+        found, or None if it is not known.
+
+        :rtype: integer
+
+        """
+        return self._line
+
+
 class TopicInUseException (ModelConstraintException):
 
     """Thrown when an attempt is made to remove a `Topic` which is
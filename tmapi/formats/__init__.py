@@ -0,0 +1,19 @@
+# Copyright 2011 Jamie Norrish (jamie@artefact.org.nz)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from ctm_parser import CTMParser
+from ctm_writer import CTMWriter
+from jtm_reader import JTMReader
+from locator_resolver import LocatorResolver
+from topic_map_handler import TopicMapHandler
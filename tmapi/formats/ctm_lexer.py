@@ -0,0 +1,143 @@
+# Copyright 2011 Jamie Norrish (jamie@artefact.org.nz)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module containing the lexer of CTM (Compact Topic Maps Syntax)
+documents.
+
+The lexer is a generator, so that a document is divided into tokens
+only as fast as the parser consumes them. Each token is a (type,
+value, line) tuple.
+
+An absolute IRI may be written without angle brackets only if its
+scheme is followed by "//" (eg, "http://psi.example.org/x"), since
+otherwise it cannot be told apart from a prefixed name. A trailing
+full stop or colon ends the IRI (as at the end of a statement, or
+after a role type), and brackets, commas and semicolons are not
+part of it.
+
+"""
+
+import re
+
+from tmapi.exceptions import ParseException
+
+
+# Token types.
+DATATYPE = 'DATATYPE'
+DATE = 'DATE'
+DATE_TIME = 'DATE_TIME'
+DECIMAL = 'DECIMAL'
+DIRECTIVE = 'DIRECTIVE'
+EOF = 'EOF'
+IDENTIFIER = 'IDENTIFIER'
+INTEGER = 'INTEGER'
+IRI = 'IRI'
+PREFIXED_NAME = 'PREFIXED_NAME'
+PUNCTUATION = 'PUNCTUATION'
+STRING = 'STRING'
+VARIABLE = 'VARIABLE'
+WILDCARD = 'WILDCARD'
+# A topic supplied by the parser (as the implicit first argument of
+# a template invoked in a topic's tail); never produced by the lexer.
+TOPIC = 'TOPIC'
+
+# Keywords, which cannot be used as identifiers.
+KEYWORDS = ('ako', 'def', 'end', 'isa')
+
+_TOKEN_PATTERNS = (
+    (None, r'#\(.*?\)#'),
+    (None, r'#[^\n]*'),
+    (None, r'\s+'),
+    (IRI, r'<[^<>"{}|^`\\\s]*>'),
+    (IRI, r'[A-Za-z][A-Za-z0-9+.-]*://'
+     r'(?:[^<>"{}|^`\\\s()\[\],;]*[^<>"{}|^`\\\s()\[\],;.:])?'),
+    (STRING, r'"""(?:[^"\\]|\\.|"(?!""))*"""'),
+    (STRING, r'"(?:[^"\\]|\\.)*"'),
+    (DATATYPE, r'\^\^'),
+    (DATE_TIME, r'-?[0-9]{4,}-[0-9]{2}-[0-9]{2}T[0-9]{2}:[0-9]{2}'
+     r'(?::[0-9]{2}(?:\.[0-9]+)?)?(?:Z|[+-][0-9]{2}:[0-9]{2})?'),
+    (DATE, r'-?[0-9]{4,}-[0-9]{2}-[0-9]{2}(?:Z|[+-][0-9]{2}:[0-9]{2})?'),
+    (DECIMAL, r'[-+]?[0-9]+\.[0-9]+'),
+    (INTEGER, r'[-+]?[0-9]+'),
+    (VARIABLE, r'\$[A-Za-z_][\w-]*'),
+    (WILDCARD, r'\?(?:[A-Za-z_][\w-]*)?'),
+    (DIRECTIVE, r'%[a-z]+'),
+    (PREFIXED_NAME, r'[A-Za-z_][\w-]*:\w(?:[\w.-]*[\w-])?'),
+    (IDENTIFIER, r'[A-Za-z_](?:[\w.-]*[\w-])?'),
+    (PUNCTUATION, r'[.;:,()\[\]@~=^-]'),
+    )
+
+_TOKEN_RE = re.compile('|'.join(['(%s)' % pattern for token_type, pattern
+                                 in _TOKEN_PATTERNS]), re.DOTALL | re.UNICODE)
+
+_ESCAPE_RE = re.compile(r'\\(?:u([0-9A-Fa-f]{4})|U([0-9A-Fa-f]{6})|(.))',
+                        re.DOTALL)
+
+_ESCAPES = {'"': u'"', '\\': u'\\', 'n': u'\n', 'r': u'\r', 't': u'\t'}
+
+
+def tokenise (text):
+    """Yields the tokens of the CTM document `text`, ending with an
+    EOF token.
+
+    :param text: the CTM document
+    :type text: unicode
+    :rtype: iterator over tuples
+
+    """
+    position = 0
+    line = 1
+    length = len(text)
+    while position < length:
+        match = _TOKEN_RE.match(text, position)
+        if match is None:
+            raise ParseException('Unexpected character "%s"' %
+                                 text[position], line)
+        text_value = value = match.group()
+        token_type = _TOKEN_PATTERNS[match.lastindex - 1][0]
+        if token_type is not None:
+            if token_type == IRI and value.startswith('<'):
+                value = value[1:-1]
+            elif token_type == STRING:
+                value = unescape(value, line)
+            yield (token_type, value, line)
+        line += text_value.count('\n')
+        position = match.end()
+    yield (EOF, None, line)
+
+def unescape (literal, line=None):
+    """Returns the value of the string `literal`, without its quotes
+    and with its escape sequences replaced.
+
+    :param literal: a quoted string literal
+    :type literal: unicode
+    :param line: the line the literal starts on, for error reporting
+    :type line: integer
+    :rtype: unicode
+
+    """
+    if literal.startswith('"""'):
+        literal = literal[3:-3]
+    else:
+        literal = literal[1:-1]
+    def replace (match):
+        short, long, character = match.groups()
+        if character is None:
+            return unichr(int(short or long, 16))
+        try:
+            return _ESCAPES[character]
+        except KeyError:
+            raise ParseException('Invalid escape sequence "\\%s"' %
+                                 character, line)
+    return _ESCAPE_RE.sub(replace, literal)
@@ -0,0 +1,627 @@
+# Copyright 2011 Jamie Norrish (jamie@artefact.org.nz)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module containing the parser of CTM (Compact Topic Maps Syntax)
+1.0 documents (http://www.isotopicmaps.org/ctm/).
+
+The parser passes each construct to a handler (see
+`TopicMapHandler`) as soon as it has been read, so that a document is
+added to a topic map without first being held in memory as a whole.
+
+The prefix, version and encoding directives, topic blocks (with
+identities, types, supertypes, names with variants, occurrences and
+embedded topics), associations, scope, reification, wildcards and
+templates are supported. The include and mergemap directives are
+not.
+
+"""
+
+import re
+
+from tmapi.constants import SUBTYPE, SUPERTYPE, SUPERTYPE_SUBTYPE, \
+    XSD, XSD_ANY_URI, XSD_DATE, XSD_DATE_TIME, XSD_DECIMAL, XSD_INTEGER, \
+    XSD_STRING
+from tmapi.exceptions import ParseException
+from tmapi.models.locator import Locator
+
+from ctm_lexer import DATATYPE, DATE, DATE_TIME, DECIMAL, DIRECTIVE, \
+    EOF, IDENTIFIER, INTEGER, IRI, KEYWORDS, PREFIXED_NAME, PUNCTUATION, STRING, TOPIC, \
+    VARIABLE, WILDCARD, tokenise
+from locator_resolver import LocatorResolver
+from topic_map_handler import ITEM_IDENTIFIER, SUBJECT_IDENTIFIER, \
+    SUBJECT_LOCATOR
+
+
+# The token types that may begin a topic reference used as the type
+# of a name or occurrence.
+TYPE_REFERENCE_TYPES = (IDENTIFIER, IRI, PREFIXED_NAME, TOPIC)
+
+_ENCODING_RE = re.compile(r'\s*%encoding\s+"([^"]*)"')
+
+
+class CTMParser (object):
+
+    """Parser of CTM documents."""
+
+    def __init__ (self, handler, base):
+        """Creates a parser passing the constructs it reads to
+        `handler`.
+
+        :param handler: the handler to receive the constructs
+        :type handler: `TopicMapHandler`
+        :param base: the locator of the document, against which
+          identifiers and relative IRIs are resolved
+        :type base: `Locator` or string
+
+        """
+        self._handler = handler
+        self._resolver = LocatorResolver(base)
+        self._resolver.add_prefix('xsd', XSD)
+        self._templates = {}
+        self._template_names = set()
+        self._wildcards = {}
+        self._invocations = 0
+        self._tokens = None
+
+    def parse (self, source):
+        """Parses the CTM document `source`.
+
+        :param source: the document, or a file-like object to read it
+          from
+        :type source: string, unicode or file-like object
+
+        """
+        if hasattr(source, 'read'):
+            source = source.read()
+        if isinstance(source, str):
+            source = _decode(source)
+        if source.startswith(u'\ufeff'):
+            source = source[1:]
+        self._tokens = _TokenStream(tokenise(source))
+        with self._handler:
+            while self._peek()[0] == DIRECTIVE:
+                self._parse_directive()
+            if self._is_punctuation(self._peek(), '~'):
+                self._next()
+                self._handler.set_reifier(self._parse_topic_ref())
+            self._parse_statements()
+
+    def _expect (self, token_type, value=None):
+        """Returns the next token, which must be of `token_type` and,
+        if specified, have `value`.
+
+        :param token_type: the required token type
+        :type token_type: string
+        :param value: the required value
+        :type value: string
+        :rtype: tuple
+
+        """
+        token = self._next()
+        if token[0] != token_type or (value is not None and
+                                      token[1] != value):
+            self._raise_unexpected(token, value or token_type)
+        return token
+
+    def _invoke (self, params, body, args):
+        """Parses the statements of a template's `body`, with its
+        `params` bound to `args`.
+
+        :param params: the names of the template's parameters
+        :type params: list of strings
+        :param body: the tokens of the template's body
+        :type body: list of tuples
+        :param args: the tokens of each argument
+        :type args: list of lists of tuples
+
+        """
+        self._invocations += 1
+        bindings = dict(zip(params, args))
+        tokens = []
+        for token in body:
+            token_type, value, line = token
+            if token_type == VARIABLE:
+                try:
+                    tokens.extend(bindings[value])
+                except KeyError:
+                    raise ParseException('Unbound variable "%s"' % value,
+                                         line)
+            elif token_type == WILDCARD and value != '?':
+                # Named wildcards are local to each invocation.
+                tokens.append((WILDCARD, '%s#%d' % (value, self._invocations),
+                               line))
+            else:
+                tokens.append(token)
+        self._parse_tokens(tokens, self._parse_statements)
+
+    def _is_punctuation (self, token, value):
+        """Returns True if `token` is the punctuation `value`.
+
+        :param token: the token
+        :type token: tuple
+        :param value: the punctuation character
+        :type value: string
+        :rtype: boolean
+
+        """
+        return token[0] == PUNCTUATION and token[1] == value
+
+    def _next (self):
+        """Returns the next token, removing it from the stream.
+
+        :rtype: tuple
+
+        """
+        return self._tokens.next()
+
+    def _parse_argument (self):
+        """Returns the tokens of the next argument of a template
+        invocation.
+
+        Wildcards and embedded topics are resolved to their topic
+        here, so that a parameter used more than once refers to the
+        same topic each time.
+
+        :rtype: list of tuples
+
+        """
+        tokens = []
+        depth = 0
+        while True:
+            token = self._peek()
+            if token[0] == EOF:
+                self._raise_unexpected(token, ')')
+            if depth == 0 and (self._is_punctuation(token, ',') or
+                               self._is_punctuation(token, ')')):
+                break
+            if self._is_punctuation(token, '(') or \
+                    self._is_punctuation(token, '['):
+                depth += 1
+            elif self._is_punctuation(token, ')') or \
+                    self._is_punctuation(token, ']'):
+                depth -= 1
+            tokens.append(self._next())
+        if not tokens:
+            self._raise_unexpected(self._peek(), 'an argument')
+        if tokens[0][0] == WILDCARD or self._is_punctuation(tokens[0], '['):
+            topic = self._parse_tokens(tokens, self._parse_topic_ref)
+            tokens = [(TOPIC, topic, tokens[0][2])]
+        return tokens
+
+    def _parse_association (self, association_type):
+        """Parses an association of `association_type`, whose roles
+        are next in the stream.
+
+        :param association_type: the association type
+        :type association_type: `Topic`
+
+        """
+        self._expect(PUNCTUATION, '(')
+        roles = [self._parse_role()]
+        while self._is_punctuation(self._peek(), ','):
+            self._next()
+            roles.append(self._parse_role())
+        self._expect(PUNCTUATION, ')')
+        scope = self._parse_scope()
+        reifier = self._parse_reifier()
+        self._handler.add_association(association_type, roles, scope,
+                                      reifier)
+
+    def _parse_directive (self):
+        """Parses a directive."""
+        token = self._next()
+        directive = token[1]
+        if directive == '%prefix':
+            prefix = self._expect(IDENTIFIER)[1]
+            self._resolver.add_prefix(prefix, self._expect(IRI)[1])
+        elif directive == '%version':
+            version = self._expect(DECIMAL)
+            if version[1] != '1.0':
+                raise ParseException('Unsupported CTM version %s' %
+                                     version[1], version[2])
+        elif directive == '%encoding':
+            # The encoding has been used in decoding the document.
+            self._expect(STRING)
+        elif directive in ('%include', '%mergemap'):
+            raise ParseException('The %s directive is not supported' %
+                                 directive, token[2])
+        else:
+            raise ParseException('Unknown directive %s' % directive,
+                                 token[2])
+
+    def _parse_invocation (self, topic=None):
+        """Parses the invocation of a template.
+
+        :param topic: the topic in whose tail the invocation occurs,
+          which is passed as the first argument
+        :type topic: `Topic`
+
+        """
+        name_token = self._expect(IDENTIFIER)
+        self._expect(PUNCTUATION, '(')
+        args = []
+        if topic is not None:
+            args.append([(TOPIC, topic, name_token[2])])
+        if not self._is_punctuation(self._peek(), ')'):
+            args.append(self._parse_argument())
+            while self._is_punctuation(self._peek(), ','):
+                self._next()
+                args.append(self._parse_argument())
+        self._expect(PUNCTUATION, ')')
+        try:
+            params, body = self._templates[(name_token[1], len(args))]
+        except KeyError:
+            raise ParseException('No template %s with %d parameters' %
+                                 (name_token[1], len(args)), name_token[2])
+        self._invoke(params, body, args)
+
+    def _parse_iri (self):
+        """Returns the locator of the IRI or prefixed name next in the
+        stream.
+
+        :rtype: `Locator`
+
+        """
+        token = self._next()
+        if token[0] == IRI:
+            return self._resolver.resolve(token[1])
+        if token[0] == PREFIXED_NAME:
+            prefix, local = token[1].split(':', 1)
+            return self._resolver.resolve_prefixed(prefix, local, token[2])
+        self._raise_unexpected(token, 'an IRI')
+
+    def _parse_literal (self):
+        """Returns the value and datatype of the literal next in the
+        stream.
+
+        :rtype: tuple of unicode and string
+
+        """
+        token = self._peek()
+        if token[0] in (IRI, PREFIXED_NAME):
+            return self._parse_iri().to_external_form(), XSD_ANY_URI
+        token = self._next()
+        if token[0] == STRING:
+            datatype = XSD_STRING
+            if self._peek()[0] == DATATYPE:
+                self._next()
+                datatype = self._parse_iri().to_external_form()
+            return token[1], datatype
+        if token[0] == INTEGER:
+            return token[1], XSD_INTEGER
+        if token[0] == DECIMAL:
+            return token[1], XSD_DECIMAL
+        if token[0] == DATE:
+            return token[1], XSD_DATE
+        if token[0] == DATE_TIME:
+            return token[1], XSD_DATE_TIME
+        self._raise_unexpected(token, 'a literal')
+
+    def _parse_name (self, topic):
+        """Parses a name of `topic`, following the name marker.
+
+        :param topic: the topic the name belongs to
+        :type topic: `Topic`
+
+        """
+        name_type = None
+        if self._peek()[0] in TYPE_REFERENCE_TYPES and \
+                self._is_punctuation(self._peek(1), ':'):
+            name_type = self._parse_topic_ref()
+            self._next()
+        value = self._expect(STRING)[1]
+        scope = self._parse_scope()
+        reifier = self._parse_reifier()
+        variants = []
+        while self._is_punctuation(self._peek(), '('):
+            self._next()
+            variant_value, datatype = self._parse_literal()
+            variant_scope = self._parse_scope()
+            variant_reifier = self._parse_reifier()
+            self._expect(PUNCTUATION, ')')
+            variants.append((variant_value, datatype, variant_scope,
+                             variant_reifier))
+        self._handler.add_name(topic, name_type, value, scope, reifier,
+                               variants)
+
+    def _parse_reifier (self):
+        """Returns the reifier next in the stream, if any.
+
+        :rtype: `Topic` or None
+
+        """
+        if self._is_punctuation(self._peek(), '~'):
+            self._next()
+            return self._parse_topic_ref()
+        return None
+
+    def _parse_role (self):
+        """Returns the type, player and reifier of the role next in
+        the stream.
+
+        :rtype: tuple
+
+        """
+        role_type = self._parse_topic_ref()
+        self._expect(PUNCTUATION, ':')
+        player = self._parse_topic_ref()
+        return role_type, player, self._parse_reifier()
+
+    def _parse_scope (self):
+        """Returns the themes of the scope next in the stream, if any.
+
+        :rtype: list of `Topic`s
+
+        """
+        themes = []
+        if self._is_punctuation(self._peek(), '@'):
+            self._next()
+            themes.append(self._parse_topic_ref())
+            while self._is_punctuation(self._peek(), ','):
+                self._next()
+                themes.append(self._parse_topic_ref())
+        return themes
+
+    def _parse_statements (self):
+        """Parses statements until the end of the stream."""
+        while self._peek()[0] != EOF:
+            token = self._peek()
+            if token[0] == DIRECTIVE:
+                self._parse_directive()
+            elif token[0] == IDENTIFIER and token[1] == 'def':
+                self._parse_template_definition()
+            elif token[0] == IDENTIFIER and \
+                    token[1] in self._template_names and \
+                    self._is_punctuation(self._peek(1), '('):
+                self._parse_invocation()
+            else:
+                topic = self._parse_topic_ref()
+                if self._is_punctuation(self._peek(), '('):
+                    self._parse_association(topic)
+                else:
+                    self._parse_topic_tail(topic, '.')
+
+    def _parse_tail_item (self, topic):
+        """Parses an item of the tail of `topic`.
+
+        :param topic: the topic the tail belongs to
+        :type topic: `Topic`
+
+        """
+        token = self._peek()
+        token_type, value = token[:2]
+        if token_type == IDENTIFIER and value == 'isa':
+            self._next()
+            self._handler.add_type(topic, self._parse_topic_ref())
+        elif token_type == IDENTIFIER and value == 'ako':
+            self._next()
+            supertype = self._parse_topic_ref()
+            get_topic = self._handler.get_topic
+            self._handler.add_association(
+                get_topic(SUBJECT_IDENTIFIER, Locator(SUPERTYPE_SUBTYPE)),
+                [(get_topic(SUBJECT_IDENTIFIER, Locator(SUBTYPE)), topic,
+                  None),
+                 (get_topic(SUBJECT_IDENTIFIER, Locator(SUPERTYPE)),
+                  supertype, None)])
+        elif self._is_punctuation(token, '-'):
+            self._next()
+            self._parse_name(topic)
+        elif self._is_punctuation(token, '='):
+            self._next()
+            self._handler.add_identity(topic, SUBJECT_LOCATOR,
+                                       self._parse_iri())
+        elif self._is_punctuation(token, '^'):
+            self._next()
+            self._handler.add_identity(topic, ITEM_IDENTIFIER,
+                                       self._parse_iri())
+        elif token_type in TYPE_REFERENCE_TYPES and \
+                self._is_punctuation(self._peek(1), ':'):
+            occurrence_type = self._parse_topic_ref()
+            self._next()
+            value, datatype = self._parse_literal()
+            scope = self._parse_scope()
+            reifier = self._parse_reifier()
+            self._handler.add_occurrence(topic, occurrence_type, value,
+                                         datatype, scope, reifier)
+        elif token_type == IDENTIFIER and \
+                self._is_punctuation(self._peek(1), '('):
+            self._parse_invocation(topic)
+        elif token_type in (IRI, PREFIXED_NAME):
+            self._handler.add_identity(topic, SUBJECT_IDENTIFIER,
+                                       self._parse_iri())
+        else:
+            self._raise_unexpected(token, 'a topic characteristic')
+
+    def _parse_template_definition (self):
+        """Parses the definition of a template."""
+        self._expect(IDENTIFIER, 'def')
+        name = self._expect(IDENTIFIER)[1]
+        self._expect(PUNCTUATION, '(')
+        params = []
+        if not self._is_punctuation(self._peek(), ')'):
+            params.append(self._expect(VARIABLE)[1])
+            while self._is_punctuation(self._peek(), ','):
+                self._next()
+                params.append(self._expect(VARIABLE)[1])
+        self._expect(PUNCTUATION, ')')
+        body = []
+        while True:
+            token = self._next()
+            if token[0] == EOF:
+                raise ParseException('Template %s is not ended' % name,
+                                     token[2])
+            if token[0] == IDENTIFIER:
+                if token[1] == 'end':
+                    break
+                if token[1] == 'def':
+                    raise ParseException(
+                        'Templates may not be defined within templates',
+                        token[2])
+            body.append(token)
+        self._templates[(name, len(params))] = (params, body)
+        self._template_names.add(name)
+
+    def _parse_tokens (self, tokens, method):
+        """Returns the result of calling `method` to parse `tokens`,
+        which must be consumed entirely.
+
+        :param tokens: the tokens to parse
+        :type tokens: list of tuples
+        :param method: the parsing method
+        :type method: callable
+
+        """
+        line = 0
+        if tokens:
+            line = tokens[-1][2]
+        stream = self._tokens
+        self._tokens = _TokenStream(tokens + [(EOF, None, line)])
+        try:
+            result = method()
+            self._expect(EOF)
+        finally:
+            self._tokens = stream
+        return result
+
+    def _parse_topic_ref (self):
+        """Returns the topic referenced next in the stream.
+
+        :rtype: `Topic`
+
+        """
+        token = self._next()
+        token_type, value, line = token
+        if token_type == TOPIC:
+            return value
+        if token_type == IDENTIFIER:
+            if value in KEYWORDS:
+                self._raise_unexpected(token, 'a topic reference')
+            return self._handler.get_topic(
+                ITEM_IDENTIFIER, self._resolver.resolve('#' + value))
+        if token_type == IRI:
+            return self._handler.get_topic(SUBJECT_IDENTIFIER,
+                                           self._resolver.resolve(value))
+        if token_type == PREFIXED_NAME:
+            prefix, local = value.split(':', 1)
+            return self._handler.get_topic(
+                SUBJECT_IDENTIFIER,
+                self._resolver.resolve_prefixed(prefix, local, line))
+        if self._is_punctuation(token, '='):
+            return self._handler.get_topic(SUBJECT_LOCATOR,
+                                           self._parse_iri())
+        if self._is_punctuation(token, '^'):
+            return self._handler.get_topic(ITEM_IDENTIFIER,
+                                           self._parse_iri())
+        if token_type == WILDCARD:
+            if value == '?':
+                return self._handler.create_topic()
+            topic = self._wildcards.get(value)
+            if topic is None:
+                topic = self._wildcards[value] = self._handler.create_topic()
+            return topic
+        if self._is_punctuation(token, '['):
+            topic = self._handler.create_topic()
+            self._parse_topic_tail(topic, ']')
+            return topic
+        if token_type == VARIABLE:
+            raise ParseException('Unbound variable "%s"' % value, line)
+        self._raise_unexpected(token, 'a topic reference')
+
+    def _parse_topic_tail (self, topic, terminator):
+        """Parses the tail of `topic`, up to and including
+        `terminator`.
+
+        :param topic: the topic the tail belongs to
+        :type topic: `Topic`
+        :param terminator: the punctuation ending the tail
+        :type terminator: string
+
+        """
+        while not self._is_punctuation(self._peek(), terminator):
+            self._parse_tail_item(topic)
+            if not self._is_punctuation(self._peek(), ';'):
+                break
+            self._next()
+        self._expect(PUNCTUATION, terminator)
+
+    def _peek (self, offset=0):
+        """Returns the token `offset` tokens ahead in the stream,
+        without removing it.
+
+        :param offset: the number of tokens to look past
+        :type offset: integer
+        :rtype: tuple
+
+        """
+        return self._tokens.peek(offset)
+
+    def _raise_unexpected (self, token, expected):
+        """Raises a `ParseException` reporting that `token` was found
+        where `expected` was required.
+
+        :param token: the token found
+        :type token: tuple
+        :param expected: a description of what was required
+        :type expected: string
+
+        """
+        found = token[1]
+        if token[0] == EOF:
+            found = 'the end of the document'
+        elif token[0] == TOPIC:
+            found = 'a topic'
+        raise ParseException('Expected %s but found %s' % (expected, found),
+                             token[2])
+
+
+class _TokenStream (object):
+
+    """Stream of tokens supporting look ahead."""
+
+    def __init__ (self, tokens):
+        self._tokens = iter(tokens)
+        self._buffer = []
+
+    def next (self):
+        token = self.peek()
+        del self._buffer[0]
+        return token
+
+    def peek (self, offset=0):
+        while len(self._buffer) <= offset:
+            try:
+                self._buffer.append(self._tokens.next())
+            except StopIteration:
+                # Continue past the end with further EOF tokens.
+                self._buffer.append(self._buffer[-1])
+        return self._buffer[offset]
+
+
+def _decode (source):
+    """Returns the CTM document `source` decoded according to its
+    encoding directive, or as UTF-8 if it has none.
+
+    :param source: the encoded document
+    :type source: string
+    :rtype: unicode
+
+    """
+    encoding = 'utf-8'
+    match = _ENCODING_RE.match(source)
+    if match is not None:
+        encoding = match.group(1)
+    try:
+        return source.decode(encoding)
+    except (LookupError, UnicodeError), e:
+        raise ParseException('The document cannot be decoded: %s' % e)
@@ -0,0 +1,440 @@
+# Copyright 2011 Jamie Norrish (jamie@artefact.org.nz)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module containing the writer of CTM (Compact Topic Maps Syntax)
+1.0 documents.
+
+The writer reads a topic map in chunks of topics and associations,
+fetching the characteristics of each chunk with a fixed number of
+queries, and writes each construct as soon as it has been read. The
+memory it uses therefore does not grow with the size of the topic
+map.
+
+"""
+
+import re
+
+from tmapi.constants import DEFAULT_NAME_TYPE, XSD_ANY_URI, XSD_DECIMAL, \
+    XSD_INTEGER, XSD_STRING
+from tmapi.models import Association, Name, Occurrence, Role, \
+    SubjectIdentifier, SubjectLocator, Topic, Variant
+from tmapi.models.batch import CHUNK_SIZE
+from tmapi.models.locator import LRUCache
+
+from topic_map_handler import TOPIC_CACHE_SIZE
+
+
+# The indentation of the characteristics within a topic block.
+INDENT = u'    '
+
+_ABSOLUTE_IRI_RE = re.compile(r'^[A-Za-z][\w+.-]*:[^<>"{}|^`\\\s]*$',
+                              re.UNICODE)
+_DECIMAL_RE = re.compile(r'^[-+]?[0-9]+\.[0-9]+$')
+_INTEGER_RE = re.compile(r'^[-+]?[0-9]+$')
+
+_ESCAPES = ((u'\\', u'\\\\'), (u'"', u'\\"'), (u'\n', u'\\n'),
+            (u'\r', u'\\r'), (u'\t', u'\\t'))
+
+
+class CTMWriter (object):
+
+    """Writer of a topic map as a CTM document.
+
+    The writer works only with topic maps stored in the database.
+
+    """
+
+    def __init__ (self, topic_map, stream):
+        """Creates a writer of `topic_map` to `stream`.
+
+        :param topic_map: the topic map to write
+        :type topic_map: `TopicMap`
+        :param stream: the file-like object to write to, which is
+          written UTF-8 encoded strings
+        :type stream: file-like object
+
+        """
+        self._topic_map = topic_map
+        self._stream = stream
+        self._references = LRUCache(TOPIC_CACHE_SIZE)
+        self._default_name_type_id = None
+
+    def write (self):
+        """Writes the topic map."""
+        default_name_type = self._topic_map.get_topic_by_subject_identifier(
+            self._topic_map.create_locator(DEFAULT_NAME_TYPE))
+        if default_name_type is not None:
+            self._default_name_type_id = default_name_type.pk
+        self._write_line(u'%encoding "UTF-8"')
+        self._write_line(u'%version 1.0')
+        reifier = self._topic_map.get_reifier()
+        if reifier is not None:
+            self._write_line(u'~ %s' % self._get_references(
+                    [reifier.pk])[reifier.pk])
+        self._write_line()
+        for topic_ids in self._get_chunks(Topic):
+            self._write_topics(topic_ids)
+        for association_ids in self._get_chunks(Association):
+            self._write_associations(association_ids)
+
+    def _get_chunks (self, model):
+        """Yields lists of the database IDs of the instances of
+        `model` in the topic map, in order, a chunk at a time.
+
+        :param model: the model of the constructs
+        :type model: class
+        :rtype: iterator over lists of integers
+
+        """
+        queryset = model.objects.filter(topic_map=self._topic_map).order_by(
+            'pk')
+        last_id = 0
+        while True:
+            ids = list(queryset.filter(pk__gt=last_id).values_list(
+                    'pk', flat=True)[:CHUNK_SIZE])
+            if not ids:
+                break
+            yield ids
+            last_id = ids[-1]
+
+    def _get_references (self, topic_ids):
+        """Returns the CTM references to the topics with database IDs
+        `topic_ids`, keyed by database ID.
+
+        :param topic_ids: the database IDs of topics
+        :type topic_ids: iterable of integers
+        :rtype: dictionary
+
+        """
+        references = {}
+        missing = []
+        for topic_id in set(topic_ids):
+            reference = self._references.get(topic_id)
+            if reference is None:
+                missing.append(topic_id)
+            else:
+                references[topic_id] = reference
+        if missing:
+            identities = self._get_identities(missing)
+            for topic_id in missing:
+                reference = _get_reference(identities, topic_id)
+                if reference is None:
+                    reference = u'^ <%s>' % self._get_generated_identifier(
+                        topic_id)
+                self._references.set(topic_id, reference)
+                references[topic_id] = reference
+        return references
+
+    def _get_generated_identifier (self, topic_id):
+        """Returns the item identifier used to refer to the topic with
+        database ID `topic_id`, which has no identity.
+
+        :param topic_id: the database ID of a topic
+        :type topic_id: integer
+        :rtype: unicode
+
+        """
+        return self._topic_map.get_locator().resolve(
+            '#topic-%d' % topic_id).to_external_form()
+
+    def _get_identities (self, topic_ids):
+        """Returns the subject identifiers, subject locators and item
+        identifiers of the topics with database IDs `topic_ids`, as a
+        dictionary of lists keyed by (kind, database ID).
+
+        :param topic_ids: the database IDs of topics
+        :type topic_ids: list of integers
+        :rtype: dictionary
+
+        """
+        identities = {}
+        for kind, model in (('si', SubjectIdentifier),
+                            ('sl', SubjectLocator)):
+            rows = _get_rows(model.objects.order_by('pk'), 'topic',
+                             topic_ids, ('topic', 'address'))
+            for topic_id, address in rows:
+                identities.setdefault((kind, topic_id), []).append(address)
+        field = Topic._meta.get_field('item_identifiers')
+        through = field.rel.through
+        source_name = field.m2m_field_name()
+        rows = _get_rows(through.objects.order_by('pk'), source_name,
+                         topic_ids, (source_name, '%s__address' %
+                                     field.m2m_reverse_field_name()))
+        for topic_id, address in rows:
+            identities.setdefault(('ii', topic_id), []).append(address)
+        return identities
+
+    def _write_associations (self, association_ids):
+        """Writes the associations with database IDs
+        `association_ids`.
+
+        :param association_ids: the database IDs of associations
+        :type association_ids: list of integers
+
+        """
+        associations = _get_rows(Association.objects.order_by('pk'), 'pk',
+                                 association_ids, ('pk', 'type', 'reifier'))
+        scopes = _get_join_rows(Association, 'scope', association_ids)
+        roles = {}
+        topic_ids = set()
+        for association_id, role_type_id, player_id, reifier_id in _get_rows(
+            Role.objects.order_by('pk'), 'association', association_ids,
+            ('association', 'type', 'player', 'reifier')):
+            roles.setdefault(association_id, []).append(
+                (role_type_id, player_id, reifier_id))
+            topic_ids.update((role_type_id, player_id, reifier_id))
+        for association_id, type_id, reifier_id in associations:
+            topic_ids.update((type_id, reifier_id))
+        for theme_ids in scopes.values():
+            topic_ids.update(theme_ids)
+        topic_ids.discard(None)
+        references = self._get_references(topic_ids)
+        for association_id, type_id, reifier_id in associations:
+            role_parts = []
+            for role_type_id, player_id, role_reifier_id in roles.get(
+                association_id, []):
+                role_parts.append(u'%s: %s%s' % (
+                        references[role_type_id], references[player_id],
+                        _format_reifier(references, role_reifier_id)))
+            self._write_line(u'%s(%s)%s%s' % (
+                    references[type_id], u', '.join(role_parts),
+                    _format_scope(references, scopes.get(association_id)),
+                    _format_reifier(references, reifier_id)))
+        self._write_line()
+
+    def _write_line (self, line=u''):
+        """Writes `line`, followed by a newline.
+
+        :param line: the line to write
+        :type line: unicode
+
+        """
+        self._stream.write((line + u'\n').encode('utf-8'))
+
+    def _write_topics (self, topic_ids):
+        """Writes the topics with database IDs `topic_ids`.
+
+        :param topic_ids: the database IDs of topics
+        :type topic_ids: list of integers
+
+        """
+        identities = self._get_identities(topic_ids)
+        types = _get_join_rows(Topic, 'types', topic_ids)
+        names = _get_rows(Name.objects.order_by('pk'), 'topic', topic_ids,
+                          ('pk', 'topic', 'type', 'value', 'reifier'))
+        name_ids = [row[0] for row in names]
+        name_scopes = _get_join_rows(Name, 'scope', name_ids)
+        variants = _get_rows(Variant.objects.order_by('pk'), 'name', name_ids,
+                             ('pk', 'name', 'value', 'datatype', 'reifier'))
+        variant_scopes = _get_join_rows(Variant, 'scope',
+                                        [row[0] for row in variants])
+        occurrences = _get_rows(Occurrence.objects.order_by('pk'), 'topic',
+                                topic_ids, ('pk', 'topic', 'type', 'value',
+                                            'datatype', 'reifier'))
+        occurrence_scopes = _get_join_rows(Occurrence, 'scope',
+                                           [row[0] for row in occurrences])
+        # Collect the topics referenced by the chunk, so that their
+        # references may be looked up together.
+        referenced_ids = set(topic_ids)
+        for type_ids in types.values():
+            referenced_ids.update(type_ids)
+        for scopes in (name_scopes, variant_scopes, occurrence_scopes):
+            for theme_ids in scopes.values():
+                referenced_ids.update(theme_ids)
+        for rows in (names, variants, occurrences):
+            for row in rows:
+                referenced_ids.add(row[-1])
+        for rows in (names, occurrences):
+            for row in rows:
+                referenced_ids.add(row[2])
+        referenced_ids.discard(None)
+        for topic_id in topic_ids:
+            # The identities of the chunk are already known.
+            reference = _get_reference(identities, topic_id)
+            if reference is not None:
+                self._references.set(topic_id, reference)
+        references = self._get_references(referenced_ids)
+        topic_variants = {}
+        for variant_id, name_id, value, datatype, reifier_id in variants:
+            theme_ids = [theme_id for theme_id in
+                         variant_scopes.get(variant_id, [])
+                         if theme_id not in name_scopes.get(name_id, [])]
+            topic_variants.setdefault(name_id, []).append(u' (%s%s%s)' % (
+                    _format_literal(value, datatype),
+                    _format_scope(references, theme_ids),
+                    _format_reifier(references, reifier_id)))
+        topic_names = {}
+        for name_id, topic_id, type_id, value, reifier_id in names:
+            name_type = u''
+            if type_id != self._default_name_type_id:
+                name_type = u'%s: ' % references[type_id]
+            topic_names.setdefault(topic_id, []).append(u'- %s%s%s%s%s' % (
+                    name_type, _format_literal(value, XSD_STRING),
+                    _format_scope(references, name_scopes.get(name_id)),
+                    _format_reifier(references, reifier_id),
+                    u''.join(topic_variants.get(name_id, []))))
+        topic_occurrences = {}
+        for occurrence_id, topic_id, type_id, value, datatype, reifier_id \
+                in occurrences:
+            topic_occurrences.setdefault(topic_id, []).append(
+                u'%s: %s%s%s' % (
+                    references[type_id], _format_literal(value, datatype),
+                    _format_scope(references,
+                                  occurrence_scopes.get(occurrence_id)),
+                    _format_reifier(references, reifier_id)))
+        for topic_id in topic_ids:
+            reference = references[topic_id]
+            items = []
+            for prefix, kind in ((u'', 'si'), (u'= ', 'sl'), (u'^ ', 'ii')):
+                for address in identities.get((kind, topic_id), []):
+                    item = u'%s<%s>' % (prefix, address)
+                    if item != reference:
+                        items.append(item)
+            for type_id in types.get(topic_id, []):
+                items.append(u'isa %s' % references[type_id])
+            items.extend(topic_names.get(topic_id, []))
+            items.extend(topic_occurrences.get(topic_id, []))
+            if items:
+                self._write_line(u'%s\n%s%s .' % (
+                        reference, INDENT, (u';\n' + INDENT).join(items)))
+            else:
+                self._write_line(u'%s .' % reference)
+            self._write_line()
+
+
+def _escape (value):
+    """Returns `value` with the characters that may not appear in a
+    CTM string literal escaped.
+
+    :param value: the value to escape
+    :type value: unicode
+    :rtype: unicode
+
+    """
+    for character, escape in _ESCAPES:
+        value = value.replace(character, escape)
+    return value
+
+def _format_literal (value, datatype):
+    """Returns the CTM literal of `value` with `datatype`.
+
+    :param value: the value
+    :type value: unicode
+    :param datatype: the external form of the datatype
+    :type datatype: string
+    :rtype: unicode
+
+    """
+    if datatype == XSD_STRING:
+        return u'"%s"' % _escape(value)
+    if datatype == XSD_ANY_URI and _ABSOLUTE_IRI_RE.match(value):
+        return u'<%s>' % value
+    if datatype == XSD_INTEGER and _INTEGER_RE.match(value):
+        return value
+    if datatype == XSD_DECIMAL and _DECIMAL_RE.match(value):
+        return value
+    return u'"%s"^^<%s>' % (_escape(value), datatype)
+
+def _format_reifier (references, reifier_id):
+    """Returns the CTM reifier clause of the reifier with database ID
+    `reifier_id`.
+
+    :param references: the CTM references to topics
+    :type references: dictionary
+    :param reifier_id: the database ID of the reifier, or None
+    :type reifier_id: integer
+    :rtype: unicode
+
+    """
+    if reifier_id is None:
+        return u''
+    return u' ~ %s' % references[reifier_id]
+
+def _format_scope (references, theme_ids):
+    """Returns the CTM scope clause of the themes with database IDs
+    `theme_ids`.
+
+    :param references: the CTM references to topics
+    :type references: dictionary
+    :param theme_ids: the database IDs of the themes
+    :type theme_ids: list of integers
+    :rtype: unicode
+
+    """
+    if not theme_ids:
+        return u''
+    return u' @%s' % u', '.join([references[theme_id] for theme_id
+                                 in theme_ids])
+
+def _get_join_rows (model, field_name, ids):
+    """Returns the targets of the many to many field `field_name` of
+    the instances of `model` with database IDs `ids`, as a dictionary
+    of lists keyed by source database ID.
+
+    :param model: the model defining the many to many field
+    :type model: class
+    :param field_name: the name of the many to many field
+    :type field_name: string
+    :param ids: the database IDs of the sources
+    :type ids: list of integers
+    :rtype: dictionary
+
+    """
+    field = model._meta.get_field(field_name)
+    source_name = field.m2m_field_name()
+    targets = {}
+    for source_id, target_id in _get_rows(
+        field.rel.through.objects.order_by('pk'), source_name, ids,
+        (source_name, field.m2m_reverse_field_name())):
+        targets.setdefault(source_id, []).append(target_id)
+    return targets
+
+def _get_reference (identities, topic_id):
+    """Returns the CTM reference to the topic with database ID
+    `topic_id` formed from its `identities`, or None if it has none.
+
+    :param identities: identities keyed by kind and database ID
+    :type identities: dictionary
+    :param topic_id: the database ID of the topic
+    :type topic_id: integer
+    :rtype: unicode
+
+    """
+    for prefix, kind in ((u'', 'si'), (u'= ', 'sl'), (u'^ ', 'ii')):
+        addresses = identities.get((kind, topic_id))
+        if addresses:
+            return u'%s<%s>' % (prefix, addresses[0])
+    return None
+
+def _get_rows (queryset, key, ids, fields):
+    """Returns the `fields` of the objects in `queryset` whose `key`
+    is in `ids`, querying a chunk of `ids` at a time.
+
+    :param queryset: the objects to select from
+    :type queryset: `QuerySet`
+    :param key: the name of the field to filter on
+    :type key: string
+    :param ids: the values of `key` to select
+    :type ids: list of integers
+    :param fields: the names of the fields to return
+    :type fields: tuple of strings
+    :rtype: list of tuples
+
+    """
+    rows = []
+    for start in range(0, len(ids), CHUNK_SIZE):
+        rows.extend(queryset.filter(
+                **{'%s__in' % key: ids[start:start+CHUNK_SIZE]}).values_list(
+                *fields))
+    return rows
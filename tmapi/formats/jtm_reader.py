@@ -0,0 +1,638 @@
+# Copyright 2011 Jamie Norrish (jamie@artefact.org.nz)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module containing a reader of JTM (JSON Topic Maps) 1.0 and 1.1
+fragments (http://www.cerny-online.com/jtm/1.1/), optimised for the
+ingest of many small fragments.
+
+Fragments are read in batches. All of the topics a batch identifies
+or references (as types, themes, players, parents or reifiers) are
+found or created with a single `TopicMap.import_topics` call, which
+matches them against the topic map a chunk of identities at a time.
+The names, variants, occurrences, associations and roles of the
+batch are then inserted in bulk, rather than one at a time through
+the TMAPI methods. Only reifiers and the item identifiers of
+constructs other than topics are added individually.
+
+The reader works only with topic maps stored in the database.
+
+"""
+
+from django.utils import simplejson
+
+from tmapi.constants import DEFAULT_NAME_TYPE, XSD_STRING
+from tmapi.exceptions import ModelConstraintException, ParseException
+from tmapi.models import Name, Occurrence, Topic, Variant
+from tmapi.models.bulk_utils import insert_constructs
+from tmapi.models.name_merge_utils import merge_topics_by_name
+from tmapi.models.scoped import add_scopes
+
+from locator_resolver import LocatorResolver
+
+
+# The number of fragments read in each batch.
+BATCH_SIZE = 100
+
+# The prefixes of JTM topic references, and the position of the
+# corresponding identities in an import spec.
+IDENTITY_POSITIONS = {'ii': 0, 'si': 1, 'sl': 2}
+
+# The item types of the fragments that may be read.
+ITEM_TYPES = ('association', 'name', 'occurrence', 'topic', 'topicmap')
+
+VERSIONS = ('1.0', '1.1')
+
+
+class JTMReader (object):
+
+    """Reader of JTM fragments into a topic map."""
+
+    def __init__ (self, topic_map, base=None, batch_size=BATCH_SIZE):
+        """Creates a reader adding to `topic_map`.
+
+        :param topic_map: the topic map to add to
+        :type topic_map: `TopicMap`
+        :param base: the locator against which relative IRIs are
+          resolved (defaults to the locator of `topic_map`)
+        :type base: `Locator` or string
+        :param batch_size: the number of fragments read in each batch
+        :type batch_size: integer
+
+        """
+        self._topic_map = topic_map
+        if base is None:
+            base = topic_map.get_locator()
+        self._base = base
+        self._batch_size = batch_size
+
+    def read (self, fragments):
+        """Reads `fragments` into the topic map, returning the
+        database IDs (see `Construct.get_id`) of the constructs that
+        JTM may reference, keyed by their JTM reference.
+
+        Topics are keyed by each of the "si:", "sl:" and "ii:"
+        references to them, and other constructs by an "ii:"
+        reference for each of their item identifiers. The IRIs of
+        the references are absolute.
+
+        :param fragments: the JTM fragments, each a JSON string, a
+          file-like object to read one from, or decoded JSON
+        :type fragments: iterable
+        :rtype: dictionary
+
+        """
+        references = {}
+        batch = []
+        for fragment in fragments:
+            batch.append(fragment)
+            if len(batch) == self._batch_size:
+                references.update(self._read_batch(batch))
+                batch = []
+        if batch:
+            references.update(self._read_batch(batch))
+        return references
+
+    def _create_associations (self, associations, topics, references):
+        """Creates `associations` in bulk.
+
+        :param associations: the decoded JTM associations
+        :type associations: list of dictionaries
+        :param topics: topics keyed by identity
+        :type topics: dictionary
+        :param references: the references of created constructs
+        :type references: dictionary
+
+        """
+        if not associations:
+            return
+        specs = []
+        for association in associations:
+            roles = [(topics[role['type']], topics[role['player']]) for
+                     role in association['roles']]
+            specs.append((topics[association['type']],
+                          _get_themes(association, topics), roles))
+        created = self._topic_map.create_associations(specs)
+        for construct, association in zip(created, associations):
+            self._set_reifiable_properties(construct, association, topics,
+                                           references)
+            if [role for role in association['roles'] if
+                role.get('reifier') or role.get('item_identifiers')]:
+                # The roles are matched with the JTM roles by type and
+                # player, which are not necessarily unique.
+                unmatched = list(construct.get_roles())
+                for role in association['roles']:
+                    role_type = topics[role['type']]
+                    player = topics[role['player']]
+                    for index, match in enumerate(unmatched):
+                        if match.type_id == role_type.pk and \
+                                match.player_id == player.pk:
+                            del unmatched[index]
+                            break
+                    self._set_reifiable_properties(match, role, topics,
+                                                   references)
+
+    def _create_names (self, names, topics, references):
+        """Creates `names` in bulk.
+
+        :param names: pairs of parent topic and decoded JTM name
+        :type names: list of tuples
+        :param topics: topics keyed by identity
+        :type topics: dictionary
+        :param references: the references of created constructs
+        :type references: dictionary
+        :rtype: list of `Name`s
+
+        """
+        instances = []
+        scopes = []
+        for topic, name in names:
+            instances.append(Name(topic=topic, type=topics[name['type']],
+                                  value=name['value'],
+                                  topic_map=self._topic_map))
+            scopes.append(_get_themes(name, topics))
+        insert_constructs(self._topic_map.pk, Name, instances)
+        add_scopes(instances, scopes)
+        variants = []
+        variant_scopes = []
+        for instance, scope, (topic, name) in zip(instances, scopes, names):
+            self._set_reifiable_properties(instance, name, topics, references)
+            for variant in name.get('variants', []):
+                variant_scope = _get_themes(variant, topics)
+                if not set(variant_scope) - set(scope):
+                    raise ModelConstraintException(
+                        instance, 'The variant would be in the same scope '
+                        'as the parent')
+                variants.append((Variant(name=instance,
+                                         value=variant['value'],
+                                         datatype=variant['datatype'],
+                                         topic_map=self._topic_map),
+                                 variant))
+                variant_scopes.append(variant_scope)
+        variant_instances = [instance for instance, variant in variants]
+        insert_constructs(self._topic_map.pk, Variant, variant_instances)
+        add_scopes(variant_instances, variant_scopes)
+        for instance, variant in variants:
+            self._set_reifiable_properties(instance, variant, topics,
+                                           references)
+        return instances
+
+    def _create_occurrences (self, occurrences, topics, references):
+        """Creates `occurrences` in bulk.
+
+        :param occurrences: pairs of parent topic and decoded JTM
+          occurrence
+        :type occurrences: list of tuples
+        :param topics: topics keyed by identity
+        :type topics: dictionary
+        :param references: the references of created constructs
+        :type references: dictionary
+
+        """
+        instances = []
+        scopes = []
+        for topic, occurrence in occurrences:
+            instances.append(Occurrence(
+                    topic=topic, type=topics[occurrence['type']],
+                    value=occurrence['value'],
+                    datatype=occurrence['datatype'],
+                    topic_map=self._topic_map))
+            scopes.append(_get_themes(occurrence, topics))
+        insert_constructs(self._topic_map.pk, Occurrence, instances)
+        add_scopes(instances, scopes)
+        for instance, (topic, occurrence) in zip(instances, occurrences):
+            self._set_reifiable_properties(instance, occurrence, topics,
+                                           references)
+
+    def _read_batch (self, fragments):
+        """Reads the batch of `fragments` into the topic map,
+        returning the references of the constructs created.
+
+        :param fragments: the JTM fragments
+        :type fragments: list
+        :rtype: dictionary
+
+        """
+        collector = _Collector(self._base)
+        for fragment in fragments:
+            collector.add_fragment(_decode(fragment))
+        topic_map = self._topic_map
+        references = {}
+        with topic_map.batch():
+            # Every topic identified or referenced in the batch is
+            # found or created together.
+            specs = [spec for spec, jtm_topic in collector.topics]
+            specs.extend([_get_spec(identity) for identity
+                          in collector.identities])
+            imported = topic_map.import_topics(specs)
+            topics = {}
+            for topic, (spec, jtm_topic) in zip(imported, collector.topics):
+                for kind, position in IDENTITY_POSITIONS.items():
+                    for address in spec[position]:
+                        topics[(kind, address)] = topic
+            for topic, identity in zip(imported[len(collector.topics):],
+                                       collector.identities):
+                topics[identity] = topic
+            for identity, topic in topics.items():
+                references['%s:%s' % identity] = topic.get_id()
+            names = []
+            occurrences = []
+            for spec, jtm_topic in collector.topics:
+                topic = topics[_get_identity(spec)]
+                for topic_type in jtm_topic.get('instance_of', []):
+                    topic.add_type(topics[topic_type])
+                names.extend([(topic, name) for name
+                              in jtm_topic.get('names', [])])
+                occurrences.extend([(topic, occurrence) for occurrence
+                                    in jtm_topic.get('occurrences', [])])
+            for parent, name in collector.names:
+                names.append((topics[parent], name))
+            for parent, occurrence in collector.occurrences:
+                occurrences.append((topics[parent], occurrence))
+            created_names = self._create_names(names, topics, references)
+            self._create_occurrences(occurrences, topics, references)
+            self._create_associations(collector.associations, topics,
+                                      references)
+            for jtm_topic_map in collector.topic_maps:
+                self._set_reifiable_properties(topic_map, jtm_topic_map,
+                                               topics, {})
+            # Topics are merged by name once all of the constructs
+            # referring to them have been created.
+            merged = merge_topics_by_name(created_names)
+            for reference, construct_id in references.items():
+                if construct_id in merged:
+                    references[reference] = merged[construct_id].get_id()
+        return references
+
+    def _set_reifiable_properties (self, construct, item, topics,
+                                   references):
+        """Sets the reifier and item identifiers of the decoded JTM
+        `item` on `construct`.
+
+        :param construct: the construct created for `item`
+        :type construct: `Reifiable`
+        :param item: the decoded JTM item
+        :type item: dictionary
+        :param topics: topics keyed by identity
+        :type topics: dictionary
+        :param references: the references of created constructs, to
+          which those of `construct` are added
+        :type references: dictionary
+
+        """
+        reifier = item.get('reifier')
+        if reifier is not None:
+            construct.set_reifier(topics[reifier])
+        for locator in item.get('item_identifiers', []):
+            construct.add_item_identifier(locator)
+            references['ii:%s' % locator.to_external_form()] = \
+                construct.get_id()
+
+
+class _Collector (object):
+
+    """Collects the items of a batch of decoded JTM fragments,
+    resolving their IRIs and topic references."""
+
+    def __init__ (self, base):
+        self.associations = []
+        self.identities = []
+        self.names = []
+        self.occurrences = []
+        self.topic_maps = []
+        self.topics = []
+        self._base = base
+        self._resolver = None
+        self._seen = set()
+
+    def add_fragment (self, fragment):
+        """Adds the items of `fragment`.
+
+        :param fragment: the decoded JTM fragment
+        :type fragment: dictionary
+
+        """
+        if not isinstance(fragment, dict):
+            raise ParseException('A JTM fragment must be an object')
+        version = fragment.get('version')
+        if version not in VERSIONS:
+            raise ParseException('Unsupported JTM version %r' % version)
+        item_type = fragment.get('item_type', '').lower()
+        if item_type not in ITEM_TYPES:
+            raise ParseException('Unsupported JTM item type %r' %
+                                 fragment.get('item_type'))
+        self._resolver = LocatorResolver(self._base)
+        if version == '1.1':
+            for prefix, reference in fragment.get('prefixes', {}).items():
+                self._resolver.add_prefix(prefix, reference)
+        if item_type == 'topicmap':
+            for topic in fragment.get('topics', []):
+                self._add_topic(topic)
+            for association in fragment.get('associations', []):
+                self._add_association(association)
+            self.topic_maps.append(self._prepare_reifiable(fragment))
+        elif item_type == 'topic':
+            self._add_topic(fragment)
+        elif item_type == 'association':
+            self._add_association(fragment)
+        else:
+            parent = self._get_parent(fragment)
+            if item_type == 'name':
+                self.names.append((parent, self._prepare_name(fragment)))
+            else:
+                self.occurrences.append(
+                    (parent, self._prepare_occurrence(fragment)))
+
+    def _add_association (self, association):
+        """Adds the JTM `association`.
+
+        :param association: the decoded JTM association
+        :type association: dictionary
+
+        """
+        prepared = self._prepare_typed(association, True)
+        roles = association.get('roles')
+        if not roles:
+            raise ParseException('An association must have roles')
+        prepared['roles'] = []
+        for role in roles:
+            prepared_role = self._prepare_typed(role, True)
+            prepared_role['player'] = self._get_reference(
+                _get_required(role, 'player'))
+            prepared['roles'].append(prepared_role)
+        self.associations.append(prepared)
+
+    def _add_topic (self, topic):
+        """Adds the JTM `topic`.
+
+        :param topic: the decoded JTM topic
+        :type topic: dictionary
+
+        """
+        spec = ([], [], [])
+        for position, key in enumerate(('item_identifiers',
+                                        'subject_identifiers',
+                                        'subject_locators')):
+            spec[position].extend([locator.to_external_form() for locator
+                                   in self._get_locators(topic, key)])
+        if not [locators for locators in spec if locators]:
+            raise ParseException('A topic must have an identity')
+        prepared = {
+            'instance_of': [self._get_reference(reference) for reference
+                            in topic.get('instance_of', [])],
+            'names': [self._prepare_name(name) for name
+                      in topic.get('names', [])],
+            'occurrences': [self._prepare_occurrence(occurrence) for
+                            occurrence in topic.get('occurrences', [])],
+            }
+        self.topics.append((spec, prepared))
+
+    def _get_iri (self, iri):
+        """Returns the locator of the IRI or (in JTM 1.1) safe CURIE
+        `iri`.
+
+        :param iri: the IRI or safe CURIE
+        :type iri: string
+        :rtype: `Locator`
+
+        """
+        if not isinstance(iri, basestring):
+            raise ParseException('Expected an IRI but found %r' % (iri,))
+        if iri.startswith('[') and iri.endswith(']') and ':' in iri:
+            prefix, local = iri[1:-1].split(':', 1)
+            return self._resolver.resolve_prefixed(prefix, local)
+        return self._resolver.resolve(iri)
+
+    def _get_locators (self, item, key):
+        """Returns the locators of the list of IRIs under `key` in
+        `item`.
+
+        :param item: the decoded JTM item
+        :type item: dictionary
+        :param key: the key of the list
+        :type key: string
+        :rtype: list of `Locator`s
+
+        """
+        return [self._get_iri(iri) for iri in item.get(key) or []]
+
+    def _get_parent (self, item):
+        """Returns the identity of the parent topic of the JTM name or
+        occurrence fragment `item`.
+
+        :param item: the decoded JTM name or occurrence
+        :type item: dictionary
+        :rtype: tuple
+
+        """
+        parent = _get_required(item, 'parent')
+        if isinstance(parent, list):
+            if not parent:
+                raise ParseException('The parent must not be empty')
+            parent = parent[0]
+        return self._get_reference(parent)
+
+    def _get_reference (self, reference):
+        """Returns the identity (kind and absolute IRI) of the JTM
+        topic `reference`, recording it to be resolved.
+
+        :param reference: the topic reference
+        :type reference: string
+        :rtype: tuple
+
+        """
+        if not isinstance(reference, basestring) or \
+                reference[:3] not in ('ii:', 'si:', 'sl:'):
+            raise ParseException('Invalid topic reference %r' % (reference,))
+        identity = (reference[:2],
+                    self._get_iri(reference[3:]).to_external_form())
+        if identity not in self._seen:
+            self._seen.add(identity)
+            self.identities.append(identity)
+        return identity
+
+    def _prepare_name (self, name):
+        """Returns the JTM `name`, with its references resolved.
+
+        :param name: the decoded JTM name
+        :type name: dictionary
+        :rtype: dictionary
+
+        """
+        prepared = self._prepare_typed(name, False)
+        if 'type' not in prepared:
+            prepared['type'] = self._get_reference('si:' + DEFAULT_NAME_TYPE)
+        prepared['value'] = _get_value(name)
+        prepared['variants'] = []
+        for variant in name.get('variants', []):
+            prepared_variant = self._prepare_reifiable(variant)
+            prepared_variant['value'] = _get_value(variant)
+            prepared_variant['datatype'] = self._prepare_datatype(variant)
+            prepared_variant['scope'] = self._prepare_scope(variant)
+            if not prepared_variant['scope']:
+                raise ParseException('A variant must have a scope')
+            prepared['variants'].append(prepared_variant)
+        return prepared
+
+    def _prepare_datatype (self, item):
+        """Returns the external form of the datatype of `item`.
+
+        :param item: the decoded JTM occurrence or variant
+        :type item: dictionary
+        :rtype: string
+
+        """
+        datatype = item.get('datatype')
+        if datatype is None:
+            return XSD_STRING
+        return self._get_iri(datatype).to_external_form()
+
+    def _prepare_occurrence (self, occurrence):
+        """Returns the JTM `occurrence`, with its references resolved.
+
+        :param occurrence: the decoded JTM occurrence
+        :type occurrence: dictionary
+        :rtype: dictionary
+
+        """
+        prepared = self._prepare_typed(occurrence, True)
+        prepared['value'] = _get_value(occurrence)
+        prepared['datatype'] = self._prepare_datatype(occurrence)
+        return prepared
+
+    def _prepare_reifiable (self, item):
+        """Returns the reifier and item identifiers of `item`.
+
+        :param item: the decoded JTM item
+        :type item: dictionary
+        :rtype: dictionary
+
+        """
+        prepared = {'item_identifiers': self._get_locators(
+                item, 'item_identifiers')}
+        if item.get('reifier') is not None:
+            prepared['reifier'] = self._get_reference(item['reifier'])
+        return prepared
+
+    def _prepare_scope (self, item):
+        """Returns the identities of the themes of `item`.
+
+        :param item: the decoded JTM scoped item
+        :type item: dictionary
+        :rtype: list of tuples
+
+        """
+        return [self._get_reference(theme) for theme
+                in item.get('scope') or []]
+
+    def _prepare_typed (self, item, required):
+        """Returns the type, scope, reifier and item identifiers of
+        `item`.
+
+        :param item: the decoded JTM item
+        :type item: dictionary
+        :param required: whether the item must have a type
+        :type required: boolean
+        :rtype: dictionary
+
+        """
+        prepared = self._prepare_reifiable(item)
+        if required:
+            prepared['type'] = self._get_reference(_get_required(item, 'type'))
+        elif item.get('type') is not None:
+            prepared['type'] = self._get_reference(item['type'])
+        prepared['scope'] = self._prepare_scope(item)
+        return prepared
+
+
+def _decode (fragment):
+    """Returns the decoded JSON of `fragment`.
+
+    :param fragment: a JSON string, a file-like object to read one
+      from, or decoded JSON
+    :type fragment: string, file-like object, or dictionary
+    :rtype: dictionary
+
+    """
+    if hasattr(fragment, 'read'):
+        fragment = fragment.read()
+    if isinstance(fragment, basestring):
+        try:
+            fragment = simplejson.loads(fragment)
+        except ValueError, e:
+            raise ParseException('Invalid JSON: %s' % e)
+    return fragment
+
+def _get_identity (spec):
+    """Returns the first identity in the import `spec`.
+
+    :param spec: the item identifiers, subject identifiers and
+      subject locators of a topic
+    :type spec: tuple of lists
+    :rtype: tuple
+
+    """
+    for kind, position in sorted(IDENTITY_POSITIONS.items()):
+        if spec[position]:
+            return (kind, spec[position][0])
+
+def _get_required (item, key):
+    """Returns the value of the required `key` in `item`.
+
+    :param item: the decoded JTM item
+    :type item: dictionary
+    :param key: the key
+    :type key: string
+
+    """
+    value = item.get(key)
+    if value is None:
+        raise ParseException('Missing required property "%s"' % key)
+    return value
+
+def _get_spec (identity):
+    """Returns the import spec of a topic with the single `identity`.
+
+    :param identity: the kind and IRI of the identity
+    :type identity: tuple
+    :rtype: tuple of lists
+
+    """
+    spec = ([], [], [])
+    spec[IDENTITY_POSITIONS[identity[0]]].append(identity[1])
+    return spec
+
+def _get_themes (item, topics):
+    """Returns the themes of the prepared JTM `item`.
+
+    :param item: the prepared JTM scoped item
+    :type item: dictionary
+    :param topics: topics keyed by identity
+    :type topics: dictionary
+    :rtype: list of `Topic`s
+
+    """
+    return [topics[theme] for theme in item['scope']]
+
+def _get_value (item):
+    """Returns the value of the JTM `item`.
+
+    :param item: the decoded JTM name, occurrence or variant
+    :type item: dictionary
+    :rtype: unicode
+
+    """
+    value = _get_required(item, 'value')
+    if not isinstance(value, basestring):
+        raise ParseException('A value must be a string')
+    return value
@@ -0,0 +1,112 @@
+# Copyright 2011 Jamie Norrish (jamie@artefact.org.nz)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module containing the resolver of the IRI references and prefixed
+names found in serialised topic maps."""
+
+from tmapi.exceptions import ParseException
+from tmapi.models.locator import LOCATOR_CACHE_SIZE, LRUCache, Locator
+
+
+class LocatorResolver (object):
+
+    """Resolves IRI references against a base locator, and prefixed
+    names against the declared prefixes.
+
+    The same references occur many times in a serialised topic map,
+    so the resolved `Locator`s are kept in a bounded cache.
+
+    """
+
+    def __init__ (self, base, cache_size=LOCATOR_CACHE_SIZE):
+        """Creates a resolver of references relative to `base`.
+
+        :param base: the locator of the document being read
+        :type base: `Locator` or string
+        :param cache_size: the maximum number of resolved locators
+          kept
+        :type cache_size: integer
+
+        """
+        if not isinstance(base, Locator):
+            base = Locator(base)
+        self._base = base
+        self._cache = LRUCache(cache_size)
+        self._prefixes = {}
+
+    def add_prefix (self, prefix, reference):
+        """Declares `prefix` as standing for `reference`.
+
+        :param prefix: the prefix
+        :type prefix: string
+        :param reference: the IRI reference the prefix stands for
+        :type reference: string
+
+        """
+        iri = self.resolve(reference).to_external_form()
+        if reference.endswith('#') and not iri.endswith('#'):
+            # The empty fragment is lost in normalising the locator,
+            # but is needed to join the local part of a name.
+            iri += '#'
+        self._prefixes[prefix] = iri
+
+    def get_base (self):
+        """Returns the locator that references are resolved against.
+
+        :rtype: `Locator`
+
+        """
+        return self._base
+
+    def get_prefixes (self):
+        """Returns the declared prefixes, mapped to the IRIs they
+        stand for.
+
+        :rtype: dictionary
+
+        """
+        return dict(self._prefixes)
+
+    def resolve (self, reference):
+        """Returns the locator of `reference` resolved against the
+        base locator.
+
+        :param reference: an absolute or relative IRI reference
+        :type reference: string
+        :rtype: `Locator`
+
+        """
+        locator = self._cache.get(reference)
+        if locator is None:
+            locator = self._base.resolve(reference)
+            self._cache.set(reference, locator)
+        return locator
+
+    def resolve_prefixed (self, prefix, local, line=None):
+        """Returns the locator of the prefixed name `prefix`:`local`.
+
+        :param prefix: the prefix
+        :type prefix: string
+        :param local: the local part of the name
+        :type local: string
+        :param line: the line the name occurs on, for error reporting
+        :type line: integer
+        :rtype: `Locator`
+
+        """
+        try:
+            iri = self._prefixes[prefix]
+        except KeyError:
+            raise ParseException('Undeclared prefix "%s"' % prefix, line)
+        return self.resolve(iri + local)
@@ -0,0 +1,237 @@
+# Copyright 2011 Jamie Norrish (jamie@artefact.org.nz)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module containing the handler that adds the constructs read from a
+serialised topic map to a `TopicMap`."""
+
+from tmapi.models import TopicMap
+from tmapi.models.locator import LRUCache, Locator
+from tmapi.models.name_merge_utils import is_merging_by_name
+
+
+# The kinds of identity by which a topic may be referenced.
+ITEM_IDENTIFIER = 'item_identifier'
+SUBJECT_IDENTIFIER = 'subject_identifier'
+SUBJECT_LOCATOR = 'subject_locator'
+
+# The maximum number of topics kept by a handler for reuse.
+TOPIC_CACHE_SIZE = 10000
+
+
+class TopicMapHandler (object):
+
+    """Receives the constructs read by a parser and adds them to a
+    topic map, as they are read.
+
+    The handler is a context manager, and the additions made while
+    it is active are made in a single batch (see `TopicMap.batch`),
+    which is rolled back if the parser raises an exception. Topics
+    referenced by an identity are kept in a bounded cache, since the
+    same topics are referenced many times in a document.
+
+    """
+
+    def __init__ (self, topic_map):
+        """Creates a handler adding to `topic_map`.
+
+        :param topic_map: the topic map to add to
+        :type topic_map: `TopicMap`
+
+        """
+        self._topic_map = topic_map
+        self._topics = LRUCache(TOPIC_CACHE_SIZE)
+        self._batch = None
+        self._merges_by_name = isinstance(topic_map, TopicMap) and \
+            is_merging_by_name(topic_map)
+
+    def __enter__ (self):
+        self._batch = self._topic_map.batch()
+        self._batch.__enter__()
+        return self
+
+    def __exit__ (self, exc_type, exc_value, traceback):
+        batch, self._batch = self._batch, None
+        return batch.__exit__(exc_type, exc_value, traceback)
+
+    def add_association (self, association_type, roles, scope=None,
+                         reifier=None):
+        """Adds an association to the topic map.
+
+        :param association_type: the association type
+        :type association_type: `Topic`
+        :param roles: the type, player and reifier (or None) of each
+          role
+        :type roles: list of tuples
+        :param scope: the themes of the association
+        :type scope: list of `Topic`s
+        :param reifier: the reifier of the association
+        :type reifier: `Topic`
+        :rtype: `Association`
+
+        """
+        association = self._topic_map.create_association(association_type,
+                                                         scope)
+        for role_type, player, role_reifier in roles:
+            role = association.create_role(role_type, player)
+            if role_reifier is not None:
+                role.set_reifier(role_reifier)
+        if reifier is not None:
+            association.set_reifier(reifier)
+        return association
+
+    def add_identity (self, topic, kind, locator):
+        """Adds the identity `locator` of `kind` to `topic`, merging
+        it with any other topic that has the identity.
+
+        :param topic: the topic to add the identity to
+        :type topic: `Topic`
+        :param kind: the kind of identity
+        :type kind: string
+        :param locator: the identity
+        :type locator: `Locator`
+
+        """
+        other = self._get_matching_construct(kind, locator)
+        getattr(topic, 'add_%s' % kind)(locator)
+        if other is not None and other != topic:
+            # The other topic has been merged into this one, and may
+            # be in the cache.
+            self._topics.clear()
+
+    def add_name (self, topic, name_type, value, scope=None, reifier=None,
+                  variants=()):
+        """Adds a name to `topic`.
+
+        :param topic: the topic to add the name to
+        :type topic: `Topic`
+        :param name_type: the name type, or None for the default
+        :type name_type: `Topic`
+        :param value: the value of the name
+        :type value: string
+        :param scope: the themes of the name
+        :type scope: list of `Topic`s
+        :param reifier: the reifier of the name
+        :type reifier: `Topic`
+        :param variants: the value, datatype, themes and reifier (or
+          None) of each variant of the name
+        :type variants: list of tuples
+        :rtype: `Name`
+
+        """
+        name = topic.create_name(value, name_type, scope)
+        if self._merges_by_name:
+            # Other topics may have been merged into this one, and be
+            # in the cache.
+            self._topics.clear()
+        if reifier is not None:
+            name.set_reifier(reifier)
+        for variant_value, datatype, variant_scope, variant_reifier \
+                in variants:
+            variant = name.create_variant(variant_value, variant_scope,
+                                          Locator(datatype))
+            if variant_reifier is not None:
+                variant.set_reifier(variant_reifier)
+        return name
+
+    def add_occurrence (self, topic, occurrence_type, value, datatype,
+                        scope=None, reifier=None):
+        """Adds an occurrence to `topic`.
+
+        :param topic: the topic to add the occurrence to
+        :type topic: `Topic`
+        :param occurrence_type: the occurrence type
+        :type occurrence_type: `Topic`
+        :param value: the value of the occurrence
+        :type value: string
+        :param datatype: the external form of the datatype
+        :type datatype: string
+        :param scope: the themes of the occurrence
+        :type scope: list of `Topic`s
+        :param reifier: the reifier of the occurrence
+        :type reifier: `Topic`
+        :rtype: `Occurrence`
+
+        """
+        occurrence = topic.create_occurrence(occurrence_type, value, scope,
+                                             Locator(datatype))
+        if reifier is not None:
+            occurrence.set_reifier(reifier)
+        return occurrence
+
+    def add_type (self, topic, topic_type):
+        """Adds `topic_type` as a type of `topic`.
+
+        :param topic: the instance
+        :type topic: `Topic`
+        :param topic_type: the type
+        :type topic_type: `Topic`
+
+        """
+        topic.add_type(topic_type)
+
+    def create_topic (self):
+        """Returns a new topic, with no identity of its own (as for a
+        wildcard).
+
+        :rtype: `Topic`
+
+        """
+        return self._topic_map.create_topic()
+
+    def get_topic (self, kind, locator):
+        """Returns the topic with the identity `locator` of `kind`,
+        creating it if necessary.
+
+        :param kind: the kind of identity
+        :type kind: string
+        :param locator: the identity
+        :type locator: `Locator`
+        :rtype: `Topic`
+
+        """
+        key = (kind, locator.to_external_form())
+        topic = self._topics.get(key)
+        if topic is None:
+            topic = getattr(self._topic_map, 'create_topic_by_%s' % kind)(
+                locator)
+            self._topics.set(key, topic)
+        return topic
+
+    def set_reifier (self, reifier):
+        """Sets `reifier` as the reifier of the topic map.
+
+        :param reifier: the reifier
+        :type reifier: `Topic`
+
+        """
+        self._topic_map.set_reifier(reifier)
+
+    def _get_matching_construct (self, kind, locator):
+        """Returns the construct that would be merged with a topic
+        gaining the identity `locator` of `kind`.
+
+        :param kind: the kind of identity
+        :type kind: string
+        :param locator: the identity
+        :type locator: `Locator`
+        :rtype: `Construct` or None
+
+        """
+        if kind == SUBJECT_LOCATOR:
+            return self._topic_map.get_topic_by_subject_locator(locator)
+        construct = self._topic_map.get_topic_by_subject_identifier(locator)
+        if construct is None:
+            construct = self._topic_map.get_construct_by_item_identifier(
+                locator)
+        return construct
@@ -12,6 +12,9 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+from tmapi.models.read_only import clear_cached, is_read_only
+
+
 class Index (object):
 
     """Base class for all indices."""
@@ -33,10 +36,13 @@ class Index (object):
         resynchronize the index with the topic map after values are
         changed.
 
+        The index of a read-only topic map is a snapshot, its results
+        being cached until it is reindexed.
+
         :rtype: boolean
 
         """
-        return True
+        return not is_read_only(self.topic_map)
         
     def is_open (self):
         """Indicates if the index is open.
@@ -57,5 +63,4 @@ class Index (object):
 
     def reindex (self):
         """Synchronizes the index with data in the topic map."""
-        pass
-            
+        clear_cached(self.topic_map, self)
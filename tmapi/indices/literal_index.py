@@ -16,11 +16,15 @@ from tmapi.constants import XSD_ANY_URI, XSD_STRING
 from tmapi.exceptions import IllegalArgumentException
 from tmapi.indices.index import Index
 from tmapi.models import Locator, Name, Occurrence
+from tmapi.models.cache_utils import shared
+from tmapi.models.read_only import cached
 from tmapi.models.variant import Variant
 
 
 class LiteralIndex (Index):
 
+    @cached
+    @shared
     def get_names (self, value):
         """Retrieves the topic names in the topic map that have a
         value equal to `value`.
@@ -37,6 +41,8 @@ class LiteralIndex (Index):
         return Name.objects.filter(topic__topic_map=self.topic_map).filter(
             value=value)
 
+    @cached
+    @shared
     def get_occurrences (self, value, datatype=None):
         """Returns the `Occurrence`s in the topic map whose value
         property matches `value` (or if `value` is a `Locator`, the
@@ -71,6 +77,8 @@ class LiteralIndex (Index):
             datatype = datatype.get_reference()
         return Occurrence.objects.filter(topic__topic_map=self.topic_map).filter(value=value).filter(datatype=datatype)
 
+    @cached
+    @shared
     def get_variants (self, value, datatype=None):
         """Returns the `Variant`s in teh topic map whose value
         property matches `value` (or if `value` is a `Locator`, the
@@ -17,11 +17,15 @@ from django.db.models import Q
 from tmapi.exceptions import IllegalArgumentException
 from tmapi.indices.index import Index
 from tmapi.models import Name, Occurrence, Topic
+from tmapi.models.cache_utils import shared
+from tmapi.models.read_only import cached
 from tmapi.models.variant import Variant
 
 
 class ScopedIndex (Index):
 
+    @cached
+    @shared
     def get_associations (self, themes=None, match_all=False):
         """Returns the `Association`s in the topic map whose scope
         property contains at least one of the specified `themes`.
@@ -46,6 +50,8 @@ class ScopedIndex (Index):
         associations = self._get_constructs(associations, themes, match_all)
         return associations
 
+    @cached
+    @shared
     def get_association_themes (self):
         """Returns the topics in the topic map used in the scope
         property of `Association`s.
@@ -57,6 +63,8 @@ class ScopedIndex (Index):
         """
         return self.topic_map.get_topics().exclude(scoped_associations=None)
 
+    @cached
+    @shared
     def get_names (self, themes=None, match_all=False):
         """Returns the `Name`s in the topic map whose scope
         property contains at least one of the specified `themes`.
@@ -81,6 +89,8 @@ class ScopedIndex (Index):
         names = self._get_constructs(names, themes, match_all)
         return names
 
+    @cached
+    @shared
     def get_name_themes (self):
         """Returns the topics in the topic map used in the scope
         property of `Name`s.
@@ -92,6 +102,8 @@ class ScopedIndex (Index):
         """
         return self.topic_map.get_topics().exclude(scoped_names=None)
 
+    @cached
+    @shared
     def get_occurrences (self, themes=None, match_all=False):
         """Returns the `Occurrence`s in the topic map whose scope
         property contains at least one of the specified `themes`.
@@ -116,6 +128,8 @@ class ScopedIndex (Index):
         occurrences = self._get_constructs(occurrences, themes, match_all)
         return occurrences
 
+    @cached
+    @shared
     def get_occurrence_themes (self):
         """Returns the topics in the topic map used in the scope
         property of `Occurrence`s.
@@ -127,6 +141,8 @@ class ScopedIndex (Index):
         """
         return self.topic_map.get_topics().exclude(scoped_occurrences=None)
 
+    @cached
+    @shared
     def get_variants (self, themes, match_all=False):
         """Returns the `Variant`s in the topic map whose scope
         property contains the specified `theme`, or one of the
@@ -166,6 +182,8 @@ class ScopedIndex (Index):
             raise IllegalArgumentException('themes must not be None')
         return variants.distinct()
 
+    @cached
+    @shared
     def get_variant_themes (self):
         """Returns the topics in the topic map used in the scope
         property of `Variant`s.
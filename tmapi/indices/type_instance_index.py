@@ -16,6 +16,8 @@ from django.db.models import Q
 
 from tmapi.indices.index import Index
 from tmapi.models import Name, Occurrence, Role, Topic
+from tmapi.models.cache_utils import shared
+from tmapi.models.read_only import cached
 
 
 class TypeInstanceIndex (Index):
@@ -30,6 +32,8 @@ class TypeInstanceIndex (Index):
 
     """
 
+    @cached
+    @shared
     def get_associations (self, association_type):
         """Returns the associations in the topic map whose type
         property equals `topic_type`.
@@ -43,6 +47,8 @@ class TypeInstanceIndex (Index):
         """
         return self.topic_map.get_associations().filter(type=association_type)
 
+    @cached
+    @shared
     def get_association_types (self):
         """Returns the topics in the topic map used in the type
         property as `Association`s.
@@ -54,6 +60,8 @@ class TypeInstanceIndex (Index):
         """
         return self.topic_map.get_topics().exclude(typed_associations=None)
 
+    @cached
+    @shared
     def get_names (self, name_type):
         """Returns the topic names in the topic map whose type
         property equals `name_type`.
@@ -68,6 +76,8 @@ class TypeInstanceIndex (Index):
         return Name.objects.filter(topic__topic_map=self.topic_map).filter(
             type=name_type)
 
+    @cached
+    @shared
     def get_name_types (self):
         """Returns the topics in the topic map used in the type
         property of `Name`s.
@@ -79,6 +89,8 @@ class TypeInstanceIndex (Index):
         """
         return self.topic_map.get_topics().exclude(typed_names=None)
 
+    @cached
+    @shared
     def get_occurrences (self, occurrence_type):
         """Returns the occurrences in the topic map whose type
         property equals `occurrence_type`.
@@ -93,6 +105,8 @@ class TypeInstanceIndex (Index):
         return Occurrence.objects.filter(
             topic__topic_map=self.topic_map).filter(type=occurrence_type)
 
+    @cached
+    @shared
     def get_occurrence_types (self):
         """Returns the topics in the topic map used in the type
         property of `Occurrence`s.
@@ -104,6 +118,8 @@ class TypeInstanceIndex (Index):
         """
         return self.topic_map.get_topics().exclude(typed_occurrences=None)
 
+    @cached
+    @shared
     def get_roles (self, role_type):
         """Returns the roles in the topic map whose type property
         equals `role_type`.
@@ -118,6 +134,8 @@ class TypeInstanceIndex (Index):
         return Role.objects.filter(topic_map=self.topic_map).filter(
             type=role_type)
 
+    @cached
+    @shared
     def get_role_types (self):
         """Returns the topics in the topic map used in the type
         property of `Role`s.
@@ -129,6 +147,8 @@ class TypeInstanceIndex (Index):
         """
         return self.topic_map.get_topics().exclude(typed_roles=None)
 
+    @cached
+    @shared
     def get_topics (self, topic_types=None, match_all=False):
         """Returns the topics which are an instance of at least one of
         the specified `topic_types`, or all topics which are not an
@@ -169,6 +189,8 @@ class TypeInstanceIndex (Index):
             topics = topics.filter(types=None)
         return topics.distinct()
 
+    @cached
+    @shared
     def get_topic_types (self):
         """Returns the topics in the topic map that are used as type
         in a type-instance relationship.
@@ -0,0 +1,305 @@
+# Copyright 2011 Jamie Norrish (jamie@artefact.org.nz)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module providing opt-in instrumentation of TMAPI operations.
+
+While instrumentation is enabled, every public method of the
+constructs, topic map systems and indices (of both the database and
+memory backends) records, for each call, the wall time taken and the
+number and duration of the SQL queries made. Times and queries are
+inclusive of nested calls; for example, the queries made by a
+`Topic.merge_in` are counted against it as well as against each of
+the methods it calls.
+
+The measurements are available as a dictionary from `get_stats`,
+may be written to a log with `log_stats`, and are passed to each
+callback added with `add_callback` (eg, to forward them to a metrics
+client).
+
+Enabling instrumentation replaces the methods of the classes with
+measuring wrappers, and disabling it restores the originals, so that
+instrumentation has no overhead at all when it is disabled.
+
+"""
+
+import inspect
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import connections
+
+
+# Names of public methods that are not TMAPI operations.
+EXCLUDED_METHODS = ('delete', 'save')
+
+logger = logging.getLogger('tmapi.instrumentation')
+
+_callbacks = []
+_lock = threading.Lock()
+_local = threading.local()
+# The original functions of each instrumented class, keyed by class.
+_originals = {}
+_stats = {}
+# The attributes of a database connection are local to each thread.
+# The attribute dictionary of each thread's connection that records
+# its queries only for instrumentation, with its previous debug
+# cursor setting, keyed by the id of the dictionary.
+_forced_connections = {}
+
+
+def add_callback (callback):
+    """Adds `callback` to be called after every instrumented call.
+
+    `callback` is called with the name of the method (qualified by
+    the name of the instance's class), the wall time of the call in
+    seconds, the number of queries it made and the time taken by
+    those queries in seconds.
+
+    :param callback: the function to be called
+    :type callback: callable
+
+    """
+    if callback not in _callbacks:
+        _callbacks.append(callback)
+
+def disable ():
+    """Disables instrumentation, restoring the original methods.
+
+    The statistics collected are kept until `reset_stats` is called.
+
+    """
+    for cls, functions in _originals.items():
+        for name, function in functions.items():
+            setattr(cls, name, function)
+    _originals.clear()
+    _lock.acquire()
+    try:
+        for attributes, use_debug_cursor in _forced_connections.values():
+            attributes['use_debug_cursor'] = use_debug_cursor
+        _forced_connections.clear()
+    finally:
+        _lock.release()
+
+def enable ():
+    """Enables instrumentation of TMAPI operations.
+
+    So that queries can be counted, each database connection is made
+    to record its queries (as it does when settings.DEBUG is True)
+    while instrumentation is enabled. Since each thread has its own
+    connections, this is done by the first instrumented call in each
+    thread. The queries made by each outermost instrumented call are
+    discarded afterwards, unless they would have been recorded
+    anyway.
+
+    """
+    if _originals:
+        return
+    for cls in _get_instrumented_classes():
+        for base in inspect.getmro(cls):
+            if base.__module__.startswith('tmapi.') and \
+                    base not in _originals:
+                _instrument_class(base)
+
+def get_stats ():
+    """Returns the statistics collected for each method.
+
+    The dictionary is keyed by method name (qualified by the name of
+    the instance's class), and each value is a dictionary with the
+    keys 'calls', 'time', 'queries' and 'query_time'. Times are in
+    seconds.
+
+    :rtype: dictionary
+
+    """
+    _lock.acquire()
+    try:
+        return dict([(name, dict(method_stats)) for name, method_stats
+                     in _stats.items()])
+    finally:
+        _lock.release()
+
+def is_enabled ():
+    """Returns True if instrumentation is enabled.
+
+    :rtype: boolean
+
+    """
+    return bool(_originals)
+
+def log_stats (level=logging.INFO):
+    """Writes the statistics collected for each method to the
+    'tmapi.instrumentation' logger, most time consuming first.
+
+    :param level: the logging level
+    :type level: integer
+
+    """
+    stats = get_stats()
+    names = sorted(stats, key=lambda name: stats[name]['time'],
+                   reverse=True)
+    for name in names:
+        method_stats = stats[name]
+        logger.log(level, '%s: %d calls, %.6fs, %d queries, %.6fs in queries',
+                   name, method_stats['calls'], method_stats['time'],
+                   method_stats['queries'], method_stats['query_time'])
+
+def remove_callback (callback):
+    """Removes `callback`, so that it is no longer called after
+    instrumented calls.
+
+    :param callback: the function to be removed
+    :type callback: callable
+
+    """
+    if callback in _callbacks:
+        _callbacks.remove(callback)
+
+def reset_stats ():
+    """Discards the statistics collected so far."""
+    _lock.acquire()
+    try:
+        _stats.clear()
+    finally:
+        _lock.release()
+
+def _force_debug_cursors ():
+    """Makes each database connection of the current thread record
+    its queries, remembering the previous setting of each connection
+    that would not otherwise have done so."""
+    for connection in connections.all():
+        if connection.use_debug_cursor or \
+                (connection.use_debug_cursor is None and settings.DEBUG):
+            continue
+        _lock.acquire()
+        try:
+            _forced_connections[id(connection.__dict__)] = (
+                connection.__dict__, connection.use_debug_cursor)
+        finally:
+            _lock.release()
+        connection.use_debug_cursor = True
+
+def _get_instrumented_classes ():
+    """Returns the classes whose methods are instrumented.
+
+    The classes are imported here, rather than with this module, so
+    that importing this module does not import the models.
+
+    :rtype: list of classes
+
+    """
+    import tmapi.indices
+    import tmapi.memory
+    import tmapi.models
+    classes = []
+    for module in (tmapi.models, tmapi.memory):
+        for name in ('Association', 'Name', 'Occurrence', 'Role', 'Topic',
+                     'TopicMap', 'TopicMapSystem', 'Variant'):
+            classes.append(getattr(module, name))
+    for module in (tmapi.indices, tmapi.memory):
+        for name in ('LiteralIndex', 'ScopedIndex', 'TypeInstanceIndex'):
+            classes.append(getattr(module, name))
+    classes.append(tmapi.models.Construct)
+    return classes
+
+def _instrument_class (cls):
+    """Replaces the public methods defined by `cls` with measuring
+    wrappers, recording the originals to be restored.
+
+    :param cls: the class to instrument
+    :type cls: class
+
+    """
+    functions = {}
+    for name, function in cls.__dict__.items():
+        if name.startswith('_') or name in EXCLUDED_METHODS or \
+                not inspect.isfunction(function):
+            continue
+        functions[name] = function
+        setattr(cls, name, _wrap(name, function))
+    _originals[cls] = functions
+
+def _record (name, elapsed, queries, query_time):
+    """Adds the measurements of a call of the method `name` to the
+    statistics, and passes them to the callbacks and logger.
+
+    :param name: the qualified name of the method
+    :type name: string
+    :param elapsed: the wall time of the call in seconds
+    :type elapsed: float
+    :param queries: the number of queries made by the call
+    :type queries: integer
+    :param query_time: the time taken by the queries in seconds
+    :type query_time: float
+
+    """
+    _lock.acquire()
+    try:
+        method_stats = _stats.get(name)
+        if method_stats is None:
+            method_stats = _stats[name] = {'calls': 0, 'time': 0.0,
+                                           'queries': 0, 'query_time': 0.0}
+        method_stats['calls'] += 1
+        method_stats['time'] += elapsed
+        method_stats['queries'] += queries
+        method_stats['query_time'] += query_time
+    finally:
+        _lock.release()
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug('%s: %.6fs, %d queries, %.6fs in queries', name,
+                     elapsed, queries, query_time)
+    for callback in _callbacks:
+        callback(name, elapsed, queries, query_time)
+
+def _wrap (name, function):
+    """Returns a wrapper around the method `function` that measures
+    each call of it.
+
+    :param name: the name of the method
+    :type name: string
+    :param function: the function implementing the method
+    :type function: function
+    :rtype: function
+
+    """
+    def wrapper (self, *args, **kwargs):
+        depth = getattr(_local, 'depth', 0)
+        if depth == 0:
+            _force_debug_cursors()
+        _local.depth = depth + 1
+        starts = [(connection, len(connection.queries)) for connection
+                  in connections.all()]
+        start = time.time()
+        try:
+            return function(self, *args, **kwargs)
+        finally:
+            elapsed = time.time() - start
+            _local.depth = depth
+            queries = 0
+            query_time = 0.0
+            for connection, count in starts:
+                new_queries = connection.queries[count:]
+                queries += len(new_queries)
+                for query in new_queries:
+                    query_time += float(query['time'])
+                if depth == 0 and \
+                        id(connection.__dict__) in _forced_connections:
+                    del connection.queries[count:]
+            _record('%s.%s' % (self.__class__.__name__, name), elapsed,
+                    queries, query_time)
+    wrapper.__name__ = function.__name__
+    wrapper.__doc__ = function.__doc__
+    wrapper.__module__ = function.__module__
+    return wrapper
@@ -0,0 +1,118 @@
+# Copyright 2011 Jamie Norrish (jamie@artefact.org.nz)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Management command running the TMAPI benchmark.
+
+The benchmark is run in a test database, created and destroyed by
+the command, so that the configured database is not touched; see
+`tmapi.benchmark`.
+
+"""
+
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import simplejson
+
+from tmapi.benchmark import DEFAULT_PARAMETERS, DEFAULT_THRESHOLD, \
+    compare_results, format_results, run_benchmarks
+
+
+class Command (BaseCommand):
+
+    args = ''
+    help = 'Runs the TMAPI benchmark, optionally comparing the results with a saved baseline.'
+    option_list = BaseCommand.option_list + (
+        make_option('--backend', default=DEFAULT_PARAMETERS['backend'],
+                    help='The backend to benchmark'),
+        make_option('--topics', type='int',
+                    default=DEFAULT_PARAMETERS['topics'],
+                    help='The number of topics to generate'),
+        make_option('--names', type='int',
+                    default=DEFAULT_PARAMETERS['names'],
+                    help='The number of names per topic'),
+        make_option('--associations', type='int',
+                    default=DEFAULT_PARAMETERS['associations'],
+                    help='The number of associations per topic'),
+        make_option('--fan-out', dest='fan_out', type='int',
+                    default=DEFAULT_PARAMETERS['fan_out'],
+                    help='The number of types, and of themes'),
+        make_option('--operations', type='int',
+                    default=DEFAULT_PARAMETERS['operations'],
+                    help='The number of times each operation is called'),
+        make_option('--seed', type='int', default=DEFAULT_PARAMETERS['seed'],
+                    help='The seed of the random number generator'),
+        make_option('--baseline',
+                    help='A baseline file to compare the results with'),
+        make_option('--save-baseline', dest='save_baseline',
+                    help='A file to save the results to as a baseline'),
+        make_option('--threshold', type='float', default=DEFAULT_THRESHOLD,
+                    help='The proportion by which the time per call may exceed the baseline'),
+        )
+
+    def handle (self, *args, **options):
+        parameters = dict([(name, options[name]) for name
+                           in DEFAULT_PARAMETERS])
+        baseline = None
+        if options['baseline']:
+            baseline = self._load_baseline(options['baseline'], parameters)
+        verbosity = int(options['verbosity'])
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=verbosity)
+        try:
+            results = run_benchmarks(**parameters)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity)
+        for line in format_results(results):
+            self.stdout.write(line + '\n')
+        if options['save_baseline']:
+            baseline_file = open(options['save_baseline'], 'w')
+            try:
+                simplejson.dump({'parameters': parameters,
+                                 'results': results}, baseline_file,
+                                indent=2, sort_keys=True)
+            finally:
+                baseline_file.close()
+        if baseline is not None:
+            regressions = compare_results(results, baseline,
+                                          options['threshold'])
+            if regressions:
+                raise CommandError('Regressions from the baseline:\n%s' %
+                                   '\n'.join(regressions))
+            self.stdout.write('No regressions from the baseline.\n')
+
+    def _load_baseline (self, path, parameters):
+        """Returns the results saved in the baseline file at `path`.
+
+        :param path: the path of the baseline file
+        :type path: string
+        :param parameters: the parameters of this run
+        :type parameters: dictionary
+        :rtype: dictionary
+
+        """
+        try:
+            baseline_file = open(path)
+        except IOError, e:
+            raise CommandError('Cannot read the baseline: %s' % e)
+        try:
+            baseline = simplejson.load(baseline_file)
+        finally:
+            baseline_file.close()
+        if baseline['parameters'] != parameters:
+            raise CommandError(
+                'The baseline was made with different parameters: %s' %
+                baseline['parameters'])
+        return baseline['results']
@@ -0,0 +1,43 @@
+# Copyright 2011 Jamie Norrish (jamie@artefact.org.nz)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""In-memory implementation of the TMAPI interfaces.
+
+A `TopicMapSystem` created by a `TopicMapSystemFactory` whose
+`tmapi.constants.BACKEND_PROPERTY_STRING` property is set to
+`tmapi.constants.MEMORY_BACKEND` holds its topic maps in memory,
+rather than in the database. The classes here provide the same public
+methods as the models of the same name, but each construct is a
+single object with __slots__, and every lookup is made through
+dictionaries and sets maintained by its topic map.
+
+A topic map stored in the database may be copied into memory with
+`load_topic_map`, and the changes made to the copy written back with
+`save_topic_map`.
+
+"""
+
+from association import Association
+from database_utils import load_topic_map, save_topic_map
+from literal_index import LiteralIndex
+from name import Name
+from occurrence import Occurrence
+from result_list import ResultList
+from role import Role
+from scoped_index import ScopedIndex
+from topic import Topic
+from topic_map import TopicMap
+from topic_map_system import TopicMapSystem
+from type_instance_index import TypeInstanceIndex
+from variant import Variant
@@ -0,0 +1,102 @@
+# Copyright 2011 Jamie Norrish (jamie@artefact.org.nz)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from tmapi.exceptions import ModelConstraintException
+
+from reifiable import Reifiable
+from result_list import ResultList
+from role import Role
+from scoped import Scoped
+from typed import Typed
+
+
+class Association (Reifiable, Scoped, Typed):
+
+    """Represents an association item."""
+
+    __slots__ = ('_id', '_topic_map', '_item_identifiers', '_reifier',
+                 '_scope', '_type', '_roles')
+    _kind = 'association'
+
+    def __init__ (self, topic_map, association_type, scope):
+        self._topic_map = topic_map
+        self._item_identifiers = ()
+        self._reifier = None
+        self._scope = scope or ()
+        self._type = association_type
+        self._roles = ()
+        topic_map._register(self)
+
+    def create_role (self, role_type, player):
+        """Creates a new role representing a role in this association.
+
+        :param role_type: the role type
+        :type role_type: `Topic`
+        :param player: the role player
+        :type player: `Topic`
+        :rtype: `Role`
+
+        """
+        if role_type is None:
+            raise ModelConstraintException(self, 'The type may not be None')
+        if player is None:
+            raise ModelConstraintException(self, 'The player may not be None')
+        if self._topic_map is not role_type._topic_map:
+            raise ModelConstraintException(
+                self, 'The type is not from the same topic map')
+        if self._topic_map is not player._topic_map:
+            raise ModelConstraintException(
+                self, 'The player is not from the same topic map')
+        return Role(self, role_type, player)
+
+    def get_parent (self):
+        """Returns the `TopicMap` to which this association belongs.
+
+        :rtype: `TopicMap`
+
+        """
+        return self._topic_map
+
+    def get_roles (self, role_type=None):
+        """Returns the `Role`s participating in this association.
+
+        If `role_type` is not None, returns all roles with the
+        specified type.
+
+        :param role_type: the type of the `Role` instances to be returned
+        :type role_type: `Topic`
+        :rtype: `ResultList` of `Role`s
+
+        """
+        if role_type is None:
+            return ResultList(self._roles)
+        return ResultList([role for role in self._roles
+                           if role._type is role_type])
+
+    def get_role_types (self):
+        """Returns the role types participating in this association.
+
+        :rtype: `ResultList` of `Topic`s
+
+        """
+        role_types = ResultList()
+        for role in self._roles:
+            if role._type not in role_types:
+                role_types.append(role._type)
+        return role_types
+
+    def remove (self):
+        for role in list(self._roles):
+            role.remove()
+        super(Association, self).remove()
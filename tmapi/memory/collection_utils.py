@@ -0,0 +1,88 @@
+# Copyright 2011 Jamie Norrish (jamie@artefact.org.nz)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module containing utility functions for maintaining the attributes
+and indices of in-memory constructs.
+
+Multi-valued properties of a construct (eg, its scope or item
+identifiers) are held as an empty tuple until a value is added, so
+that the many constructs with no such values share a single object.
+
+"""
+
+
+def append_value (construct, name, value):
+    """Appends `value` to the multi-valued property `name` of
+    `construct`.
+
+    :param construct: the construct to add to
+    :type construct: `Construct`
+    :param name: the name of the property's slot
+    :type name: string
+    :param value: the value to add
+
+    """
+    values = getattr(construct, name)
+    if values:
+        values.append(value)
+    else:
+        setattr(construct, name, [value])
+
+def remove_value (construct, name, value):
+    """Removes `value`, if present, from the multi-valued property
+    `name` of `construct`.
+
+    :param construct: the construct to remove from
+    :type construct: `Construct`
+    :param name: the name of the property's slot
+    :type name: string
+    :param value: the value to remove
+
+    """
+    values = getattr(construct, name)
+    if value in values:
+        values.remove(value)
+
+def index_add (index, key, construct):
+    """Adds `construct` to the set held under `key` in `index`.
+
+    :param index: the index
+    :type index: dictionary
+    :param key: the key to add `construct` under
+    :param construct: the construct to add
+    :type construct: `Construct`
+
+    """
+    constructs = index.get(key)
+    if constructs is None:
+        index[key] = set([construct])
+    else:
+        constructs.add(construct)
+
+def index_remove (index, key, construct):
+    """Removes `construct` from the set held under `key` in `index`,
+    removing `key` if the set becomes empty.
+
+    :param index: the index
+    :type index: dictionary
+    :param key: the key to remove `construct` from
+    :param construct: the construct to remove
+    :type construct: `Construct`
+
+    """
+    constructs = index.get(key)
+    if constructs is not None:
+        constructs.discard(construct)
+        if not constructs:
+            del index[key]
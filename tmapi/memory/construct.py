@@ -0,0 +1,139 @@
+# Copyright 2011 Jamie Norrish (jamie@artefact.org.nz)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from tmapi.exceptions import IdentityConstraintException, \
+    ModelConstraintException
+
+from collection_utils import append_value, remove_value
+from result_list import ResultList
+
+
+class Construct (object):
+
+    """Base class of all in-memory Topic Maps constructs.
+
+    The slots holding a construct's properties are declared by the
+    concrete classes only, since Python does not allow a class to
+    inherit non-empty slots from more than one base.
+
+    """
+
+    __slots__ = ()
+
+    def add_item_identifier (self, item_identifier):
+        """Adds an item identifier.
+
+        It is not allowed to have two `Construct`s in the same
+        `TopicMap` with the same item identifier. If the two objects
+        are `Topic`s, then they must be merged. If at least one of the
+        two objects is not a `Topic`, an `IdentityConstraintException`
+        must be reported.
+
+        :param item_identifier: the item identifier to be added
+        :type item_identifier: `Locator`
+        :raises `IdentityConstraintException`: if another construct
+          has an item identifier which is equal to `item_identifier`
+
+        """
+        if item_identifier is None:
+            raise ModelConstraintException(
+                self, 'The item identifier may not be None')
+        address = item_identifier.to_external_form()
+        construct = self._topic_map._iid_index.get(address)
+        if construct is self:
+            return
+        if construct is not None:
+            raise IdentityConstraintException(
+                self, construct, item_identifier,
+                'This item identifier is already associated with another construct')
+        self._add_item_identifier(item_identifier)
+
+    def _add_item_identifier (self, item_identifier):
+        """Adds an item identifier to this construct, without any
+        checking.
+
+        :param item_identifier: the item identifier to be added
+        :type item_identifier: `Locator`
+
+        """
+        topic_map = self._topic_map
+        item_identifier = topic_map._system._intern(item_identifier)
+        topic_map._iid_index[item_identifier.to_external_form()] = self
+        append_value(self, '_item_identifiers', item_identifier)
+
+    def get_id (self):
+        """Returns the identifier of this construct.
+
+        This property has no representation in the Topic Maps - Data Model.
+
+        The ID can be anything, so long as no other `Construct` in the
+        same topic map has the same ID.
+
+        :rtype: integer
+
+        """
+        return self._id
+
+    def get_item_identifiers (self):
+        """Returns the item identifiers of this Topic Maps construct.
+
+        :rtype: `ResultList` of `Locator`s
+
+        """
+        return ResultList(self._item_identifiers)
+
+    def get_parent (self):
+        """Returns the parent of this construct.
+
+        This method returns None iff this construct is a `TopicMap`
+        instance.
+
+        """
+        raise NotImplementedError
+
+    def get_topic_map (self, proxy=None):
+        """Returns the `TopicMap` instance to which this Topic Maps
+        construct belongs.
+
+        A `TopicMap` instance returns itself.
+
+        :param proxy: ignored; accepted for compatibility with the
+          database backend
+        :rtype: `TopicMap`
+
+        """
+        return self._topic_map
+
+    def remove (self):
+        """Deletes this construct from its parent container.
+
+        After invocation of this method, the construct is in an
+        undefined state and must not be used further.
+
+        """
+        self._topic_map._unregister(self)
+
+    def remove_item_identifier (self, item_identifier):
+        """Remove an item identifier.
+
+        :param item_identifier: the item identifier to be removed from
+          this construct
+        :type item_identifier: `Locator`
+
+        """
+        address = item_identifier.to_external_form()
+        index = self._topic_map._iid_index
+        if index.get(address) is self:
+            del index[address]
+            remove_value(self, '_item_identifiers', item_identifier)
@@ -0,0 +1,321 @@
+# Copyright 2011 Jamie Norrish (jamie@artefact.org.nz)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""This module provides functions to copy Topic Maps constructs from
+one in-memory topic map to another.
+
+It is the in-memory counterpart of `tmapi.models.copy_utils`.
+
+"""
+
+from merge_utils import generate_association_signature, \
+    generate_name_signature, generate_occurrence_signature, \
+    generate_variant_signature, move_role_characteristics
+
+
+def copy (source, target):
+    """Copies the topics and associations from the `source` to the
+    `target` topic map.
+
+    :param source: the topic map to take the topics and associations from
+    :type source: `TopicMap`
+    :param target: the topic map to receive the topics and associations
+    :type target: `TopicMap`
+
+    """
+    if source is target:
+        return
+    merge_map = {}
+    for topic in source.get_topics():
+        for slo in topic._subject_locators:
+            existing = target.get_topic_by_subject_locator(slo)
+            if existing is not None:
+                _add_merge(topic, existing, merge_map)
+        for sid in topic._subject_identifiers:
+            existing = target.get_topic_by_subject_identifier(sid)
+            if existing is not None:
+                _add_merge(topic, existing, merge_map)
+            existing = target.get_construct_by_item_identifier(sid)
+            if existing is not None and existing._kind == 'topic':
+                _add_merge(topic, existing, merge_map)
+        for iid in topic._item_identifiers:
+            existing = target.get_construct_by_item_identifier(iid)
+            if existing is not None and existing._kind == 'topic':
+                _add_merge(topic, existing, merge_map)
+            existing = target.get_topic_by_subject_identifier(iid)
+            if existing is not None:
+                _add_merge(topic, existing, merge_map)
+    source_reifier = source._reifier
+    target_reifier = target._reifier
+    if source_reifier is not None and target_reifier is not None:
+        _add_merge(source_reifier, target_reifier, merge_map)
+    merges = merge_map.items()
+    for topic in source.get_topics():
+        if topic not in merge_map:
+            _copy_topic(topic, target, merge_map)
+    for topic, target_topic in merges:
+        _copy_identities(topic, target_topic)
+        _copy_types(topic, target_topic, merge_map)
+        _copy_characteristics(topic, target_topic, merge_map)
+    _copy_associations(source, target, merge_map)
+
+def _add_merge (source, target, merge_map):
+    """Adds a mapping from `source` to `target` into the `merge_map`.
+
+    If `source` already has a mapping to another target topic,
+    `target` is merged with the existing target topic.
+
+    :param source: the source topic
+    :type source: `Topic`
+    :param target: the target topic
+    :type target: `Topic`
+    :param merge_map: the map that holds the merge mappings
+    :type merge_map: dictionary
+
+    """
+    previous_target = merge_map.get(source)
+    if previous_target is not None:
+        if previous_target is not target:
+            previous_target.merge_in(target)
+    else:
+        merge_map[source] = target
+
+def _copy_associations (source, target, merge_map):
+    """Copies the associations from `source` topic map to `target`
+    topic map.
+
+    :param source: the topic map to take the associations from
+    :type source: `TopicMap`
+    :param target: the topic map that receives the associations
+    :type target: `TopicMap`
+    :param merge_map: the map that holds the merge mappings
+    :type merge_map: dictionary
+
+    """
+    signatures = {}
+    for association in target.get_associations():
+        signatures[generate_association_signature(association)] = association
+    for association in source.get_associations():
+        association_type = _copy_topic_reference(association._type, target,
+                                                 merge_map)
+        scope = _copy_scope(association._scope, target, merge_map)
+        target_association = target.create_association(association_type,
+                                                       scope)
+        for role in association._roles:
+            role_type = _copy_topic_reference(role._type, target, merge_map)
+            player = _copy_topic_reference(role._player, target, merge_map)
+            target_role = target_association.create_role(role_type, player)
+            _copy_item_identifiers(role, target_role)
+            _copy_reifier(role, target_role, merge_map)
+        signature = generate_association_signature(target_association)
+        existing = signatures.get(signature)
+        if existing is not None:
+            move_role_characteristics(target_association, existing)
+            target_association.remove()
+            target_association = existing
+        else:
+            signatures[signature] = target_association
+        _copy_reifier(association, target_association, merge_map)
+        _copy_item_identifiers(association, target_association)
+
+def _copy_characteristics (topic, target_topic, merge_map):
+    """Copies the occurrences and names from `topic` to the `target_topic`.
+
+    :param topic: the topic to take the characteristics from
+    :type topic: `Topic`
+    :param target_topic: the topic that receives the characteristics
+    :type target_topic: `Topic`
+    :param merge_map: the map that holds the merge mappings
+    :type merge_map: dictionary
+
+    """
+    signatures = {}
+    for occurrence in target_topic._occurrences:
+        signatures[generate_occurrence_signature(occurrence)] = occurrence
+    topic_map = target_topic._topic_map
+    for occurrence in topic._occurrences:
+        occurrence_type = _copy_topic_reference(occurrence._type, topic_map,
+                                                merge_map)
+        scope = _copy_scope(occurrence._scope, topic_map, merge_map)
+        target_occurrence = target_topic.create_occurrence(
+            occurrence_type, occurrence._value, scope,
+            occurrence.get_datatype())
+        signature = generate_occurrence_signature(target_occurrence)
+        existing = signatures.get(signature)
+        if existing is not None:
+            target_occurrence.remove()
+            target_occurrence = existing
+        else:
+            signatures[signature] = target_occurrence
+        _copy_reifier(occurrence, target_occurrence, merge_map)
+        _copy_item_identifiers(occurrence, target_occurrence)
+    signatures = {}
+    for name in target_topic._names:
+        signatures[generate_name_signature(name)] = name
+    for name in topic._names:
+        name_type = _copy_topic_reference(name._type, topic_map, merge_map)
+        scope = _copy_scope(name._scope, topic_map, merge_map)
+        target_name = target_topic.create_name(name._value, name_type, scope)
+        signature = generate_name_signature(target_name)
+        existing = signatures.get(signature)
+        if existing is not None:
+            target_name.remove()
+            target_name = existing
+        else:
+            signatures[signature] = target_name
+        _copy_reifier(name, target_name, merge_map)
+        _copy_item_identifiers(name, target_name)
+        _copy_variants(name, target_name, merge_map)
+
+def _copy_identities (topic, target_topic):
+    """Copies the identities (item identifiers, subject identifiers
+    and subject locators) from the `source` to the `target_topic`.
+
+    :param topic: the topic to take the identities from
+    :type topic: `Topic`
+    :param target_topic: the topic that receives the identities
+    :type target_topic: `Topic`
+
+    """
+    for sid in topic._subject_identifiers:
+        target_topic.add_subject_identifier(sid)
+    for slo in topic._subject_locators:
+        target_topic.add_subject_locator(slo)
+    _copy_item_identifiers(topic, target_topic)
+
+def _copy_item_identifiers (source, target):
+    """Copies the item identifiers from `source` to `target`.
+
+    :param source: the Topic Maps construct to take the item identifiers from
+    :type source: `Construct`
+    :param target: the Topic Maps construct that receives the item identifiers
+    :type target: `Construct`
+
+    """
+    for iid in source._item_identifiers:
+        target.add_item_identifier(iid)
+
+def _copy_reifier (source, target, merge_map):
+    """Copies the reifier of `source` to the `target`.
+
+    :param source: the reifiable Topic Maps construct to take the reifier from
+    :type source: `Reifiable`
+    :param target: the target Topic Maps construct that receives the reifier
+    :type target: `Reifiable`
+    :param merge_map: the map that holds the merge mappings
+    :type merge_map: dictionary
+
+    """
+    if source._reifier is not None:
+        target.set_reifier(_copy_topic_reference(
+                source._reifier, target._topic_map, merge_map))
+
+def _copy_scope (themes, topic_map, merge_map):
+    """Copies and returns `themes` into `topic_map`.
+
+    :param themes: the scope to copy
+    :type themes: list of `Topic`s
+    :param topic_map: the Topic Map that receives the scope
+    :type topic_map: `TopicMap`
+    :param merge_map: the map that holds the merge mappings
+    :type merge_map: dictionary
+    :rtype: list of `Topic`s
+
+    """
+    return [_copy_topic_reference(theme, topic_map, merge_map)
+            for theme in themes]
+
+def _copy_topic (topic, target, merge_map):
+    """Copies the `topic` to the `target` topic map, recording the
+    copy in `merge_map`.
+
+    Returns the newly created topic.
+
+    :param topic: the topic to copy
+    :type topic: `Topic`
+    :param target: the target topic map
+    :type target: `TopicMap`
+    :param merge_map: the map that holds the merge mappings
+    :type merge_map: dictionary
+    :rtype: `Topic`
+
+    """
+    target_topic = target.create_empty_topic()
+    merge_map[topic] = target_topic
+    _copy_identities(topic, target_topic)
+    _copy_types(topic, target_topic, merge_map)
+    _copy_characteristics(topic, target_topic, merge_map)
+    return target_topic
+
+def _copy_topic_reference (topic, topic_map, merge_map):
+    """Returns the topic in `topic_map` corresponding to `topic`,
+    copying `topic` if it has not already been copied.
+
+    :param topic: the topic referenced by a source construct
+    :type topic: `Topic`
+    :param topic_map: the Topic Map that receives the reference
+    :type topic_map: `TopicMap`
+    :param merge_map: the map that holds the merge mappings
+    :type merge_map: dictionary
+    :rtype: `Topic`
+
+    """
+    target_topic = merge_map.get(topic)
+    if target_topic is None:
+        target_topic = _copy_topic(topic, topic_map, merge_map)
+    return target_topic
+
+def _copy_types (topic, target_topic, merge_map):
+    """Copies the types from the `topic` to the `target_topic`.
+
+    :param topic: the topic to take the types from
+    :type topic: `Topic`
+    :param target_topic: the topic that receives the types
+    :type target_topic: `Topic`
+    :param merge_map: the map that holds the merge mappings
+    :type merge_map: dictionary
+
+    """
+    for topic_type in topic._types:
+        target_topic.add_type(_copy_topic_reference(
+                topic_type, target_topic._topic_map, merge_map))
+
+def _copy_variants (source, target, merge_map):
+    """Copies the variants from `source` to `target`.
+
+    :param source: the name to take the variants from
+    :type source: `Name`
+    :param target: the name that receives the variants
+    :type target: `Name`
+    :param merge_map: the map that holds the merge mappings
+    :type merge_map: dictionary
+
+    """
+    signatures = {}
+    for variant in target._variants:
+        signatures[generate_variant_signature(variant)] = variant
+    topic_map = target._topic_map
+    for variant in source._variants:
+        scope = _copy_scope(variant.get_scope(), topic_map, merge_map)
+        target_variant = target.create_variant(variant._value, scope,
+                                               variant.get_datatype())
+        signature = generate_variant_signature(target_variant)
+        existing = signatures.get(signature)
+        if existing is not None:
+            target_variant.remove()
+            target_variant = existing
+        else:
+            signatures[signature] = target_variant
+        _copy_reifier(variant, target_variant, merge_map)
+        _copy_item_identifiers(variant, target_variant)
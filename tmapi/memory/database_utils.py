@@ -0,0 +1,585 @@
+# Copyright 2011 Jamie Norrish (jamie@artefact.org.nz)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module containing functions for moving a topic map between the
+database and memory in bulk.
+
+`load_topic_map` reads a whole topic map from the database with a
+fixed number of queries (one per table), and builds an in-memory copy
+of it. `save_topic_map` writes the changes made to that copy back to
+the database, comparing each construct against its state when it was
+loaded (or last saved) so that only the changed rows are written.
+
+Constructs are matched between the two by their identifiers: a loaded
+construct has the same ID as its database counterpart, and a
+construct created in memory takes the ID of the `Identifier` created
+for it when it is first saved. Changes made to the database topic map
+by other means between loading and saving are not detected, and may
+be overwritten.
+
+"""
+
+from django.db import transaction
+from django.utils.encoding import smart_unicode
+
+from tmapi.constants import BACKEND_PROPERTY_STRING, MEMORY_BACKEND
+from tmapi.exceptions import IllegalArgumentException
+from tmapi.models import Association, ItemIdentifier, Name, Occurrence, \
+    Role, SubjectIdentifier, SubjectLocator, Topic, TopicMap, Variant
+from tmapi.models.batch import CHUNK_SIZE, flush_batches, insert_join_rows
+from tmapi.models.bulk_utils import bulk_insert, create_identifiers
+from tmapi.models.locator import Locator
+
+from association import Association as MemoryAssociation
+from name import Name as MemoryName
+from occurrence import Occurrence as MemoryOccurrence
+from reifiable import Reifiable
+from role import Role as MemoryRole
+from scoped import Scoped
+from topic import Topic as MemoryTopic
+from topic_map_system import TopicMapSystem
+from typed import Typed
+from variant import Variant as MemoryVariant
+
+
+# Database models, keyed by the kind of construct.
+MODELS = {
+    'association': Association,
+    'name': Name,
+    'occurrence': Occurrence,
+    'role': Role,
+    'topic': Topic,
+    'topic_map': TopicMap,
+    'variant': Variant,
+    }
+
+# The kinds of construct, in an order in which each construct's parent
+# precedes it.
+KINDS = ('topic', 'association', 'role', 'name', 'occurrence', 'variant')
+
+# Fields holding a single value, other than the identifier and topic
+# map; those that reference another construct are listed in
+# REFERENCE_FIELDS.
+SCALAR_FIELDS = {
+    'association': ('reifier', 'type'),
+    'name': ('reifier', 'type', 'topic', 'value'),
+    'occurrence': ('reifier', 'type', 'topic', 'value', 'datatype'),
+    'role': ('reifier', 'type', 'association', 'player'),
+    'topic': (),
+    'topic_map': ('reifier',),
+    'variant': ('reifier', 'name', 'value', 'datatype'),
+    }
+REFERENCE_FIELDS = ('association', 'name', 'player', 'reifier', 'topic',
+                    'type')
+
+# Many to many fields holding references to topics.
+TOPIC_SET_FIELDS = ('scope', 'types')
+
+# Models storing the subject identifiers and locators of topics.
+SUBJECT_MODELS = (('subject_identifiers', SubjectIdentifier),
+                  ('subject_locators', SubjectLocator))
+
+
+def load_topic_map (topic_map, system=None):
+    """Returns an in-memory copy of the database `topic_map`.
+
+    The whole of `topic_map` is read with a fixed number of queries,
+    however many constructs it contains. The copy's constructs have
+    the same IDs as those in the database, and its changes may be
+    written back with `save_topic_map`.
+
+    :param topic_map: the topic map to load
+    :type topic_map: `tmapi.models.TopicMap`
+    :param system: the in-memory system to load into; if None, a new
+      system with the features of `topic_map`'s system is created
+    :type system: `tmapi.memory.TopicMapSystem`
+    :rtype: `tmapi.memory.TopicMap`
+
+    """
+    flush_batches()
+    if system is None:
+        features = dict(topic_map.topic_map_system.features.values_list(
+                'feature_string', 'value'))
+        system = TopicMapSystem(
+            features, {BACKEND_PROPERTY_STRING: MEMORY_BACKEND})
+    rows = {}
+    for kind in KINDS:
+        fields = ['id', 'identifier'] + list(SCALAR_FIELDS[kind])
+        rows[kind] = MODELS[kind].objects.filter(
+            topic_map=topic_map).values_list(*fields)
+    scopes = {}
+    for kind in ('association', 'name', 'occurrence', 'variant'):
+        scopes[kind] = _get_join_rows(kind, 'scope', topic_map)
+    types = _get_join_rows('topic', 'types', topic_map)
+    item_identifiers = {}
+    for kind in KINDS + ('topic_map',):
+        item_identifiers[kind] = _get_join_rows(
+            kind, 'item_identifiers', topic_map, 'address')
+    subjects = {}
+    for name, model in SUBJECT_MODELS:
+        subjects[name] = model.objects.filter(
+            containing_topic_map=topic_map).values_list('topic', 'address')
+    last_id = topic_map.identifier_id
+    for kind in KINDS:
+        for row in rows[kind]:
+            last_id = max(last_id, row[1])
+    system._reserve_ids(last_id)
+    memory_topic_map = system.create_topic_map(topic_map.iri)
+    # The constructs of each kind, keyed by database ID.
+    constructs = dict([(kind, {}) for kind in MODELS])
+    pks = {}
+    _set_id(memory_topic_map, memory_topic_map, topic_map.identifier_id)
+    constructs['topic_map'][topic_map.pk] = memory_topic_map
+    pks[memory_topic_map._id] = topic_map.pk
+    topics = constructs['topic']
+    for pk, identifier_id in rows['topic']:
+        topic = MemoryTopic(memory_topic_map)
+        _set_id(memory_topic_map, topic, identifier_id)
+        topics[pk] = topic
+        pks[identifier_id] = pk
+    for source, target in types:
+        topics[source].add_type(topics[target])
+    for name, model in SUBJECT_MODELS:
+        if name == 'subject_identifiers':
+            add = MemoryTopic._add_subject_identifier
+        else:
+            add = MemoryTopic._add_subject_locator
+        for pk, address in subjects[name]:
+            add(topics[pk], Locator(address))
+    for kind in ('association', 'role', 'name', 'occurrence', 'variant'):
+        scope = {}
+        for source, target in scopes.get(kind, ()):
+            scope.setdefault(source, []).append(topics[target])
+        by_pk = constructs[kind]
+        for row in rows[kind]:
+            construct = _create_construct(
+                kind, memory_topic_map, row[2:], constructs,
+                scope.get(row[0]))
+            _set_id(memory_topic_map, construct, row[1])
+            by_pk[row[0]] = construct
+            pks[row[1]] = row[0]
+            reifier_id = row[2]
+            if reifier_id is not None:
+                construct.set_reifier(topics[reifier_id])
+    if topic_map.reifier_id is not None:
+        memory_topic_map.set_reifier(topics[topic_map.reifier_id])
+    for kind, join_rows in item_identifiers.items():
+        by_pk = constructs[kind]
+        for pk, address in join_rows:
+            by_pk[pk]._add_item_identifier(Locator(address))
+    memory_topic_map._stored = (topic_map.pk,
+                                _get_states(memory_topic_map, pks))
+    return memory_topic_map
+
+def save_topic_map (topic_map):
+    """Writes the changes made to `topic_map`, since it was loaded
+    with `load_topic_map` or last saved, to the database topic map it
+    was loaded from.
+
+    Only those constructs that have been created, modified or
+    removed are written, using bulk inserts, updates and deletes. All
+    of the changes are written in a single transaction.
+
+    Constructs created in memory are given the IDs of the
+    `Identifier`s created for them.
+
+    :param topic_map: the in-memory topic map to save
+    :type topic_map: `tmapi.memory.TopicMap`
+
+    """
+    if topic_map._stored is None:
+        raise IllegalArgumentException(
+            'The topic map was not loaded from the database')
+    topic_map_pk, states = topic_map._stored
+    flush_batches()
+    with transaction.commit_on_success():
+        pks, new_ids = _write_changes(topic_map, topic_map_pk, states)
+    constructs = topic_map._constructs
+    moved = [constructs.pop(old_id) for old_id in new_ids]
+    for construct in moved:
+        pks[new_ids[construct._id]] = pks.pop(construct._id)
+        construct._id = new_ids[construct._id]
+        constructs[construct._id] = construct
+    if new_ids:
+        topic_map._system._reserve_ids(max(new_ids.values()))
+    topic_map._stored = (topic_map_pk, _get_states(topic_map, pks))
+
+def _add_item_identifiers (topic_map_pk, added):
+    """Creates the item identifiers `added` to constructs in the
+    topic map with database ID `topic_map_pk`.
+
+    :param topic_map_pk: the database ID of the topic map
+    :type topic_map_pk: integer
+    :param added: the item_identifiers field of the construct's
+      model, the construct's database ID, and the address of the item
+      identifier
+    :type added: list of tuples
+
+    """
+    if not added:
+        return
+    addresses = [address for field, pk, address in added]
+    bulk_insert(ItemIdentifier, [
+            ItemIdentifier(address=address,
+                           containing_topic_map_id=topic_map_pk)
+            for address in addresses])
+    ids = {}
+    for chunk in _chunk(addresses):
+        ids.update(ItemIdentifier.objects.filter(
+                containing_topic_map=topic_map_pk,
+                address__in=chunk).values_list('address', 'id'))
+    join_rows = {}
+    for field, pk, address in added:
+        join_rows.setdefault(field, []).append((pk, ids[address]))
+    for field, rows in join_rows.items():
+        insert_join_rows(field, rows, False)
+
+def _chunk (values):
+    """Returns `values` split into lists of at most CHUNK_SIZE items.
+
+    :param values: the values to split
+    :type values: list
+    :rtype: list of lists
+
+    """
+    values = list(values)
+    return [values[start:start+CHUNK_SIZE]
+            for start in range(0, len(values), CHUNK_SIZE)]
+
+def _create_construct (kind, topic_map, values, constructs, scope):
+    """Creates an in-memory construct of `kind` from the values of its
+    SCALAR_FIELDS (save for the reifier) as read from the database.
+
+    :param kind: the kind of construct to create
+    :type kind: string
+    :param topic_map: the topic map to create the construct in
+    :type topic_map: `tmapi.memory.TopicMap`
+    :param values: the values of the construct's fields
+    :type values: tuple
+    :param constructs: the constructs already created, by kind and
+      database ID
+    :type constructs: dictionary
+    :param scope: the scope of the construct
+    :type scope: list of `tmapi.memory.Topic`s
+    :rtype: `tmapi.memory.Construct`
+
+    """
+    topics = constructs['topic']
+    values = values[1:]
+    if kind == 'association':
+        return MemoryAssociation(topic_map, topics[values[0]], scope)
+    elif kind == 'role':
+        return MemoryRole(constructs['association'][values[1]],
+                          topics[values[0]], topics[values[2]])
+    elif kind == 'name':
+        return MemoryName(topics[values[1]], values[2], topics[values[0]],
+                          scope)
+    elif kind == 'occurrence':
+        return MemoryOccurrence(topics[values[1]], topics[values[0]],
+                                values[2], values[3], scope)
+    return MemoryVariant(constructs['name'][values[0]], values[1],
+                         values[2], scope)
+
+def _get_join_rows (kind, field_name, topic_map, target_field=None):
+    """Returns the rows of the join table of the many to many field
+    `field_name` of the model for `kind` whose source is in
+    `topic_map`.
+
+    :param kind: the kind of construct
+    :type kind: string
+    :param field_name: the name of the many to many field
+    :type field_name: string
+    :param topic_map: the topic map
+    :type topic_map: `tmapi.models.TopicMap`
+    :param target_field: the field of the target model to return,
+      rather than its database ID
+    :type target_field: string
+    :rtype: `QuerySet` of pairs
+
+    """
+    field = MODELS[kind]._meta.get_field(field_name)
+    source = field.m2m_field_name()
+    target = field.m2m_reverse_field_name()
+    if kind == 'topic_map':
+        lookup = source
+    else:
+        lookup = '%s__topic_map' % source
+    if target_field is not None:
+        target = '%s__%s' % (target, target_field)
+    return field.rel.through.objects.filter(
+        **{lookup: topic_map}).values_list(source, target)
+
+def _get_state (construct):
+    """Returns the state of `construct` as it is stored in the
+    database, with constructs referenced by their IDs.
+
+    :param construct: the construct
+    :type construct: `tmapi.memory.Construct`
+    :rtype: dictionary
+
+    """
+    state = {'item_identifiers': frozenset(
+            [locator.to_external_form() for locator
+             in construct._item_identifiers])}
+    kind = construct._kind
+    if isinstance(construct, Reifiable):
+        state['reifier'] = _get_id(construct._reifier)
+    if isinstance(construct, Typed):
+        state['type'] = construct._type._id
+    if isinstance(construct, Scoped):
+        state['scope'] = frozenset([theme._id for theme in construct._scope])
+    if kind == 'topic':
+        state['types'] = frozenset([topic._id for topic in construct._types])
+        for name, model in SUBJECT_MODELS:
+            state[name] = frozenset(
+                [locator.to_external_form() for locator
+                 in getattr(construct, '_' + name)])
+    elif kind == 'role':
+        state['association'] = construct._association._id
+        state['player'] = construct._player._id
+    elif kind in ('name', 'occurrence'):
+        state['topic'] = construct._topic._id
+    elif kind == 'variant':
+        state['name'] = construct._name._id
+    if kind in ('name', 'occurrence', 'variant'):
+        state['value'] = smart_unicode(construct._value)
+    if kind in ('occurrence', 'variant'):
+        state['datatype'] = construct._datatype
+    return state
+
+def _get_field_values (kind, state, pks, attnames):
+    """Returns the database values of those SCALAR_FIELDS of `kind`
+    that are in `state`, with references to constructs given as
+    their database IDs.
+
+    :param kind: the kind of construct
+    :type kind: string
+    :param state: the (partial) state of a construct
+    :type state: dictionary
+    :param pks: the database IDs of constructs, keyed by their IDs
+    :type pks: dictionary
+    :param attnames: whether to name reference fields by their
+      attribute names (eg, 'type_id') rather than their field names
+    :type attnames: boolean
+    :rtype: dictionary
+
+    """
+    values = {}
+    for name in SCALAR_FIELDS[kind]:
+        if name not in state:
+            continue
+        value = state[name]
+        if name in REFERENCE_FIELDS:
+            if value is not None:
+                value = pks[value]
+            if attnames:
+                name = name + '_id'
+        values[name] = value
+    return values
+
+def _get_id (construct):
+    """Returns the ID of `construct`, or None if it is None.
+
+    :param construct: the construct
+    :type construct: `tmapi.memory.Construct` or None
+    :rtype: integer or None
+
+    """
+    if construct is None:
+        return None
+    return construct._id
+
+def _get_states (topic_map, pks):
+    """Returns the kind, database ID and state of each construct in
+    `topic_map`, keyed by the construct's ID.
+
+    :param topic_map: the in-memory topic map
+    :type topic_map: `tmapi.memory.TopicMap`
+    :param pks: the database IDs of the constructs, keyed by their IDs
+    :type pks: dictionary
+    :rtype: dictionary
+
+    """
+    states = {}
+    for id, construct in topic_map._constructs.items():
+        states[id] = (construct._kind, pks[id], _get_state(construct))
+    return states
+
+def _set_id (topic_map, construct, id):
+    """Changes the ID of `construct` in `topic_map` to `id`.
+
+    :param topic_map: the topic map containing `construct`
+    :type topic_map: `tmapi.memory.TopicMap`
+    :param construct: the construct
+    :type construct: `tmapi.memory.Construct`
+    :param id: the new ID
+    :type id: integer
+
+    """
+    del topic_map._constructs[construct._id]
+    construct._id = id
+    topic_map._constructs[id] = construct
+
+def _write_changes (topic_map, topic_map_pk, states):
+    """Writes the differences between the constructs of `topic_map`
+    and their stored `states` to the database.
+
+    Rows are written in an order that never leaves a reference to a
+    missing row, nor two rows with the same reifier or identifier:
+    identifiers and reifiers no longer used are removed first, then
+    new constructs are inserted, then existing constructs are
+    updated, and finally removed constructs are deleted.
+
+    Returns the database IDs of the constructs, and the IDs of the
+    `Identifier`s created for new constructs, each keyed by the
+    construct's current ID.
+
+    :param topic_map: the in-memory topic map
+    :type topic_map: `tmapi.memory.TopicMap`
+    :param topic_map_pk: the database ID of the stored topic map
+    :type topic_map_pk: integer
+    :param states: the stored kind, database ID and state of each
+      construct, keyed by ID
+    :type states: dictionary
+    :rtype: tuple of two dictionaries
+
+    """
+    pks = {}
+    # Pairs of old and current state (the former None for a new
+    # construct), by kind and construct ID.
+    changes = dict([(kind, {}) for kind in MODELS])
+    for id, construct in topic_map._constructs.items():
+        state = _get_state(construct)
+        if id in states:
+            kind, pks[id], old_state = states[id]
+            if state != old_state:
+                changes[kind][id] = (old_state, state)
+        else:
+            changes[construct._kind][id] = (None, state)
+    removed = dict([(kind, {}) for kind in MODELS])
+    for id, (kind, pk, state) in states.items():
+        if id not in topic_map._constructs:
+            removed[kind][pk] = state
+    # Remove identifiers and reifiers that are no longer used, or
+    # have moved to another construct.
+    released_identifiers = []
+    released_subjects = dict([(name, []) for name, model in SUBJECT_MODELS])
+    for kind, model in MODELS.items():
+        released_reifiers = []
+        pairs = [(pks[id], old_state, state) for id, (old_state, state)
+                 in changes[kind].items() if old_state is not None]
+        pairs.extend([(pk, old_state, {}) for pk, old_state
+                      in removed[kind].items()])
+        for pk, old_state, state in pairs:
+            if old_state.get('reifier') is not None and \
+                    old_state['reifier'] != state.get('reifier'):
+                released_reifiers.append(pk)
+            released_identifiers.extend(
+                old_state['item_identifiers'].difference(
+                    state.get('item_identifiers', ())))
+            for name in released_subjects:
+                if name in old_state:
+                    released_subjects[name].extend(
+                        old_state[name].difference(state.get(name, ())))
+        for chunk in _chunk(released_reifiers):
+            model.objects.filter(pk__in=chunk).update(reifier=None)
+    for chunk in _chunk(released_identifiers):
+        ItemIdentifier.objects.filter(containing_topic_map=topic_map_pk,
+                                      address__in=chunk).delete()
+    for name, model in SUBJECT_MODELS:
+        for chunk in _chunk(released_subjects[name]):
+            model.objects.filter(containing_topic_map=topic_map_pk,
+                                 address__in=chunk).delete()
+    # Insert new constructs.
+    new_ids = {}
+    for kind in KINDS:
+        new = [id for id, (old_state, state) in changes[kind].items()
+               if old_state is None]
+        if not new:
+            continue
+        model = MODELS[kind]
+        identifier_ids = create_identifiers(topic_map_pk, len(new))
+        instances = []
+        for id, identifier_id in zip(new, identifier_ids):
+            new_ids[id] = identifier_id
+            fields = _get_field_values(kind, changes[kind][id][1], pks, True)
+            instances.append(model(identifier_id=identifier_id,
+                                   topic_map_id=topic_map_pk, **fields))
+        bulk_insert(model, instances)
+        ids = dict([(identifier_id, id) for id, identifier_id
+                    in new_ids.items()])
+        for chunk in _chunk(identifier_ids):
+            for identifier_id, pk in model.objects.filter(
+                identifier__in=chunk).values_list('identifier', 'id'):
+                pks[ids[identifier_id]] = pk
+    # Update existing constructs, and add the many to many and
+    # identity rows of new and existing constructs.
+    updates = {}
+    join_rows = {}
+    cleared = {}
+    added_identifiers = []
+    added_subjects = dict([(name, []) for name, model in SUBJECT_MODELS])
+    for kind, model in MODELS.items():
+        for id, (old_state, state) in changes[kind].items():
+            pk = pks[id]
+            if old_state is not None:
+                fields = {}
+                for name in SCALAR_FIELDS[kind]:
+                    if state[name] != old_state[name] and \
+                            not (name == 'reifier' and state[name] is None):
+                        fields[name] = state[name]
+                if fields:
+                    fields = _get_field_values(kind, fields, pks, False)
+                    key = (model, tuple(sorted(fields.items())))
+                    updates.setdefault(key, []).append(pk)
+            else:
+                old_state = {}
+            for name in TOPIC_SET_FIELDS:
+                if name not in state or \
+                        state[name] == old_state.get(name, frozenset()):
+                    continue
+                field = model._meta.get_field(name)
+                if old_state:
+                    cleared.setdefault(field, []).append(pk)
+                join_rows.setdefault(field, []).extend(
+                    [(pk, pks[topic_id]) for topic_id in state[name]])
+            field = model._meta.get_field('item_identifiers')
+            for address in state['item_identifiers'].difference(
+                old_state.get('item_identifiers', ())):
+                added_identifiers.append((field, pk, address))
+            for name in added_subjects:
+                if name in state:
+                    added_subjects[name].extend(
+                        [(pk, address) for address in state[name].difference(
+                                old_state.get(name, ()))])
+    for (model, fields), update_pks in updates.items():
+        for chunk in _chunk(update_pks):
+            model.objects.filter(pk__in=chunk).update(**dict(fields))
+    for field, clear_pks in cleared.items():
+        for chunk in _chunk(clear_pks):
+            field.rel.through.objects.filter(
+                **{'%s__in' % field.m2m_field_name(): chunk}).delete()
+    for field, rows in join_rows.items():
+        insert_join_rows(field, rows, False)
+    _add_item_identifiers(topic_map_pk, added_identifiers)
+    for name, model in SUBJECT_MODELS:
+        bulk_insert(model, [
+                model(topic_id=pk, address=address,
+                      containing_topic_map_id=topic_map_pk)
+                for pk, address in added_subjects[name]])
+    # Delete removed constructs, children first.
+    for kind in reversed(KINDS):
+        for chunk in _chunk(removed[kind].keys()):
+            MODELS[kind].objects.filter(pk__in=chunk).delete()
+    return pks, new_ids
@@ -0,0 +1,141 @@
+# Copyright 2011 Jamie Norrish (jamie@artefact.org.nz)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from django.utils.encoding import smart_unicode
+
+from tmapi.constants import XSD_ANY_URI, XSD_FLOAT, XSD_INT, XSD_LONG, \
+    XSD_STRING
+from tmapi.exceptions import ModelConstraintException
+from tmapi.models.locator import Locator
+
+from collection_utils import index_add, index_remove
+from reifiable import Reifiable
+from scoped import Scoped
+
+
+class DatatypeAware (Reifiable, Scoped):
+
+    """Common base interface for `Occurrence`s and `Variant`s."""
+
+    __slots__ = ()
+
+    def get_datatype (self):
+        """Returns the `Locator` identifying the datatype of the value.
+
+        :rtype: `Locator`
+
+        """
+        return Locator(self._datatype)
+
+    def get_value (self):
+        """Returns the lexical representation of the value."""
+        datatype = self._datatype
+        value = self._value
+        if datatype == XSD_FLOAT:
+            value = float(value)
+        elif datatype == XSD_INT:
+            value = int(value)
+        elif datatype == XSD_LONG:
+            value = long(value)
+        return value
+
+    def locator_value (self):
+        """Returns the `Locator` representation of the value.
+
+        :rtype: `Locator`
+
+        """
+        if self._datatype == XSD_ANY_URI:
+            if isinstance(self._value, Locator):
+                return self._value
+            return Locator(self._value)
+        raise TypeError('Value is not a Locator')
+
+    def set_value (self, value, datatype=None):
+        """Sets the value.
+
+        If `datatype` is None, the datatype will be implicitly set to
+        match the type of `value`.
+
+        :param value: the value
+        :param datatype: optional datatype of `value`
+        :type datatype: `Locator`
+
+        """
+        if value is None:
+            raise ModelConstraintException(self, 'The value may not be None')
+        if datatype is None:
+            if isinstance(value, str) or isinstance(value, unicode):
+                datatype = XSD_STRING
+            elif isinstance(value, Locator):
+                datatype = XSD_ANY_URI
+                value = value.to_external_form()
+            elif isinstance(value, float):
+                datatype = XSD_FLOAT
+            elif isinstance(value, int):
+                datatype = XSD_INT
+            elif isinstance(value, long):
+                datatype = XSD_LONG
+        else:
+            datatype = datatype.to_external_form()
+        index = self._topic_map._literal_index[self._kind]
+        index_remove(index, self._get_literal_key(), self)
+        self._value = value
+        self._datatype = datatype
+        index_add(index, self._get_literal_key(), self)
+
+    def _get_literal_key (self):
+        """Returns the key of this construct in the literal index of
+        its topic map.
+
+        :rtype: tuple
+
+        """
+        return (literal_key(self._value), self._datatype)
+
+
+def get_datatype (value):
+    """Returns the external form of the datatype implied by `value`.
+
+    :param value: the value of an occurrence
+    :type value: string, `Locator`, or number
+    :rtype: string
+
+    """
+    if isinstance(value, Locator):
+        datatype = XSD_ANY_URI
+    elif isinstance(value, float):
+        datatype = XSD_FLOAT
+    elif isinstance(value, int):
+        datatype = XSD_INT
+    elif isinstance(value, long):
+        datatype = XSD_LONG
+    else:
+        datatype = XSD_STRING
+    return datatype
+
+def literal_key (value):
+    """Returns the form of `value` under which it is indexed.
+
+    This is the form in which the database backend stores the value,
+    so that lookups match those made against the database.
+
+    :param value: a name, occurrence or variant value
+    :type value: string, `Locator`, or number
+    :rtype: unicode
+
+    """
+    if isinstance(value, Locator):
+        value = value.get_reference()
+    return smart_unicode(value)
@@ -0,0 +1,150 @@
+# Copyright 2011 Jamie Norrish (jamie@artefact.org.nz)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module containing utility functions for merging in-memory topics.
+
+These are the in-memory counterparts of the functions in
+`tmapi.models.signature` and `tmapi.models.merge_utils`. Since each
+in-memory construct is a single object, topics are represented in
+signatures by themselves rather than by their identifiers.
+
+"""
+
+from collection_utils import append_value, remove_value
+
+
+def generate_association_signature (association):
+    """Generates the signature for an association.
+
+    :param association: the association to generate the signature for
+    :type association: `Association`
+    :rtype: tuple
+
+    """
+    return (association._type, frozenset(association._scope),
+            frozenset([generate_role_signature(role) for role
+                       in association._roles]))
+
+def generate_name_signature (name):
+    """Generates the signature for the specified name.
+
+    The parent and the variants are not taken into account.
+
+    :param name: the name to generate the signature for
+    :type name: `Name`
+    :rtype: tuple
+
+    """
+    return (name._type, frozenset(name._scope), name._get_literal_key())
+
+def generate_occurrence_signature (occurrence):
+    """Generates the signature for an occurrence.
+
+    :param occurrence: the occurrence to generate the signature for
+    :type occurrence: `Occurrence`
+    :rtype: tuple
+
+    """
+    return (occurrence._type, frozenset(occurrence._scope),
+            occurrence._get_literal_key())
+
+def generate_role_signature (role):
+    """Generates the signature for a role.
+
+    :param role: the role to generate the signature for
+    :type role: `Role`
+    :rtype: tuple
+
+    """
+    return (role._type, role._player)
+
+def generate_variant_signature (variant):
+    """Generates the signature for the specified `variant`.
+
+    :param variant: the variant to generate the signature for
+    :type variant: `Variant`
+    :rtype: tuple
+
+    """
+    return (frozenset(variant.get_scope()), variant._get_literal_key())
+
+def handle_existing_construct (source, target):
+    """Moves the item identifiers and reifier from `source` to
+    `target`.
+
+    If `source` and `target` are both reified, the reifiers are
+    merged.
+
+    :param source: the source Topic Maps construct
+    :type source: `Construct`
+    :param target: the target Topic Maps construct
+    :type target: `Construct`
+
+    """
+    index = source._topic_map._iid_index
+    for item_identifier in source._item_identifiers:
+        index[item_identifier.to_external_form()] = target
+        append_value(target, '_item_identifiers', item_identifier)
+    source._item_identifiers = ()
+    source_reifier = source._reifier
+    if source_reifier is None:
+        return
+    target_reifier = target._reifier
+    source.set_reifier(None)
+    if target_reifier is not None:
+        target_reifier.merge_in(source_reifier)
+    else:
+        target.set_reifier(source_reifier)
+
+def move_role_characteristics (source, target):
+    """Moves role item identifiers and reifiers from the roles of
+    `source` to the equivalent roles of `target`, and removes the
+    roles of `source`.
+
+    :param source: the association to remove the characteristics from
+    :type source: `Association`
+    :param target: the association that takes the role characteristics
+    :type target: `Association`
+
+    """
+    signatures = {}
+    for role in target._roles:
+        signatures[generate_role_signature(role)] = role
+    for role in list(source._roles):
+        existing = signatures.get(generate_role_signature(role))
+        if existing is not None:
+            handle_existing_construct(role, existing)
+        role.remove()
+
+def move_variants (source, target):
+    """Moves the variants from `source` to `target`.
+
+    :param source: the name to take the variants from
+    :type source: `Name`
+    :param target: the name to add the variants to
+    :type target: `Name`
+
+    """
+    signatures = {}
+    for variant in target._variants:
+        signatures[generate_variant_signature(variant)] = variant
+    for variant in list(source._variants):
+        existing = signatures.get(generate_variant_signature(variant))
+        if existing is not None:
+            handle_existing_construct(variant, existing)
+            variant.remove()
+        else:
+            remove_value(source, '_variants', variant)
+            variant._name = target
+            append_value(target, '_variants', variant)
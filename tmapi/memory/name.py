@@ -0,0 +1,132 @@
+# Copyright 2011 Jamie Norrish (jamie@artefact.org.nz)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from tmapi.constants import XSD_ANY_URI, XSD_STRING
+from tmapi.exceptions import ModelConstraintException
+from tmapi.models.locator import Locator
+
+from collection_utils import append_value, index_add, index_remove, \
+    remove_value
+from datatype_aware import literal_key
+from reifiable import Reifiable
+from result_list import ResultList
+from scoped import Scoped, prepare_scope
+from typed import Typed
+from variant import Variant
+
+
+class Name (Reifiable, Scoped, Typed):
+
+    """Represents a topic name item."""
+
+    __slots__ = ('_id', '_topic_map', '_item_identifiers', '_reifier',
+                 '_scope', '_type', '_value', '_topic', '_variants')
+    _kind = 'name'
+
+    def __init__ (self, topic, value, name_type, scope):
+        self._topic_map = topic._topic_map
+        self._item_identifiers = ()
+        self._reifier = None
+        self._scope = scope or ()
+        self._type = name_type
+        self._value = value
+        self._topic = topic
+        self._variants = ()
+        self._topic_map._register(self)
+        append_value(topic, '_names', self)
+
+    def create_variant (self, value, scope, datatype=None):
+        """Creates a `Variant` of this topic name with the specified
+        string `value` and `scope`.
+
+        If `datatype` is None, the newly created `Variant` will have
+        the datatype xsd:string.
+
+        The newly created `Variant` will contain all themes from the
+        parent name and the themes specified in `scope`.
+
+        :param value: the string value or locator which represents an IRI
+        :type value: string or `Locator`
+        :param scope: list of themes
+        :type scope: list of `Topic`s
+        :rtype: `Variant`
+
+        """
+        if value is None:
+            raise ModelConstraintException(self, 'The value may not be None')
+        if not scope:
+            raise ModelConstraintException(self, 'The scope may not be None')
+        scope = prepare_scope(self, self._topic_map, scope)
+        if scope == list(self._scope):
+            raise ModelConstraintException(
+                self, 'The variant would be in the same scope as the parent')
+        if datatype is None:
+            if isinstance(value, Locator):
+                datatype = XSD_ANY_URI
+            else:
+                datatype = XSD_STRING
+        else:
+            datatype = datatype.to_external_form()
+        if isinstance(value, Locator):
+            value = value.to_external_form()
+        return Variant(self, value, datatype, scope)
+
+    def get_parent (self, proxy=None):
+        """Returns the `Topic` to which this name belongs.
+
+        :param proxy: ignored; accepted for compatibility with the
+          database backend
+        :rtype: `Topic`
+
+        """
+        return self._topic
+
+    def get_value (self):
+        """Returns the value of this name."""
+        return self._value
+
+    def get_variants (self):
+        """Returns the variants defined for this name.
+
+        :rtype: `ResultList` of `Variant`s
+
+        """
+        return ResultList(self._variants)
+
+    def remove (self):
+        for variant in list(self._variants):
+            variant.remove()
+        remove_value(self._topic, '_names', self)
+        super(Name, self).remove()
+
+    def set_value (self, value):
+        """Sets the value of this name. The previous value is overridden."""
+        if value is None:
+            raise ModelConstraintException(self, 'The value may not be None')
+        index = self._topic_map._literal_index[self._kind]
+        index_remove(index, self._get_literal_key(), self)
+        self._value = value
+        index_add(index, self._get_literal_key(), self)
+
+    def _get_literal_key (self):
+        """Returns the key of this name in the literal index of its
+        topic map.
+
+        :rtype: unicode
+
+        """
+        return literal_key(self._value)
+
+    def __unicode__ (self):
+        return self._value
@@ -0,0 +1,52 @@
+# Copyright 2011 Jamie Norrish (jamie@artefact.org.nz)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from collection_utils import append_value, remove_value
+from datatype_aware import DatatypeAware
+from typed import Typed
+
+
+class Occurrence (DatatypeAware, Typed):
+
+    """Represents an occurrence item."""
+
+    __slots__ = ('_id', '_topic_map', '_item_identifiers', '_reifier',
+                 '_scope', '_type', '_value', '_datatype', '_topic')
+    _kind = 'occurrence'
+
+    def __init__ (self, topic, occurrence_type, value, datatype, scope):
+        self._topic_map = topic._topic_map
+        self._item_identifiers = ()
+        self._reifier = None
+        self._scope = scope or ()
+        self._type = occurrence_type
+        self._value = value
+        self._datatype = datatype
+        self._topic = topic
+        self._topic_map._register(self)
+        append_value(topic, '_occurrences', self)
+
+    def get_parent (self, proxy=None):
+        """Returns the `Topic` to which this occurrence belongs.
+
+        :param proxy: ignored; accepted for compatibility with the
+          database backend
+        :rtype: `Topic`
+
+        """
+        return self._topic
+
+    def remove (self):
+        remove_value(self._topic, '_occurrences', self)
+        super(Occurrence, self).remove()
@@ -0,0 +1,32 @@
+# Copyright 2011 Jamie Norrish (jamie@artefact.org.nz)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module defining the list type returned by the in-memory backend."""
+
+
+class ResultList (list):
+
+    """List of the constructs (or locators) returned by a method of
+    the in-memory backend.
+
+    Callers of the TMAPI methods commonly use the `count()` method of
+    the QuerySets returned by the database backend; it is supported
+    here so that such code works with either backend.
+
+    """
+
+    def count (self, *args):
+        if args:
+            return super(ResultList, self).count(*args)
+        return len(self)
@@ -0,0 +1,82 @@
+# Copyright 2011 Jamie Norrish (jamie@artefact.org.nz)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from tmapi.exceptions import ModelConstraintException
+
+from collection_utils import append_value, remove_value
+from reifiable import Reifiable
+from typed import Typed
+
+
+class Role (Reifiable, Typed):
+
+    """Represents an association role item."""
+
+    __slots__ = ('_id', '_topic_map', '_item_identifiers', '_reifier',
+                 '_type', '_association', '_player')
+    _kind = 'role'
+
+    def __init__ (self, association, role_type, player):
+        self._topic_map = association._topic_map
+        self._item_identifiers = ()
+        self._reifier = None
+        self._type = role_type
+        self._association = association
+        self._player = player
+        self._topic_map._register(self)
+        append_value(association, '_roles', self)
+        append_value(player, '_roles_played', self)
+
+    def get_parent (self, proxy=None):
+        """Returns the `Association` to which this role belongs.
+
+        :param proxy: ignored; accepted for compatibility with the
+          database backend
+        :rtype: `Association`
+
+        """
+        return self._association
+
+    def get_player (self, proxy=None):
+        """Returns the topic playing this role.
+
+        :param proxy: ignored; accepted for compatibility with the
+          database backend
+        :rtype: `Topic`
+
+        """
+        return self._player
+
+    def remove (self):
+        remove_value(self._association, '_roles', self)
+        remove_value(self._player, '_roles_played', self)
+        super(Role, self).remove()
+
+    def set_player (self, player):
+        """Sets the role player.
+
+        Any previous role player will be overridden by `player`.
+
+        :param player: the `Topic` which should play this role
+        :type player: `Topic`
+
+        """
+        if player is None:
+            raise ModelConstraintException(self, 'The player may not be None')
+        if self._topic_map is not player._topic_map:
+            raise ModelConstraintException(
+                self, 'The player is not from the same topic map')
+        remove_value(self._player, '_roles_played', self)
+        self._player = player
+        append_value(player, '_roles_played', self)
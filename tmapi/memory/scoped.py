@@ -0,0 +1,98 @@
+# Copyright 2011 Jamie Norrish (jamie@artefact.org.nz)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from tmapi.exceptions import ModelConstraintException
+
+from collection_utils import append_value, index_add, index_remove, \
+    remove_value
+from construct import Construct
+from result_list import ResultList
+
+
+class Scoped (Construct):
+
+    """Indicates that a statement (Topic Maps construct) has a
+    scope. `Association`s, `Occurrence`s, `Name`s, and `Variant`s are
+    scoped."""
+
+    __slots__ = ()
+
+    def add_theme (self, theme):
+        """Adds a topic to the scope.
+
+        :param theme: the topic which should be added to the scope
+        :type theme: `Topic`
+
+        """
+        if theme is None:
+            raise ModelConstraintException(self, 'The theme may not be None')
+        if self._topic_map is not theme._topic_map:
+            raise ModelConstraintException(
+                self, 'The theme is not from the same topic map')
+        if theme not in self._scope:
+            append_value(self, '_scope', theme)
+            index_add(self._topic_map._theme_index[self._kind], theme, self)
+
+    def get_scope (self):
+        """Returns the topics which define the scope. An empty set
+        represents the unconstrained scope.
+
+        :rtype: `ResultList` of `Topic`s
+
+        """
+        return ResultList(self._scope)
+
+    def remove_theme (self, theme):
+        """Removes a topic from the scope.
+
+        :param theme: the topic which should be removed from the scope
+        :type theme: `Topic`
+
+        """
+        if theme in self._scope:
+            remove_value(self, '_scope', theme)
+            index_remove(self._topic_map._theme_index[self._kind], theme,
+                         self)
+
+
+def prepare_scope (reporter, topic_map, scope):
+    """Returns `scope` as a list of themes, having checked that each
+    theme is a topic in `topic_map`.
+
+    :param reporter: the construct reporting any constraint violation
+    :type reporter: `Construct`
+    :param topic_map: the topic map
+    :type topic_map: `TopicMap`
+    :param scope: the themes
+    :type scope: `Topic`, list of `Topic`s, or None
+    :rtype: list of `Topic`s
+    :raises `ModelConstraintException`: if a theme is None or is not
+      from the topic map
+
+    """
+    if scope is None:
+        return []
+    if type(scope) not in (type([]), type(())):
+        scope = [scope]
+    themes = []
+    for theme in scope:
+        if theme is None:
+            raise ModelConstraintException(
+                reporter, 'The theme may not be None')
+        if theme._topic_map is not topic_map:
+            raise ModelConstraintException(
+                reporter, 'The theme is not from the same topic map')
+        if theme not in themes:
+            themes.append(theme)
+    return themes
@@ -0,0 +1,229 @@
+# Copyright 2011 Jamie Norrish (jamie@artefact.org.nz)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from tmapi.exceptions import IllegalArgumentException
+from tmapi.indices.index import Index
+
+from result_list import ResultList
+from topic import Topic
+
+
+class ScopedIndex (Index):
+
+    """In-memory implementation of `tmapi.indices.ScopedIndex`."""
+
+    def get_associations (self, themes=None, match_all=False):
+        """Returns the `Association`s in the topic map whose scope
+        property contains at least one of the specified `themes`.
+
+        If `themes` is None, all `Association`s in the unconstrained
+        scope are returned.
+
+        If `match_all` is True, the scope property of an association
+        must match all `themes`.
+
+        The return value may be empty but must never be None.
+
+        :param themes: scope of the `Association`s to be returned
+        :type themes: `Topic` or list of `Topic`s
+        :param match_all: whether an `Association`'s scope property
+          must match all `themes`
+        :type match_all: boolean
+        :rtype: `ResultList` of `Association`s
+
+        """
+        return self._get_constructs('association', themes, match_all)
+
+    def get_association_themes (self):
+        """Returns the topics in the topic map used in the scope
+        property of `Association`s.
+
+        The return value may be empty but must never be None.
+
+        :rtype: `ResultList` of `Topic`s
+
+        """
+        return ResultList(self.topic_map._theme_index['association'])
+
+    def get_names (self, themes=None, match_all=False):
+        """Returns the `Name`s in the topic map whose scope
+        property contains at least one of the specified `themes`.
+
+        If `themes` is None, all `Name`s in the unconstrained
+        scope are returned.
+
+        If `match_all` is True, the scope property of a name
+        must match all `themes`.
+
+        The return value may be empty but must never be None.
+
+        :param themes: scope of the `Name`s to be returned
+        :type themes: `Topic` or list of `Topic`s
+        :param match_all: whether a `Name`'s scope property must match
+          all `themes`
+        :type match_all: boolean
+        :rtype: `ResultList` of `Name`s
+
+        """
+        return self._get_constructs('name', themes, match_all)
+
+    def get_name_themes (self):
+        """Returns the topics in the topic map used in the scope
+        property of `Name`s.
+
+        The return value may be empty but must never be None.
+
+        :rtype: `ResultList` of `Topic`s
+
+        """
+        return ResultList(self.topic_map._theme_index['name'])
+
+    def get_occurrences (self, themes=None, match_all=False):
+        """Returns the `Occurrence`s in the topic map whose scope
+        property contains at least one of the specified `themes`.
+
+        If `themes` is None, all `Occurrence`s in the unconstrained
+        scope are returned.
+
+        If `match_all` is True, the scope property of an occurrence
+        must match all `themes`.
+
+        The return value may be empty but must never be None.
+
+        :param themes: scope of the `Occurrence`s to be returned
+        :type themes: `Topic` or list of `Topic`s
+        :param match_all: whether a `Occurrence`'s scope property must
+          match all `themes`
+        :type match_all: boolean
+        :rtype: `ResultList` of `Occurrence`s
+
+        """
+        return self._get_constructs('occurrence', themes, match_all)
+
+    def get_occurrence_themes (self):
+        """Returns the topics in the topic map used in the scope
+        property of `Occurrence`s.
+
+        The return value may be empty but must never be None.
+
+        :rtype: `ResultList` of `Topic`s
+
+        """
+        return ResultList(self.topic_map._theme_index['occurrence'])
+
+    def get_variants (self, themes, match_all=False):
+        """Returns the `Variant`s in the topic map whose scope
+        property contains the specified `theme`, or one of the
+        specified `themes` (if `match_all` is False), or all of the
+        specified `themes` (if `match_all` is True).
+
+        The scope of a variant includes the scope of its name.
+
+        The return value may be empty but must never be None.
+
+        :param themes: scope of the `Variant`s to be returned
+        :type themes: `Topic` or list of `Topic`s
+        :param match_all: whether a `Variant`'s scope property must
+          match all `themes`
+        :type match_all: boolean
+        :rtype: `ResultList` of `Variant`s
+
+        """
+        if themes is None:
+            raise IllegalArgumentException('themes must not be None')
+        if isinstance(themes, Topic):
+            themes = [themes]
+        variant_index = self.topic_map._theme_index['variant']
+        name_index = self.topic_map._theme_index['name']
+        variants = None
+        for theme in themes:
+            matches = set(variant_index.get(theme, ()))
+            for name in name_index.get(theme, ()):
+                matches.update(name._variants)
+            if variants is None:
+                variants = matches
+            elif match_all:
+                variants.intersection_update(matches)
+            else:
+                variants.update(matches)
+        if variants is None:
+            if match_all:
+                variants = self.topic_map._members['variant']
+            else:
+                variants = ()
+        return ResultList(variants)
+
+    def get_variant_themes (self):
+        """Returns the topics in the topic map used in the scope
+        property of `Variant`s, including those inherited from their
+        names.
+
+        The return value may be empty but must never be None.
+
+        :rtype: `ResultList` of `Topic`s
+
+        """
+        themes = set(self.topic_map._theme_index['variant'])
+        for theme, names in self.topic_map._theme_index['name'].items():
+            for name in names:
+                if name._variants:
+                    themes.add(theme)
+                    break
+        return ResultList(themes)
+
+    def _get_constructs (self, kind, themes, match_all):
+        """Returns those constructs of `kind` whose scope property
+        contains at least one of the specified `themes`.
+
+        If `themes` is None, all constructs of `kind` in the
+        unconstrained scope are returned.
+
+        If `match_all` is True, the scope property of a construct
+        must match all `themes`.
+
+        :param kind: the kind of construct
+        :type kind: string
+        :param themes: scope of the constructs to be returned
+        :type themes: `Topic` or list of `Topic`s
+        :param match_all: whether a construct's scope property must
+          match all `themes`
+        :type match_all: boolean
+        :rtype: `ResultList` of `Construct`s
+
+        """
+        members = self.topic_map._members[kind]
+        if themes is None:
+            if match_all:
+                raise IllegalArgumentException(
+                    'match_all must not be specified if themes is None')
+            return ResultList([construct for construct in members
+                               if not construct._scope])
+        if isinstance(themes, Topic):
+            themes = [themes]
+        index = self.topic_map._theme_index[kind]
+        constructs = None
+        for theme in themes:
+            matches = index.get(theme, ())
+            if constructs is None:
+                constructs = set(matches)
+            elif match_all:
+                constructs.intersection_update(matches)
+            else:
+                constructs.update(matches)
+        if constructs is None:
+            if match_all:
+                constructs = members
+            else:
+                constructs = ()
+        return ResultList(constructs)
@@ -0,0 +1,579 @@
+# Copyright 2011 Jamie Norrish (jamie@artefact.org.nz)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from tmapi.constants import AUTOMERGE_FEATURE_STRING, DEFAULT_NAME_TYPE
+from tmapi.exceptions import IdentityConstraintException, \
+    ModelConstraintException, TopicInUseException
+from tmapi.models.locator import Locator
+
+from collection_utils import append_value, index_add, index_remove, \
+    remove_value
+from construct import Construct
+from datatype_aware import get_datatype
+from merge_utils import generate_association_signature, \
+    generate_name_signature, generate_occurrence_signature, \
+    handle_existing_construct, move_role_characteristics, move_variants
+from name import Name
+from occurrence import Occurrence
+from result_list import ResultList
+from scoped import prepare_scope
+
+
+class Topic (Construct):
+
+    """Represents a topic item."""
+
+    __slots__ = ('_id', '_topic_map', '_item_identifiers',
+                 '_subject_identifiers', '_subject_locators', '_types',
+                 '_names', '_occurrences', '_roles_played', '_reified')
+    _kind = 'topic'
+
+    def __init__ (self, topic_map):
+        self._topic_map = topic_map
+        self._item_identifiers = ()
+        self._subject_identifiers = ()
+        self._subject_locators = ()
+        self._types = ()
+        self._names = ()
+        self._occurrences = ()
+        self._roles_played = ()
+        self._reified = None
+        topic_map._register(self)
+
+    def add_item_identifier (self, item_identifier):
+        """Adds an item identifier to this topic.
+
+        If adding the specified item identifier would make this topic
+        represent the same subject as another topic and the feature
+        "automerge" (http://tmapi.org/features/automerge/) is
+        disabled, an `IdentityConstraintException` is thrown.
+
+        :param item_identifier: the item identifier to be added
+        :type item_identifier: `Locator`
+
+        """
+        if item_identifier is None:
+            raise ModelConstraintException(
+                self, 'The item identifier may not be None')
+        address = item_identifier.to_external_form()
+        topic_map = self._topic_map
+        construct = topic_map._iid_index.get(address)
+        if construct is self:
+            return
+        if construct is not None:
+            if not isinstance(construct, Topic):
+                raise IdentityConstraintException(
+                    self, construct, item_identifier, 'This item identifier is already associated with another non-Topic construct')
+            self._merge_identical(construct, item_identifier, 'Another topic has the same item identifier and automerge is disabled')
+            return
+        topic = topic_map._sid_index.get(address)
+        if topic is not None and topic is not self:
+            self._merge_identical(topic, item_identifier, 'Another topic has the same subject identifier and automerge is disabled')
+        if address not in topic_map._iid_index:
+            self._add_item_identifier(item_identifier)
+
+    def add_subject_identifier (self, subject_identifier):
+        """Adds a subject identifier to this topic.
+
+        If adding the specified subject identifier would make this
+        topic represent the same subject as another topic and the
+        feature "automerge" (http://tmapi.org/features/automerge/) is
+        disabled, an `IdentityConstraintException` is thrown.
+
+        :param subject_identifier: the subject identifier to be added
+        :type subject_identifier: `Locator`
+
+        """
+        if subject_identifier is None:
+            raise ModelConstraintException(
+                self, 'The subject identifier may not be None')
+        address = subject_identifier.to_external_form()
+        topic_map = self._topic_map
+        topic = topic_map._sid_index.get(address)
+        if topic is self:
+            return
+        if topic is None:
+            topic = topic_map._iid_index.get(address)
+            if not isinstance(topic, Topic):
+                topic = None
+        if topic is not None and topic is not self:
+            self._merge_identical(topic, subject_identifier, 'Another topic has the same subject/item identifier and automerge is disabled')
+        if address not in topic_map._sid_index:
+            self._add_subject_identifier(subject_identifier)
+
+    def _add_subject_identifier (self, subject_identifier):
+        """Adds a subject identifier to this topic, without any
+        checking.
+
+        :param subject_identifier: the subject identifier to be added
+        :type subject_identifier: `Locator`
+
+        """
+        topic_map = self._topic_map
+        subject_identifier = topic_map._system._intern(subject_identifier)
+        topic_map._sid_index[subject_identifier.to_external_form()] = self
+        append_value(self, '_subject_identifiers', subject_identifier)
+
+    def add_subject_locator (self, subject_locator):
+        """Adds a subject locator to this topic.
+
+        If adding the specified subject locator would make this topic
+        represent the same subject as another topic and the feature
+        'automerge' (http://tmapi.org/features/automerge/) is
+        disabled, an `IdentityConstraintException` is thrown.
+
+        :param subject_locator: the subject locator to be added
+        :type subject_locator: `Locator`
+
+        """
+        if subject_locator is None:
+            raise ModelConstraintException(
+                self, 'The subject locator may not be None')
+        address = subject_locator.to_external_form()
+        topic = self._topic_map._slo_index.get(address)
+        if topic is self:
+            return
+        if topic is not None:
+            self._merge_identical(topic, subject_locator, 'Another topic has the same subject locator and automerge is disabled')
+        else:
+            self._add_subject_locator(subject_locator)
+
+    def _add_subject_locator (self, subject_locator):
+        """Adds a subject locator to this topic, without any checking.
+
+        :param subject_locator: the subject locator to be added
+        :type subject_locator: `Locator`
+
+        """
+        topic_map = self._topic_map
+        subject_locator = topic_map._system._intern(subject_locator)
+        topic_map._slo_index[subject_locator.to_external_form()] = self
+        append_value(self, '_subject_locators', subject_locator)
+
+    def add_type (self, type):
+        """Adds a type to this topic.
+
+        :param type: the type of which this topic should become an instance
+        :type type: `Topic`
+
+        """
+        if type is None:
+            raise ModelConstraintException(self, 'The type may not be None')
+        if self._topic_map is not type._topic_map:
+            raise ModelConstraintException(
+                self, 'The type is not from the same topic map')
+        if type not in self._types:
+            append_value(self, '_types', type)
+            index_add(self._topic_map._type_index[self._kind], type, self)
+
+    def create_name (self, value, name_type=None, scope=None, proxy=None):
+        """Creates a `Name` for this topic with the specified `value`,
+        `type` and `scope`.
+
+        If `name_type` is None, the created `Name` will have the default
+        name type (a `Topic` with the subject identifier
+        http://psi.topicmaps.org/iso13250/model/topic-name).
+
+        If `scope` is None or an empty list, the name will be in the
+        unconstrained scope.
+
+        :param value: the string value of the name
+        :type value: string
+        :param name_type: the name type
+        :type name_type: `Topic`
+        :param scope: a list of themes
+        :type scope: `Topic` or list of `Topic`s
+        :param proxy: ignored; accepted for compatibility with the
+          database backend
+        :rtype: `Name`
+
+        """
+        return self.create_names([(value, name_type, scope)])[0]
+
+    def create_names (self, names, proxy=None):
+        """Creates a `Name` for this topic for each of the specified
+        (`value`, `name_type`, `scope`) tuples.
+
+        Each name is created as by `create_name()`, but all of the
+        arguments are validated before any name is created.
+
+        :param names: the value, type (or None) and scope (or None) of
+          each name to be created
+        :type names: list of tuples
+        :param proxy: ignored; accepted for compatibility with the
+          database backend
+        :rtype: list of `Name`s
+
+        """
+        specs = []
+        for value, name_type, scope in names:
+            if value is None:
+                raise ModelConstraintException(
+                    self, 'The value may not be None')
+            if name_type is not None and \
+                    self._topic_map is not name_type._topic_map:
+                raise ModelConstraintException(
+                    self, 'The type is not from the same topic map')
+            scope = prepare_scope(self, self._topic_map, scope)
+            specs.append((value, name_type, scope))
+        created = []
+        default_name_type = None
+        for value, name_type, scope in specs:
+            if name_type is None:
+                if default_name_type is None:
+                    default_name_type = self._get_default_name_type()
+                name_type = default_name_type
+            created.append(Name(self, value, name_type, scope))
+        return created
+
+    def create_occurrence (self, type, value, scope=None, datatype=None,
+                           proxy=None):
+        """Creates an `Occurrence` for this topic with the specified
+        `type`, `value`, and `scope`.
+
+        If `datatype` is not None, the newly created `Occurrence` will
+        have the datatype specified by `datatype`.
+
+        :param type: the occurrence type
+        :type type: `Topic`
+        :param value: the value of the occurrence
+        :type value: String or `Locator`
+        :param scope: optional list of themes
+        :type scope: list of `Topic`s
+        :param datatype: optional locator indicating the datatype of `value`
+        :type datatype: `Locator`
+        :param proxy: ignored; accepted for compatibility with the
+          database backend
+        :rtype: `Occurrence`
+
+        """
+        if type is None:
+            raise ModelConstraintException(self, 'The type may not be None')
+        if value is None:
+            raise ModelConstraintException(self, 'The value may not be None')
+        if datatype is None:
+            datatype = get_datatype(value)
+        else:
+            datatype = datatype.to_external_form()
+        if self._topic_map is not type._topic_map:
+            raise ModelConstraintException(
+                self, 'The type is not from the same topic map')
+        scope = prepare_scope(self, self._topic_map, scope)
+        return Occurrence(self, type, value, datatype, scope)
+
+    def get_names (self, name_type=None):
+        """Returns the names of this topic.
+
+        If `name_type` is not None, only names of the specified
+        type are returned.
+
+        :param name_type: the type of the `Name`s to be returned
+        :type name_type: `Topic`
+        :rtype: `ResultList` of `Name`s
+
+        """
+        if name_type is None:
+            return ResultList(self._names)
+        return ResultList([name for name in self._names
+                           if name._type is name_type])
+
+    def get_occurrences (self, occurrence_type=None, proxy=None):
+        """Returns the `Occurrence`s of this topic.
+
+        If `occurrence_type` is not None, returns the `Occurrence`s of
+        this topic where the occurrence type is `occurrence_type`.
+
+        :param occurrence_type: the type of the `Occurrence`s to be returned
+        :type occurrence_type: `Topic`
+        :param proxy: ignored; accepted for compatibility with the
+          database backend
+        :rtype: `ResultList` of `Occurrence`s
+
+        """
+        if occurrence_type is None:
+            return ResultList(self._occurrences)
+        return ResultList([occurrence for occurrence in self._occurrences
+                           if occurrence._type is occurrence_type])
+
+    def get_parent (self):
+        """Returns the `TopicMap` to which this topic belongs.
+
+        :rtype: `TopicMap`
+
+        """
+        return self._topic_map
+
+    def get_reified (self):
+        """Returns the `Construct` which is reified by this topic.
+
+        :rtype: `Construct` or None
+
+        """
+        return self._reified
+
+    def get_roles_played (self, role_type=None, association_type=None):
+        """Returns the roles played by this topic.
+
+        If `role_type` is not None, returns the roles played by this
+        topic where the role type is `role_type`.
+
+        If `role_type` and `association_type` are not None, returns
+        the roles played by this topic where the role type is
+        `role_type` and the association type is `association_type`.
+
+        :param role_type: the type of the `Role`s to be returned
+        :type role_type: `Topic` or None
+        :param association_type: the type of the `Association` of
+          which the returned roles must be part
+        :type association_type: `Topic` or None
+        :rtype: `ResultList` of `Role`s
+
+        """
+        if role_type is not None:
+            roles = [role for role in self._roles_played
+                     if role._type is role_type]
+            if association_type is not None:
+                roles = [role for role in roles
+                         if role._association._type is association_type]
+        elif association_type is not None:
+            raise Exception('This is a broken call to get_roles_played, specifying an assocation type but not a role type')
+        else:
+            roles = self._roles_played
+        return ResultList(roles)
+
+    def get_subject_identifiers (self):
+        """Returns the subject identifiers assigned to this topic.
+
+        :rtype: `ResultList` of `Locator`s
+
+        """
+        return ResultList(self._subject_identifiers)
+
+    def get_subject_locators (self):
+        """Returns the subject locators assigned to this topic.
+
+        :rtype: `ResultList` of `Locator`s
+
+        """
+        return ResultList(self._subject_locators)
+
+    def get_types (self):
+        """Returns the types of which this topic is an instance.
+
+        :rtype: `ResultList` of `Topic`s
+
+        """
+        return ResultList(self._types)
+
+    def merge_in (self, other):
+        """Merges another topic into this topic.
+
+        Merging a topic into this topic causes this topic to gain all
+        of the characteristics of the other topic and to replace the
+        other topic wherever it is used as type, theme, or
+        reifier. After this method completes, `other` will have been
+        removed from the `TopicMap`.
+
+        If `self` equals `other` no changes are made to the topic.
+
+        NOTE: The other topic must belong to the same `TopicMap`
+        instance as this topic.
+
+        :param other: the topic to be merged into this topic
+        :type other: `Topic`
+
+        """
+        if other is None:
+            raise ModelConstraintException(
+                self, 'The topic to merge in may not be None')
+        if other is self:
+            return
+        topic_map = self._topic_map
+        if topic_map is not other._topic_map:
+            raise ModelConstraintException(
+                self, 'The topic to merge in is not from the same topic map')
+        other_reified = other._reified
+        if self._reified is not None and other_reified is not None:
+            raise ModelConstraintException(
+                self, 'Both topics are being used as reifiers')
+        if other_reified is not None:
+            other_reified.set_reifier(self)
+        # Replace other wherever it is used as a type or theme.
+        for topic_type in other._types:
+            if topic_type is not other:
+                self.add_type(topic_type)
+        for instance in list(topic_map._type_index['topic'].get(other, ())):
+            instance.remove_type(other)
+            instance.add_type(self)
+        for kind, index in topic_map._type_index.items():
+            if kind != self._kind:
+                for typed in list(index.get(other, ())):
+                    typed.set_type(self)
+        for index in topic_map._theme_index.values():
+            for scoped in list(index.get(other, ())):
+                scoped.remove_theme(other)
+                scoped.add_theme(self)
+        for subject_identifier in other._subject_identifiers:
+            topic_map._sid_index[subject_identifier.to_external_form()] = self
+            append_value(self, '_subject_identifiers', subject_identifier)
+        other._subject_identifiers = ()
+        for subject_locator in other._subject_locators:
+            topic_map._slo_index[subject_locator.to_external_form()] = self
+            append_value(self, '_subject_locators', subject_locator)
+        other._subject_locators = ()
+        for item_identifier in other._item_identifiers:
+            topic_map._iid_index[item_identifier.to_external_form()] = self
+            append_value(self, '_item_identifiers', item_identifier)
+        other._item_identifiers = ()
+        signatures = {}
+        for name in self._names:
+            signatures[generate_name_signature(name)] = name
+        for name in list(other._names):
+            existing = signatures.get(generate_name_signature(name))
+            if existing is not None:
+                handle_existing_construct(name, existing)
+                move_variants(name, existing)
+                name.remove()
+            else:
+                remove_value(other, '_names', name)
+                name._topic = self
+                append_value(self, '_names', name)
+        signatures = {}
+        for occurrence in self._occurrences:
+            signatures[generate_occurrence_signature(occurrence)] = occurrence
+        for occurrence in list(other._occurrences):
+            existing = signatures.get(generate_occurrence_signature(occurrence))
+            if existing is not None:
+                handle_existing_construct(occurrence, existing)
+                occurrence.remove()
+            else:
+                remove_value(other, '_occurrences', occurrence)
+                occurrence._topic = self
+                append_value(self, '_occurrences', occurrence)
+        signatures = {}
+        for role in self._roles_played:
+            parent = role._association
+            signatures[generate_association_signature(parent)] = parent
+        for role in list(other._roles_played):
+            role.set_player(self)
+            parent = role._association
+            existing = signatures.get(generate_association_signature(parent))
+            if existing is not None and existing is not parent:
+                handle_existing_construct(parent, existing)
+                move_role_characteristics(parent, existing)
+                parent.remove()
+        other.remove()
+
+    def _merge_identical (self, other, locator, message):
+        """Merges `other`, which has been found to represent the same
+        subject as this topic because of `locator`, into this topic.
+
+        :param other: the topic representing the same subject
+        :type other: `Topic`
+        :param locator: the identifier shared by the topics
+        :type locator: `Locator`
+        :param message: the message of the exception raised if
+          automerge is disabled
+        :type message: string
+        :raises `IdentityConstraintException`: if automerge is disabled
+
+        """
+        if self._topic_map._system.get_feature(AUTOMERGE_FEATURE_STRING):
+            self.merge_in(other)
+        else:
+            raise IdentityConstraintException(self, other, locator, message)
+
+    def remove (self):
+        """Removes this topic from the containing `TopicMap` instance.
+
+        This method throws a `TopicInUseException` if the topic plays
+        a `Role`, is used as type of a `Typed` construct, or if it is
+        used as a theme for a `Scoped` construct, or if it reifies a
+        `Reifiable`.
+
+        """
+        topic_map = self._topic_map
+        if self._roles_played:
+            raise TopicInUseException(self, 'This topic is used as a player')
+        if self._reified is not None:
+            raise TopicInUseException(self, 'This topic is used as a reifier')
+        for index in topic_map._theme_index.values():
+            if self in index:
+                raise TopicInUseException(self, 'This topic is used as a theme')
+        for index in topic_map._type_index.values():
+            if self in index:
+                raise TopicInUseException(self, 'This topic is used as a type')
+        for name in list(self._names):
+            name.remove()
+        for occurrence in list(self._occurrences):
+            occurrence.remove()
+        for topic_type in list(self._types):
+            self.remove_type(topic_type)
+        for subject_identifier in self._subject_identifiers:
+            del topic_map._sid_index[subject_identifier.to_external_form()]
+        self._subject_identifiers = ()
+        for subject_locator in self._subject_locators:
+            del topic_map._slo_index[subject_locator.to_external_form()]
+        self._subject_locators = ()
+        super(Topic, self).remove()
+
+    def remove_subject_identifier (self, subject_identifier):
+        """Removes a subject identifer from this topic.
+
+        :param subject_identifier: the subject identifier to be remove
+          from this topic
+        :type subject_identifier: `Locator`
+
+        """
+        address = subject_identifier.to_external_form()
+        index = self._topic_map._sid_index
+        if index.get(address) is self:
+            del index[address]
+            remove_value(self, '_subject_identifiers', subject_identifier)
+
+    def remove_subject_locator (self, subject_locator):
+        """Removes a subject locator from this topic.
+
+        :param subject_locator: the subject locator to be removed from
+          this topic
+        :type subject_locator: `Locator`
+
+        """
+        address = subject_locator.to_external_form()
+        index = self._topic_map._slo_index
+        if index.get(address) is self:
+            del index[address]
+            remove_value(self, '_subject_locators', subject_locator)
+
+    def remove_type (self, topic_type):
+        """Removes a type from this topic.
+
+        :param topic_type: the type to be removed from this topic
+        :type topic_type: `Topic`
+
+        """
+        if topic_type in self._types:
+            remove_value(self, '_types', topic_type)
+            index_remove(self._topic_map._type_index[self._kind], topic_type,
+                         self)
+
+    def _get_default_name_type (self):
+        """Returns the topic representing the default name type,
+        creating it if necessary.
+
+        :rtype: `Topic`
+
+        """
+        return self._topic_map.create_topic_by_subject_identifier(
+            Locator(DEFAULT_NAME_TYPE))
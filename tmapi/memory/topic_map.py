@@ -0,0 +1,704 @@
+# Copyright 2011 Jamie Norrish (jamie@artefact.org.nz)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from django.contrib.sites.models import Site
+
+import tmapi.indices
+from tmapi.exceptions import IdentityConstraintException, \
+    ModelConstraintException, UnsupportedOperationException
+from tmapi.models.locator import Locator, LocatorBase
+
+from association import Association
+from collection_utils import index_add, index_remove
+from copy_utils import copy
+from literal_index import LiteralIndex
+from merge_utils import generate_association_signature
+from reifiable import Reifiable
+from result_list import ResultList
+from scoped import Scoped, prepare_scope
+from scoped_index import ScopedIndex
+from topic import Topic
+from type_instance_index import TypeInstanceIndex
+from typed import Typed
+
+
+# Index implementations, keyed by the index interfaces that may be
+# passed to `TopicMap.get_index()`.
+INDICES = {
+    tmapi.indices.LiteralIndex: LiteralIndex,
+    tmapi.indices.ScopedIndex: ScopedIndex,
+    tmapi.indices.TypeInstanceIndex: TypeInstanceIndex,
+    LiteralIndex: LiteralIndex,
+    ScopedIndex: ScopedIndex,
+    TypeInstanceIndex: TypeInstanceIndex,
+    }
+
+
+class Batch (object):
+
+    """Context manager returned by `TopicMap.batch()`.
+
+    In-memory modifications have no per-operation cost to save, so
+    this does nothing. Unlike a batch of the database backend, it
+    does not undo modifications made within it if an exception is
+    raised.
+
+    """
+
+    def __enter__ (self):
+        return self
+
+    def __exit__ (self, exc_type, exc_value, traceback):
+        return False
+
+    def flush (self):
+        pass
+
+
+class TopicMap (Reifiable):
+
+    """Represents a topic map item.
+
+    Besides its constructs, a topic map holds the indices through
+    which they are looked up: dictionaries from the external form of
+    an identifier to the construct with that identifier, and
+    dictionaries keyed by the kind of construct (eg, 'name') mapping
+    types, themes and values to the sets of constructs with them.
+
+    """
+
+    __slots__ = ('_id', '_topic_map', '_item_identifiers', '_reifier',
+                 '_system', '_locator', '_constructs', '_members',
+                 '_iid_index', '_sid_index', '_slo_index', '_type_index',
+                 '_theme_index', '_literal_index', '_indices', '_stored')
+    _kind = 'topic_map'
+
+    def __init__ (self, system, locator):
+        self._topic_map = self
+        self._item_identifiers = ()
+        self._reifier = None
+        self._system = system
+        self._locator = locator
+        self._constructs = {}
+        self._members = {'association': set(), 'name': set(),
+                         'occurrence': set(), 'role': set(),
+                         'topic': set(), 'topic_map': set(),
+                         'variant': set()}
+        self._iid_index = {}
+        self._sid_index = {}
+        self._slo_index = {}
+        # The 'topic' index maps topic types to their instances.
+        self._type_index = {'association': {}, 'name': {}, 'occurrence': {},
+                            'role': {}, 'topic': {}}
+        self._theme_index = {'association': {}, 'name': {},
+                             'occurrence': {}, 'variant': {}}
+        self._literal_index = {'name': {}, 'occurrence': {}, 'variant': {}}
+        self._indices = {}
+        # The database ID of the topic map this was loaded from and
+        # the stored state of its constructs, or None if it was not
+        # loaded from the database (see `database_utils`).
+        self._stored = None
+        self._register(self)
+
+    def batch (self):
+        """Returns a context manager for compatibility with
+        `tmapi.models.TopicMap.batch()`.
+
+        :rtype: `Batch`
+
+        """
+        return Batch()
+
+    def close (self):
+        """Closes use of this topic map instance.
+
+        Topic maps held in memory are never read-only, so there is
+        nothing to release.
+
+        """
+        pass
+
+    def create_association (self, association_type, scope=None, proxy=None):
+        """Creates an `Association` in this topic map with the
+        specified type and scope.
+
+        :param association_type: the association type
+        :type association_type: `Topic`
+        :param scope: scope
+        :type scope: list of `Topic`s
+        :param proxy: ignored; accepted for compatibility with the
+          database backend
+        :rtype: `Association`
+
+        """
+        if association_type is None:
+            raise ModelConstraintException(self, 'The type may not be None')
+        if self is not association_type._topic_map:
+            raise ModelConstraintException(
+                self, 'The type is not from this topic map')
+        scope = prepare_scope(self, self, scope)
+        return Association(self, association_type, scope)
+
+    def create_associations (self, specs, dedupe=False, proxy=None):
+        """Creates an `Association`, with its `Role`s, in this topic
+        map for each of the specified (`association_type`, `scope`,
+        `roles`) tuples, where `roles` is a list of (`role_type`,
+        `player`) tuples.
+
+        All of the topics are validated before anything is created.
+
+        If `dedupe` is True, no association is created for a tuple
+        that has the same signature (type, scope and roles) as an
+        existing association in this topic map, or as an earlier
+        tuple; the existing association is returned in its place.
+
+        :param specs: the type, scope (or None) and roles of each
+          association to be created
+        :type specs: list of tuples
+        :param dedupe: whether to reuse existing associations with the
+          same signature
+        :type dedupe: boolean
+        :param proxy: ignored; accepted for compatibility with the
+          database backend
+        :rtype: list of `Association`s
+
+        """
+        specs = [self._prepare_association_spec(association_type, scope,
+                                                roles)
+                 for association_type, scope, roles in specs]
+        signatures = {}
+        if dedupe:
+            type_index = self._type_index['association']
+            for association_type in set([spec[0] for spec in specs]):
+                for association in type_index.get(association_type, ()):
+                    signature = generate_association_signature(association)
+                    signatures[signature] = association
+        results = []
+        for association_type, scope, roles in specs:
+            if dedupe:
+                signature = (association_type, frozenset(scope),
+                             frozenset(roles))
+                existing = signatures.get(signature)
+                if existing is not None:
+                    results.append(existing)
+                    continue
+            association = Association(self, association_type, scope)
+            for role_type, player in roles:
+                association.create_role(role_type, player)
+            if dedupe:
+                signatures[signature] = association
+            results.append(association)
+        return results
+
+    def create_empty_topic (self):
+        """Returns a `Topic` instance with no other information.
+
+        :rtype: `Topic`
+
+        """
+        return Topic(self)
+
+    def create_locator (self, reference):
+        """Returns a `Locator` instance representing the specified IRI
+        reference.
+
+        The specified IRI reference is assumed to be absolute.
+
+        :param reference: a string which uses the IRI notation
+        :type reference: string
+        :rtype: `Locator`
+
+        """
+        return Locator(reference)
+
+    def create_topic (self, proxy=None):
+        """Returns a `Topic` instance with an automatically generated
+        item identifier.
+
+        This method never returns an existing `Topic` but creates a
+        new one with an automatically generated item identifier.
+
+        :param proxy: ignored; accepted for compatibility with the
+          database backend
+        :rtype: `Topic`
+
+        """
+        topic = Topic(self)
+        address = 'http://%s/tmapi/iid/auto/%d' % \
+            (Site.objects.get_current().domain, topic._id)
+        topic._add_item_identifier(Locator(address))
+        return topic
+
+    def create_topic_by_item_identifier (self, item_identifier):
+        """Returns a `Topic` instance with the specified item identifier.
+
+        This method returns either an existing `Topic` or creates a
+        new `Topic` instance with the specified item identifier.
+
+        If a topic with the specified item identifier exists in the
+        topic map, that topic is returned. If a topic with a subject
+        identifier equal to the specified item identifier exists, the
+        specified item identifier is added to that topic and the topic
+        is returned. If neither a topic with the specified item
+        identifier nor with a subject identifier equal to the subject
+        identifier exists, a topic with the item identifier is
+        created.
+
+        :param item_identifier: the item identifier the topic should contain
+        :type item_identifier: `Locator`
+        :rtype: `Topic`
+
+        """
+        if item_identifier is None:
+            raise ModelConstraintException(
+                self, 'The item identifier may not be None')
+        reference = item_identifier.to_external_form()
+        construct = self._iid_index.get(reference)
+        if construct is not None:
+            if not isinstance(construct, Topic):
+                raise IdentityConstraintException(
+                    self, construct, item_identifier, 'This item identifier is already associated with another non-Topic construct')
+            return construct
+        topic = self._sid_index.get(reference)
+        if topic is None:
+            topic = Topic(self)
+        topic._add_item_identifier(item_identifier)
+        return topic
+
+    def create_topic_by_subject_identifier (self, subject_identifier):
+        """Returns a `Topic` instance with the specified subject identifier.
+
+        This method returns either an existing `Topic` or creates a
+        new `Topic` instance with the specified subject identifier.
+
+        If a topic with the specified subject identifier exists in
+        this topic map, that topic is returned. If a topic with an
+        item identifier equal to the specified subject identifier
+        exists, the specified subject identifier is added to that
+        topic and the topic is returned. If neither a topic with the
+        specified subject identifier nor with an item identifier equal
+        to the subject identifier exists, a topic with the subject
+        identifier is created.
+
+        :param subject_identifier: the subject identifier the topic
+          should contain
+        :type subject_identifier: `Locator`
+        :rtype: `Topic`
+
+        """
+        if subject_identifier is None:
+            raise ModelConstraintException(
+                self, 'The subject identifier may not be None')
+        reference = subject_identifier.to_external_form()
+        topic = self._sid_index.get(reference)
+        if topic is None:
+            topic = self._iid_index.get(reference)
+            if not isinstance(topic, Topic):
+                topic = Topic(self)
+            topic._add_subject_identifier(subject_identifier)
+        return topic
+
+    def create_topic_by_subject_locator (self, subject_locator):
+        """Returns a `Topic` instance with the specified subject locator.
+
+        This method returns either an existing `Topic` or creates a
+        new `Topic` instance with the specified subject locator.
+
+        :param subject_locator: the subject locator the topic should
+          contain
+        :type subject_locator: `Locator`
+        :rtype: `Topic`
+
+        """
+        if subject_locator is None:
+            raise ModelConstraintException(
+                self, 'The subject locator may not be None')
+        topic = self._slo_index.get(subject_locator.to_external_form())
+        if topic is None:
+            topic = Topic(self)
+            topic._add_subject_locator(subject_locator)
+        return topic
+
+    def get_associations (self):
+        """Returns all `Association`s contained in this topic map.
+
+        :rtype: `ResultList` of `Association`s
+
+        """
+        return ResultList(self._members['association'])
+
+    def get_change_sequence (self):
+        """Raises `UnsupportedOperationException`, since topic maps
+        held in memory have no change journal."""
+        raise UnsupportedOperationException(
+            'The memory backend does not support the change journal')
+
+    def get_changes (self, since=0):
+        """Raises `UnsupportedOperationException`, since topic maps
+        held in memory have no change journal."""
+        raise UnsupportedOperationException(
+            'The memory backend does not support the change journal')
+
+    def get_construct_by_id (self, id, proxy=None):
+        """Returns a `Construct` by its (system specific) identifier.
+
+        :param id: the identifier of the construct to be returned
+        :type id: string or integer
+        :param proxy: ignored; accepted for compatibility with the
+          database backend
+        :rtype: `Construct` or None
+
+        """
+        return self._constructs.get(int(id))
+
+    def get_construct_by_item_identifier (self, item_identifier):
+        """Returns a `Construct` by its item identifier.
+
+        :param item_identifier: the item identifier of the construct
+          to be returned
+        :type item_identifier: `Locator`
+        :rtype: a construct or None
+
+        """
+        return self._iid_index.get(item_identifier.to_external_form())
+
+    def get_index (self, index_interface):
+        """Returns the specified index.
+
+        Either the index interfaces defined in `tmapi.indices` or
+        their in-memory implementations may be specified.
+
+        :param index_interface: the index to return
+        :type index_interface: class
+        :rtype: `Index`
+
+        """
+        index_class = INDICES.get(index_interface)
+        if index_class is None:
+            raise UnsupportedOperationException(
+                'This TMAPI implementation does not support that index')
+        if index_class not in self._indices:
+            self._indices[index_class] = index_class(self)
+        return self._indices[index_class]
+
+    def get_locator (self):
+        """Returns the `Locator` that was used to create the topic map.
+
+        Note: The returned locator represents the storage address of
+        the topic map and implies no further semantics.
+
+        :rtype: `Locator`
+
+        """
+        return self._locator
+
+    def get_parent (self):
+        """Returns None.
+
+        :rtype: None
+
+        """
+        return None
+
+    def get_topics (self):
+        """Returns all `Topic`s contained in this topic map.
+
+        :rtype: `ResultList` of `Topic`s
+
+        """
+        return ResultList(self._members['topic'])
+
+    def get_topic_by_subject_identifier (self, subject_identifier):
+        """Returns a topic by its subject identifier.
+
+        If no topic with the specified subject identifier exists, this
+        method returns `None`.
+
+        :param subject_identifier: the subject identifier of the topic
+          to be returned
+        :type subject_identifier: `Locator`
+        :rtype: `Topic` or `None`
+
+        """
+        return self._sid_index.get(subject_identifier.to_external_form())
+
+    def get_topic_by_subject_locator (self, subject_locator):
+        """Returns a topic by its subject locator.
+
+        If no topic with the specified subject locator exists, this
+        method returns `None`.
+
+        :param subject_locator: the subject locator of the topic to be
+          returned
+        :type subject_locator: `Locator`
+        :rtype: `Topic` of `None`
+
+        """
+        return self._slo_index.get(subject_locator.to_external_form())
+
+    def import_topics (self, specs, processes=1, partitions=None):
+        """Returns a `Topic` in this topic map for each of the
+        specified (`item_identifiers`, `subject_identifiers`,
+        `subject_locators`) tuples, where each item is a list of IRI
+        references or `Locator`s, creating and merging topics as
+        necessary.
+
+        The topics are imported in this process; `processes` and
+        `partitions` are accepted for compatibility with the database
+        backend.
+
+        :param specs: the identities of each topic to be imported
+        :type specs: list of tuples
+        :param processes: ignored
+        :type processes: integer
+        :param partitions: ignored
+        :type partitions: integer
+        :rtype: list of `Topic`s
+
+        """
+        indices = (self._iid_index, self._sid_index, self._slo_index)
+        firsts = []
+        for spec in specs:
+            topic = None
+            for index, relation, references in zip(
+                indices, ('item_identifier', 'subject_identifier',
+                          'subject_locator'), spec):
+                for reference in references or ():
+                    if not isinstance(reference, LocatorBase):
+                        reference = Locator(reference)
+                    if topic is None:
+                        topic = getattr(self, 'create_topic_by_%s' %
+                                        relation)(reference)
+                        firsts.append((index, reference.to_external_form()))
+                    else:
+                        getattr(topic, 'add_%s' % relation)(reference)
+            if topic is None:
+                raise ModelConstraintException(
+                    self, 'A topic to be imported must have an identity')
+        # Topics returned for earlier specs may since have been
+        # merged away, so look each up again by its first identity.
+        return [index[address] for index, address in firsts]
+
+    def iter_associations (self, batch_size=None, after_id=None):
+        """Yields the `Association`s in this topic map in order of
+        identifier.
+
+        :param batch_size: ignored, being accepted for compatibility
+          with the database backend
+        :type batch_size: integer
+        :param after_id: the identifier of the association after which
+          to start
+        :type after_id: integer
+        :rtype: generator of `Association`s
+
+        """
+        return self._iterate('association', after_id)
+
+    def iter_topics (self, batch_size=None, after_id=None):
+        """Yields the `Topic`s in this topic map in order of
+        identifier.
+
+        :param batch_size: ignored, being accepted for compatibility
+          with the database backend
+        :type batch_size: integer
+        :param after_id: the identifier of the topic after which to
+          start
+        :type after_id: integer
+        :rtype: generator of `Topic`s
+
+        """
+        return self._iterate('topic', after_id)
+
+    def merge_by_topic_name (self):
+        """Raises `UnsupportedOperationException`, since topic maps
+        held in memory do not support merging by topic name."""
+        raise UnsupportedOperationException(
+            'The memory backend does not support merging by topic name')
+
+    def merge_changes_in (self, other, since=0):
+        """Raises `UnsupportedOperationException`, since topic maps
+        held in memory have no change journal."""
+        raise UnsupportedOperationException(
+            'The memory backend does not support the change journal')
+
+    def merge_in (self, other):
+        """Merges the topic map `other` into this topic map.
+
+        All `Topic`s and `Association`s and all of their contents in
+        `other` will be added to this topic map.
+
+        All information items in `other` will be merged into this
+        topic map as defined by the Topic Maps - Data Model (TMDM)
+        merging rules.
+
+        The merge process will not modify `other` in any way.
+
+        If this topic map equals `other`, no changes are made to the
+        topic map.
+
+        :param other: the topic map to be merged with this topic map
+          instance
+        :type other: `TopicMap`
+
+        """
+        if other is None:
+            raise ModelConstraintException(
+                self, 'The topic map to merge in may not be None')
+        copy(other, self)
+
+    def plan_merge (self, other):
+        """Raises `UnsupportedOperationException`, since merge plans
+        are computed with database queries."""
+        raise UnsupportedOperationException(
+            'The memory backend does not support merge plans')
+
+    def plan_subject_identifiers (self, additions):
+        """Raises `UnsupportedOperationException`, since merge plans
+        are computed with database queries."""
+        raise UnsupportedOperationException(
+            'The memory backend does not support merge plans')
+
+    def remove (self):
+        if self._reifier is not None:
+            self._reifier._reified = None
+        self._system._remove_topic_map(self)
+
+    def resolve_identity (self, locator):
+        """Returns the topic in this topic map with `locator` as a
+        subject identifier, and the construct with `locator` as an
+        item identifier.
+
+        :param locator: the locator to resolve
+        :type locator: `Locator`
+        :rtype: tuple of `Topic` or None, and `Construct` or None
+
+        """
+        return self.resolve_identities([locator])[
+            locator.to_external_form()]
+
+    def resolve_identities (self, locators):
+        """Returns the topics in this topic map with each of
+        `locators` as a subject identifier, and the constructs with
+        each as an item identifier.
+
+        The returned dictionary is keyed by the external form of each
+        locator, and has as values pairs as returned by
+        `resolve_identity`.
+
+        :param locators: the locators to resolve
+        :type locators: list of `Locator`s
+        :rtype: dictionary
+
+        """
+        matches = {}
+        for locator in locators:
+            address = locator.to_external_form()
+            matches[address] = (self._sid_index.get(address),
+                                self._iid_index.get(address))
+        return matches
+
+    def _iterate (self, kind, after_id):
+        """Yields the members of this topic map of `kind` in order of
+        identifier, starting after `after_id`."""
+        members = sorted(self._members[kind], key=lambda member: member._id)
+        for member in members:
+            if after_id is None or member._id > after_id:
+                yield member
+
+    def _prepare_association_spec (self, association_type, scope, roles):
+        """Returns the validated components of an association
+        specification.
+
+        :param association_type: the association type
+        :type association_type: `Topic`
+        :param scope: scope
+        :type scope: list of `Topic`s or None
+        :param roles: the role types and players
+        :type roles: list of tuples
+        :rtype: tuple
+
+        """
+        if association_type is None:
+            raise ModelConstraintException(self, 'The type may not be None')
+        if self is not association_type._topic_map:
+            raise ModelConstraintException(
+                self, 'The type is not from this topic map')
+        scope = prepare_scope(self, self, scope)
+        roles = list(roles or [])
+        for role_type, player in roles:
+            if role_type is None:
+                raise ModelConstraintException(
+                    self, 'The role type may not be None')
+            if player is None:
+                raise ModelConstraintException(
+                    self, 'The player may not be None')
+            if self is not role_type._topic_map:
+                raise ModelConstraintException(
+                    self, 'The role type is not from this topic map')
+            if self is not player._topic_map:
+                raise ModelConstraintException(
+                    self, 'The player is not from this topic map')
+        return association_type, scope, roles
+
+    def _register (self, construct):
+        """Adds the newly created `construct` to this topic map and
+        its indices, assigning it an identifier.
+
+        :param construct: the new construct
+        :type construct: `Construct`
+
+        """
+        construct._id = self._system._next_id()
+        self._constructs[construct._id] = construct
+        kind = construct._kind
+        self._members[kind].add(construct)
+        if isinstance(construct, Typed):
+            index_add(self._type_index[kind], construct._type, construct)
+        if isinstance(construct, Scoped):
+            index = self._theme_index[kind]
+            for theme in construct._scope:
+                index_add(index, theme, construct)
+        if kind in self._literal_index:
+            index_add(self._literal_index[kind],
+                      construct._get_literal_key(), construct)
+
+    def _unregister (self, construct):
+        """Removes `construct` from this topic map and its indices.
+
+        :param construct: the construct to remove
+        :type construct: `Construct`
+
+        """
+        kind = construct._kind
+        if isinstance(construct, Typed):
+            index_remove(self._type_index[kind], construct._type, construct)
+        if isinstance(construct, Scoped):
+            index = self._theme_index[kind]
+            for theme in construct._scope:
+                index_remove(index, theme, construct)
+        if kind in self._literal_index:
+            index_remove(self._literal_index[kind],
+                         construct._get_literal_key(), construct)
+        if isinstance(construct, Reifiable) and construct._reifier is not None:
+            construct._reifier._reified = None
+            construct._reifier = None
+        for item_identifier in construct._item_identifiers:
+            del self._iid_index[item_identifier.to_external_form()]
+        construct._item_identifiers = ()
+        del self._constructs[construct._id]
+        self._members[kind].discard(construct)
+        construct._topic_map = None
+
+    def __unicode__ (self):
+        return u'Topic map (%s)' % self._locator.to_external_form()
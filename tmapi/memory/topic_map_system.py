@@ -0,0 +1,174 @@
+# Copyright 2011 Jamie Norrish (jamie@artefact.org.nz)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from tmapi.exceptions import FeatureNotRecognizedException, \
+    TopicMapExistsException
+from tmapi.models.locator import Locator
+
+from result_list import ResultList
+from topic_map import TopicMap
+
+
+class TopicMapSystem (object):
+
+    """A TMAPI system holding its topic maps in memory.
+
+    Instances are created by `TopicMapSystemFactory` when its
+    BACKEND_PROPERTY_STRING property is set to MEMORY_BACKEND.
+
+    The locators stored by the topic maps of a system are interned,
+    so that each IRI is held by a single `Locator` however many
+    constructs it identifies.
+
+    """
+
+    __slots__ = ('_features', '_properties', '_topic_maps', '_locators',
+                 '_last_id')
+
+    def __init__ (self, features, properties):
+        """Initialises a system with the specified `features` and
+        `properties`.
+
+        :param features: the state of each feature
+        :type features: dictionary of booleans
+        :param properties: the value of each property
+        :type properties: dictionary
+
+        """
+        self._features = features
+        self._properties = properties
+        self._topic_maps = {}
+        self._locators = {}
+        self._last_id = 0
+
+    def create_locator (self, reference):
+        """Returns a `Locator` instance representing the specified IRI
+        `reference`.
+
+        The specified IRI `reference` is assumed to be absolute.
+
+        :param reference: a string which uses the IRI notation
+        :type reference: String
+        :rtype: `Locator`
+
+        """
+        return Locator(reference)
+
+    def create_topic_map (self, iri, proxy=None):
+        """Creates a new `TopicMap` and stores it within the system
+        under the specified `iri`.
+
+        :param iri: the address which should be used to store the `TopicMap`
+        :type iri: `Locator` or String
+        :param proxy: ignored; accepted for compatibility with the
+          database backend
+        :rtype: `TopicMap`
+
+        """
+        if not isinstance(iri, Locator):
+            iri = self.create_locator(iri)
+        reference = iri.to_external_form()
+        if reference in self._topic_maps:
+            raise TopicMapExistsException()
+        topic_map = TopicMap(self, self._intern(iri))
+        self._topic_maps[reference] = topic_map
+        return topic_map
+
+    def get_feature (self, feature_name):
+        """Returns the value of the feature specified by
+        `feature_name` for this TopicMapSystem instance.
+
+        :param feature_name: the name of the feature to check
+        :type feature_name: string
+        :rtype: Boolean
+
+        """
+        try:
+            return self._features[feature_name]
+        except KeyError:
+            raise FeatureNotRecognizedException
+
+    def get_locators (self):
+        """Returns all storage addresses of `TopicMap` instances known
+        by this system.
+
+        :rtype: `ResultList` of strings
+
+        """
+        return ResultList(self._topic_maps.keys())
+
+    def get_property (self, property_name):
+        """Returns a property in the underlying implementation of
+        `TopicMapSystem`.
+
+        :param property_name: the name of the property to retrieve
+        :type property_name: string
+        :rtype: object value set for the property or None if no value is set
+
+        """
+        return self._properties.get(property_name)
+
+    def get_topic_map (self, iri):
+        """Retrieves a `TopicMap` managed by this system with the
+        specified storage address `iri`.
+
+        :param iri: the storage address to retrieve the `TopicMap` from
+        :type iri: `Locator` or String
+        :rtype: `TopicMap` or None
+
+        """
+        if not isinstance(iri, Locator):
+            iri = self.create_locator(iri)
+        return self._topic_maps.get(iri.to_external_form())
+
+    def _intern (self, locator):
+        """Returns the locator held by this system that is equal to
+        `locator`, which becomes that locator if there is none.
+
+        :param locator: the locator to intern
+        :type locator: `Locator`
+        :rtype: `Locator`
+
+        """
+        return self._locators.setdefault(locator.to_external_form(), locator)
+
+    def _next_id (self):
+        """Returns a new construct identifier, unique within this
+        system.
+
+        :rtype: integer
+
+        """
+        self._last_id += 1
+        return self._last_id
+
+    def _reserve_ids (self, last_id):
+        """Ensures that no identifier up to `last_id` is returned by
+        `_next_id`, so that constructs may be given identifiers from
+        elsewhere (such as the database) in that range.
+
+        :param last_id: the highest identifier to reserve
+        :type last_id: integer
+
+        """
+        self._last_id = max(self._last_id, last_id)
+
+    def _remove_topic_map (self, topic_map):
+        """Removes `topic_map` from this system.
+
+        :param topic_map: the topic map to remove
+        :type topic_map: `TopicMap`
+
+        """
+        del self._topic_maps[topic_map.get_locator().to_external_form()]
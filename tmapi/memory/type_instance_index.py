@@ -0,0 +1,184 @@
+# Copyright 2011 Jamie Norrish (jamie@artefact.org.nz)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from tmapi.indices.index import Index
+
+from result_list import ResultList
+from topic import Topic
+
+
+class TypeInstanceIndex (Index):
+
+    """In-memory implementation of `tmapi.indices.TypeInstanceIndex`."""
+
+    def get_associations (self, association_type):
+        """Returns the associations in the topic map whose type
+        property equals `association_type`.
+
+        The return value may be empty but must never be None.
+
+        :param association_type: the type of the `Association`s to be
+          returned
+        :type association_type: `Topic`
+        :rtype: `ResultList` of `Association`s
+
+        """
+        return self._get_typed('association', association_type)
+
+    def get_association_types (self):
+        """Returns the topics in the topic map used in the type
+        property of `Association`s.
+
+        The return value may be empty but must never be None.
+
+        :rtype: `ResultList` of `Topic`s
+
+        """
+        return ResultList(self.topic_map._type_index['association'])
+
+    def get_names (self, name_type):
+        """Returns the topic names in the topic map whose type
+        property equals `name_type`.
+
+        The return value may be empty but must never be None.
+
+        :param name_type: the type of the `Name`s to be returned
+        :type name_type: `Topic`
+        :rtype: `ResultList` of `Name`s
+
+        """
+        return self._get_typed('name', name_type)
+
+    def get_name_types (self):
+        """Returns the topics in the topic map used in the type
+        property of `Name`s.
+
+        The return value may be empty but must never be None.
+
+        :rtype: `ResultList` of `Topic`s
+
+        """
+        return ResultList(self.topic_map._type_index['name'])
+
+    def get_occurrences (self, occurrence_type):
+        """Returns the occurrences in the topic map whose type
+        property equals `occurrence_type`.
+
+        The return value may be empty but must never be None.
+
+        :param occurrence_type: the type of the `Occurrence`s to be returned
+        :type occurrence_type: `Topic`
+        :rtype: `ResultList` of `Occurrence`s
+
+        """
+        return self._get_typed('occurrence', occurrence_type)
+
+    def get_occurrence_types (self):
+        """Returns the topics in the topic map used in the type
+        property of `Occurrence`s.
+
+        The return value may be empty but must never be None.
+
+        :rtype: `ResultList` of `Topic`s
+
+        """
+        return ResultList(self.topic_map._type_index['occurrence'])
+
+    def get_roles (self, role_type):
+        """Returns the roles in the topic map whose type property
+        equals `role_type`.
+
+        The return value may be empty but must never be None.
+
+        :param role_type: the type of the `Role`s to be returned
+        :type role_type: `Topic`
+        :rtype: `ResultList` of `Role`s
+
+        """
+        return self._get_typed('role', role_type)
+
+    def get_role_types (self):
+        """Returns the topics in the topic map used in the type
+        property of `Role`s.
+
+        The return value may be empty but must never be None.
+
+        :rtype: `ResultList` of `Topic`s
+
+        """
+        return ResultList(self.topic_map._type_index['role'])
+
+    def get_topics (self, topic_types=None, match_all=False):
+        """Returns the topics which are an instance of at least one of
+        the specified `topic_types`, or all topics which are not an
+        instance of another topic (iff `topic_types` is None).
+
+        If `match_all` is True, a topic must be an instance of all
+        `topic_types`; if False, the topic must be an instace of at
+        least one type.
+
+        The return value may be empty but must never by None.
+
+        :param topic_types: types of the `Topic`s to be returned
+        :type topic_types: `Topic` or list of `Topic`s
+        :param match_all: whether a topic must be an instance of only
+          one or all `topic_types`
+        :type match_all: boolean
+        :rtype: `ResultList` of `Topic`s
+
+        """
+        topics = self.topic_map._members['topic']
+        if topic_types is None:
+            return ResultList([topic for topic in topics if not topic._types])
+        if isinstance(topic_types, Topic):
+            topic_types = [topic_types]
+        index = self.topic_map._type_index['topic']
+        instances = None
+        for topic_type in topic_types:
+            matches = index.get(topic_type, ())
+            if instances is None:
+                instances = set(matches)
+            elif match_all:
+                instances.intersection_update(matches)
+            else:
+                instances.update(matches)
+        if instances is None:
+            if match_all:
+                instances = topics
+            else:
+                instances = ()
+        return ResultList(instances)
+
+    def get_topic_types (self):
+        """Returns the topics in the topic map that are used as type
+        in a type-instance relationship.
+
+        :rtype: `ResultList` of `Topic`s
+
+        """
+        return ResultList(self.topic_map._type_index['topic'])
+
+    def _get_typed (self, kind, construct_type):
+        """Returns the constructs of `kind` whose type property
+        equals `construct_type`.
+
+        :param kind: the kind of construct
+        :type kind: string
+        :param construct_type: the type of the constructs to be returned
+        :type construct_type: `Topic`
+        :rtype: `ResultList` of `Construct`s
+
+        """
+        return ResultList(self.topic_map._type_index[kind].get(
+                construct_type, ()))
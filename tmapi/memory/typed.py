@@ -0,0 +1,54 @@
+# Copyright 2011 Jamie Norrish (jamie@artefact.org.nz)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from tmapi.exceptions import ModelConstraintException
+
+from collection_utils import index_add, index_remove
+from construct import Construct
+
+
+class Typed (Construct):
+
+    """Indicates that a Topic Maps construct is typed. `Association`s,
+    `Role`s, `Occurrence`s, and `Name`s are typed."""
+
+    __slots__ = ()
+
+    def get_type (self, proxy=None):
+        """Returns the type of this construct.
+
+        :param proxy: ignored; accepted for compatibility with the
+          database backend
+        :rtype: the `Topic` that represents the type
+
+        """
+        return self._type
+
+    def set_type (self, construct_type):
+        """Sets the type of this construct. Any previous type is overridden.
+
+        :param construct_type: the `Topic` that should define the
+          nature of this construct
+        :type construct_type: `Topic`
+
+        """
+        if construct_type is None:
+            raise ModelConstraintException(self, 'The type may not be None')
+        if self._topic_map is not construct_type._topic_map:
+            raise ModelConstraintException(
+                self, 'The type is not from the same topic map')
+        index = self._topic_map._type_index[self._kind]
+        index_remove(index, self._type, self)
+        self._type = construct_type
+        index_add(index, construct_type, self)
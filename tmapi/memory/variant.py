@@ -0,0 +1,63 @@
+# Copyright 2011 Jamie Norrish (jamie@artefact.org.nz)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from collection_utils import append_value, remove_value
+from datatype_aware import DatatypeAware
+from result_list import ResultList
+
+
+class Variant (DatatypeAware):
+
+    """Represents a variant item."""
+
+    __slots__ = ('_id', '_topic_map', '_item_identifiers', '_reifier',
+                 '_scope', '_value', '_datatype', '_name')
+    _kind = 'variant'
+
+    def __init__ (self, name, value, datatype, scope):
+        self._topic_map = name._topic_map
+        self._item_identifiers = ()
+        self._reifier = None
+        self._scope = scope or ()
+        self._value = value
+        self._datatype = datatype
+        self._name = name
+        self._topic_map._register(self)
+        append_value(name, '_variants', self)
+
+    def get_parent (self):
+        """Returns the `Name` to which this variant belongs.
+
+        :rtype: `Name`
+
+        """
+        return self._name
+
+    def get_scope (self):
+        """Returns the scope of this variant.
+
+        The returned scope is a true superset of the parent's scope.
+
+        :rtype: `ResultList` of `Topic`s
+
+        """
+        scope = ResultList(self._scope)
+        for theme in self._name._scope:
+            if theme not in scope:
+                scope.append(theme)
+        return scope
+
+    def remove (self):
+        remove_value(self._name, '_variants', self)
+        super(Variant, self).remove()
@@ -0,0 +1,47 @@
+# Copyright 2011 Jamie Norrish (jamie@artefact.org.nz)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module providing Django middleware for TMAPI."""
+
+from tmapi.models.request_scope import RequestScope
+
+
+class RequestScopeMiddleware (object):
+
+    """Middleware handling each request within a `RequestScope`, so
+    that the types, players, reifiers and scopes of the constructs
+    used in views and templates are loaded together.
+
+    To use it, add 'tmapi.middleware.RequestScopeMiddleware' to the
+    MIDDLEWARE_CLASSES setting.
+
+    """
+
+    def process_request (self, request):
+        scope = RequestScope()
+        scope.__enter__()
+        request.tmapi_request_scope = scope
+
+    def process_exception (self, request, exception):
+        self._close(request)
+
+    def process_response (self, request, response):
+        self._close(request)
+        return response
+
+    def _close (self, request):
+        scope = getattr(request, 'tmapi_request_scope', None)
+        if scope is not None:
+            del request.tmapi_request_scope
+            scope.__exit__(None, None, None)
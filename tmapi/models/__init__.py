@@ -22,6 +22,7 @@ and ultimately on "ISO 13250-2: Topic Maps - Data Model"
 """
 
 from association import Association
+from change_entry import ChangeEntry
 from construct import Construct
 from construct_fields import ConstructFields
 from datatype_aware import DatatypeAware
@@ -42,3 +43,4 @@ from topic_map_system import TopicMapSystem
 from topic_map_system_factory import TopicMapSystemFactory
 from typed import Typed
 from variant import Variant
+
@@ -0,0 +1,352 @@
+# Copyright 2011 Jamie Norrish (jamie@artefact.org.nz)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module providing batched (single transaction) modification of a
+topic map.
+
+While a `Batch` is active for a topic map, additions to the many to
+many relationships of its constructs (scope, types and item
+identifiers) are not written one at a time. Instead they are collected
+and written with a single duplicate check and a bulk insert per join
+table when the batch is flushed. A batch is flushed when it exits,
+before any query is made through a construct manager, and before any
+TMAPI operation that reads or deletes those relationships, so that
+results are the same as without a batch. Entries for the change
+journal (see `tmapi.models.journal`) are likewise collected and
+written together, and the shared cache (see
+`tmapi.models.cache_utils`) is invalidated again once the batch's
+transaction has been committed. Queries made other than through a
+construct manager or its QuerySets (eg, through the manager of a join
+table or of an identifier model) do not flush the batch.
+
+Constraint checks are not deferred by the batch beyond what the
+database already does. Django creates foreign keys on PostgreSQL as
+DEFERRABLE INITIALLY DEFERRED, so within the batch's transaction they
+are already checked only at commit; SQLite and MySQL cannot defer
+them. The Topic Maps constraints checked by TMAPI (identity, same
+topic map, and so on) cannot be deferred either, since the outcome of
+each (eg, a merge) determines what later operations in the batch
+see.
+
+"""
+
+import sys
+import threading
+
+from django.db import connection, transaction
+
+from cache_utils import invalidate
+from change_entry import ChangeEntry
+from read_only import check_writable
+
+
+# The maximum number of rows inserted, or of values in an IN clause,
+# in a single statement. This keeps within the limits of SQLite.
+CHUNK_SIZE = 400
+
+_local = threading.local()
+
+
+class Batch (object):
+
+    """Context manager wrapping modifications of a topic map in a
+    single transaction.
+
+    Batches are reentrant: entering a batch for a topic map that
+    already has an active batch in the current thread joins the
+    existing batch, and only the outermost batch flushes and commits.
+
+    """
+
+    def __init__ (self, topic_map):
+        self._topic_map = topic_map
+        self._topic_map_id = topic_map.pk
+        self._pending = {}
+        self._changes = []
+        self._changed = False
+        self._joined = None
+        self._transaction = None
+
+    def __enter__ (self):
+        check_writable(self._topic_map)
+        batches = _get_batches()
+        existing = batches.get(self._topic_map_id)
+        if existing is not None:
+            self._joined = existing
+            return existing
+        self._transaction = transaction.commit_on_success()
+        self._transaction.__enter__()
+        batches[self._topic_map_id] = self
+        return self
+
+    def __exit__ (self, exc_type, exc_value, traceback):
+        if self._joined is not None:
+            self._joined = None
+            return False
+        if exc_type is None:
+            try:
+                self.flush()
+            except:
+                exc_info = sys.exc_info()
+                self._finish(*exc_info)
+                raise exc_info[0], exc_info[1], exc_info[2]
+        self._finish(exc_type, exc_value, traceback)
+        return False
+
+    def add (self, field, rows, new=False):
+        """Queues the insertion of `rows` into the join table of the
+        many to many `field`.
+
+        :param field: the many to many field
+        :type field: `ManyToManyField`
+        :param rows: pairs of source and target database IDs
+        :type rows: list of tuples
+        :param new: whether the source objects were created in this
+          batch, so that no rows for them can already exist
+        :type new: boolean
+
+        """
+        through = field.rel.through
+        if through not in self._pending:
+            self._pending[through] = (field, [], [], set())
+        checked_rows, new_rows, seen = self._pending[through][1:]
+        if new:
+            pending_rows = new_rows
+        else:
+            pending_rows = checked_rows
+        for row in rows:
+            if row not in seen:
+                seen.add(row)
+                pending_rows.append(row)
+
+    def add_changes (self, entries):
+        """Queues the insertion of change journal `entries`.
+
+        :param entries: the construct identifier, kind and operation
+          of each entry
+        :type entries: list of tuples
+
+        """
+        self._changes.extend(entries)
+
+    def _finish (self, exc_type, exc_value, traceback):
+        """Deactivates this batch and commits or (if an exception was
+        raised) rolls back its transaction."""
+        del _get_batches()[self._topic_map_id]
+        self._pending = {}
+        self._changes = []
+        try:
+            self._transaction.__exit__(exc_type, exc_value, traceback)
+        finally:
+            if self._changed:
+                self._changed = False
+                invalidate(self._topic_map_id)
+
+    def flush (self):
+        """Writes all queued many to many additions and change
+        journal entries to the database."""
+        pending = self._pending
+        self._pending = {}
+        for field, checked_rows, new_rows, seen in pending.values():
+            insert_join_rows(field, checked_rows)
+            insert_join_rows(field, new_rows, False)
+        changes = self._changes
+        self._changes = []
+        insert_changes(self._topic_map_id, changes)
+
+    def mark_changed (self):
+        """Notes that the topic map has been changed within this
+        batch.
+
+        The shared cache is invalidated at the first change, so that
+        this process does not read stale results within the batch,
+        and again when the batch finishes.
+
+        """
+        if not self._changed:
+            self._changed = True
+            invalidate(self._topic_map_id)
+
+
+def add_join_rows (model, field_name, topic_map_id, rows, new=False):
+    """Adds `rows` to the join table of the many to many field
+    `field_name` of `model`.
+
+    If a batch is active for the topic map with database ID
+    `topic_map_id`, the addition is queued until the batch is
+    flushed; otherwise the rows are inserted immediately. The caller
+    must already have checked that the topic map is writable.
+
+    :param model: the model defining the many to many field
+    :type model: class
+    :param field_name: the name of the many to many field
+    :type field_name: string
+    :param topic_map_id: the database ID of the topic map containing
+      the source objects
+    :type topic_map_id: integer
+    :param rows: pairs of source and target database IDs
+    :type rows: list of tuples
+    :param new: whether the source objects have just been created,
+      so that no rows for them can already exist
+    :type new: boolean
+
+    """
+    if not rows:
+        return
+    field = model._meta.get_field(field_name)
+    batch = _get_batches().get(topic_map_id)
+    if batch is None:
+        insert_join_rows(field, rows, not new)
+    else:
+        batch.add(field, rows, new)
+
+def add_m2m (instance, field_name, objs):
+    """Adds `objs` to the many to many field `field_name` of
+    `instance`.
+
+    If a batch is active for the topic map containing `instance`, the
+    addition is queued until the batch is flushed.
+
+    :param instance: the model instance to add to
+    :type instance: `Model`
+    :param field_name: the name of the many to many field
+    :type field_name: string
+    :param objs: the objects to add
+    :type objs: list of `Model`s
+
+    """
+    if not objs:
+        return
+    check_writable(instance)
+    # A TopicMap has no topic_map_id, being its own topic map.
+    topic_map_id = getattr(instance, 'topic_map_id', instance.pk)
+    batch = _get_batches().get(topic_map_id)
+    if batch is None:
+        getattr(instance, field_name).add(*objs)
+    else:
+        field = instance._meta.get_field(field_name)
+        batch.add(field, [(instance.pk, obj.pk) for obj in objs])
+
+def flush_batches ():
+    """Writes the queued additions of all batches active in the
+    current thread."""
+    batches = getattr(_local, 'batches', None)
+    if batches:
+        for batch in batches.values():
+            batch.flush()
+
+def get_batch (topic_map_id):
+    """Returns the batch active in the current thread for the topic
+    map with database ID `topic_map_id`.
+
+    :param topic_map_id: the database ID of a topic map
+    :type topic_map_id: integer
+    :rtype: `Batch` or None
+
+    """
+    return _get_batches().get(topic_map_id)
+
+def insert_changes (topic_map_id, entries):
+    """Inserts change journal `entries` for the topic map with
+    database ID `topic_map_id`, in order.
+
+    :param topic_map_id: the database ID of the topic map
+    :type topic_map_id: integer
+    :param entries: the construct identifier, kind and operation of
+      each entry
+    :type entries: list of tuples
+
+    """
+    if not entries:
+        return
+    opts = ChangeEntry._meta
+    qn = connection.ops.quote_name
+    sql = 'INSERT INTO %s (%s, %s, %s, %s) VALUES (%%s, %%s, %%s, %%s)' % (
+        qn(opts.db_table), qn(opts.get_field('topic_map').column),
+        qn(opts.get_field('construct_id').column),
+        qn(opts.get_field('kind').column),
+        qn(opts.get_field('operation').column))
+    rows = [(topic_map_id,) + tuple(entry) for entry in entries]
+    cursor = connection.cursor()
+    for start in range(0, len(rows), CHUNK_SIZE):
+        cursor.executemany(sql, rows[start:start+CHUNK_SIZE])
+    transaction.commit_unless_managed()
+
+def insert_join_rows (field, rows, check_existing=True):
+    """Inserts `rows` into the join table of the many to many `field`.
+
+    :param field: the many to many field
+    :type field: `ManyToManyField`
+    :param rows: pairs of source and target database IDs
+    :type rows: list of tuples
+    :param check_existing: whether to skip those rows that already
+      exist in the join table
+    :type check_existing: boolean
+
+    """
+    seen = set()
+    rows = [row for row in rows if not (row in seen or seen.add(row))]
+    if check_existing:
+        rows = _remove_existing_rows(field, rows)
+    if not rows:
+        return
+    qn = connection.ops.quote_name
+    sql = 'INSERT INTO %s (%s, %s) VALUES (%%s, %%s)' % (
+        qn(field.m2m_db_table()), qn(field.m2m_column_name()),
+        qn(field.m2m_reverse_name()))
+    cursor = connection.cursor()
+    for start in range(0, len(rows), CHUNK_SIZE):
+        cursor.executemany(sql, rows[start:start+CHUNK_SIZE])
+    transaction.commit_unless_managed()
+
+def _remove_existing_rows (field, rows):
+    """Returns those of `rows` that do not already exist in the join
+    table of the many to many `field`.
+
+    :param field: the many to many field
+    :type field: `ManyToManyField`
+    :param rows: pairs of source and target database IDs
+    :type rows: list of tuples
+    :rtype: list of tuples
+
+    """
+    if not rows:
+        return rows
+    through = field.rel.through
+    source_name = field.m2m_field_name()
+    target_name = field.m2m_reverse_field_name()
+    source_ids = set([row[0] for row in rows])
+    target_ids = set([row[1] for row in rows])
+    if len(source_ids) <= len(target_ids):
+        key, ids = source_name, list(source_ids)
+    else:
+        key, ids = target_name, list(target_ids)
+    existing = set()
+    for start in range(0, len(ids), CHUNK_SIZE):
+        existing.update(through.objects.filter(
+                **{'%s__in' % key: ids[start:start+CHUNK_SIZE]}).values_list(
+                source_name, target_name))
+    return [row for row in rows if row not in existing]
+
+def _get_batches ():
+    """Returns the dictionary of batches active in the current
+    thread, keyed by topic map database ID.
+
+    :rtype: dictionary
+
+    """
+    batches = getattr(_local, 'batches', None)
+    if batches is None:
+        batches = _local.batches = {}
+    return batches
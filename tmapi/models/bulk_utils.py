@@ -0,0 +1,136 @@
+# Copyright 2011 Jamie Norrish (jamie@artefact.org.nz)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module containing utility functions for inserting many rows at
+once.
+
+These functions bypass the models' save() methods (and Django's
+signals), so they must only be used where the caller takes care of
+everything save() would otherwise do.
+
+"""
+
+from django.db import DEFAULT_DB_ALIAS, connection, transaction
+from django.db.models import AutoField
+
+from batch import CHUNK_SIZE
+from identifier import Identifier
+from invalidation import invalidate_topic_map
+from journal import CREATE, get_kind, record_changes
+
+
+def bulk_insert (model, instances):
+    """Inserts unsaved `instances` of `model` using a single
+    executemany statement per chunk.
+
+    The primary keys of `instances` are not set.
+
+    :param model: the model class
+    :type model: class
+    :param instances: unsaved model instances
+    :type instances: list of `Model`s
+
+    """
+    if not instances:
+        return
+    fields = [field for field in model._meta.local_fields
+              if not isinstance(field, AutoField)]
+    qn = connection.ops.quote_name
+    sql = 'INSERT INTO %s (%s) VALUES (%s)' % (
+        qn(model._meta.db_table),
+        ', '.join([qn(field.column) for field in fields]),
+        ', '.join(['%s'] * len(fields)))
+    rows = []
+    for instance in instances:
+        rows.append([field.get_db_prep_save(field.pre_save(instance, True),
+                                            connection=connection)
+                     for field in fields])
+    cursor = connection.cursor()
+    for start in range(0, len(rows), CHUNK_SIZE):
+        cursor.executemany(sql, rows[start:start+CHUNK_SIZE])
+    transaction.commit_unless_managed()
+
+def create_identifiers (topic_map_id, count):
+    """Creates `count` `Identifier`s in the topic map with database ID
+    `topic_map_id`, returning their database IDs.
+
+    On PostgreSQL the identifiers are created with a multi-row INSERT
+    ... RETURNING statement per chunk. Other backends provide no
+    portable way to learn the IDs of rows inserted together, so the
+    identifiers are created one at a time. The caller must already
+    have checked that the topic map is writable.
+
+    :param topic_map_id: the database ID of the topic map
+    :type topic_map_id: integer
+    :param count: the number of identifiers to create
+    :type count: integer
+    :rtype: list of integers
+
+    """
+    ids = []
+    if connection.vendor == 'postgresql' and \
+            connection.features.can_return_id_from_insert:
+        qn = connection.ops.quote_name
+        opts = Identifier._meta
+        column = opts.get_field('containing_topic_map').column
+        cursor = connection.cursor()
+        for start in range(0, count, CHUNK_SIZE):
+            size = min(CHUNK_SIZE, count - start)
+            sql = 'INSERT INTO %s (%s) VALUES %s RETURNING %s' % (
+                qn(opts.db_table), qn(column), ', '.join(['(%s)'] * size),
+                qn(opts.pk.column))
+            cursor.execute(sql, [topic_map_id] * size)
+            ids.extend([row[0] for row in cursor.fetchall()])
+        transaction.commit_unless_managed()
+    else:
+        for i in range(count):
+            identifier = Identifier(containing_topic_map_id=topic_map_id)
+            identifier.save()
+            ids.append(identifier.pk)
+    return ids
+
+def insert_constructs (topic_map_id, model, instances):
+    """Inserts unsaved `instances` of the construct `model` in the
+    topic map with database ID `topic_map_id`, in bulk.
+
+    Unlike `bulk_insert`, the primary keys of `instances` are set,
+    being fetched by the identifiers created for them with a query
+    per chunk.
+
+    :param topic_map_id: the database ID of the topic map
+    :type topic_map_id: integer
+    :param model: the construct model class
+    :type model: class
+    :param instances: unsaved construct instances
+    :type instances: list of `Construct`s
+
+    """
+    if not instances:
+        return
+    identifier_ids = create_identifiers(topic_map_id, len(instances))
+    for instance, identifier_id in zip(instances, identifier_ids):
+        instance.identifier_id = identifier_id
+    bulk_insert(model, instances)
+    pks = {}
+    for start in range(0, len(identifier_ids), CHUNK_SIZE):
+        pks.update(model.objects.filter(
+                identifier__in=identifier_ids[start:start+CHUNK_SIZE])
+                   .values_list('identifier', 'pk'))
+    for instance in instances:
+        instance.pk = pks[instance.identifier_id]
+        instance._state.adding = False
+        instance._state.db = DEFAULT_DB_ALIAS
+    invalidate_topic_map(topic_map_id)
+    record_changes(topic_map_id, [(instance.identifier_id, get_kind(instance),
+                                   CREATE) for instance in instances])
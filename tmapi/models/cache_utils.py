@@ -0,0 +1,241 @@
+# Copyright 2011 Jamie Norrish (jamie@artefact.org.nz)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module providing an optional cache of lookups, shared between
+processes through Django's cache framework.
+
+When the TMAPI_CACHE setting names a cache (an alias in the CACHES
+setting), the results of the methods decorated with `shared` (lookups
+of topics and constructs by identifier, and the queries of the
+indices) are stored in that cache. A construct is stored as its model
+and database ID, and a `QuerySet` as its model and the database IDs of
+its results in order, so that a cached result is loaded with a single
+query by primary key, as an instance of the same (possibly proxy)
+model and, for a `QuerySet`, in the same order. A `QuerySet` with more
+than MAX_CACHED_RESULTS results is not cached at all, and is queried
+afresh on every call.
+
+Every key includes a version number per topic map, held in the cache
+itself. Changing a topic map (see `tmapi.models.invalidation`)
+increments its version, which invalidates all of its cached results at
+once, in every process. Within a batch the version is incremented at
+the first change and again once the batch's transaction has been
+committed, so that no process can cache a result read from the
+database before the commit under the new version.
+Changes made within a transaction managed by the caller rather than
+by a batch are only invalidated before the commit.
+
+"""
+
+import time
+
+from django.conf import settings
+from django.core.cache import get_cache
+from django.db.models import Model, get_model
+from django.db.models.query import QuerySet
+from django.utils.hashcompat import md5_constructor
+
+from read_only import get_argument_key
+
+
+# The largest number of results of a QuerySet that are cached; larger
+# results are not cached at all. This keeps the IN clause loading them
+# within the limits of SQLite.
+MAX_CACHED_RESULTS = 400
+
+# The cache backends in use, keyed by alias.
+_backends = {}
+
+# Marks a cached result of None.
+_NONE = 'none'
+
+
+def get_shared_cache ():
+    """Returns the cache named by the TMAPI_CACHE setting, or None if
+    the shared cache is not in use.
+
+    :rtype: cache backend or None
+
+    """
+    alias = getattr(settings, 'TMAPI_CACHE', None)
+    if alias is None:
+        return None
+    backend = _backends.get(alias)
+    if backend is None:
+        backend = _backends[alias] = get_cache(alias)
+    return backend
+
+def invalidate (topic_map_id):
+    """Invalidates the results cached for the topic map with database
+    ID `topic_map_id`, by incrementing its version.
+
+    :param topic_map_id: the database ID of the topic map
+    :type topic_map_id: integer
+
+    """
+    cache = get_shared_cache()
+    if cache is None:
+        return
+    key = _get_version_key(topic_map_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # The version is not in the cache. Any results cached under
+        # an earlier version are made unreachable by starting again
+        # from a version based on the time.
+        cache.set(key, _get_initial_version())
+
+def shared (method):
+    """Decorator storing the results of `method` in the shared cache,
+    if it is in use.
+
+    `method` must be a method of a `TopicMap`, or of an object with a
+    `topic_map` attribute (such as an `Index`), and must return a
+    construct, None or a `QuerySet`.
+
+    A cached `QuerySet` is returned with its results already loaded,
+    in their original order; filtering it further queries the
+    database afresh, without that order. A `QuerySet` with more than
+    MAX_CACHED_RESULTS results is not cached.
+
+    :param method: the method to decorate
+    :type method: function
+    :rtype: function
+
+    """
+    def wrapper (self, *args, **kwargs):
+        cache = get_shared_cache()
+        topic_map = getattr(self, 'topic_map', self)
+        if cache is None or topic_map.pk is None:
+            return method(self, *args, **kwargs)
+        key = _get_key(cache, topic_map.pk, (
+                self.__class__.__name__, method.__name__,
+                get_argument_key(args),
+                get_argument_key(sorted(kwargs.items()))))
+        value = cache.get(key)
+        if value == _NONE:
+            return None
+        if value is not None:
+            result = _load(value)
+            if result is not None:
+                return result
+        result = method(self, *args, **kwargs)
+        value = _dump(result)
+        if value is not None:
+            cache.set(key, value)
+        return result
+    wrapper.__name__ = method.__name__
+    wrapper.__doc__ = method.__doc__
+    return wrapper
+
+def _dump (result):
+    """Returns the form in which `result` is stored in the cache, or
+    None if it is not to be cached.
+
+    :param result: the result of a lookup
+    :type result: `Construct`, `QuerySet` or None
+    :rtype: string or tuple
+
+    """
+    if result is None:
+        return _NONE
+    if isinstance(result, Model):
+        return ('construct', _get_model_name(result), [result.pk])
+    if isinstance(result, QuerySet):
+        ids = list(result.values_list('pk', flat=True)[
+                :MAX_CACHED_RESULTS+1])
+        if len(ids) > MAX_CACHED_RESULTS:
+            return None
+        return ('queryset', _get_model_name(result.model), ids)
+    return None
+
+def _get_initial_version ():
+    """Returns a version number for a topic map whose version is not
+    in the cache, greater than any it can have had before.
+
+    :rtype: integer
+
+    """
+    return int(time.time() * 1000)
+
+def _get_key (cache, topic_map_id, lookup):
+    """Returns the cache key for `lookup` in the topic map with
+    database ID `topic_map_id`, at its current version.
+
+    :param cache: the shared cache
+    :type cache: cache backend
+    :param topic_map_id: the database ID of the topic map
+    :type topic_map_id: integer
+    :param lookup: the class, method and arguments of the lookup
+    :type lookup: tuple
+    :rtype: string
+
+    """
+    version_key = _get_version_key(topic_map_id)
+    version = cache.get(version_key)
+    if version is None:
+        version = _get_initial_version()
+        if not cache.add(version_key, version):
+            version = cache.get(version_key, version)
+    return 'tmapi:%d:%d:%s' % (topic_map_id, version,
+                               md5_constructor(repr(lookup)).hexdigest())
+
+def _get_model_name (model):
+    """Returns the application label and name of `model` (a model
+    class or instance), which may be a proxy model.
+
+    :param model: the model
+    :type model: class or `Model`
+    :rtype: tuple
+
+    """
+    return (model._meta.app_label, model._meta.object_name)
+
+def _get_version_key (topic_map_id):
+    """Returns the cache key of the version of the topic map with
+    database ID `topic_map_id`.
+
+    :param topic_map_id: the database ID of the topic map
+    :type topic_map_id: integer
+    :rtype: string
+
+    """
+    return 'tmapi:%d:version' % topic_map_id
+
+def _load (value):
+    """Returns the result stored in the cache as `value`, or None if
+    a construct it refers to no longer exists.
+
+    A `QuerySet` is returned with its results loaded, in the order of
+    the cached database IDs.
+
+    :param value: the form, model name and database IDs of a cached
+      construct or `QuerySet`
+    :type value: tuple
+    :rtype: `Construct`, `QuerySet` or None
+
+    """
+    form, model_name, ids = value
+    model = get_model(*model_name)
+    if model is None:
+        return None
+    queryset = model._default_manager.filter(pk__in=ids)
+    constructs = dict((construct.pk, construct) for construct in
+                      queryset.iterator())
+    if len(constructs) != len(set(ids)):
+        return None
+    if form == 'construct':
+        return constructs[ids[0]]
+    queryset._result_cache = [constructs[pk] for pk in ids]
+    return queryset
@@ -0,0 +1,74 @@
+# Copyright 2011 Jamie Norrish (jamie@artefact.org.nz)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from django.db import models
+
+
+class ChangeEntry (models.Model):
+
+    """An entry in the change journal of a topic map, recording that
+    an operation was performed on a construct.
+
+    The database ID of an entry is its sequence number; later entries
+    have higher sequence numbers.
+
+    """
+
+    topic_map = models.ForeignKey('TopicMap', related_name='change_entries')
+    # The identifier (see `Construct.get_id`) of the construct, which
+    # no longer exists if it has been removed.
+    construct_id = models.IntegerField()
+    kind = models.CharField(max_length=16)
+    operation = models.CharField(max_length=16)
+
+    class Meta:
+        app_label = 'tmapi'
+
+    def get_construct_id (self):
+        """Returns the identifier of the changed construct.
+
+        :rtype: integer
+
+        """
+        return self.construct_id
+
+    def get_kind (self):
+        """Returns the kind of the changed construct (eg, "topic" or
+        "name").
+
+        :rtype: string
+
+        """
+        return self.kind
+
+    def get_operation (self):
+        """Returns the operation performed on the construct (one of
+        the operations defined in `tmapi.models.journal`).
+
+        :rtype: string
+
+        """
+        return self.operation
+
+    def get_sequence (self):
+        """Returns the sequence number of this entry.
+
+        :rtype: integer
+
+        """
+        return self.pk
+
+    def __unicode__ (self):
+        return u'%d: %s %s %d' % (self.pk, self.operation, self.kind,
+                                  self.construct_id)
@@ -15,7 +15,13 @@
 from tmapi.exceptions import IdentityConstraintException, \
     ModelConstraintException
 
+from batch import add_m2m, flush_batches
 from item_identifier import ItemIdentifier
+from invalidation import invalidate_construct
+from iteration_utils import get_prefetched
+from journal import UPDATE, record_change, record_removal
+from proxy_utils import cast_related
+from read_only import check_writable
 
 
 class Construct (object):
@@ -43,6 +49,7 @@ class Construct (object):
         if item_identifier is None:
             raise ModelConstraintException(
                 self, 'The item identifier may not be None')
+        check_writable(self)
         address = item_identifier.to_external_form()
         topic_map = self.get_topic_map()
         try:
@@ -65,7 +72,9 @@ class Construct (object):
             ii = ItemIdentifier(address=address,
                                 containing_topic_map=topic_map)
             ii.save()
-            self.item_identifiers.add(ii)
+            add_m2m(self, 'item_identifiers', [ii])
+            invalidate_construct(self)
+            record_change(self, UPDATE)
 
     def get_id (self):
         """Returns the identifier of this construct.
@@ -86,7 +95,12 @@ class Construct (object):
         :rtype: `QuerySet` of `Locator`s
 
         """
-        return self.item_identifiers.all()
+        flush_batches()
+        item_identifiers = self.item_identifiers.all()
+        prefetched = get_prefetched(self, 'item_identifiers')
+        if prefetched is not None:
+            item_identifiers._result_cache = prefetched
+        return item_identifiers
     
     def get_parent (self):
         """Returns the parent of this construct.
@@ -103,14 +117,12 @@ class Construct (object):
 
         A `TopicMap` instance returns itself.
 
+        :param proxy: Django proxy model
+        :type proxy: class
         :rtype: `TopicMap`
 
         """
-        if proxy is None:
-            topic_map = self.topic_map
-        else:
-            topic_map = proxy.objects.get(pk=self.topic_map.id)
-        return topic_map
+        return cast_related(self, 'topic_map', proxy)
 
     def remove (self):
         """Deletes this construct from its parent container.
@@ -119,6 +131,10 @@ class Construct (object):
         undefined state and must not be used further.
 
         """
+        check_writable(self)
+        flush_batches()
+        invalidate_construct(self)
+        record_removal(self)
         # item identifiers are joined to a construct in a many to many
         # relationship, so they need to be explicitly deleted.
         self.get_item_identifiers().delete()
@@ -132,6 +148,7 @@ class Construct (object):
         :type item_identifier: `Locator`
 
         """
+        check_writable(self)
         address = item_identifier.to_external_form()
         try:
             topic_map = self.topic_map
@@ -140,6 +157,9 @@ class Construct (object):
         try:
             ii = ItemIdentifier.objects.get(
                 address=address, containing_topic_map=topic_map)
+            flush_batches()
             ii.delete()
+            invalidate_construct(self)
+            record_change(self, UPDATE)
         except ItemIdentifier.DoesNotExist:
             pass
@@ -14,7 +14,11 @@
 
 from django.db import models
 
+from construct_manager import ConstructManager
 from identifier import Identifier
+from invalidation import invalidate_construct
+from journal import CREATE, UPDATE, record_change
+from read_only import check_writable
 
 
 class BaseConstructFields (models.Model):
@@ -29,11 +33,15 @@ class BaseConstructFields (models.Model):
     item_identifiers = models.ManyToManyField('ItemIdentifier',
                                               related_name='%(class)s')
 
+    objects = ConstructManager()
+
     class Meta:
         abstract = True
         app_label = 'tmapi'
         
     def save (self, *args, **kwargs):
+        check_writable(self)
+        created = self.pk is None
         if not hasattr(self, 'identifier'):
             try:
                 topic_map = self.topic_map
@@ -52,6 +60,11 @@ class BaseConstructFields (models.Model):
             # set (see above), so set it once the TopicMap is saved.
             self.identifier.containing_topic_map = self
             self.identifier.save()
+        invalidate_construct(self)
+        if created:
+            record_change(self, CREATE)
+        else:
+            record_change(self, UPDATE)
 
 
 class ConstructFields (BaseConstructFields):
@@ -0,0 +1,295 @@
+# Copyright 2011 Jamie Norrish (jamie@artefact.org.nz)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module defining the manager and QuerySet used by all Topic Maps
+construct models."""
+
+from django.db import models
+from django.db.models import Model
+from django.db.models.query import QuerySet, ValuesListQuerySet, \
+    ValuesQuerySet
+
+from batch import CHUNK_SIZE, flush_batches
+from iteration_utils import iterate_keyset
+from proxy_utils import _is_proxy_for
+from read_only import MAP_NAME, mark_read_only
+from request_scope import get_request_scope
+
+
+class BatchFlushingMixin (object):
+
+    """Mixin for the QuerySets returned by `values()` and
+    `values_list()` on a `ConstructQuerySet`, which write any
+    additions queued by an active `Batch` before the query is run."""
+
+    def aggregate (self, *args, **kwargs):
+        flush_batches()
+        return super(BatchFlushingMixin, self).aggregate(*args, **kwargs)
+
+    def count (self):
+        flush_batches()
+        return super(BatchFlushingMixin, self).count()
+
+    def exists (self):
+        flush_batches()
+        return super(BatchFlushingMixin, self).exists()
+
+    def iterator (self):
+        flush_batches()
+        return super(BatchFlushingMixin, self).iterator()
+
+    def _clone (self, klass=None, setup=False, **kwargs):
+        return super(BatchFlushingMixin, self)._clone(
+            _get_flushing_class(klass), setup, **kwargs)
+
+
+class ConstructValuesQuerySet (BatchFlushingMixin, ValuesQuerySet):
+
+    """ValuesQuerySet for Topic Maps construct models."""
+
+
+class ConstructValuesListQuerySet (BatchFlushingMixin, ValuesListQuerySet):
+
+    """ValuesListQuerySet for Topic Maps construct models."""
+
+
+class ConstructQuerySet (QuerySet):
+
+    """QuerySet for Topic Maps construct models.
+
+    Any additions queued by an active `Batch` are written before the
+    query is run, so that the results reflect them; this includes
+    the queries of `values()` and `values_list()`. The constructs
+    returned while a `RequestScope` is active are registered with it.
+
+    The results of a QuerySet obtained through a read-only topic map
+    belong to it; see `tmapi.models.read_only`.
+
+    A field whose value is derived from others (such as a name's
+    `name_key`) names them in its `depends_on` attribute, and is
+    recomputed by `update()` when any of them is updated.
+
+    """
+
+    _read_only_map = None
+    _scoped = True
+
+    def aggregate (self, *args, **kwargs):
+        flush_batches()
+        return super(ConstructQuerySet, self).aggregate(*args, **kwargs)
+
+    def as_proxy (self, proxy):
+        """Returns a copy of this QuerySet whose results are
+        instances of the Django proxy model `proxy`.
+
+        The SQL is unchanged; only the class of the returned objects
+        differs.
+
+        :param proxy: Django proxy model
+        :type proxy: class or None
+        :rtype: `ConstructQuerySet`
+
+        """
+        clone = self._clone()
+        if proxy is not None:
+            if not _is_proxy_for(proxy, self.model):
+                raise TypeError('%s is not a proxy for %s' %
+                                (proxy.__name__, self.model.__name__))
+            clone.model = proxy
+        return clone
+
+    def count (self):
+        flush_batches()
+        return super(ConstructQuerySet, self).count()
+
+    def delete (self):
+        flush_batches()
+        super(ConstructQuerySet, self).delete()
+    delete.alters_data = True
+
+    def exists (self):
+        flush_batches()
+        return super(ConstructQuerySet, self).exists()
+
+    def iterator (self):
+        flush_batches()
+        iterator = super(ConstructQuerySet, self).iterator()
+        if self._read_only_map is not None:
+            iterator = self._mark_read_only(iterator)
+        scope = get_request_scope()
+        if scope is None or not self._scoped:
+            return iterator
+        return self._register(scope, iterator)
+
+    def keyset_iterator (self, batch_size=CHUNK_SIZE, after_id=None,
+                         prefetch=()):
+        """Returns a generator of the results of this QuerySet in
+        order of identifier (see `Construct.get_id`), reading
+        `batch_size` results at a time using keyset pagination; see
+        `tmapi.models.iteration_utils.iterate_keyset`.
+
+        :param batch_size: the number of results to read at a time
+        :type batch_size: integer
+        :param after_id: the identifier after which to start
+        :type after_id: integer
+        :param prefetch: the names of the fields whose values are
+          prefetched for each batch
+        :type prefetch: sequence of strings
+        :rtype: generator
+
+        """
+        return iterate_keyset(self, batch_size, after_id, prefetch)
+
+    def unscoped (self):
+        """Returns a copy of this QuerySet whose results are not
+        registered with the active `RequestScope`.
+
+        The request scope holds the constructs registered with it
+        until it ends, which suits the constructs a request works
+        with, but not those it merely passes over.
+
+        :rtype: `ConstructQuerySet`
+
+        """
+        clone = self._clone()
+        clone._scoped = False
+        return clone
+
+    def update (self, **kwargs):
+        flush_batches()
+        derived_fields = self._get_derived_fields(kwargs)
+        if not derived_fields:
+            return super(ConstructQuerySet, self).update(**kwargs)
+        instance = self._get_updated_instance(derived_fields, kwargs)
+        if instance is not None:
+            for field in derived_fields:
+                kwargs[field.attname] = field.pre_save(instance, False)
+            return super(ConstructQuerySet, self).update(**kwargs)
+        # The derived values depend on the current values of fields
+        # that are not being updated, and so are recomputed for each
+        # updated row.
+        pks = list(self.values_list('pk', flat=True))
+        rows = super(ConstructQuerySet, self).update(**kwargs)
+        manager = self.model._default_manager
+        for start in range(0, len(pks), CHUNK_SIZE):
+            updates = {}
+            for instance in manager.filter(
+                pk__in=pks[start:start+CHUNK_SIZE]).unscoped():
+                values = tuple([(field.attname, field.pre_save(instance,
+                                                               False))
+                                for field in derived_fields])
+                updates.setdefault(values, []).append(instance.pk)
+            for values, update_pks in updates.items():
+                manager.filter(pk__in=update_pks).update(**dict(values))
+        return rows
+    update.alters_data = True
+
+    def _clone (self, klass=None, setup=False, **kwargs):
+        clone = super(ConstructQuerySet, self)._clone(
+            _get_flushing_class(klass), setup, **kwargs)
+        setattr(clone, MAP_NAME, self._read_only_map)
+        clone._scoped = self._scoped
+        return clone
+
+    def _get_derived_fields (self, kwargs):
+        """Returns the fields of this QuerySet's model whose values
+        are derived from any of the fields updated with `kwargs`.
+
+        :param kwargs: the arguments to `update()`
+        :type kwargs: dictionary
+        :rtype: list of `Field`s
+
+        """
+        derived_fields = []
+        for field in self.model._meta.local_fields:
+            for name in getattr(field, 'depends_on', ()):
+                dependency = self.model._meta.get_field(name)
+                if dependency.name in kwargs or dependency.attname in kwargs:
+                    derived_fields.append(field)
+                    break
+        return derived_fields
+
+    def _get_updated_instance (self, derived_fields, kwargs):
+        """Returns an unsaved instance of this QuerySet's model
+        holding the values updated with `kwargs`, or None if they do
+        not include all of the fields that `derived_fields` depend on.
+
+        :param derived_fields: the fields to be recomputed
+        :type derived_fields: list of `Field`s
+        :param kwargs: the arguments to `update()`
+        :type kwargs: dictionary
+        :rtype: `Model` or None
+
+        """
+        instance = self.model()
+        for field in derived_fields:
+            for name in field.depends_on:
+                dependency = self.model._meta.get_field(name)
+                if dependency.name in kwargs:
+                    value = kwargs[dependency.name]
+                elif dependency.attname in kwargs:
+                    value = kwargs[dependency.attname]
+                else:
+                    return None
+                if isinstance(value, Model):
+                    value = value.pk
+                setattr(instance, dependency.attname, value)
+        return instance
+
+    def _mark_read_only (self, iterator):
+        """Yields the results of `iterator`, marked as belonging to
+        this QuerySet's read-only topic map."""
+        for obj in iterator:
+            yield mark_read_only(self._read_only_map, obj)
+
+    def _register (self, scope, iterator):
+        """Yields the results of `iterator`, registering each with
+        the request `scope`."""
+        for obj in iterator:
+            scope.add(obj)
+            yield obj
+
+
+def _get_flushing_class (klass):
+    """Returns the QuerySet class to be used in place of `klass`, so
+    that the queries of `values()` and `values_list()` write any
+    queued additions.
+
+    :param klass: the QuerySet class, or None
+    :type klass: class
+    :rtype: class
+
+    """
+    return {ValuesQuerySet: ConstructValuesQuerySet,
+            ValuesListQuerySet: ConstructValuesListQuerySet}.get(klass, klass)
+
+
+class ConstructManager (models.Manager):
+
+    """Manager for Topic Maps construct models.
+
+    Because Django creates related managers as subclasses of a
+    model's default manager, the QuerySets returned by related
+    managers (eg, `topic.names`) also support `as_proxy()`.
+
+    """
+
+    def as_proxy (self, proxy):
+        return self.get_query_set().as_proxy(proxy)
+
+    def get_query_set (self):
+        queryset = ConstructQuerySet(self.model, using=self._db)
+        # Set on related managers reached from a read-only topic map.
+        setattr(queryset, MAP_NAME, getattr(self, MAP_NAME, None))
+        return queryset
@@ -22,12 +22,22 @@ project (http://tinytim.sourceforget.net/).
 
 """
 
+from association import Association
+from batch import CHUNK_SIZE
+from locator import Locator
+from name import Name
+from name_merge_utils import defer_name_merging
+from occurrence import Occurrence
+from role import Role
+from subject_identifier import SubjectIdentifier
+from subject_locator import SubjectLocator
 from topic import Topic
-from merge_utils import move_role_characteristics
-from signature import generate_association_signature, generate_name_signature, \
-    generate_occurrence_signature, generate_variant_signature
+from variant import Variant
+from signature import generate_name_signature, generate_occurrence_signature, \
+    generate_variant_signature
 
-def copy (source, target):
+@defer_name_merging
+def copy (source, target, merge_map=None):
     """Copies the topics and associations from the `source` to the
     `target` topic map.
 
@@ -35,45 +45,137 @@ def copy (source, target):
     :type source: `TopicMap`
     :param target: the topic map to receive the topics and associations
     :type target: `TopicMap`
+    :param merge_map: the topics of `source` mapped to the topics of
+      `target` they are to be merged with, if already known (eg, from
+      a `MergePlan`)
+    :type merge_map: dictionary
 
     """
     if source == target:
         return
-    merge_map = {}
-    for topic in source.get_topics():
-        for slo in topic.get_subject_locators():
-            existing = target.get_topic_by_subject_locator(slo)
-            if existing is not None:
-                _add_merge(topic, existing, merge_map)
-        for sid in topic.get_subject_identifiers():
-            existing = target.get_topic_by_subject_identifier(sid)
-            if existing is not None:
-                _add_merge(topic, existing, merge_map)
-            existing_construct = target.get_construct_by_item_identifier(sid)
-            if isinstance(existing_construct, Topic):
-                _add_merge(topic, existing_construct, merge_map)
-        for iid in topic.get_item_identifiers():
-            existing_construct = target.get_construct_by_item_identifier(iid)
-            if isinstance(existing_construct, Topic):
-                _add_merge(topic, existing_construct, merge_map)
-            existing = target.get_topic_by_subject_identifier(iid)
-            if existing is not None:
-                _add_merge(topic, existing, merge_map)
-    source_reifier = source.get_reifier()
-    target_reifier = target.get_reifier()
-    if source_reifier is not None and target_reifier is not None:
-        _add_merge(source_reifier, target_reifier, merge_map)
+    topics = dict([(topic.pk, topic) for topic in source.get_topics()])
+    if merge_map is None:
+        merge_map = {}
+        # Target topics merged into another, mapped to the topic they
+        # were merged into.
+        merged = {}
+        _add_identity_merges(source, target, topics, None, merge_map, merged)
+        _add_reifier_merge(source, target, merge_map, merged)
+    merges = merge_map.items()
     for topic in source.get_topics():
         if topic not in merge_map:
             _copy_topic(topic, target, merge_map)
-    for topic in merge_map:
-        target_topic = merge_map.get(topic)
+    for topic, target_topic in merges:
+        _copy_identities(topic, target_topic)
+        _copy_types(topic, target_topic, merge_map)
+        _copy_characteristics(topic, target_topic, merge_map)
+    association_ids = list(source.get_associations().values_list(
+            'pk', flat=True))
+    _copy_associations(source, target, association_ids, topics, merge_map)
+
+@defer_name_merging
+def copy_changes (source, target, topic_ids, association_ids):
+    """Copies the topics with database IDs `topic_ids` and the
+    associations with database IDs `association_ids` from the `source`
+    to the `target` topic map, merging as `copy` does.
+
+    Only those topics and associations, and the topics they refer to,
+    are read from `source`, with a query per chunk rather than per
+    construct. A referenced topic that is matched by identity to a
+    topic in `target` is not itself copied.
+
+    :param source: the topic map to take the topics and associations from
+    :type source: `TopicMap`
+    :param target: the topic map to receive the topics and associations
+    :type target: `TopicMap`
+    :param topic_ids: the database IDs of the topics to copy
+    :type topic_ids: list of integers
+    :param association_ids: the database IDs of the associations to copy
+    :type association_ids: list of integers
+
+    """
+    if source == target:
+        return
+    merge_map = {}
+    merged = {}
+    topic_ids = set(topic_ids)
+    association_ids = list(association_ids)
+    topics = {}
+    # Topics whose references have been added to those to be read.
+    expanded = set(topic_ids)
+    pending = topic_ids | _get_topic_references(topic_ids) | \
+        _get_association_references(association_ids)
+    while pending:
+        pending = list(pending)
+        for start in range(0, len(pending), CHUNK_SIZE):
+            topics.update([(topic.pk, topic) for topic in
+                           source.get_topics().filter(
+                        pk__in=pending[start:start+CHUNK_SIZE])])
+        _add_identity_merges(source, target, topics, pending, merge_map,
+                             merged)
+        # A topic that is not in target is copied with its types and
+        # characteristics, so the topics they refer to are needed too.
+        unmatched = set([pk for pk in pending if pk in topics and
+                         topics[pk] not in merge_map]) - expanded
+        expanded.update(unmatched)
+        pending = _get_topic_references(unmatched) - set(topics)
+    _add_reifier_merge(source, target, merge_map, merged)
+    changed = [topics[pk] for pk in topic_ids if pk in topics]
+    merges = [(topic, merge_map[topic]) for topic in changed
+              if topic in merge_map]
+    for topic in changed:
+        if topic not in merge_map:
+            _copy_topic(topic, target, merge_map)
+    for topic, target_topic in merges:
         _copy_identities(topic, target_topic)
         _copy_types(topic, target_topic, merge_map)
         _copy_characteristics(topic, target_topic, merge_map)
-    _copy_associations(source, target, merge_map)
+    _copy_associations(source, target, association_ids, topics, merge_map)
+
+def _add_identity_merges (source, target, topics, topic_ids, merge_map,
+                          merged):
+    """Adds a mapping into `merge_map` for each of the `topics` that
+    shares an identity with a topic in `target`.
+
+    :param source: the topic map containing `topics`
+    :type source: `TopicMap`
+    :param target: the topic map to resolve the identities in
+    :type target: `TopicMap`
+    :param topics: source topics keyed by database ID
+    :type topics: dictionary
+    :param topic_ids: the database IDs of the topics whose identities
+      are to be resolved, or None for all topics in `source`
+    :type topic_ids: list of integers or None
+    :param merge_map: the map that holds the merge mappings
+    :type merge_map: dictionary
+    :param merged: the target topics already merged into another
+      target topic, mapped to that topic
+    :type merged: dictionary
 
-def _add_merge (source, target, merge_map):
+    """
+    subject_locators = _get_topic_rows(
+        SubjectLocator.objects.filter(containing_topic_map=source),
+        'topic', topic_ids, ('topic', 'address'))
+    existing = _get_topics_by_subject_locator(
+        target, [address for topic_id, address in subject_locators])
+    for topic_id, address in subject_locators:
+        if address in existing:
+            _add_merge(topics[topic_id], existing[address], merge_map, merged)
+    identities = _get_topic_rows(
+        SubjectIdentifier.objects.filter(containing_topic_map=source),
+        'topic', topic_ids, ('topic', 'address'))
+    identities.extend(_get_topic_rows(
+            Topic.item_identifiers.through.objects.filter(
+                topic__topic_map=source), 'topic', topic_ids,
+            ('topic', 'itemidentifier__address')))
+    locators = [Locator(address) for topic_id, address in identities]
+    resolved = target.resolve_identities(locators)
+    for (topic_id, address), locator in zip(identities, locators):
+        for construct in resolved[locator.to_external_form()]:
+            if isinstance(construct, Topic):
+                _add_merge(topics[topic_id], construct, merge_map, merged)
+
+def _add_merge (source, target, merge_map, merged):
     """Adds a mapping from `source` to `target` into the `merge_map`.
 
     If `source` already has a mapping to another target topic,
@@ -85,53 +187,127 @@ def _add_merge (source, target, merge_map):
     :type target: `Topic`
     :param merge_map: the map that holds the merge mappings
     :type merge_map: dictionary
+    :param merged: the target topics already merged into another
+      target topic, mapped to that topic
+    :type merged: dictionary
 
     """
+    while target in merged:
+        target = merged[target]
     previous_target = merge_map.get(source)
     if previous_target is not None:
         if previous_target != target:
             previous_target.merge_in(target)
+            merged[target] = previous_target
+            for other_source, other_target in merge_map.items():
+                if other_target == target:
+                    merge_map[other_source] = previous_target
     else:
         merge_map[source] = target
 
-def _copy_associations (source, target, merge_map):
-    """Copies the associations from `source` topic map to `target`
-    topic map.
+def _add_reifier_merge (source, target, merge_map, merged):
+    """Adds a mapping from the reifier of the `source` topic map to
+    the reifier of the `target` topic map into the `merge_map`, if
+    both are reified.
+
+    :param source: the source topic map
+    :type source: `TopicMap`
+    :param target: the target topic map
+    :type target: `TopicMap`
+    :param merge_map: the map that holds the merge mappings
+    :type merge_map: dictionary
+    :param merged: the target topics already merged into another
+      target topic, mapped to that topic
+    :type merged: dictionary
+
+    """
+    source_reifier = source.get_reifier()
+    target_reifier = target.get_reifier()
+    if source_reifier is not None and target_reifier is not None:
+        _add_merge(source_reifier, target_reifier, merge_map, merged)
+
+def _copy_associations (source, target, association_ids, topics, merge_map):
+    """Copies the associations with database IDs `association_ids`
+    from `source` topic map to `target` topic map.
+
+    The associations are read, and created in `target` (reusing any
+    existing association with the same signature), in bulk.
 
     :param source: the topic map to take the associations from
     :type source: `TopicMap`
     :param target: the topic map that receives the associations
     :type target: `TopicMap`
+    :param association_ids: the database IDs of the associations
+    :type association_ids: list of integers
+    :param topics: the source topics referenced by the associations,
+      keyed by database ID
+    :type topics: dictionary
     :param merge_map: the map that holds the merge mappings
     :type merge_map: dictionary
 
     """
-    signatures = {}
-    for association in target.get_associations():
-        signature = generate_association_signature(association)
-        signatures[signature] = association
-    for association in source.get_associations():
-        association_type = _copy_type(association, target, merge_map)
-        scope = _copy_scope(association, target, merge_map)
-        target_association = target.create_association(association_type, scope)
-        for role in association.get_roles():
-            role_type = _copy_type(role, target, merge_map)
-            source_player = role.get_player()
-            if source_player in merge_map:
-                player = merge_map.get(source_player)
-            else:
-                player = _copy_topic(source_player, target, merge_map)
-            target_role = target_association.create_role(role_type, player)
-            _copy_item_identifiers(role, target_role)
-            _copy_reifier(role, target_role, merge_map)
-        signature = generate_association_signature(target_association)
-        existing = signatures.get(signature)
-        if existing is not None:
-            move_role_characteristics(target_association, existing)
-            target_association.remove()
-            target_association = existing
-        _copy_reifier(association, target_association, merge_map)
-        _copy_item_identifiers(association, target_association)
+    associations = []
+    scopes = {}
+    roles = {}
+    item_identifiers = {}
+    for start in range(0, len(association_ids), CHUNK_SIZE):
+        chunk = association_ids[start:start+CHUNK_SIZE]
+        for association in source.get_associations().filter(pk__in=chunk):
+            associations.append(association)
+            scopes[association.pk] = []
+            roles[association.pk] = []
+        for association_id, theme_id in _get_scope_rows(Association, 'pk',
+                                                        chunk):
+            scopes[association_id].append(theme_id)
+        for role in Role.objects.filter(association__in=chunk):
+            roles[role.association_id].append(role)
+        rows = Association.item_identifiers.through.objects.filter(
+            association__in=chunk).values_list('association',
+                                               'itemidentifier__address')
+        for association_id, address in rows:
+            item_identifiers.setdefault(('association', association_id),
+                                        []).append(address)
+        rows = Role.item_identifiers.through.objects.filter(
+            role__association__in=chunk).values_list(
+            'role', 'itemidentifier__address')
+        for role_id, address in rows:
+            item_identifiers.setdefault(('role', role_id), []).append(address)
+    get_topic = lambda pk: _get_target_topic(topics[pk], target, merge_map)
+    specs = []
+    for association in associations:
+        specs.append((get_topic(association.type_id),
+                      [get_topic(pk) for pk in scopes[association.pk]],
+                      [(get_topic(role.type_id), get_topic(role.player_id))
+                       for role in roles[association.pk]]))
+    target_associations = target.create_associations(specs, dedupe=True)
+    # Roles with characteristics to copy, keyed by the target
+    # association and the target role type and player.
+    role_copies = {}
+    for association, target_association in zip(associations,
+                                                target_associations):
+        if association.reifier_id is not None:
+            target_association.set_reifier(
+                get_topic(association.reifier_id))
+        for address in item_identifiers.get(('association', association.pk),
+                                            []):
+            target_association.add_item_identifier(Locator(address))
+        for role in roles[association.pk]:
+            if role.reifier_id is not None or \
+                    ('role', role.pk) in item_identifiers:
+                key = (target_association.pk, get_topic(role.type_id).pk,
+                       get_topic(role.player_id).pk)
+                role_copies.setdefault(key, []).append(role)
+    target_association_ids = list(set([key[0] for key in role_copies]))
+    for start in range(0, len(target_association_ids), CHUNK_SIZE):
+        for target_role in Role.objects.filter(
+            association__in=target_association_ids[start:start+CHUNK_SIZE]):
+            key = (target_role.association_id, target_role.type_id,
+                   target_role.player_id)
+            for role in role_copies.pop(key, []):
+                if role.reifier_id is not None:
+                    target_role.set_reifier(get_topic(role.reifier_id))
+                for address in item_identifiers.get(('role', role.pk), []):
+                    target_role.add_item_identifier(Locator(address))
 
 def _copy_characteristics (topic, target_topic, merge_map):
     """Copies the occurrences and names from `topic` to the `target_topic`.
@@ -263,6 +439,9 @@ def _copy_topic (topic, target, merge_map):
 
     """
     target_topic = target.create_empty_topic()
+    # Record the copy before copying the topic's characteristics, so
+    # that a topic used as a type or theme is copied only once.
+    merge_map[topic] = target_topic
     _copy_identities(topic, target_topic)
     _copy_types(topic, target_topic, merge_map)
     _copy_characteristics(topic, target_topic, merge_map)
@@ -301,7 +480,7 @@ def _copy_types (topic, target_topic, merge_map):
     for topic_type in topic.get_types():
         target_type = merge_map.get(topic_type)
         if target_type is None:
-            target_type = _copy_topic(type, target_topic.get_topic_map(),
+            target_type = _copy_topic(topic_type, target_topic.get_topic_map(),
                                       merge_map)
         target_topic.add_type(target_type)
 
@@ -332,3 +511,162 @@ def _copy_variants (source, target, merge_map):
             target_variant = existing
         _copy_reifier(variant, target_variant, merge_map)
         _copy_item_identifiers(variant, target_variant)
+
+def _get_association_references (association_ids):
+    """Returns the database IDs of the topics referred to by the
+    associations with database IDs `association_ids`, and by their
+    roles, as types, themes, players and reifiers.
+
+    :param association_ids: the database IDs of the associations
+    :type association_ids: list of integers
+    :rtype: set of integers
+
+    """
+    references = set()
+    association_ids = list(association_ids)
+    references.update(_get_references(Association, 'pk', association_ids,
+                                      ('type', 'reifier')))
+    references.update(_get_references(Role, 'association', association_ids,
+                                      ('type', 'player', 'reifier')))
+    references.update([theme_id for association_id, theme_id in
+                       _get_scope_rows(Association, 'pk', association_ids)])
+    return references
+
+def _get_references (model, key, ids, fields):
+    """Returns the non-null values of `fields` of the instances of
+    `model` whose `key` is one of `ids`.
+
+    :param model: the model class
+    :type model: class
+    :param key: the name of the field to filter on
+    :type key: string
+    :param ids: the values of `key` to select
+    :type ids: list of integers
+    :param fields: the names of the foreign key fields
+    :type fields: tuple of strings
+    :rtype: set of integers
+
+    """
+    references = set()
+    for start in range(0, len(ids), CHUNK_SIZE):
+        for row in model.objects.filter(**{
+                '%s__in' % key: ids[start:start+CHUNK_SIZE]}).values_list(
+            *fields):
+            references.update(row)
+    references.discard(None)
+    return references
+
+def _get_scope_rows (model, key, ids):
+    """Returns the (construct, theme) database ID pairs of the scopes
+    of the instances of the scoped `model` whose `key` is one of
+    `ids`.
+
+    :param model: the scoped model class
+    :type model: class
+    :param key: the name of the field to filter on
+    :type key: string
+    :param ids: the values of `key` to select
+    :type ids: list of integers
+    :rtype: list of tuples
+
+    """
+    field = model._meta.get_field('scope')
+    source_name = field.m2m_field_name()
+    theme_name = field.m2m_reverse_field_name()
+    rows = []
+    for start in range(0, len(ids), CHUNK_SIZE):
+        rows.extend(field.rel.through.objects.filter(**{
+                    '%s__%s__in' % (source_name, key):
+                        ids[start:start+CHUNK_SIZE]}).values_list(
+                source_name, theme_name))
+    return rows
+
+def _get_target_topic (topic, target, merge_map):
+    """Returns the topic in the `target` topic map corresponding to
+    `topic`, copying `topic` if there is none.
+
+    :param topic: the source topic
+    :type topic: `Topic`
+    :param target: the target topic map
+    :type target: `TopicMap`
+    :param merge_map: the map that holds the merge mappings
+    :type merge_map: dictionary
+    :rtype: `Topic`
+
+    """
+    if topic in merge_map:
+        return merge_map.get(topic)
+    return _copy_topic(topic, target, merge_map)
+
+def _get_topic_references (topic_ids):
+    """Returns the database IDs of the topics referred to by the
+    topics with database IDs `topic_ids`, as types, and by their
+    names, variants and occurrences, as types, themes and reifiers.
+
+    :param topic_ids: the database IDs of the topics
+    :type topic_ids: set of integers
+    :rtype: set of integers
+
+    """
+    references = set()
+    topic_ids = list(topic_ids)
+    types_field = Topic._meta.get_field('types')
+    for start in range(0, len(topic_ids), CHUNK_SIZE):
+        references.update(types_field.rel.through.objects.filter(**{
+                    '%s__in' % types_field.m2m_field_name():
+                        topic_ids[start:start+CHUNK_SIZE]}).values_list(
+                types_field.m2m_reverse_field_name(), flat=True))
+    for model, key in ((Name, 'topic'), (Occurrence, 'topic'),
+                       (Variant, 'name__topic')):
+        fields = ('reifier',)
+        if model is not Variant:
+            fields = ('type', 'reifier')
+        references.update(_get_references(model, key, topic_ids, fields))
+        references.update([theme_id for construct_id, theme_id in
+                           _get_scope_rows(model, key, topic_ids)])
+    return references
+
+def _get_topic_rows (queryset, key, topic_ids, fields):
+    """Returns the values of `fields` of the rows in `queryset`
+    whose `key` is one of `topic_ids`.
+
+    :param queryset: the rows to select from
+    :type queryset: `QuerySet`
+    :param key: the name of the field referring to the topic
+    :type key: string
+    :param topic_ids: the database IDs of the topics, or None for all
+      rows in `queryset`
+    :type topic_ids: list of integers or None
+    :param fields: the names of the fields to return
+    :type fields: tuple of strings
+    :rtype: list of tuples
+
+    """
+    if topic_ids is None:
+        return list(queryset.values_list(*fields))
+    rows = []
+    for start in range(0, len(topic_ids), CHUNK_SIZE):
+        rows.extend(queryset.filter(**{
+                    '%s__in' % key: topic_ids[start:start+CHUNK_SIZE]})
+                    .values_list(*fields))
+    return rows
+
+def _get_topics_by_subject_locator (topic_map, addresses):
+    """Returns the topics in `topic_map` having each of `addresses`
+    as a subject locator, keyed by address.
+
+    :param topic_map: the topic map containing the topics
+    :type topic_map: `TopicMap`
+    :param addresses: external forms of subject locators
+    :type addresses: list of strings
+    :rtype: dictionary
+
+    """
+    topics = {}
+    for start in range(0, len(addresses), CHUNK_SIZE):
+        for subject_locator in SubjectLocator.objects.filter(
+            containing_topic_map=topic_map,
+            address__in=addresses[start:start+CHUNK_SIZE]).select_related(
+            'topic'):
+            topics[subject_locator.address] = subject_locator.topic
+    return topics
@@ -0,0 +1,490 @@
+# Copyright 2011 Jamie Norrish (jamie@artefact.org.nz)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module containing a pipeline for importing many topics into a
+topic map in parallel.
+
+An import is divided between processes in two stages. First, the IRI
+references identifying the topics are normalised by a pool of
+processes. Then the topics are grouped by the identities they
+share, and the groups are divided into partitions by a hash of their
+identities, so that each identity is the concern of exactly one
+partition. Each partition is written by a process with its own
+database connection. The topics of a group are merged before they
+are written, and topics are matched with those already in the topic
+map with a single query per chunk of identities.
+
+An identity that matches an existing construct is deferred to a
+final pass in the calling process, which adds it through the
+ordinary TMAPI methods, merging topics as necessary.
+
+"""
+
+import multiprocessing
+import zlib
+
+from django.db import connection, transaction
+
+from tmapi.constants import AUTOMERGE_FEATURE_STRING
+from tmapi.exceptions import IdentityConstraintException, \
+    ModelConstraintException, TMAPIRuntimeException
+
+from batch import CHUNK_SIZE, insert_join_rows
+from bulk_utils import bulk_insert, create_identifiers
+from invalidation import invalidate_topic_map
+from item_identifier import ItemIdentifier
+from journal import CREATE, UPDATE, record_changes, record_changes_by_pk
+from locator import Locator, LocatorBase
+from subject_identifier import SubjectIdentifier
+from subject_locator import SubjectLocator
+from topic import Topic
+from transaction_utils import retry_on_conflict
+
+
+# The relations of a topic to its identities, in the order in which
+# they are given in an import spec.
+RELATIONS = ('item_identifiers', 'subject_identifiers', 'subject_locators')
+
+
+def import_topics (topic_map, specs, processes=1, partitions=None):
+    """Returns a `Topic` in `topic_map` for each of the specified
+    (`item_identifiers`, `subject_identifiers`, `subject_locators`)
+    tuples, where each item is a list of IRI references or `Locator`s.
+
+    Each topic has all of the identities given in its spec. Topics
+    are created where necessary, and merged where their identities
+    require it. If the "automerge" feature is disabled, an
+    `IdentityConstraintException` is raised, before anything is
+    written, when a spec joins topics that earlier specs would
+    create separately.
+
+    With more than one process, the work is done by a pool of
+    processes, each using its own database connection. This
+    requires that the import is not made within a transaction, and
+    that the database is one that other connections can see (not an
+    in-memory SQLite database). The writes of each partition are
+    committed separately.
+
+    :param topic_map: the topic map to import into
+    :type topic_map: `TopicMap`
+    :param specs: the identities of each topic to be imported
+    :type specs: list of tuples
+    :param processes: the number of processes to use
+    :type processes: integer
+    :param partitions: the number of partitions the topics are
+      divided into (defaults to the number of processes)
+    :type partitions: integer
+    :rtype: list of `Topic`s
+
+    """
+    specs = list(specs)
+    if partitions is None:
+        partitions = processes
+    pool = None
+    if processes > 1:
+        if transaction.is_managed():
+            raise TMAPIRuntimeException(
+                'A parallel import may not be made within a transaction')
+        # Each process must open its own database connection rather
+        # than share the one it would otherwise inherit.
+        connection.close()
+        pool = multiprocessing.Pool(processes)
+    try:
+        if pool is None:
+            identities = map(_normalise_spec, specs)
+        else:
+            identities = pool.map(_normalise_spec, specs,
+                                  max(1, len(specs) // (processes * 4)))
+        # Group the specs that share an identity, so that every
+        # identity is written by the partition of its group.
+        automerge = topic_map.topic_map_system.get_feature(
+            AUTOMERGE_FEATURE_STRING)
+        parents = {}
+        for spec_identities in identities:
+            if not spec_identities:
+                raise ModelConstraintException(
+                    topic_map, 'A topic to be imported must have an identity')
+            joined = _join_keys(parents, [_get_match_key(*identity) for
+                                          identity in spec_identities])
+            if joined is not None and not automerge:
+                raise IdentityConstraintException(
+                    topic_map, None, _get_locator(joined[1]), 'Topics to be imported share an identity with different topics and automerge is disabled')
+        entries = [[] for i in range(partitions)]
+        for index, spec_identities in enumerate(identities):
+            owner = _get_partition(_find_root(
+                    parents, _get_match_key(*spec_identities[0])), partitions)
+            entries[owner].append((index, spec_identities))
+        if pool is None:
+            results = [retry_on_conflict(_write_partition, topic_map,
+                                         partition_entries)
+                       for partition_entries in entries]
+        else:
+            results = pool.map(_write_partition_by_id,
+                               [(topic_map.__class__, topic_map.pk,
+                                 partition_entries)
+                                for partition_entries in entries], 1)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    topic_ids = {}
+    deferred = []
+    for partition_topic_ids, partition_deferred in results:
+        topic_ids.update(partition_topic_ids)
+        deferred.extend(partition_deferred)
+    replaced = _reconcile(topic_map, topic_ids, deferred)
+    ids = [_get_replacement(replaced, topic_ids[index]) for index
+           in range(len(specs))]
+    unique_ids = list(set(ids))
+    topics = {}
+    for start in range(0, len(unique_ids), CHUNK_SIZE):
+        topics.update(Topic.objects.in_bulk(
+                unique_ids[start:start+CHUNK_SIZE]))
+    return [topics[topic_id] for topic_id in ids]
+
+def _find_root (parents, key):
+    """Returns the key representing the group that `key` belongs to.
+
+    :param parents: the parent of each key
+    :type parents: dictionary
+    :param key: the key to find the group of
+    :type key: tuple
+    :rtype: tuple
+
+    """
+    while parents[key] != key:
+        parents[key] = parents[parents[key]]
+        key = parents[key]
+    return key
+
+def _get_existing_matches (topic_map, keys):
+    """Returns the database IDs of the topics in `topic_map` matching
+    each of the match `keys` that any construct matches.
+
+    The value for a key matching the item identifier of a construct
+    other than a topic is None.
+
+    :param topic_map: the topic map to search
+    :type topic_map: `TopicMap`
+    :param keys: the match keys of identities
+    :type keys: list of tuples
+    :rtype: dictionary
+
+    """
+    existing = {}
+    addresses = [address for is_locator, address in keys if not is_locator]
+    matches = topic_map.resolve_identities(
+        [_get_locator(address) for address in addresses])
+    for address in addresses:
+        topic, construct = matches[address]
+        if topic is not None:
+            existing[(False, address)] = topic.pk
+        elif construct is not None:
+            if isinstance(construct, Topic):
+                existing[(False, address)] = construct.pk
+            else:
+                existing[(False, address)] = None
+    addresses = [address for is_locator, address in keys if is_locator]
+    for start in range(0, len(addresses), CHUNK_SIZE):
+        for address, topic_id in SubjectLocator.objects.filter(
+            address__in=addresses[start:start+CHUNK_SIZE],
+            containing_topic_map=topic_map).values_list('address', 'topic'):
+            existing[(True, address)] = topic_id
+    return existing
+
+def _get_match_key (relation, address):
+    """Returns the key by which identities that match each other are
+    found.
+
+    Subject identifiers and item identifiers match each other; subject
+    locators match only subject locators.
+
+    :param relation: the relation of the identity to its topic
+    :type relation: string
+    :param address: the external form of the identity
+    :type address: string
+    :rtype: tuple
+
+    """
+    return (relation == 'subject_locators', address)
+
+def _get_locator (address):
+    """Returns a `Locator` for the IRI whose external form is
+    `address`, without normalising it again.
+
+    :param address: the external form of an IRI
+    :type address: string
+    :rtype: `Locator`
+
+    """
+    locator = Locator.__new__(Locator)
+    locator.generate_forms_from_external(address)
+    return locator
+
+def _get_matching_topic (topic_map, relation, address):
+    """Returns the topic in `topic_map` that would be merged with a
+    topic gaining the identity `address` in `relation`.
+
+    :param topic_map: the topic map to search
+    :type topic_map: `TopicMap`
+    :param relation: the relation of the identity to its topic
+    :type relation: string
+    :param address: the external form of the identity
+    :type address: string
+    :rtype: `Topic` or None
+
+    """
+    if relation == 'subject_locators':
+        try:
+            return topic_map._get_topic_by_address(relation, address)
+        except Topic.DoesNotExist:
+            return None
+    topic, construct = topic_map.resolve_identity(_get_locator(address))
+    if topic is None and isinstance(construct, Topic):
+        topic = construct
+    return topic
+
+def _get_partition (key, partitions):
+    """Returns the number of the partition that the identity with
+    match `key` belongs to.
+
+    The hash used is the same in every process.
+
+    :param key: the match key of an identity
+    :type key: tuple
+    :param partitions: the number of partitions
+    :type partitions: integer
+    :rtype: integer
+
+    """
+    is_locator, address = key
+    return (zlib.crc32('%d%s' % (is_locator, address.encode('utf-8'))) &
+            0xffffffff) % partitions
+
+def _get_replacement (replaced, topic_id):
+    """Returns the database ID of the topic that the topic with
+    `topic_id` has (perhaps indirectly) been merged into.
+
+    :param replaced: the database ID of the topic each merged topic
+      was merged into
+    :type replaced: dictionary
+    :param topic_id: the database ID of a topic
+    :type topic_id: integer
+    :rtype: integer
+
+    """
+    while topic_id in replaced:
+        topic_id = replaced[topic_id]
+    return topic_id
+
+def _join_keys (parents, keys):
+    """Joins the groups of the match `keys` of a spec into one.
+
+    Returns one of `keys` whose group is joined to a different group
+    that another of `keys` already belonged to, or None if the spec
+    joins no two existing groups.
+
+    :param parents: the parent of each key
+    :type parents: dictionary
+    :param keys: the match keys of the identities of a spec
+    :type keys: list of tuples
+    :rtype: tuple
+
+    """
+    joined = None
+    roots = set()
+    for key in keys:
+        if key in parents:
+            root = _find_root(parents, key)
+            if roots and root not in roots and joined is None:
+                joined = key
+            roots.add(root)
+    for key in keys:
+        parents.setdefault(key, key)
+    root = _find_root(parents, keys[0])
+    for key in keys[1:]:
+        parents[_find_root(parents, key)] = root
+    return joined
+
+def _normalise_spec (spec):
+    """Returns the identities in `spec` as (relation, address) pairs,
+    each address being the external form of a locator.
+
+    :param spec: the identities of a topic to be imported
+    :type spec: tuple
+    :rtype: list of tuples
+
+    """
+    identities = []
+    for relation, references in zip(RELATIONS, spec):
+        for reference in references or ():
+            if not isinstance(reference, LocatorBase):
+                reference = Locator(reference)
+            identities.append((relation, reference.to_external_form()))
+    return identities
+
+def _reconcile (topic_map, topic_ids, deferred):
+    """Adds each of the `deferred` identities to the imported topic it
+    belongs to, merging topics as necessary.
+
+    Returns the database ID of the topic that each topic merged away
+    was merged into.
+
+    :param topic_map: the topic map imported into
+    :type topic_map: `TopicMap`
+    :param topic_ids: the database ID of the topic for each spec
+    :type topic_ids: dictionary
+    :param deferred: the index of the spec, relation and address of
+      each deferred identity
+    :type deferred: list of tuples
+    :rtype: dictionary
+
+    """
+    replaced = {}
+    if not deferred:
+        return replaced
+    with topic_map.batch():
+        for index, relation, address in deferred:
+            topic = Topic.objects.get(
+                pk=_get_replacement(replaced, topic_ids[index]))
+            other = _get_matching_topic(topic_map, relation, address)
+            getattr(topic, 'add_%s' % relation[:-1])(_get_locator(address))
+            if other is not None and other != topic:
+                replaced[other.pk] = topic.pk
+    return replaced
+
+def _write_identities (topic_map, rows):
+    """Adds the identities in `rows` to their topics.
+
+    :param topic_map: the topic map containing the topics
+    :type topic_map: `TopicMap`
+    :param rows: the relation, address and topic database ID of each
+      identity
+    :type rows: set of tuples
+
+    """
+    bulk_insert(SubjectIdentifier, [
+            SubjectIdentifier(topic_id=topic_id, address=address,
+                              containing_topic_map=topic_map)
+            for relation, address, topic_id in rows
+            if relation == 'subject_identifiers'])
+    bulk_insert(SubjectLocator, [
+            SubjectLocator(topic_id=topic_id, address=address,
+                           containing_topic_map=topic_map)
+            for relation, address, topic_id in rows
+            if relation == 'subject_locators'])
+    item_identifiers = dict([(address, topic_id) for relation, address,
+                             topic_id in rows
+                             if relation == 'item_identifiers'])
+    bulk_insert(ItemIdentifier, [
+            ItemIdentifier(address=address, containing_topic_map=topic_map)
+            for address in item_identifiers])
+    addresses = item_identifiers.keys()
+    join_rows = []
+    for start in range(0, len(addresses), CHUNK_SIZE):
+        for address, pk in ItemIdentifier.objects.filter(
+            address__in=addresses[start:start+CHUNK_SIZE],
+            containing_topic_map=topic_map).values_list('address', 'pk'):
+            join_rows.append((item_identifiers[address], pk))
+    insert_join_rows(Topic._meta.get_field('item_identifiers'), join_rows,
+                     False)
+
+def _write_partition (topic_map, entries):
+    """Writes the topics of a partition to `topic_map`.
+
+    Returns the database ID of the topic for each spec in the
+    partition, and the identities that are deferred to the final
+    pass.
+
+    :param topic_map: the topic map to import into
+    :type topic_map: `TopicMap`
+    :param entries: the index of each spec in the partition, with its
+      identities
+    :type entries: list of tuples
+    :rtype: tuple of dictionary and list of tuples
+
+    """
+    # Group the specs that share an identity.
+    parents = {}
+    for index, identities in entries:
+        _join_keys(parents, [_get_match_key(*identity) for identity
+                             in identities])
+    groups = {}
+    for entry in entries:
+        root = _find_root(parents, _get_match_key(*entry[1][0]))
+        groups.setdefault(root, []).append(entry)
+    existing = _get_existing_matches(topic_map, parents.keys())
+    topic_ids = {}
+    deferred = []
+    rows = set()
+    new = []
+    updated = set()
+    for group in groups.values():
+        topic_id = None
+        group_rows = set()
+        for index, identities in group:
+            for relation, address in identities:
+                key = _get_match_key(relation, address)
+                if key in existing:
+                    deferred.append((index, relation, address))
+                    if topic_id is None:
+                        topic_id = existing[key]
+                else:
+                    group_rows.add((relation, address))
+        if topic_id is None:
+            new.append((group, group_rows))
+        else:
+            rows.update([(relation, address, topic_id) for relation, address
+                         in group_rows])
+            if group_rows:
+                updated.add(topic_id)
+            for index, identities in group:
+                topic_ids[index] = topic_id
+    identifier_ids = create_identifiers(topic_map.pk, len(new))
+    bulk_insert(Topic, [Topic(topic_map=topic_map, identifier_id=identifier_id)
+                        for identifier_id in identifier_ids])
+    pks = {}
+    for start in range(0, len(identifier_ids), CHUNK_SIZE):
+        pks.update(Topic.objects.filter(
+                identifier__in=identifier_ids[start:start+CHUNK_SIZE])
+                   .values_list('identifier', 'pk'))
+    for identifier_id, (group, group_rows) in zip(identifier_ids, new):
+        topic_id = pks[identifier_id]
+        rows.update([(relation, address, topic_id) for relation, address
+                     in group_rows])
+        for index, identities in group:
+            topic_ids[index] = topic_id
+    _write_identities(topic_map, rows)
+    if identifier_ids or updated:
+        invalidate_topic_map(topic_map.pk)
+    record_changes(topic_map.pk, [(identifier_id, 'topic', CREATE)
+                                  for identifier_id in identifier_ids])
+    record_changes_by_pk(topic_map.pk, Topic, list(updated), UPDATE)
+    return topic_ids, deferred
+
+def _write_partition_by_id (args):
+    """Writes the topics of a partition in a process of the pool.
+
+    The topic map is passed by class and database ID, to be retrieved
+    with this process' own database connection.
+
+    :param args: the topic map class and database ID, and the entries
+      of the partition
+    :type args: tuple
+    :rtype: tuple of dictionary and list of tuples
+
+    """
+    topic_map_class, topic_map_id, entries = args
+    topic_map = topic_map_class.objects.get(pk=topic_map_id)
+    return retry_on_conflict(_write_partition, topic_map, entries)
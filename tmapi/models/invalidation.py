@@ -0,0 +1,65 @@
+# Copyright 2011 Jamie Norrish (jamie@artefact.org.nz)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module containing the invalidation of the data held about a topic
+map outside the database when the topic map is changed.
+
+Each operation that changes a construct invalidates, whether or not
+the change journal (see `tmapi.models.journal`) is enabled:
+
+* the results cached for the topic map in the shared cache (see
+  `tmapi.models.cache_utils`), or, within a batch, marks the batch as
+  having changed the topic map, so that they are invalidated when it
+  is flushed;
+
+* the identifiers prefetched by keyset iteration (see
+  `tmapi.models.iteration_utils`); and
+
+* the scopes loaded by the active request scope (see
+  `tmapi.models.request_scope`).
+
+"""
+
+from batch import get_batch
+from cache_utils import invalidate
+from iteration_utils import discard_prefetched
+from request_scope import reset_request_scope
+
+
+def invalidate_construct (construct):
+    """Invalidates the data held about the topic map of `construct`,
+    which has been changed.
+
+    :param construct: the changed construct
+    :type construct: `Construct`
+
+    """
+    # A TopicMap has no topic_map_id, being its own topic map.
+    invalidate_topic_map(getattr(construct, 'topic_map_id', construct.pk))
+
+def invalidate_topic_map (topic_map_id):
+    """Invalidates the data held about the topic map with database ID
+    `topic_map_id`, which has been changed.
+
+    :param topic_map_id: the database ID of the topic map
+    :type topic_map_id: integer
+
+    """
+    discard_prefetched()
+    reset_request_scope()
+    batch = get_batch(topic_map_id)
+    if batch is None:
+        invalidate(topic_map_id)
+    else:
+        batch.mark_changed()
@@ -14,10 +14,10 @@
 
 from django.db import models
 
-from locator import LocatorBase
+from locator import StoredLocatorBase
 
 
-class ItemIdentifier (LocatorBase, models.Model):
+class ItemIdentifier (StoredLocatorBase, models.Model):
 
     address = models.CharField(max_length=512)
     # Include a reference to the topic map of the construct this
@@ -31,14 +31,6 @@ class ItemIdentifier (LocatorBase, models.Model):
         app_label = 'tmapi'
         unique_together = (('address', 'containing_topic_map'),)
 
-    def __init__ (self, *args, **kwargs):
-        super(ItemIdentifier, self).__init__(*args, **kwargs)
-        self.generate_forms(self.address)
-        
-    def save (self, *args, **kwargs):
-        super(ItemIdentifier, self).save(*args, **kwargs)
-        self.generate_forms(self.address)
-
     def get_construct (self):
         """Returns the `Construct` that this is an item identifier for.
 
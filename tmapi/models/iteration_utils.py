@@ -0,0 +1,179 @@
+# Copyright 2011 Jamie Norrish (jamie@artefact.org.nz)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module providing iteration over large numbers of constructs in
+constant memory.
+
+`iterate_keyset` reads the results of a `QuerySet` a page at a time,
+in order of identifier (see `Construct.get_id`), with each page
+selecting the constructs whose identifier is greater than that of the
+last one read (keyset pagination). No
+page takes longer to read than the first, unlike OFFSET pagination,
+and only one page is held in memory at a time. The constructs read
+are not registered with an active `RequestScope` (see
+`tmapi.models.request_scope`), which would otherwise hold all of
+them until the end of the request.
+
+The related identifiers of the constructs on each page may be
+prefetched with a query per page, so that `get_item_identifiers`,
+`get_subject_identifiers` and `get_subject_locators` make no further
+queries. Prefetched identifiers are discarded whenever a topic map is
+changed (see `tmapi.models.invalidation`).
+
+"""
+
+import itertools
+
+from batch import CHUNK_SIZE, flush_batches
+
+
+# Source of the generations of prefetched values; the values
+# prefetched in an earlier generation are discarded.
+_generations = itertools.count()
+_generation = _generations.next()
+
+
+def discard_prefetched ():
+    """Discards all prefetched values."""
+    global _generation
+    _generation = _generations.next()
+
+def get_prefetched (instance, field_name):
+    """Returns the values of `field_name` prefetched for `instance`,
+    or None if they have not been prefetched.
+
+    :param instance: the construct
+    :type instance: `Construct`
+    :param field_name: the name of the many to many field, or of the
+      reverse foreign key
+    :type field_name: string
+    :rtype: list or None
+
+    """
+    prefetched = instance.__dict__.get(_get_cache_name(field_name))
+    if prefetched is None or prefetched[0] != _generation:
+        return None
+    return list(prefetched[1])
+
+def iterate_keyset (queryset, batch_size=CHUNK_SIZE, after_id=None,
+                    prefetch=()):
+    """Yields the constructs selected by `queryset` in order of
+    identifier (as returned by `Construct.get_id`), a page of
+    `batch_size` results at a time.
+
+    The results are read with a query per page (plus a query per page
+    for each prefetched field), each selecting the results with an
+    identifier greater than that of the last result of the previous
+    page. Iteration may therefore be resumed by passing the
+    identifier of the last result seen as `after_id`, as on the
+    memory backend. The results are not registered with an active
+    `RequestScope`.
+
+    :param queryset: the query whose results are iterated over
+    :type queryset: `QuerySet`
+    :param batch_size: the number of results to read at a time
+    :type batch_size: integer
+    :param after_id: the identifier after which to start
+    :type after_id: integer
+    :param prefetch: the names of the many to many fields (eg,
+      'item_identifiers') or reverse foreign keys (eg,
+      'subject_identifiers') whose values are prefetched for each page
+    :type prefetch: sequence of strings
+    :rtype: generator of `Construct`s
+
+    """
+    if batch_size < 1:
+        raise ValueError('The batch size must be positive')
+    queryset = _get_unscoped(queryset).order_by('identifier')
+    while True:
+        page = queryset
+        if after_id is not None:
+            page = page.filter(identifier__gt=after_id)
+        page = list(page[:batch_size])
+        if not page:
+            return
+        for field_name in prefetch:
+            prefetch_related(page, field_name)
+        for instance in page:
+            yield instance
+        if len(page) < batch_size:
+            return
+        after_id = page[-1].identifier_id
+
+def prefetch_related (instances, field_name):
+    """Prefetches the values of `field_name` for each of `instances`,
+    with a query per CHUNK_SIZE instances.
+
+    :param instances: constructs of the same model
+    :type instances: list of `Construct`s
+    :param field_name: the name of a many to many field, or of a
+      reverse foreign key, of the constructs' model
+    :type field_name: string
+
+    """
+    if not instances:
+        return
+    flush_batches()
+    field, model, direct, m2m = instances[0]._meta.get_field_by_name(
+        field_name)
+    if m2m:
+        through = field.rel.through
+        source_name = field.m2m_field_name()
+        target_name = field.m2m_reverse_field_name()
+        def get_rows (ids):
+            return [(getattr(row, '%s_id' % source_name),
+                     getattr(row, target_name)) for row in
+                    through.objects.filter(**{'%s__in' % source_name: ids})
+                    .select_related(target_name)]
+    else:
+        # A reverse foreign key, given by a RelatedObject.
+        related_field = field.field
+        def get_rows (ids):
+            return [(getattr(obj, related_field.attname), obj) for obj in
+                    _get_unscoped(field.model._default_manager.filter(
+                    **{'%s__in' % related_field.name: ids}))]
+    values = dict([(instance.pk, []) for instance in instances])
+    ids = values.keys()
+    for start in range(0, len(ids), CHUNK_SIZE):
+        for instance_id, value in get_rows(ids[start:start+CHUNK_SIZE]):
+            values[instance_id].append(value)
+    cache_name = _get_cache_name(field_name)
+    for instance in instances:
+        instance.__dict__[cache_name] = (_generation, values[instance.pk])
+
+def _get_cache_name (field_name):
+    """Returns the name of the attribute holding the prefetched
+    values of `field_name`.
+
+    :param field_name: the name of the field
+    :type field_name: string
+    :rtype: string
+
+    """
+    return '_%s_prefetched' % field_name
+
+def _get_unscoped (queryset):
+    """Returns `queryset`, or a copy of it whose results are not
+    registered with the active `RequestScope` if it is a
+    `ConstructQuerySet`.
+
+    :param queryset: the query
+    :type queryset: `QuerySet`
+    :rtype: `QuerySet`
+
+    """
+    unscoped = getattr(queryset, 'unscoped', None)
+    if unscoped is None:
+        return queryset
+    return unscoped()
@@ -0,0 +1,254 @@
+# Copyright 2011 Jamie Norrish (jamie@artefact.org.nz)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module containing the change journal of topic maps.
+
+When the TMAPI_JOURNAL setting is True, each operation that changes a
+construct appends an entry to the journal of its topic map, recording
+the construct's identifier (see `Construct.get_id`), its kind and the
+operation. Consumers such as replicas and external indices can then
+read the changes made since the last entry they processed (see
+`TopicMap.get_changes`), rather than rescanning the topic map.
+
+The journal is append only. Within a batch, entries are queued and
+written together when the batch is flushed, and they are discarded
+with the rest of the batch if it is rolled back.
+
+Sequence numbers are assigned when an entry is written, so an entry
+written by a transaction that is still open may become visible after
+entries with higher sequence numbers. A consumer that must not miss
+such entries should re-read from a little before its last sequence
+number, since applying an entry twice is harmless.
+
+"""
+
+from django.conf import settings
+from django.db.models import get_model
+
+from batch import CHUNK_SIZE, get_batch, insert_changes
+from change_entry import ChangeEntry
+
+
+# Operations recorded in the journal.
+CREATE = 'create'
+MERGE = 'merge'
+REMOVE = 'remove'
+UPDATE = 'update'
+
+# The constructs removed along with a construct of each kind, as the
+# kind and the field relating them to it.
+DEPENDENTS = {
+    'association': (('role', 'association'),),
+    'name': (('variant', 'name'),),
+    'topic': (('name', 'topic'), ('occurrence', 'topic')),
+    }
+
+# The topic or association containing a construct of each kind, as the
+# model and the field leading from it to the topic or association.
+CONTAINERS = {
+    'association': ('association', 'pk'),
+    'name': ('topic', 'topic'),
+    'occurrence': ('topic', 'topic'),
+    'role': ('association', 'association'),
+    'topic': ('topic', 'pk'),
+    'variant': ('topic', 'name__topic'),
+    }
+
+
+def get_changed_containers (topic_map, since, until):
+    """Returns the database IDs of the topics and of the associations
+    in `topic_map` that were changed, or that contain a construct that
+    was changed, by the entries in its journal with sequence numbers
+    greater than `since` and no greater than `until`.
+
+    Entries for constructs that no longer exist are ignored, as are
+    entries for the topic map itself.
+
+    :param topic_map: the topic map
+    :type topic_map: `TopicMap`
+    :param since: the sequence number after which to start
+    :type since: integer
+    :param until: the sequence number of the last entry to read
+    :type until: integer
+    :rtype: tuple of a set of topic IDs and a set of association IDs
+
+    """
+    identifier_ids = {}
+    for entry in get_changes(topic_map, since):
+        if entry.pk > until:
+            break
+        if entry.kind in CONTAINERS:
+            identifier_ids.setdefault(entry.kind, set()).add(
+                entry.construct_id)
+    containers = {'association': set(), 'topic': set()}
+    for kind, ids in identifier_ids.items():
+        container, field_name = CONTAINERS[kind]
+        model = get_model('tmapi', kind)
+        ids = list(ids)
+        for start in range(0, len(ids), CHUNK_SIZE):
+            containers[container].update(model.objects.filter(
+                    identifier__in=ids[start:start+CHUNK_SIZE]).values_list(
+                    field_name, flat=True))
+    return containers['topic'], containers['association']
+
+def get_changes (topic_map, since=0):
+    """Yields the entries in the journal of `topic_map` with sequence
+    numbers greater than `since`, in order.
+
+    The entries are read a chunk at a time.
+
+    :param topic_map: the topic map
+    :type topic_map: `TopicMap`
+    :param since: the sequence number after which to start
+    :type since: integer
+    :rtype: iterator over `ChangeEntry`s
+
+    """
+    queryset = ChangeEntry.objects.filter(topic_map=topic_map).order_by('pk')
+    while True:
+        entries = list(queryset.filter(pk__gt=since)[:CHUNK_SIZE])
+        for entry in entries:
+            yield entry
+        if len(entries) < CHUNK_SIZE:
+            break
+        since = entries[-1].pk
+
+def get_kind (construct):
+    """Returns the kind of `construct`, as recorded in the journal.
+
+    :param construct: the construct
+    :type construct: `Construct`
+    :rtype: string
+
+    """
+    opts = construct._meta
+    while opts.proxy:
+        opts = opts.proxy_for_model._meta
+    return opts.object_name.lower()
+
+def get_last_sequence (topic_map):
+    """Returns the sequence number of the last entry in the journal of
+    `topic_map`, or 0 if it has none.
+
+    :param topic_map: the topic map
+    :type topic_map: `TopicMap`
+    :rtype: integer
+
+    """
+    sequences = ChangeEntry.objects.filter(topic_map=topic_map).order_by(
+        '-pk').values_list('pk', flat=True)[:1]
+    if sequences:
+        return sequences[0]
+    return 0
+
+def is_enabled ():
+    """Returns True if changes are recorded in the journal.
+
+    :rtype: boolean
+
+    """
+    return getattr(settings, 'TMAPI_JOURNAL', False)
+
+def record_change (construct, operation):
+    """Records `operation` as having been performed on `construct`.
+
+    :param construct: the changed construct
+    :type construct: `Construct`
+    :param operation: the operation
+    :type operation: string
+
+    """
+    # A TopicMap has no topic_map_id, being its own topic map.
+    topic_map_id = getattr(construct, 'topic_map_id', construct.pk)
+    record_changes(topic_map_id, [(construct.identifier_id,
+                                   get_kind(construct), operation)])
+
+def record_changes (topic_map_id, entries):
+    """Records `entries` in the journal of the topic map with database
+    ID `topic_map_id`.
+
+    If a batch is active for the topic map, the entries are queued
+    until it is flushed.
+
+    :param topic_map_id: the database ID of the topic map
+    :type topic_map_id: integer
+    :param entries: the construct identifier, kind and operation of
+      each entry
+    :type entries: list of tuples
+
+    """
+    if not entries or not is_enabled():
+        return
+    batch = get_batch(topic_map_id)
+    if batch is None:
+        insert_changes(topic_map_id, entries)
+    else:
+        batch.add_changes(entries)
+
+def record_changes_by_pk (topic_map_id, model, pks, operation):
+    """Records `operation` as having been performed on the instances
+    of the construct `model` with database IDs `pks`.
+
+    :param topic_map_id: the database ID of the topic map
+    :type topic_map_id: integer
+    :param model: the construct model class
+    :type model: class
+    :param pks: the database IDs of the constructs
+    :type pks: list of integers
+    :param operation: the operation
+    :type operation: string
+
+    """
+    if not pks or not is_enabled():
+        return
+    kind = model._meta.object_name.lower()
+    entries = []
+    for start in range(0, len(pks), CHUNK_SIZE):
+        entries.extend([(identifier_id, kind, operation) for identifier_id
+                        in model.objects.filter(
+                    pk__in=pks[start:start+CHUNK_SIZE]).values_list(
+                    'identifier', flat=True)])
+    record_changes(topic_map_id, entries)
+
+def record_removal (construct):
+    """Records the removal of `construct`, and of the constructs that
+    are removed along with it.
+
+    This must be called before `construct` is deleted.
+
+    :param construct: the construct being removed
+    :type construct: `Construct`
+
+    """
+    if not is_enabled():
+        return
+    kind = get_kind(construct)
+    topic_map_id = getattr(construct, 'topic_map_id', construct.pk)
+    entries = [(construct.identifier_id, kind, REMOVE)]
+    parents = {kind: [construct.pk]}
+    while parents:
+        kind, pks = parents.popitem()
+        for dependent_kind, field_name in DEPENDENTS.get(kind, ()):
+            model = get_model('tmapi', dependent_kind)
+            dependent_pks = []
+            for start in range(0, len(pks), CHUNK_SIZE):
+                queryset = model.objects.filter(**{
+                        '%s__in' % field_name: pks[start:start+CHUNK_SIZE]})
+                for pk, identifier_id in queryset.values_list('pk',
+                                                              'identifier'):
+                    dependent_pks.append(pk)
+                    entries.append((identifier_id, dependent_kind, REMOVE))
+            if dependent_pks:
+                parents[dependent_kind] = dependent_pks
+    record_changes(topic_map_id, entries)
@@ -12,6 +12,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import threading
 import unicodedata
 import urllib
 import urlparse
@@ -19,21 +20,147 @@ import urlparse
 from tmapi.exceptions import MalformedIRIException
 
 
+# The maximum number of references whose normalised forms are cached.
+LOCATOR_CACHE_SIZE = 10000
+
+
+class LRUCache (object):
+
+    """Mapping of bounded size that discards its least recently used
+    item when full."""
+
+    def __init__ (self, max_size):
+        self._max_size = max_size
+        self._lock = threading.Lock()
+        self._links = {}
+        # Circular doubly linked list of [previous, next, key, value]
+        # links, ordered from least to most recently used.
+        self._root = []
+        self._root[:] = [self._root, self._root, None, None]
+
+    def clear (self):
+        self._lock.acquire()
+        try:
+            self._links.clear()
+            self._root[:] = [self._root, self._root, None, None]
+        finally:
+            self._lock.release()
+
+    def get (self, key, default=None):
+        """Returns the value for `key`, or `default` if `key` is not
+        in the cache."""
+        self._lock.acquire()
+        try:
+            link = self._links.get(key)
+            if link is None:
+                return default
+            self._move_to_end(link)
+            return link[3]
+        finally:
+            self._lock.release()
+
+    def set (self, key, value):
+        """Sets the value for `key`, discarding the least recently
+        used item if the cache is full."""
+        self._lock.acquire()
+        try:
+            link = self._links.get(key)
+            if link is not None:
+                link[3] = value
+                self._move_to_end(link)
+                return
+            root = self._root
+            if len(self._links) >= self._max_size:
+                oldest = root[1]
+                root[1] = oldest[1]
+                oldest[1][0] = root
+                del self._links[oldest[2]]
+            last = root[0]
+            link = [last, root, key, value]
+            last[1] = root[0] = link
+            self._links[key] = link
+        finally:
+            self._lock.release()
+
+    def _move_to_end (self, link):
+        previous, next = link[0], link[1]
+        previous[1] = next
+        next[0] = previous
+        root = self._root
+        last = root[0]
+        link[0] = last
+        link[1] = root
+        last[1] = root[0] = link
+
+    def __len__ (self):
+        return len(self._links)
+
+
+# Cache of references mapped to their (reference, external) forms,
+# keyed by the type of the reference as well as by the reference,
+# since a byte string and a unicode string may compare equal but not
+# be unnormalised alike.
+_forms_cache = LRUCache(LOCATOR_CACHE_SIZE)
+# Cache of external forms mapped to their reference forms.
+_reference_cache = LRUCache(LOCATOR_CACHE_SIZE)
+
+
 class LocatorBase (object):
 
     """Immutable representation of an IRI."""
 
+    __slots__ = ('_reference', '_external')
+
     def generate_forms (self, reference):
-        self._reference = self.unnormalise(reference)
-        self._external = self.normalise(self._reference)
-        
+        key = (type(reference), reference)
+        forms = _forms_cache.get(key)
+        if forms is None:
+            reference_form = self.unnormalise(reference)
+            forms = (reference_form, self.normalise(reference_form))
+            _forms_cache.set(key, forms)
+        self._reference, self._external = forms
+
+    def generate_forms_from_external (self, external):
+        """Sets the forms of this locator from `external`, which must
+        already be in external (normalised) form, as is the case with
+        addresses stored in the database.
+
+        :param external: the external form of the IRI
+        :type external: string
+
+        """
+        reference = _reference_cache.get(external)
+        if reference is None:
+            # The escapes of an external form are of UTF-8 octets,
+            # which `unnormalise` decodes only from a byte string.
+            if isinstance(external, unicode):
+                reference = self.unnormalise(external.encode('utf-8'))
+            else:
+                reference = self.unnormalise(external)
+            _reference_cache.set(external, reference)
+        self._reference = reference
+        self._external = external
+
+    def _generate_lazy_forms (self):
+        """Generates the forms of this locator on first access.
+
+        Subclasses whose forms are not set on creation must override
+        this method.
+
+        """
+        raise NotImplementedError
+
     def get_reference (self):
         """Returns a lexical representation of the IRI.
 
         :rtype: String
 
         """
-        return self._reference
+        try:
+            return self._reference
+        except AttributeError:
+            self._generate_lazy_forms()
+            return self._reference
 
     def resolve (self, reference):
         """Resolves the `reference` against this locator.
@@ -46,7 +173,7 @@ class LocatorBase (object):
         :rtype: `Locator`
 
         """
-        return Locator(urlparse.urljoin(self._external, reference))
+        return Locator(urlparse.urljoin(self.to_external_form(), reference))
     
     def to_external_form (self):
         """Returns the external form of the IRI.
@@ -57,7 +184,11 @@ class LocatorBase (object):
         :rtype: String
 
         """
-        return self._external
+        try:
+            return self._external
+        except AttributeError:
+            self._generate_lazy_forms()
+            return self._external
 
     def normalise (self, reference):
         parts = list(urlparse.urlsplit(reference))
@@ -89,8 +220,35 @@ class LocatorBase (object):
 
 class Locator (LocatorBase):
 
+    __slots__ = ()
+
     def __init__ (self, reference):
         self.generate_forms(reference)
 
     def __unicode__ (self):
         return self._reference
+
+
+class StoredLocatorBase (LocatorBase):
+
+    """Base class for models that store an IRI in an `address` field.
+
+    The reference and external forms are generated on first access
+    rather than on instantiation, so that loading many instances
+    only to read their `address` does no IRI processing. The address
+    must be given, and is stored, in external form.
+
+    """
+
+    __slots__ = ()
+
+    def _generate_lazy_forms (self):
+        self.generate_forms_from_external(self.address)
+
+    def save (self, *args, **kwargs):
+        # The address may have been changed since the forms were
+        # generated, so generate them afresh on next access.
+        for name in LocatorBase.__slots__:
+            if hasattr(self, name):
+                delattr(self, name)
+        super(StoredLocatorBase, self).save(*args, **kwargs)
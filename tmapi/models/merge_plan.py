@@ -0,0 +1,571 @@
+# Copyright 2011 Jamie Norrish (jamie@artefact.org.nz)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module providing merge plans, which describe the merging that a
+merge of topic maps, or the addition of subject identifiers, would
+cause, without making any change.
+
+A `MergePlan` is created by `TopicMap.plan_merge` or
+`TopicMap.plan_subject_identifiers`. It computes, with queries per
+chunk of identifiers or topics rather than per construct:
+
+* the equivalence classes of topics, being the sets of topics that
+  would become a single topic (see `get_topic_classes`), including
+  those merged by name when the merge by topic name feature is
+  enabled for the target topic map;
+
+* the names, occurrences and associations that would then be
+  duplicates, and so be merged (see `get_duplicate_names`,
+  `get_duplicate_occurrences` and `get_duplicate_associations`).
+
+The plan may then be executed with `execute`, which merges the
+topics of each class directly, without resolving their identities
+again. If the change journal (see `tmapi.models.journal`) shows that
+either topic map has changed since the plan was made, the plan is
+made afresh before it is executed; if the journal is disabled, the
+caller must ensure that the topic maps have not changed.
+
+"""
+
+from tmapi.constants import AUTOMERGE_FEATURE_STRING
+
+from association import Association
+from batch import CHUNK_SIZE
+from copy_utils import copy
+from journal import get_last_sequence, is_enabled
+from name_merge_utils import get_name_key, is_merging_by_name
+from name import Name
+from occurrence import Occurrence
+from partition import Partition
+from read_only import check_writable
+from role import Role
+from subject_identifier import SubjectIdentifier
+from subject_locator import SubjectLocator
+from topic import Topic
+
+
+# The sides of a merge to which a construct belongs.
+SOURCE = 'source'
+TARGET = 'target'
+
+
+class MergePlan (object):
+
+    """The merging of topics, and of the constructs they contain,
+    that a merge of topic maps or the addition of subject identifiers
+    would cause."""
+
+    def __init__ (self, target, source=None, additions=None):
+        """Initialises the plan for merging `source` into `target`,
+        or for adding subject identifiers to topics in `target`.
+
+        :param target: the topic map to be changed
+        :type target: `TopicMap`
+        :param source: the topic map to be merged into `target`
+        :type source: `TopicMap`
+        :param additions: the topics and the subject identifiers to
+          be added to them
+        :type additions: list of (`Topic`, `Locator`) tuples
+
+        """
+        self._target = target
+        self._source = source
+        self._additions = list(additions or [])
+        self._make()
+
+    def execute (self):
+        """Makes the merges described by this plan, in a single
+        transaction.
+
+        When planning the addition of subject identifiers with the
+        automerge feature disabled, the additions are made one by
+        one, so that an `IdentityConstraintException` is raised as
+        it would be by `Topic.add_subject_identifier`.
+
+        """
+        check_writable(self._target)
+        if not self.is_current():
+            self._make()
+        with self._target.batch():
+            if self._source is None:
+                self._execute_additions()
+            elif self._source != self._target:
+                survivors = self._merge_classes()
+                merge_map = {}
+                for members, survivor in zip(self._classes, survivors):
+                    if survivor is None:
+                        # Source topics merged only with each other,
+                        # by name, are merged once they are copied.
+                        continue
+                    for topic in self._get_constructs(
+                        Topic, [pk for side, pk in members if side == SOURCE]):
+                        merge_map[topic] = survivor
+                copy(self._source, self._target, merge_map)
+
+    def get_duplicate_associations (self):
+        """Returns the sets of associations that would have the same
+        signature, and so be merged into one.
+
+        :rtype: list of lists of `Association`s
+
+        """
+        return self._get_groups(Association, self._duplicates['association'])
+
+    def get_duplicate_names (self):
+        """Returns the sets of names that would have the same
+        signature and parent topic, and so be merged into one.
+
+        :rtype: list of lists of `Name`s
+
+        """
+        return self._get_groups(Name, self._duplicates['name'])
+
+    def get_duplicate_occurrences (self):
+        """Returns the sets of occurrences that would have the same
+        signature and parent topic, and so be merged into one.
+
+        :rtype: list of lists of `Occurrence`s
+
+        """
+        return self._get_groups(Occurrence, self._duplicates['occurrence'])
+
+    def get_merge_count (self):
+        """Returns the number of topics that would be merged into
+        another topic.
+
+        :rtype: integer
+
+        """
+        return sum([len(members) - 1 for members in self._classes])
+
+    def get_topic_classes (self):
+        """Returns the sets of topics that would be merged into a
+        single topic. Each set lists the topics of the target topic
+        map before those of the source topic map.
+
+        :rtype: list of lists of `Topic`s
+
+        """
+        return self._get_groups(Topic, self._classes)
+
+    def is_current (self):
+        """Returns False if the change journal shows that a topic map
+        has changed since this plan was made.
+
+        :rtype: boolean
+
+        """
+        return self._sequences == self._get_sequences()
+
+    def _add_addition_matches (self, partition):
+        """Adds to `partition` the topics that would be merged by the
+        planned additions of subject identifiers.
+
+        :param partition: the partition of topics
+        :type partition: `Partition`
+
+        """
+        additions = {}
+        for topic, locator in self._additions:
+            address = locator.to_external_form()
+            additions.setdefault(address, []).append(topic.pk)
+        owners = _get_owners(self._target, additions.keys(),
+                             (SubjectIdentifier, Topic))
+        for address, topic_ids in additions.items():
+            for topic_id in topic_ids[1:] + owners.get(address, []):
+                partition.union((TARGET, topic_ids[0]), (TARGET, topic_id))
+
+    def _add_identity_matches (self, partition):
+        """Adds to `partition` the topics of the source topic map that
+        share an identity with topics of the target topic map, and
+        the reifiers of the topic maps.
+
+        :param partition: the partition of topics
+        :type partition: `Partition`
+
+        """
+        source, target = self._source, self._target
+        for kinds, rows in (
+            ((SubjectLocator,), SubjectLocator.objects.filter(
+                    containing_topic_map=source).values_list(
+                    'topic', 'address')),
+            ((SubjectIdentifier, Topic), SubjectIdentifier.objects.filter(
+                    containing_topic_map=source).values_list(
+                    'topic', 'address')),
+            ((SubjectIdentifier, Topic),
+             Topic.item_identifiers.through.objects.filter(
+                    topic__topic_map=source).values_list(
+                    'topic', 'itemidentifier__address'))):
+            rows = list(rows)
+            owners = _get_owners(target, list(set(
+                        [address for topic_id, address in rows])), kinds)
+            for topic_id, address in rows:
+                for owner_id in owners.get(address, []):
+                    partition.union((SOURCE, topic_id), (TARGET, owner_id))
+        if source.reifier_id is not None and target.reifier_id is not None:
+            partition.union((SOURCE, source.reifier_id),
+                            (TARGET, target.reifier_id))
+
+    def _add_name_matches (self, partition):
+        """Adds to `partition` the topics that would be merged by
+        name once the source topic map is copied, if the merge by
+        topic name feature is enabled for the target topic map.
+
+        The types and themes of names are compared by the classes of
+        topics they belong to. The names of the target topic map that
+        may match a name of the source topic map are found by their
+        keys, for each topic of the target topic map in the class of
+        its type. Since joining topics may make further names match,
+        this is repeated until no more topics are joined.
+
+        :param partition: the partition of topics
+        :type partition: `Partition`
+
+        """
+        if not is_merging_by_name(self._target):
+            return
+        names = self._get_name_rows(SOURCE, Name.objects.filter(
+                topic_map=self._source))
+        source_names = list(names)
+        read_keys = set()
+        changed = True
+        while changed:
+            target_types = {}
+            for members in partition.get_classes():
+                target_types[partition.find(members[0])] = [
+                    pk for side, pk in members if side == TARGET]
+            keys = set()
+            for side, topic_id, type_id, value, theme_ids in source_names:
+                for target_type_id in target_types.get(
+                    partition.find((SOURCE, type_id)), []):
+                    keys.add(get_name_key(target_type_id, value))
+            keys = list(keys - read_keys)
+            read_keys.update(keys)
+            for start in range(0, len(keys), CHUNK_SIZE):
+                names.extend(self._get_name_rows(TARGET, Name.objects.filter(
+                            topic_map=self._target,
+                            name_key__in=keys[start:start+CHUNK_SIZE])))
+            owners = {}
+            for side, topic_id, type_id, value, theme_ids in names:
+                signature = (partition.find((side, type_id)), value,
+                             frozenset([partition.find((side, theme_id))
+                                        for theme_id in theme_ids]))
+                owners.setdefault(signature, []).append((side, topic_id))
+            changed = False
+            for nodes in owners.values():
+                for node in nodes[1:]:
+                    if partition.find(node) != partition.find(nodes[0]):
+                        partition.union(nodes[0], node)
+                        changed = True
+
+    def _execute_additions (self):
+        """Merges the topics of each class, and adds the planned
+        subject identifiers."""
+        survivors = {}
+        if self._target.topic_map_system.get_feature(
+            AUTOMERGE_FEATURE_STRING):
+            for members, survivor in zip(self._classes,
+                                         self._merge_classes()):
+                for side, pk in members:
+                    survivors[pk] = survivor
+        for topic, locator in self._additions:
+            survivors.get(topic.pk, topic).add_subject_identifier(locator)
+
+    def _find_duplicate_associations (self, keys):
+        """Returns the groups of associations that would have the same
+        signature, as lists of (side, database ID) pairs.
+
+        :param keys: the class index of each merged topic
+        :type keys: dictionary
+        :rtype: list of lists of tuples
+
+        """
+        scope_field = Association._meta.get_field('scope')
+        scope_through = scope_field.rel.through
+        association_name = scope_field.m2m_field_name()
+        theme_name = scope_field.m2m_reverse_field_name()
+        signatures = {}
+        for side, topic_map in self._get_sides():
+            key = lambda pk: keys.get((side, pk), (side, pk))
+            topic_ids = [pk for node_side, pk in keys if node_side == side]
+            association_ids = set()
+            for start in range(0, len(topic_ids), CHUNK_SIZE):
+                chunk = topic_ids[start:start+CHUNK_SIZE]
+                associations = topic_map.association_constructs.all()
+                association_ids.update(associations.filter(
+                        type__in=chunk).values_list('pk', flat=True))
+                roles = Role.objects.filter(association__topic_map=topic_map)
+                association_ids.update(roles.filter(
+                        player__in=chunk).values_list('association',
+                                                      flat=True))
+                association_ids.update(roles.filter(
+                        type__in=chunk).values_list('association', flat=True))
+                association_ids.update(scope_through.objects.filter(**{
+                            '%s__topic_map' % association_name: topic_map,
+                            '%s__in' % theme_name: chunk}).values_list(
+                        association_name, flat=True))
+            association_ids = list(association_ids)
+            for start in range(0, len(association_ids), CHUNK_SIZE):
+                chunk = association_ids[start:start+CHUNK_SIZE]
+                types = dict(Association.objects.filter(
+                        pk__in=chunk).values_list('pk', 'type'))
+                scopes = dict([(pk, set()) for pk in types])
+                roles = dict([(pk, set()) for pk in types])
+                for association_id, theme_id in scope_through.objects.filter(
+                    **{'%s__in' % association_name: chunk}).values_list(
+                    association_name, theme_name):
+                    scopes[association_id].add(key(theme_id))
+                for association_id, role_type_id, player_id in \
+                        Role.objects.filter(association__in=chunk).values_list(
+                    'association', 'type', 'player'):
+                    roles[association_id].add((key(role_type_id),
+                                               key(player_id)))
+                for pk, type_id in types.items():
+                    signature = (key(type_id), frozenset(scopes[pk]),
+                                 frozenset(roles[pk]))
+                    signatures.setdefault(signature, []).append((side, pk))
+        return _get_duplicates(signatures)
+
+    def _find_duplicate_characteristics (self, model, keys):
+        """Returns the groups of characteristics of `model` that would
+        have the same signature and parent topic, as lists of (side,
+        database ID) pairs.
+
+        Only a characteristic whose parent topic, type or a theme is
+        merged can come to have the same signature as another, so
+        only those characteristics are read.
+
+        :param model: `Name` or `Occurrence`
+        :type model: class
+        :param keys: the class index of each merged topic
+        :type keys: dictionary
+        :rtype: list of lists of tuples
+
+        """
+        fields = ['pk', 'topic', 'type', 'value']
+        if model is Occurrence:
+            fields.append('datatype')
+        scope_field = model._meta.get_field('scope')
+        scope_through = scope_field.rel.through
+        source_name = scope_field.m2m_field_name()
+        theme_name = scope_field.m2m_reverse_field_name()
+        signatures = {}
+        for side, topic_map in self._get_sides():
+            key = lambda pk: keys.get((side, pk), (side, pk))
+            topic_ids = [pk for node_side, pk in keys if node_side == side]
+            construct_ids = set()
+            for start in range(0, len(topic_ids), CHUNK_SIZE):
+                chunk = topic_ids[start:start+CHUNK_SIZE]
+                for field_name in ('topic', 'type'):
+                    construct_ids.update(model.objects.filter(**{
+                                '%s__in' % field_name: chunk}).values_list(
+                            'pk', flat=True))
+                construct_ids.update(scope_through.objects.filter(**{
+                            '%s__in' % theme_name: chunk}).values_list(
+                        source_name, flat=True))
+            construct_ids = list(construct_ids)
+            for start in range(0, len(construct_ids), CHUNK_SIZE):
+                chunk = construct_ids[start:start+CHUNK_SIZE]
+                rows = list(model.objects.filter(
+                        pk__in=chunk).values_list(*fields))
+                scopes = dict([(row[0], set()) for row in rows])
+                for construct_id, theme_id in scope_through.objects.filter(
+                    **{'%s__in' % source_name: chunk}).values_list(
+                    source_name, theme_name):
+                    scopes[construct_id].add(key(theme_id))
+                for row in rows:
+                    signature = (key(row[1]), key(row[2]),
+                                 frozenset(scopes[row[0]])) + tuple(row[3:])
+                    signatures.setdefault(signature, []).append(
+                        (side, row[0]))
+        return _get_duplicates(signatures)
+
+    def _get_constructs (self, model, pks):
+        """Returns the constructs of `model` with database IDs `pks`,
+        in the same order, reading them with a query per chunk.
+
+        :param model: the construct model
+        :type model: class
+        :param pks: the database IDs
+        :type pks: list of integers
+        :rtype: list of `Construct`s
+
+        """
+        constructs = {}
+        for start in range(0, len(pks), CHUNK_SIZE):
+            constructs.update([(construct.pk, construct) for construct in
+                               model.objects.filter(
+                        pk__in=pks[start:start+CHUNK_SIZE])])
+        return [constructs[pk] for pk in pks if pk in constructs]
+
+    def _get_groups (self, model, groups):
+        """Returns `groups` of (side, database ID) pairs as lists of
+        constructs of `model`.
+
+        :param model: the construct model
+        :type model: class
+        :param groups: the groups
+        :type groups: list of lists of tuples
+        :rtype: list of lists of `Construct`s
+
+        """
+        pks = [pk for members in groups for side, pk in members]
+        constructs = dict([(construct.pk, construct) for construct in
+                           self._get_constructs(model, pks)])
+        return [[constructs[pk] for side, pk in members if pk in constructs]
+                for members in groups]
+
+    def _get_name_rows (self, side, names):
+        """Returns the topic, type, value and themes of each of
+        `names`, reading their scopes with a query per chunk.
+
+        :param side: the side of the merge the names belong to
+        :type side: string
+        :param names: the names
+        :type names: `QuerySet` of `Name`s
+        :rtype: list of tuples
+
+        """
+        scope_field = Name._meta.get_field('scope')
+        through = scope_field.rel.through
+        name_name = scope_field.m2m_field_name()
+        theme_name = scope_field.m2m_reverse_field_name()
+        rows = list(names.values_list('pk', 'topic', 'type', 'value'))
+        scopes = dict([(row[0], []) for row in rows])
+        pks = scopes.keys()
+        for start in range(0, len(pks), CHUNK_SIZE):
+            for name_id, theme_id in through.objects.filter(**{
+                    '%s__in' % name_name: pks[start:start+CHUNK_SIZE]}
+                    ).values_list(name_name, theme_name):
+                scopes[name_id].append(theme_id)
+        return [(side, topic_id, type_id, value, scopes[name_id])
+                for name_id, topic_id, type_id, value in rows]
+
+    def _get_sequences (self):
+        """Returns the sequence numbers of the latest changes to the
+        topic maps, or None if the change journal is disabled.
+
+        :rtype: tuple or None
+
+        """
+        if not is_enabled():
+            return None
+        return tuple([get_last_sequence(topic_map) for side, topic_map
+                      in self._get_sides()])
+
+    def _get_sides (self):
+        """Returns the sides of the merge and their topic maps.
+
+        :rtype: list of tuples
+
+        """
+        sides = [(TARGET, self._target)]
+        if self._source is not None and self._source != self._target:
+            sides.append((SOURCE, self._source))
+        return sides
+
+    def _make (self):
+        """Computes the classes of merged topics and the duplicate
+        constructs."""
+        self._sequences = self._get_sequences()
+        partition = Partition()
+        if self._source is None:
+            self._add_addition_matches(partition)
+        elif self._source != self._target:
+            self._add_identity_matches(partition)
+            self._add_name_matches(partition)
+        self._classes = partition.get_classes(_get_sort_key)
+        keys = {}
+        for index, members in enumerate(self._classes):
+            for node in members:
+                keys[node] = index
+        self._duplicates = {
+            'association': self._find_duplicate_associations(keys),
+            'name': self._find_duplicate_characteristics(Name, keys),
+            'occurrence': self._find_duplicate_characteristics(Occurrence,
+                                                               keys),
+            }
+
+    def _merge_classes (self):
+        """Merges the target topics of each class into one, returning
+        the surviving topic of each class, or None for a class with
+        no target topics.
+
+        :rtype: list of `Topic`s
+
+        """
+        survivors = []
+        for members in self._classes:
+            topics = self._get_constructs(
+                Topic, [pk for side, pk in members if side == TARGET])
+            for topic in topics[1:]:
+                topics[0].merge_in(topic)
+            survivors.append((topics or [None])[0])
+        return survivors
+
+
+def _get_duplicates (signatures):
+    """Returns the groups of constructs sharing a signature, the
+    constructs of the target topic map first.
+
+    :param signatures: the constructs having each signature
+    :type signatures: dictionary
+    :rtype: list of lists of tuples
+
+    """
+    return sorted([sorted(members, key=_get_sort_key)
+                   for members in signatures.values() if len(members) > 1])
+
+def _get_owners (topic_map, addresses, kinds):
+    """Returns the database IDs of the topics in `topic_map` that have
+    each of `addresses` as an identity of one of `kinds`, keyed by
+    address.
+
+    :param topic_map: the topic map
+    :type topic_map: `TopicMap`
+    :param addresses: the addresses of the identities
+    :type addresses: list of strings
+    :param kinds: `SubjectLocator`, `SubjectIdentifier` or `Topic`
+      (for item identifiers)
+    :type kinds: sequence of classes
+    :rtype: dictionary
+
+    """
+    owners = {}
+    for start in range(0, len(addresses), CHUNK_SIZE):
+        chunk = addresses[start:start+CHUNK_SIZE]
+        for kind in kinds:
+            if kind is Topic:
+                rows = Topic.item_identifiers.through.objects.filter(
+                    topic__topic_map=topic_map,
+                    itemidentifier__address__in=chunk).values_list(
+                    'itemidentifier__address', 'topic')
+            else:
+                rows = kind.objects.filter(
+                    containing_topic_map=topic_map,
+                    address__in=chunk).values_list('address', 'topic')
+            for address, topic_id in rows:
+                owners.setdefault(address, []).append(topic_id)
+    return owners
+
+def _get_sort_key (node):
+    """Returns the key ordering the (side, database ID) pair `node`,
+    target constructs first and then by database ID.
+
+    :param node: the side and database ID of a construct
+    :type node: tuple
+    :rtype: tuple
+
+    """
+    return (node[0] != TARGET, node[1])
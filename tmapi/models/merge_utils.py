@@ -20,6 +20,9 @@ project (http://tinytim.sourceforget.net/).
 
 """
 
+from batch import add_m2m
+from invalidation import invalidate_construct
+from journal import UPDATE, record_change
 from signature import generate_role_signature, generate_variant_signature
 
 
@@ -42,7 +45,9 @@ def handle_existing_construct (source, target):
     # Handle item identifiers.
     for iid in source.get_item_identifiers():
         source.item_identifiers.remove(iid)
-        target.item_identifiers.add(iid)
+        add_m2m(target, 'item_identifiers', [iid])
+    invalidate_construct(target)
+    record_change(target, UPDATE)
     # Handle reifiers.
     source_reifier = source.get_reifier()
     if source_reifier is None:
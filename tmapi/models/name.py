@@ -19,22 +19,52 @@ from tmapi.exceptions import ModelConstraintException
 
 from construct_fields import ConstructFields
 from locator import Locator
+from name_merge_utils import get_name_key, merge_topics_by_name, \
+    record_name_key
+from proxy_utils import cast_related
 from reifiable import Reifiable
-from scoped import Scoped
+from scoped import Scoped, add_scopes, prepare_scope
 from typed import Typed
 from variant import Variant
 
 
+class NameKeyField (models.CharField):
+
+    """Field holding the key of a name, by which names with the same
+    type and value are found; see `tmapi.models.name_merge_utils`."""
+
+    # The fields from which the key is derived, so that it is
+    # recomputed when they are changed by `ConstructQuerySet.update`.
+    depends_on = ('type', 'value')
+
+    def __init__ (self, *args, **kwargs):
+        kwargs['db_index'] = True
+        kwargs['editable'] = False
+        kwargs['max_length'] = 32
+        super(NameKeyField, self).__init__(*args, **kwargs)
+
+    def pre_save (self, model_instance, add):
+        value = get_name_key(model_instance.type_id, model_instance.value)
+        setattr(model_instance, self.attname, value)
+        record_name_key(value)
+        return value
+
+
 class Name (ConstructFields, Reifiable, Scoped, Typed):
 
     """Represents a topic name item."""
     
     topic = models.ForeignKey('Topic', related_name='names')
     value = models.TextField()
+    name_key = NameKeyField()
 
     class Meta:
         app_label = 'tmapi'
 
+    def add_theme (self, theme):
+        super(Name, self).add_theme(theme)
+        merge_topics_by_name([self])
+
     def create_variant (self, value, scope, datatype=None):
         """Creates a `Variant` of this topic name with the specified
         string `value` and `scope`.
@@ -56,8 +86,7 @@ class Name (ConstructFields, Reifiable, Scoped, Typed):
             raise ModelConstraintException(self, 'The value may not be None')
         if not scope:
             raise ModelConstraintException(self, 'The scope may not be None')
-        if type(scope) not in (type([]), type(())):
-            scope = [scope]
+        scope = prepare_scope(self, self.topic_map_id, scope)
         if scope == list(self.get_scope()):
             raise ModelConstraintException(
                 self, 'The variant would be in the same scope as the parent')
@@ -71,8 +100,7 @@ class Name (ConstructFields, Reifiable, Scoped, Typed):
         variant = Variant(name=self, datatype=datatype.to_external_form(),
                           value=value, topic_map=self.topic_map)
         variant.save()
-        for theme in scope:
-            variant.scope.add(theme)
+        add_scopes([variant], [scope])
         return variant
         
     def get_parent (self, proxy=None):
@@ -83,10 +111,7 @@ class Name (ConstructFields, Reifiable, Scoped, Typed):
         :rtype: `Topic` or `proxy`
 
         """
-        parent = self.topic
-        if proxy is not None:
-            parent = proxy.objects.get(pk=parent.id)
-        return parent
+        return cast_related(self, 'topic', proxy)
 
     def get_value (self):
         """Returns the value of this name."""
@@ -96,12 +121,21 @@ class Name (ConstructFields, Reifiable, Scoped, Typed):
         """Returns the variants defined for this name."""
         return self.variants.all()
                 
+    def remove_theme (self, theme):
+        super(Name, self).remove_theme(theme)
+        merge_topics_by_name([self])
+
+    def set_type (self, construct_type):
+        super(Name, self).set_type(construct_type)
+        merge_topics_by_name([self])
+
     def set_value (self, value):
         """Sets the value of this name. The previous value is overridden."""
         if value is None:
             raise ModelConstraintException(self, 'The value may not be None')
         self.value = value
         self.save()
+        merge_topics_by_name([self])
 
     def __unicode__ (self):
         return self.value
@@ -0,0 +1,230 @@
+# Copyright 2011 Jamie Norrish (jamie@artefact.org.nz)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module containing utility functions for merging topics by their
+names, as required by the merge by topic name feature
+(MERGE_BY_TOPIC_NAME_FEATURE_STRING).
+
+Two topics are merged by name when they have names with the same
+value, type and scope. Each name has a `name_key`, a hash of its type
+and value held in an indexed column, so that the names that may match
+a name are found with an index lookup; their scopes are then
+compared.
+
+While the feature is enabled, topics are merged as soon as a name is
+created, or has its value, type or scope changed, and when topics
+are imported. `merge_all_by_name` merges all of the topics of a topic
+map that share names (eg, after enabling the feature for existing
+data), finding the candidate names with a GROUP BY query.
+
+"""
+
+import threading
+
+from django.db.models import Count, get_model
+from django.utils.hashcompat import md5_constructor
+
+from tmapi.constants import MERGE_BY_TOPIC_NAME_FEATURE_STRING
+
+from batch import CHUNK_SIZE, flush_batches
+from partition import Partition
+
+
+_local = threading.local()
+
+
+def defer_name_merging (function):
+    """Decorator suspending the merging of topics by name in the
+    current thread while `function` runs, and then merging the topics
+    of the target topic map that have names with the keys written
+    meanwhile, if the merge by topic name feature is enabled.
+
+    `function` must take the source and target topic maps as its
+    first two arguments (as `tmapi.models.copy_utils.copy` does). It
+    may therefore hold references to topics of the target topic map
+    without their being merged away. The work done afterwards depends
+    on the number of names `function` writes, not on the size of the
+    target topic map.
+
+    :param function: the function to decorate
+    :type function: function
+    :rtype: function
+
+    """
+    def wrapper (source, target, *args, **kwargs):
+        outermost = not getattr(_local, 'suspended', 0)
+        if outermost:
+            _local.keys = set()
+        _local.suspended = getattr(_local, 'suspended', 0) + 1
+        try:
+            result = function(source, target, *args, **kwargs)
+        finally:
+            _local.suspended -= 1
+            if outermost:
+                keys = _local.keys
+                _local.keys = None
+        if outermost and keys and is_merging_by_name(target):
+            _merge_by_keys(target, list(keys), ())
+        return result
+    wrapper.__name__ = function.__name__
+    wrapper.__doc__ = function.__doc__
+    return wrapper
+
+def get_name_key (type_id, value):
+    """Returns the key of a name with type `type_id` and `value`.
+
+    :param type_id: the database ID of the name type
+    :type type_id: integer
+    :param value: the value of the name
+    :type value: string
+    :rtype: string
+
+    """
+    key = u'%s:%s' % (type_id, value)
+    return md5_constructor(key.encode('utf-8')).hexdigest()
+
+def is_merging_by_name (topic_map):
+    """Returns True if topics in `topic_map` are merged by name
+    whenever their names change.
+
+    :param topic_map: the topic map
+    :type topic_map: `TopicMap`
+    :rtype: boolean
+
+    """
+    if getattr(_local, 'suspended', 0):
+        return False
+    return topic_map.topic_map_system.get_feature(
+        MERGE_BY_TOPIC_NAME_FEATURE_STRING)
+
+def merge_all_by_name (topic_map):
+    """Merges all topics in `topic_map` that have names with the same
+    value, type and scope.
+
+    The keys shared by the names of more than one topic are found
+    with a single GROUP BY query; only the names with those keys are
+    then read.
+
+    :param topic_map: the topic map
+    :type topic_map: `TopicMap`
+    :rtype: dictionary of the identifiers of the merged topics mapped
+      to the topics they were merged into
+
+    """
+    flush_batches()
+    name_model = get_model('tmapi', 'Name')
+    keys = list(name_model.objects.filter(topic_map=topic_map).values(
+            'name_key').annotate(topic_count=Count('topic', distinct=True))
+                .filter(topic_count__gt=1).values_list('name_key', flat=True))
+    return _merge_by_keys(topic_map, keys, ())
+
+def merge_topics_by_name (names):
+    """Merges the topics of `names` with any other topics having
+    names with the same value, type and scope, if the merge by topic
+    name feature is enabled.
+
+    The topic of each of `names` is kept, the other topics being
+    merged into it.
+
+    :param names: the names that have been created or changed
+    :type names: list of `Name`s
+    :rtype: dictionary of the identifiers of the merged topics mapped
+      to the topics they were merged into
+
+    """
+    if not names:
+        return {}
+    topic_map = names[0].topic_map
+    if not is_merging_by_name(topic_map):
+        return {}
+    return _merge_by_keys(topic_map, list(set(
+                [name.name_key for name in names])),
+                          [name.topic_id for name in names])
+
+def record_name_key (key):
+    """Notes that a name with `key` has been written, if the merging
+    of topics by name is suspended in the current thread (see
+    `defer_name_merging`).
+
+    :param key: the name key
+    :type key: string
+
+    """
+    keys = getattr(_local, 'keys', None)
+    if keys is not None:
+        keys.add(key)
+
+def _merge_by_keys (topic_map, keys, preferred_ids):
+    """Merges the topics in `topic_map` that have names with the same
+    value, type and scope, among the names with `keys`.
+
+    :param topic_map: the topic map
+    :type topic_map: `TopicMap`
+    :param keys: the name keys
+    :type keys: list of strings
+    :param preferred_ids: the database IDs of topics to be kept in
+      preference to those they are merged with
+    :type preferred_ids: list of integers
+    :rtype: dictionary
+
+    """
+    flush_batches()
+    name_model = get_model('tmapi', 'Name')
+    scope_field = name_model._meta.get_field('scope')
+    through = scope_field.rel.through
+    name_name = scope_field.m2m_field_name()
+    theme_name = scope_field.m2m_reverse_field_name()
+    groups = {}
+    for start in range(0, len(keys), CHUNK_SIZE):
+        rows = list(name_model.objects.filter(
+                topic_map=topic_map,
+                name_key__in=keys[start:start+CHUNK_SIZE]).values_list(
+                'pk', 'topic', 'type', 'value'))
+        scopes = dict([(row[0], set()) for row in rows])
+        pks = scopes.keys()
+        for name_start in range(0, len(pks), CHUNK_SIZE):
+            for name_id, theme_id in through.objects.filter(**{
+                    '%s__in' % name_name: pks[name_start:name_start+CHUNK_SIZE]
+                    }).values_list(name_name, theme_name):
+                scopes[name_id].add(theme_id)
+        for name_id, topic_id, type_id, value in rows:
+            signature = (type_id, value, frozenset(scopes[name_id]))
+            groups.setdefault(signature, set()).add(topic_id)
+    partition = Partition()
+    for group in groups.values():
+        group = list(group)
+        for topic_id in group[1:]:
+            partition.union(group[0], topic_id)
+    classes = partition.get_classes()
+    if not classes:
+        return {}
+    topic_model = get_model('tmapi', 'Topic')
+    merged = {}
+    with topic_map.batch():
+        for topic_class in classes:
+            survivor_id = min(topic_class)
+            for topic_id in preferred_ids:
+                if topic_id in topic_class:
+                    survivor_id = topic_id
+                    break
+            topic_ids = list(topic_class)
+            topics = {}
+            for start in range(0, len(topic_ids), CHUNK_SIZE):
+                topics.update(topic_model.objects.in_bulk(
+                        topic_ids[start:start+CHUNK_SIZE]))
+            survivor = topics.pop(survivor_id)
+            for topic in topics.values():
+                merged[topic.get_id()] = survivor
+                survivor.merge_in(topic)
+    return merged
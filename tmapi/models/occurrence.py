@@ -16,6 +16,7 @@ from django.db import models
 
 from construct_fields import ConstructFields
 from datatype_aware import DatatypeAware
+from proxy_utils import cast_related
 from typed import Typed
 
 
@@ -34,9 +35,5 @@ class Occurrence (ConstructFields, DatatypeAware, Typed):
         :rtype: `Topic`
         
         """
-        if proxy is None:
-            topic = self.topic
-        else:
-            topic = proxy.objects.get(pk=self.topic.id)
-        return topic
+        return cast_related(self, 'topic', proxy)
         
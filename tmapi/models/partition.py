@@ -0,0 +1,72 @@
+# Copyright 2011 Jamie Norrish (jamie@artefact.org.nz)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module providing a partition of items into disjoint sets, as used
+to find the classes of topics that are to be merged together."""
+
+
+class Partition (object):
+
+    """Disjoint sets of hashable items, joined with `union` (a
+    union-find structure with path compression)."""
+
+    def __init__ (self):
+        self._parents = {}
+
+    def find (self, node):
+        """Returns the item representing the set containing `node`,
+        adding `node` as a set of its own if it is new.
+
+        :param node: the item
+        :type node: object
+        :rtype: object
+
+        """
+        root = self._parents.setdefault(node, node)
+        while self._parents[root] != root:
+            root = self._parents[root]
+        while node != root:
+            parent = self._parents[node]
+            self._parents[node] = root
+            node = parent
+        return root
+
+    def get_classes (self, key=None):
+        """Returns the sets with more than one member, as lists
+        sorted by `key`.
+
+        :param key: the function giving the sort key of an item
+        :type key: function
+        :rtype: list of lists
+
+        """
+        classes = {}
+        for node in self._parents:
+            classes.setdefault(self.find(node), []).append(node)
+        return sorted([sorted(members, key=key)
+                       for members in classes.values() if len(members) > 1])
+
+    def union (self, node, other):
+        """Joins the sets containing `node` and `other`.
+
+        :param node: an item
+        :type node: object
+        :param other: another item
+        :type other: object
+
+        """
+        root = self.find(node)
+        other_root = self.find(other)
+        if root != other_root:
+            self._parents[other_root] = root
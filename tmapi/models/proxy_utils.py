@@ -0,0 +1,104 @@
+# Copyright 2011 Jamie Norrish (jamie@artefact.org.nz)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module containing utility functions for working with Django proxy
+models of the TMAPI models.
+
+Casting an already loaded instance to a proxy model reuses the loaded
+row (and any related objects cached on it), rather than fetching the
+same row again through the proxy's manager.
+
+"""
+
+import copy
+
+
+def cast (instance, proxy):
+    """Returns `instance` as an instance of the Django proxy model
+    `proxy`.
+
+    If `proxy` is backed by the concrete model of `instance`, the
+    returned object shares the loaded field values and caches of
+    `instance` and no query is made. Otherwise the object is fetched
+    through `proxy`'s manager.
+
+    :param instance: the model instance to cast
+    :type instance: `Model` or None
+    :param proxy: Django proxy model
+    :type proxy: class or None
+    :rtype: `proxy` instance, or `instance` if `proxy` is None
+
+    """
+    if instance is None or proxy is None or type(instance) is proxy:
+        return instance
+    if not _is_proxy_for(proxy, type(instance)):
+        return proxy.objects.get(pk=instance.pk)
+    cast_instance = proxy.__new__(proxy)
+    cast_instance.__dict__ = instance.__dict__.copy()
+    cast_instance._state = copy.copy(instance._state)
+    return cast_instance
+
+def cast_related (instance, field_name, proxy):
+    """Returns the object referenced by the foreign key `field_name`
+    of `instance` as an instance of the Django proxy model `proxy`.
+
+    If the related object has already been loaded, it is cast without
+    a query; otherwise it is fetched once, directly through `proxy`,
+    and cached on `instance`.
+
+    :param instance: the model instance holding the foreign key
+    :type instance: `Model`
+    :param field_name: the name of the foreign key field
+    :type field_name: string
+    :param proxy: Django proxy model
+    :type proxy: class or None
+    :rtype: `proxy` instance, or the related object if `proxy` is None
+
+    """
+    field = instance._meta.get_field(field_name)
+    cache_name = field.get_cache_name()
+    if proxy is None or hasattr(instance, cache_name):
+        return cast(getattr(instance, field_name), proxy)
+    related_id = getattr(instance, field.attname)
+    if related_id is None:
+        return None
+    related = proxy.objects.get(pk=related_id)
+    if _is_proxy_for(proxy, field.rel.to):
+        setattr(instance, cache_name, related)
+    return related
+
+def _concrete_model (model):
+    """Returns the concrete model underlying `model`.
+
+    :param model: Django model class, possibly a proxy
+    :type model: class
+    :rtype: class
+
+    """
+    while model._meta.proxy:
+        model = model._meta.proxy_for_model
+    return model
+
+def _is_proxy_for (proxy, model):
+    """Returns True if instances of `model` may be cast to `proxy`,
+    that is, if both are backed by the same concrete model.
+
+    :param proxy: Django model class
+    :type proxy: class
+    :param model: Django model class
+    :type model: class
+    :rtype: boolean
+
+    """
+    return _concrete_model(proxy) is _concrete_model(model)
@@ -0,0 +1,279 @@
+# Copyright 2011 Jamie Norrish (jamie@artefact.org.nz)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module supporting topic maps opened read-only.
+
+A topic map retrieved from a `TopicMapSystem` whose readOnly feature
+(READ_ONLY_FEATURE_STRING) is enabled is read-only until it is closed
+(see `TopicMap.close`). This suits replicas that only serve reads.
+
+Only the `TopicMap` instance returned by the read-only system, and
+the constructs reached through it, are read-only; the same topic map
+retrieved through any other system remains writable. A construct
+belongs to a read-only topic map when it was loaded through one: the
+constructs returned by its lookups, indices and related managers,
+and the objects reached from them through related fields, have that
+`TopicMap` instance as their `topic_map`. The related field
+descriptors of the construct models are wrapped to this end when a
+topic map is first opened read-only, so that there is no overhead
+unless the readOnly feature is used.
+
+Every TMAPI operation that would modify a read-only topic map raises
+an `UnsupportedOperationException` before doing anything. Since the
+topic map cannot change, the results of the methods decorated with
+`cached` (lookups of topics by identifier, and the queries of the
+indices) are kept on the `TopicMap` instance for as long as it is
+open, with no invalidation. Changes written to the database by
+another system are therefore not seen until the topic map is
+reopened, or an index is reindexed.
+
+"""
+
+from django.db.models import Model, get_model
+from django.db.models.fields.related import \
+    ForeignRelatedObjectsDescriptor, ManyRelatedObjectsDescriptor, \
+    ReverseManyRelatedObjectsDescriptor, \
+    ReverseSingleRelatedObjectDescriptor, SingleRelatedObjectDescriptor
+from django.db.models.manager import Manager
+from django.db.models.query import QuerySet
+
+from tmapi.exceptions import UnsupportedOperationException
+
+from locator import LocatorBase
+
+
+# The name of the attribute of a `TopicMap` holding the cache of a
+# read-only topic map, which is None if it is writable.
+CACHE_NAME = '_read_only_cache'
+
+# The name of the attribute of a `ConstructQuerySet`, or of a related
+# manager, holding the read-only `TopicMap` its results belong to.
+MAP_NAME = '_read_only_map'
+
+# The names of the models whose related field descriptors pass on
+# read-only state.
+MODEL_NAMES = ('Association', 'ItemIdentifier', 'Name', 'Occurrence', 'Role',
+               'SubjectIdentifier', 'SubjectLocator', 'Topic', 'TopicMap',
+               'Variant')
+
+# The related field descriptors that pass on read-only state.
+RELATED_DESCRIPTORS = (
+    ForeignRelatedObjectsDescriptor, ManyRelatedObjectsDescriptor,
+    ReverseManyRelatedObjectsDescriptor, ReverseSingleRelatedObjectDescriptor,
+    SingleRelatedObjectDescriptor)
+
+# Marks a cached result of None.
+_NONE = object()
+
+
+class ReadOnlyDescriptor (object):
+
+    """Descriptor wrapping a related field descriptor, so that the
+    objects, managers and QuerySets reached through it from a
+    construct of a read-only topic map are also read-only."""
+
+    def __init__ (self, descriptor):
+        self._descriptor = descriptor
+
+    def __get__ (self, instance, instance_type=None):
+        value = self._descriptor.__get__(instance, instance_type)
+        if instance is not None:
+            topic_map = get_read_only_map(instance)
+            if topic_map is not None:
+                value = mark_read_only(topic_map, value)
+        return value
+
+    def __set__ (self, instance, value):
+        self._descriptor.__set__(instance, value)
+
+    def __getattr__ (self, name):
+        return getattr(self._descriptor, name)
+
+
+def cached (method):
+    """Decorator caching the results of `method` when the topic map
+    it operates on is read-only.
+
+    `method` must be a method of a `TopicMap`, or of an object with a
+    `topic_map` attribute (such as an `Index`). A cached `QuerySet` is
+    evaluated before it is stored, so that it is read from the
+    database only once. The results are marked as belonging to the
+    read-only topic map.
+
+    :param method: the method to decorate
+    :type method: function
+    :rtype: function
+
+    """
+    def wrapper (self, *args, **kwargs):
+        topic_map = get_read_only_map(getattr(self, 'topic_map', self))
+        if topic_map is None:
+            return method(self, *args, **kwargs)
+        cache = getattr(topic_map, CACHE_NAME)
+        key = (self.__class__.__name__, method.__name__,
+               get_argument_key(args),
+               get_argument_key(sorted(kwargs.items())))
+        result = cache.get(key)
+        if result is None:
+            result = mark_read_only(topic_map, method(self, *args, **kwargs))
+            if isinstance(result, QuerySet):
+                len(result)
+            if result is None:
+                result = _NONE
+            cache[key] = result
+        if result is _NONE:
+            return None
+        return result
+    wrapper.__name__ = method.__name__
+    wrapper.__doc__ = method.__doc__
+    return wrapper
+
+def check_writable (construct):
+    """Raises an `UnsupportedOperationException` if `construct`
+    belongs to a read-only topic map.
+
+    :param construct: the topic map or construct to be modified
+    :type construct: `TopicMap` or `Construct`
+
+    """
+    if get_read_only_map(construct) is not None:
+        raise UnsupportedOperationException('The topic map is read-only')
+
+def clear_cached (topic_map, owner):
+    """Discards the cached results of the methods of `owner` for the
+    read-only `topic_map`.
+
+    :param topic_map: the topic map
+    :type topic_map: `TopicMap`
+    :param owner: the object whose methods' results are to be discarded
+    :type owner: object
+
+    """
+    topic_map = get_read_only_map(topic_map)
+    if topic_map is not None:
+        cache = getattr(topic_map, CACHE_NAME)
+        name = owner.__class__.__name__
+        for key in cache.keys():
+            if key[0] == name:
+                del cache[key]
+
+def close_read_only (topic_map):
+    """Closes `topic_map` as a read-only topic map, discarding its
+    cached results.
+
+    :param topic_map: the topic map
+    :type topic_map: `TopicMap`
+
+    """
+    setattr(topic_map, CACHE_NAME, None)
+
+def get_argument_key (value):
+    """Returns a hashable form of the method argument `value`, for
+    use in a cache key.
+
+    Locators are keyed by their external form, and model instances
+    by their class and database ID.
+
+    :param value: the argument
+    :type value: object
+    :rtype: object
+
+    """
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return tuple([get_argument_key(item) for item in value])
+    if isinstance(value, LocatorBase):
+        return value.to_external_form()
+    if isinstance(value, Model):
+        return (value.__class__, value.pk)
+    return value
+
+def get_read_only_map (construct):
+    """Returns the read-only topic map that `construct` belongs to,
+    or None if it is writable.
+
+    No query is made: a construct belongs to a read-only topic map
+    only if it was loaded through that `TopicMap` instance.
+
+    :param construct: a topic map or construct
+    :type construct: `TopicMap` or `Construct`
+    :rtype: `TopicMap` or None
+
+    """
+    values = getattr(construct, '__dict__', {})
+    if values.get(CACHE_NAME) is not None:
+        return construct
+    topic_map = values.get('_topic_map_cache')
+    if topic_map is not None and topic_map.__dict__.get(CACHE_NAME) is not None:
+        return topic_map
+    return None
+
+def install_read_only_descriptors ():
+    """Wraps the related field descriptors of the models named in
+    MODEL_NAMES with `ReadOnlyDescriptor`s, unless they are already
+    wrapped."""
+    for model_name in MODEL_NAMES:
+        model = get_model('tmapi', model_name)
+        for name, descriptor in model.__dict__.items():
+            if isinstance(descriptor, RELATED_DESCRIPTORS):
+                setattr(model, name, ReadOnlyDescriptor(descriptor))
+
+def is_read_only (topic_map):
+    """Returns True if `topic_map` is open read-only.
+
+    :param topic_map: the topic map
+    :type topic_map: `TopicMap`
+    :rtype: boolean
+
+    """
+    return get_read_only_map(topic_map) is not None
+
+def mark_read_only (topic_map, value):
+    """Returns `value` marked as belonging to the read-only
+    `topic_map`.
+
+    A construct of `topic_map` has it set as its `topic_map`; a
+    related manager or `QuerySet` of constructs returns constructs so
+    marked. Any other value is returned unchanged.
+
+    :param topic_map: the read-only topic map
+    :type topic_map: `TopicMap`
+    :param value: a construct, manager, `QuerySet` or other value
+    :type value: object
+    :rtype: object
+
+    """
+    if isinstance(value, Model):
+        if getattr(value, 'topic_map_id', None) == topic_map.pk:
+            value._topic_map_cache = topic_map
+    elif isinstance(value, Manager):
+        setattr(value, MAP_NAME, topic_map)
+    elif isinstance(value, QuerySet) and hasattr(value, MAP_NAME):
+        if value._result_cache is None:
+            value = value._clone()
+            setattr(value, MAP_NAME, topic_map)
+        else:
+            for construct in value._result_cache:
+                mark_read_only(topic_map, construct)
+    return value
+
+def open_read_only (topic_map):
+    """Opens `topic_map` read-only.
+
+    :param topic_map: the topic map
+    :type topic_map: `TopicMap`
+
+    """
+    install_read_only_descriptors()
+    if getattr(topic_map, CACHE_NAME, None) is None:
+        setattr(topic_map, CACHE_NAME, {})
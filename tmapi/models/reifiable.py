@@ -17,6 +17,7 @@ from django.db import models
 from tmapi.exceptions import ModelConstraintException
 
 from construct import Construct
+from request_scope import load_related
 
 
 class Reifiable (Construct, models.Model):
@@ -37,6 +38,7 @@ class Reifiable (Construct, models.Model):
         :rtype: `Topic`
 
         """
+        load_related(self, 'reifier')
         return self.reifier
 
     def set_reifier (self, reifier):
@@ -0,0 +1,277 @@
+# Copyright 2011 Jamie Norrish (jamie@artefact.org.nz)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module providing request scopes, within which the objects referred
+to by many constructs are loaded together.
+
+While a `RequestScope` is active in the current thread, every
+construct loaded through a construct manager is registered with it.
+The first call of `get_type`, `get_player` or `get_reifier` on a
+registered construct then loads the referenced topic of every
+registered construct of the same model that has not yet loaded it,
+with a single IN query (per chunk of CHUNK_SIZE topics). `get_scope`
+similarly loads the scopes of all of those constructs with a single
+query. Code iterating over many constructs, such as a template or a
+GraphQL resolver, thereby makes one query per kind of getter rather
+than one per construct, without having to be changed.
+
+Constructs are registered by database ID and held by weak reference,
+so that the request scope does not keep alive those that are no longer
+used, and each registered construct is considered only once by each
+kind of getter. The objects so loaded are cached on the constructs, so
+a request scope should cover no more than a single request. Loaded
+scopes are discarded whenever a topic map is changed (see
+`tmapi.models.invalidation`), and are only used while the request
+scope that loaded them is active.
+`tmapi.middleware.RequestScopeMiddleware` opens a request scope for
+each request handled by Django.
+
+"""
+
+import itertools
+import threading
+import weakref
+
+from batch import CHUNK_SIZE, flush_batches
+from proxy_utils import _concrete_model
+
+
+# The name of the attribute caching the scope of a construct, after
+# Django's naming of the caches of related objects.
+SCOPE_CACHE_NAME = '_scope_cache'
+
+# Source of the identifiers of request scopes.
+_ids = itertools.count()
+
+_local = threading.local()
+
+
+class RequestScope (object):
+
+    """Context manager within which the objects referred to by
+    constructs are loaded together.
+
+    Request scopes are reentrant: entering a request scope while
+    another is active in the current thread joins the existing scope.
+
+    """
+
+    def __init__ (self):
+        self._constructs = {}
+        self._generation = 0
+        self._id = _ids.next()
+        self._joined = None
+        self._pending = {}
+
+    def __enter__ (self):
+        existing = get_request_scope()
+        if existing is not None:
+            self._joined = existing
+            return existing
+        _local.scope = self
+        return self
+
+    def __exit__ (self, exc_type, exc_value, traceback):
+        if self._joined is not None:
+            self._joined = None
+            return False
+        _local.scope = None
+        self._constructs = {}
+        self._pending = {}
+        return False
+
+    def add (self, instance):
+        """Registers `instance`, so that the objects it refers to are
+        loaded together with those of other constructs of its model.
+
+        :param instance: the construct
+        :type instance: `Construct`
+
+        """
+        model = _concrete_model(type(instance))
+        constructs = self._constructs.get(model)
+        if constructs is None:
+            constructs = self._constructs[model] = \
+                weakref.WeakValueDictionary()
+        constructs[instance.pk] = instance
+        for (pending_model, cache_name), pending in self._pending.items():
+            if pending_model is model:
+                pending[instance.pk] = instance
+
+    def load_related (self, instance, field_name):
+        """Loads the object referenced by the foreign key `field_name`
+        of `instance`, and of every other registered construct of the
+        same model that has not loaded it.
+
+        :param instance: the construct
+        :type instance: `Construct`
+        :param field_name: the name of the foreign key field
+        :type field_name: string
+
+        """
+        field = instance._meta.get_field(field_name)
+        cache_name = field.get_cache_name()
+        constructs = [construct for construct in
+                      self._get_siblings(instance, cache_name)
+                      if not hasattr(construct, cache_name) and
+                      getattr(construct, field.attname) is not None]
+        ids = list(set([getattr(construct, field.attname)
+                        for construct in constructs]))
+        related = {}
+        for start in range(0, len(ids), CHUNK_SIZE):
+            for obj in field.rel.to._default_manager.filter(
+                pk__in=ids[start:start+CHUNK_SIZE]):
+                related[obj.pk] = obj
+        for construct in constructs:
+            obj = related.get(getattr(construct, field.attname))
+            if obj is not None:
+                setattr(construct, cache_name, obj)
+
+    def load_scope (self, instance):
+        """Loads the scope of `instance`, and of every other
+        registered construct of the same model whose scope has not
+        been loaded.
+
+        :param instance: the scoped construct
+        :type instance: `Scoped`
+
+        """
+        flush_batches()
+        field = instance._meta.get_field('scope')
+        through = field.rel.through
+        source_name = field.m2m_field_name()
+        target_name = field.m2m_reverse_field_name()
+        key = self._get_key()
+        constructs = [construct for construct in
+                      self._get_siblings(instance, SCOPE_CACHE_NAME)
+                      if getattr(construct, SCOPE_CACHE_NAME,
+                                 (None,))[0] != key]
+        ids = list(set([construct.pk for construct in constructs]))
+        scopes = dict([(construct_id, []) for construct_id in ids])
+        for start in range(0, len(ids), CHUNK_SIZE):
+            for row in through.objects.filter(**{
+                    '%s__in' % source_name: ids[start:start+CHUNK_SIZE]}
+                    ).select_related(target_name):
+                scopes[getattr(row, '%s_id' % source_name)].append(
+                    getattr(row, target_name))
+        key = self._get_key()
+        for construct in constructs:
+            setattr(construct, SCOPE_CACHE_NAME, (key, scopes[construct.pk]))
+
+    def reset (self):
+        """Discards the scopes loaded by this request scope."""
+        self._generation += 1
+        for key in self._pending.keys():
+            if key[1] == SCOPE_CACHE_NAME:
+                del self._pending[key]
+
+    def _get_key (self):
+        """Returns the key identifying the scopes loaded by this
+        request scope since it was last reset.
+
+        :rtype: tuple
+
+        """
+        return (self._id, self._generation)
+
+    def _get_siblings (self, instance, cache_name):
+        """Returns the registered constructs of the same model as
+        `instance`, including `instance`, that have not yet been
+        considered for loading into `cache_name`.
+
+        The constructs returned are no longer pending for
+        `cache_name`, so that each is considered once.
+
+        :param instance: the construct
+        :type instance: `Construct`
+        :param cache_name: the name of the attribute caching the
+          objects to be loaded
+        :type cache_name: string
+        :rtype: list of `Construct`s
+
+        """
+        model = _concrete_model(type(instance))
+        constructs = self._constructs.get(model)
+        if constructs is None or constructs.get(instance.pk) is not instance:
+            self.add(instance)
+        key = (model, cache_name)
+        pending = self._pending.get(key)
+        if pending is None:
+            pending = self._constructs[model]
+        self._pending[key] = weakref.WeakValueDictionary()
+        siblings = pending.values()
+        if pending.get(instance.pk) is not instance:
+            siblings.append(instance)
+        return siblings
+
+
+def clear_loaded_scope (instance):
+    """Discards the scope of `instance` loaded by a request scope.
+
+    :param instance: the scoped construct
+    :type instance: `Scoped`
+
+    """
+    instance.__dict__.pop(SCOPE_CACHE_NAME, None)
+
+def get_loaded_scope (instance):
+    """Returns the scope of `instance`, loading it together with
+    those of other constructs if a request scope is active.
+
+    Returns None if no request scope is active.
+
+    :param instance: the scoped construct
+    :type instance: `Scoped`
+    :rtype: list of `Topic`s or None
+
+    """
+    scope = get_request_scope()
+    if scope is None:
+        return None
+    cached = getattr(instance, SCOPE_CACHE_NAME, None)
+    if cached is None or cached[0] != scope._get_key():
+        scope.load_scope(instance)
+        cached = getattr(instance, SCOPE_CACHE_NAME)
+    return cached[1]
+
+def get_request_scope ():
+    """Returns the request scope active in the current thread.
+
+    :rtype: `RequestScope` or None
+
+    """
+    return getattr(_local, 'scope', None)
+
+def load_related (instance, field_name):
+    """Loads the object referenced by the foreign key `field_name` of
+    `instance`, together with those of other constructs, if a request
+    scope is active and the object has not already been loaded.
+
+    :param instance: the construct
+    :type instance: `Construct`
+    :param field_name: the name of the foreign key field
+    :type field_name: string
+
+    """
+    scope = get_request_scope()
+    if scope is not None and not hasattr(
+        instance, instance._meta.get_field(field_name).get_cache_name()):
+        scope.load_related(instance, field_name)
+
+def reset_request_scope ():
+    """Discards the scopes loaded by the request scope active in the
+    current thread, if any."""
+    scope = get_request_scope()
+    if scope is not None:
+        scope.reset()
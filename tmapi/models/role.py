@@ -17,7 +17,9 @@ from django.db import models
 from tmapi.exceptions import ModelConstraintException
 
 from construct_fields import ConstructFields
+from proxy_utils import cast_related
 from reifiable import Reifiable
+from request_scope import load_related
 from typed import Typed
 
 
@@ -34,24 +36,23 @@ class Role (ConstructFields, Reifiable, Typed):
     def get_parent (self, proxy=None):
         """Returns the `Association` to which this role belongs.
 
+        :param proxy: Django proxy model
+        :type proxy: class
         :rtype: `Association`
         
         """
-        parent = self.association
-        if proxy is not None:
-            parent = proxy.objects.get(pk=parent.id)
-        return parent
+        return cast_related(self, 'association', proxy)
 
     def get_player (self, proxy=None):
         """Returns the topic playing this role.
 
+        :param proxy: Django proxy model
+        :type proxy: class
         :rtype: `Topic`
         
         """
-        player = self.player
-        if proxy is not None:
-            player = proxy.objects.get(pk=player.id)
-        return player
+        load_related(self, 'player')
+        return cast_related(self, 'player', proxy)
 
     def set_player (self, player):
         """Sets the role player.
@@ -16,7 +16,12 @@ from django.db import models
 
 from tmapi.exceptions import ModelConstraintException
 
+from batch import add_join_rows, add_m2m, flush_batches
 from construct import Construct
+from invalidation import invalidate_construct
+from journal import UPDATE, record_change
+from read_only import check_writable
+from request_scope import clear_loaded_scope, get_loaded_scope
 
 
 class Scoped (Construct, models.Model):
@@ -40,19 +45,29 @@ class Scoped (Construct, models.Model):
         """
         if theme is None:
             raise ModelConstraintException(self, 'The theme may not be None')
-        if self.topic_map != theme.get_topic_map():
+        if self.topic_map_id != theme.topic_map_id:
             raise ModelConstraintException(
                 self, 'The theme is not from the same topic map')
-        self.scope.add(theme)
+        add_m2m(self, 'scope', [theme])
+        clear_loaded_scope(self)
+        invalidate_construct(self)
+        record_change(self, UPDATE)
         
     def get_scope (self):
         """Returns the topics which define the scope. An empty set
         represents the unconstrained scope.
 
+        While a `RequestScope` is active, the scope is loaded
+        together with those of other constructs.
+
         :rtype: `QuerySet` of `Topic`s
         
         """
-        return self.scope.all()
+        scope = self.scope.all()
+        themes = get_loaded_scope(self)
+        if themes is not None:
+            scope._result_cache = list(themes)
+        return scope
 
     def remove_theme (self, theme):
         """Removes a topic from the scope.
@@ -61,4 +76,63 @@ class Scoped (Construct, models.Model):
         :type theme: `Topic`
 
         """
+        check_writable(self)
+        flush_batches()
         self.scope.remove(theme)
+        clear_loaded_scope(self)
+        invalidate_construct(self)
+        record_change(self, UPDATE)
+
+
+def add_scopes (constructs, scopes):
+    """Adds each of `scopes` to the corresponding newly created
+    construct in `constructs`.
+
+    The themes are added with a single bulk insert into the scope
+    join table (or are queued, if a batch is active). The themes must
+    already have been validated with `prepare_scope()`.
+
+    :param constructs: newly created scoped constructs, all of the
+      same model and in the same topic map
+    :type constructs: list of `Scoped`s
+    :param scopes: the scope of each construct
+    :type scopes: list of lists of `Topic`s
+
+    """
+    rows = []
+    for construct, scope in zip(constructs, scopes):
+        for theme in scope:
+            rows.append((construct.pk, theme.pk))
+    if rows:
+        construct = constructs[0]
+        add_join_rows(type(construct), 'scope', construct.topic_map_id, rows,
+                      new=True)
+
+def prepare_scope (reporter, topic_map_id, scope):
+    """Returns `scope` as a list of themes, having checked that each
+    theme is a topic in the topic map with database ID
+    `topic_map_id`.
+
+    :param reporter: the construct reporting any constraint violation
+    :type reporter: `Construct`
+    :param topic_map_id: the database ID of the topic map
+    :type topic_map_id: integer
+    :param scope: the themes
+    :type scope: `Topic`, list of `Topic`s, or None
+    :rtype: list of `Topic`s
+    :raises `ModelConstraintException`: if a theme is None or is not
+      from the topic map
+
+    """
+    if scope is None:
+        return []
+    if type(scope) not in (type([]), type(())):
+        scope = [scope]
+    for theme in scope:
+        if theme is None:
+            raise ModelConstraintException(
+                reporter, 'The theme may not be None')
+        if theme.topic_map_id != topic_map_id:
+            raise ModelConstraintException(
+                reporter, 'The theme is not from the same topic map')
+    return list(scope)
@@ -14,10 +14,10 @@
 
 from django.db import models
 
-from locator import LocatorBase
+from locator import StoredLocatorBase
 
 
-class SubjectLocator (LocatorBase, models.Model):
+class SubjectLocator (StoredLocatorBase, models.Model):
 
     topic = models.ForeignKey('Topic', related_name='subject_locators')
     address = models.CharField(max_length=512)
@@ -26,14 +26,7 @@ class SubjectLocator (LocatorBase, models.Model):
 
     class Meta:
         app_label = 'tmapi'
+        unique_together = (('address', 'containing_topic_map'),)
 
-    def __init__ (self, *args, **kwargs):
-        super(SubjectLocator, self).__init__(*args, **kwargs)
-        self.generate_forms(self.address)
-        
-    def save (self, *args, **kwargs):
-        super(SubjectLocator, self).save(*args, **kwargs)
-        self.generate_forms(self.address)
-        
     def __unicode__ (self):
         return self.address
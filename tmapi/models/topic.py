@@ -16,18 +16,26 @@
 
 from django.db import models
 
-from tmapi.constants import AUTOMERGE_FEATURE_STRING, XSD_ANY_URI, XSD_FLOAT, XSD_INT, XSD_LONG, XSD_STRING
+from tmapi.constants import AUTOMERGE_FEATURE_STRING, DEFAULT_NAME_TYPE, \
+    XSD_ANY_URI, XSD_FLOAT, XSD_INT, XSD_LONG, XSD_STRING
 from tmapi.exceptions import IdentityConstraintException, \
     ModelConstraintException, TopicInUseException
 
+from batch import add_m2m, flush_batches
 from construct import Construct
 from construct_fields import ConstructFields
+from invalidation import invalidate_construct
 from item_identifier import ItemIdentifier
+from iteration_utils import get_prefetched
+from journal import MERGE, UPDATE, record_change
 from locator import Locator
 from name import Name
+from name_merge_utils import merge_topics_by_name
 from subject_identifier import SubjectIdentifier
 from subject_locator import SubjectLocator
 from occurrence import Occurrence
+from read_only import check_writable
+from scoped import add_scopes, prepare_scope
 from merge_utils import handle_existing_construct, \
     move_role_characteristics, move_variants
 from signature import generate_association_signature, \
@@ -59,38 +67,32 @@ class Topic (Construct, ConstructFields):
         if item_identifier is None:
             raise ModelConstraintException(
                 self, 'The item identifier may not be None')
+        check_writable(self)
         address = item_identifier.to_external_form()
-        try:
-            ii = ItemIdentifier.objects.get(address=address,
-                                            containing_topic_map=self.topic_map)
-            construct = ii.get_construct()
-            if construct == self:
-                return
+        topic, construct = self.topic_map.resolve_identity(item_identifier)
+        if construct is not None:
             if not isinstance(construct, Topic):
                 raise IdentityConstraintException(
                     self, construct, item_identifier, 'This item identifier is already associated with another non-Topic construct')
-            if self.topic_map.topic_map_system.get_feature(
+            if construct == self:
+                return
+            if not self.topic_map.topic_map_system.get_feature(
                 AUTOMERGE_FEATURE_STRING):
-                self.merge_in(construct)
-            else:
                 raise IdentityConstraintException(
                     self, construct, item_identifier, 'Another topic has the same item identifier and automerge is disabled')
-        except ItemIdentifier.DoesNotExist:
-            try:
-                # Check that there is no topic with a subject
-                # indicator whose address matches item_identifier's.
-                topic = self.topic_map.topic_constructs.get(
-                    subject_identifiers__address=address)
-                if topic == self:
-                    self._add_item_identifier(address)
-                elif self.topic_map.topic_map_system.get_feature(
-                    AUTOMERGE_FEATURE_STRING):
-                    self.merge_in(topic)
-                else:
-                    raise IdentityConstraintException(
-                        self, topic, item_identifier, 'Another topic has the same subject identifier and automerge is disabled')
-            except Topic.DoesNotExist:
-                self._add_item_identifier(address)
+            self.merge_in(construct)
+        elif topic is not None and topic != self:
+            if not self.topic_map.topic_map_system.get_feature(
+                AUTOMERGE_FEATURE_STRING):
+                raise IdentityConstraintException(
+                    self, topic, item_identifier, 'Another topic has the same subject identifier and automerge is disabled')
+            # The merged topic has this locator as a subject
+            # identifier only, so the item identifier must still be
+            # added.
+            self.merge_in(topic)
+            self._add_item_identifier(address)
+        else:
+            self._add_item_identifier(address)
 
     def _add_item_identifier (self, address):
         """Adds an item identifier to this topic.
@@ -106,7 +108,9 @@ class Topic (Construct, ConstructFields):
         ii = ItemIdentifier(address=address,
                             containing_topic_map=self.topic_map)
         ii.save()
-        self.item_identifiers.add(ii)
+        add_m2m(self, 'item_identifiers', [ii])
+        invalidate_construct(self)
+        record_change(self, UPDATE)
         
     def add_subject_identifier (self, subject_identifier):
         """Adds a subject identifier to this topic.
@@ -123,28 +127,28 @@ class Topic (Construct, ConstructFields):
         if subject_identifier is None:
             raise ModelConstraintException(
                 self, 'The subject identifier may not be None')
+        check_writable(self)
         address = subject_identifier.to_external_form()
-        try:
-            # Check if there is an existing topic with the same
-            # subject identifier or item identifier.
-            topic = self.topic_map.topic_constructs.get(
-                models.Q(subject_identifiers__address=address) |
-                models.Q(item_identifiers__address=address))
-            if topic == self:
-                # If the match was because this topic has an item
-                # identifier equal to subject_identifier, add the
-                # subject identifier. Otherwise do nothing.
-                if not SubjectIdentifier.objects.filter(topic=self,
-                                                        address=address):
-                    self._add_subject_identifier(address)
-            elif self.topic_map.topic_map_system.get_feature(
+        topic, construct = self.topic_map.resolve_identity(subject_identifier)
+        if topic is None and isinstance(construct, Topic):
+            # The match is by an item identifier, which leaves the
+            # subject identifier to be added, whether or not the
+            # topics are merged.
+            if construct != self:
+                if not self.topic_map.topic_map_system.get_feature(
+                    AUTOMERGE_FEATURE_STRING):
+                    raise IdentityConstraintException(
+                        self, construct, subject_identifier, 'Another topic has the same subject/item identifier and automerge is disabled')
+                self.merge_in(construct)
+            self._add_subject_identifier(address)
+        elif topic is None:
+            self._add_subject_identifier(address)
+        elif topic != self:
+            if not self.topic_map.topic_map_system.get_feature(
                 AUTOMERGE_FEATURE_STRING):
-                self.merge_in(topic)
-            else:
                 raise IdentityConstraintException(
                     self, topic, subject_identifier, 'Another topic has the same subject/item identifier and automerge is disabled')
-        except Topic.DoesNotExist:
-            self._add_subject_identifier(address)
+            self.merge_in(topic)
 
     def _add_subject_identifier (self, address):
         """Adds a subject identifier to this topic.
@@ -160,7 +164,8 @@ class Topic (Construct, ConstructFields):
         si = SubjectIdentifier(topic=self, address=address,
                                containing_topic_map=self.topic_map)
         si.save()
-        self.subject_identifiers.add(si)
+        invalidate_construct(self)
+        record_change(self, UPDATE)
             
     def add_subject_locator (self, subject_locator):
         """Adds a subject locator to this topic.
@@ -177,10 +182,11 @@ class Topic (Construct, ConstructFields):
         if subject_locator is None:
             raise ModelConstraintException(
                 self, 'The subject locator may not be None')
+        check_writable(self)
         address = subject_locator.to_external_form()
         try:
-            topic = self.topic_map.topic_constructs.get(
-                subject_locators__address=address)
+            topic = self.topic_map._get_topic_by_address(
+                'subject_locators', address)
             if topic == self:
                 return
             elif self.topic_map.topic_map_system.get_feature(
@@ -193,7 +199,8 @@ class Topic (Construct, ConstructFields):
             sl = SubjectLocator(topic=self, address=address,
                                 containing_topic_map=self.topic_map)
             sl.save()
-            self.subject_locators.add(sl)
+            invalidate_construct(self)
+            record_change(self, UPDATE)
     
     def add_type (self, type):
         """Adds a type to this topic.
@@ -204,10 +211,12 @@ class Topic (Construct, ConstructFields):
         """
         if type is None:
             raise ModelConstraintException(self, 'The type may not be None')
-        if self.topic_map != type.topic_map:
+        if self.topic_map_id != type.topic_map_id:
             raise ModelConstraintException(
                 self, 'The type is not from the same topic map')
-        self.types.add(type)
+        add_m2m(self, 'types', [type])
+        invalidate_construct(self)
+        record_change(self, UPDATE)
 
     def create_name (self, value, name_type=None, scope=None, proxy=Name):
         """Creates a `Name` for this topic with the specified `value`,
@@ -220,6 +229,10 @@ class Topic (Construct, ConstructFields):
         If `scope` is None or an empty list, the name will be in the
         unconstrained scope.
 
+        If the feature "mergeByTopicName" is enabled, any other topic
+        with a name of the same value, type and scope is merged into
+        this topic.
+
         :param value: the string value of the name
         :type value: string
         :param name_type: the name type
@@ -233,25 +246,65 @@ class Topic (Construct, ConstructFields):
         """
         if value is None:
             raise ModelConstraintException(self, 'The value may not be None')
-        if name_type is None:
-            name_type = self.topic_map.create_topic_by_subject_identifier(
-                Locator('http://psi.topicmaps.org/iso13250/model/topic-name'))
-        elif self.topic_map != name_type.topic_map:
+        if name_type is not None and \
+                self.topic_map_id != name_type.topic_map_id:
             raise ModelConstraintException(
                 self, 'The type is not from the same topic map')
+        scope = prepare_scope(self, self.topic_map_id, scope)
+        if name_type is None:
+            name_type = self._get_default_name_type()
         name = proxy(topic=self, value=value, topic_map=self.topic_map,
                     type=name_type)
         name.save()
-        if scope is not None:
-            if type(scope) not in (type([]), type(())):
-                scope = [scope]
-            for theme in scope:
-                if self.topic_map != theme.topic_map:
-                    raise ModelConstraintException(
-                        self, 'The theme is not from the same topic map')
-                name.scope.add(theme)
+        add_scopes([name], [scope])
+        merge_topics_by_name([name])
         return name
 
+    def create_names (self, names, proxy=Name):
+        """Creates a `Name` for this topic for each of the specified
+        (`value`, `name_type`, `scope`) tuples.
+
+        Each name is created as by `create_name()`, but all of the
+        arguments are validated before any name is created, the names
+        are created in a single transaction, and their scopes are
+        added with a single bulk insert.
+
+        :param names: the value, type (or None) and scope (or None) of
+          each name to be created
+        :type names: list of tuples
+        :param proxy: Django proxy model
+        :type proxy: class
+        :rtype: list of `Name`s
+
+        """
+        specs = []
+        for value, name_type, scope in names:
+            if value is None:
+                raise ModelConstraintException(
+                    self, 'The value may not be None')
+            if name_type is not None and \
+                    self.topic_map_id != name_type.topic_map_id:
+                raise ModelConstraintException(
+                    self, 'The type is not from the same topic map')
+            scope = prepare_scope(self, self.topic_map_id, scope)
+            specs.append((value, name_type, scope))
+        topic_map = self.topic_map
+        created = []
+        with topic_map.batch():
+            default_name_type = None
+            for value, name_type, scope in specs:
+                if name_type is None:
+                    if default_name_type is None:
+                        default_name_type = self._get_default_name_type()
+                    name_type = default_name_type
+                name = proxy(topic=self, value=value, topic_map=topic_map,
+                             type=name_type)
+                name.save()
+                created.append(name)
+            add_scopes(created, [spec[2] for spec in specs])
+            merge_topics_by_name(created)
+        return created
+
     def create_occurrence (self, type, value, scope=None, datatype=None,
                            proxy=Occurrence):
         """Creates an `Occurrence` for this topic with the specified
@@ -288,19 +341,15 @@ class Topic (Construct, ConstructFields):
                 datatype = Locator(XSD_LONG)
             else:
                 datatype = Locator(XSD_STRING)
-        if self.topic_map != type.topic_map:
+        if self.topic_map_id != type.topic_map_id:
             raise ModelConstraintException(
                 self, 'The type is not from the same topic map')
+        scope = prepare_scope(self, self.topic_map_id, scope)
         occurrence = proxy(type=type, value=value,
                            datatype=datatype.to_external_form(),
                            topic=self, topic_map=self.topic_map)
         occurrence.save()
-        if scope is not None:
-            for theme in scope:
-                if self.topic_map != theme.topic_map:
-                    raise ModelConstraintException(
-                        self, 'The theme is not from the same topic map')
-                occurrence.scope.add(theme)
+        add_scopes([occurrence], [scope])
         return occurrence
 
     @models.permalink
@@ -407,7 +456,11 @@ class Topic (Construct, ConstructFields):
         :rtype: `QuerySet` of `Locator`s
         
         """
-        return self.subject_identifiers.all()
+        subject_identifiers = self.subject_identifiers.all()
+        prefetched = get_prefetched(self, 'subject_identifiers')
+        if prefetched is not None:
+            subject_identifiers._result_cache = prefetched
+        return subject_identifiers
 
     def get_subject_locators (self):
         """Returns the subject locators assigned to this topic.
@@ -415,7 +468,11 @@ class Topic (Construct, ConstructFields):
         :rtype: `QuerySet` of `Locator`s
         
         """
-        return self.subject_locators.all()
+        subject_locators = self.subject_locators.all()
+        prefetched = get_prefetched(self, 'subject_locators')
+        if prefetched is not None:
+            subject_locators._result_cache = prefetched
+        return subject_locators
 
     def get_types (self):
         """Returns a QuerySet containing the types of which this topic
@@ -449,6 +506,7 @@ class Topic (Construct, ConstructFields):
                 self, 'The topic to merge in may not be None')
         if other == self:
             return
+        check_writable(self)
         if self.topic_map != other.topic_map:
             raise ModelConstraintException(
                 self, 'The topic to merge in is not from the same topic map')
@@ -468,7 +526,7 @@ class Topic (Construct, ConstructFields):
             subject_locator.save()
         for item_identifier in other.get_item_identifiers():
             other.item_identifiers.remove(item_identifier)
-            self.item_identifiers.add(item_identifier)
+            add_m2m(self, 'item_identifiers', [item_identifier])
         signatures = {}
         for name in self.get_names():
             signature = generate_name_signature(name)
@@ -511,6 +569,8 @@ class Topic (Construct, ConstructFields):
                 move_role_characteristics(parent, existing)
                 parent.remove()
         other.remove()
+        invalidate_construct(self)
+        record_change(self, MERGE)
 
     def remove (self):
         """Removes this topic from the containing `TopicMap` instance.
@@ -539,10 +599,14 @@ class Topic (Construct, ConstructFields):
         :type subject_identifier: `Locator`
 
         """
+        check_writable(self)
         try:
             si = SubjectIdentifier.objects.get(
-                topic=self, address=subject_identifier.to_external_form())
+                address=subject_identifier.to_external_form(),
+                containing_topic_map=self.topic_map_id, topic=self)
             si.delete()
+            invalidate_construct(self)
+            record_change(self, UPDATE)
         except SubjectIdentifier.DoesNotExist:
             pass
 
@@ -554,10 +618,14 @@ class Topic (Construct, ConstructFields):
         :type subject_locator: `Locator`
 
         """
+        check_writable(self)
         try:
             sl = SubjectLocator.objects.get(
-                topic=self, address=subject_locator.to_external_form())
+                address=subject_locator.to_external_form(),
+                containing_topic_map=self.topic_map_id, topic=self)
             sl.delete()
+            invalidate_construct(self)
+            record_change(self, UPDATE)
         except SubjectLocator.DoesNotExist:
             pass
     
@@ -568,7 +636,21 @@ class Topic (Construct, ConstructFields):
         :type topic_type: `Topic`
 
         """
+        check_writable(self)
+        flush_batches()
         self.types.remove(topic_type)
+        invalidate_construct(self)
+        record_change(self, UPDATE)
+
+    def _get_default_name_type (self):
+        """Returns the topic representing the default name type,
+        creating it if necessary.
+
+        :rtype: `Topic`
+
+        """
+        return self.topic_map.create_topic_by_subject_identifier(
+            Locator(DEFAULT_NAME_TYPE))
 
     def _has_scoped_constructs (self):
         """Returns True if there are constructs scoped by this topic.
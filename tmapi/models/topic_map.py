@@ -13,24 +13,39 @@
 # limitations under the License.
 
 from django.contrib.sites.models import Site
-from django.db import models
+from django.db import DEFAULT_DB_ALIAS, connection, models
 
-from tmapi.exceptions import ModelConstraintException, \
-    UnsupportedOperationException
+from tmapi.exceptions import IdentityConstraintException, \
+    ModelConstraintException, UnsupportedOperationException
 from tmapi.indices.literal_index import LiteralIndex
 from tmapi.indices.scoped_index import ScopedIndex
 from tmapi.indices.type_instance_index import TypeInstanceIndex
 
 from association import Association
+from batch import Batch, CHUNK_SIZE, add_m2m, flush_batches
+from bulk_utils import bulk_insert, create_identifiers
+from cache_utils import shared
 from construct_fields import BaseConstructFields
 from identifier import Identifier
+from import_utils import import_topics
+from invalidation import invalidate_topic_map
 from item_identifier import ItemIdentifier
+from iteration_utils import iterate_keyset
+from journal import CREATE, get_changed_containers, get_changes, \
+    get_last_sequence, record_changes
 from locator import Locator
+from merge_plan import MergePlan
+from name_merge_utils import merge_all_by_name
+from proxy_utils import cast
+from read_only import cached, check_writable, close_read_only
 from reifiable import Reifiable
+from role import Role
+from scoped import add_scopes, prepare_scope
 from subject_identifier import SubjectIdentifier
 from subject_locator import SubjectLocator
 from topic import Topic
-from copy_utils import copy
+from transaction_utils import retry_on_conflict
+from copy_utils import copy, copy_changes
 
 
 class TopicMap (BaseConstructFields, Reifiable):
@@ -50,6 +65,29 @@ class TopicMap (BaseConstructFields, Reifiable):
         super(TopicMap, self).__init__(*args, **kwargs)
         self._indices = {}
 
+    def batch (self):
+        """Returns a context manager within which modifications of
+        this topic map are made in a single transaction.
+
+        Additions to the scope, types and item identifiers of
+        constructs are collected and written in bulk, rather than one
+        row at a time. If an exception is raised within the context,
+        all modifications made within it are rolled back.
+
+        :rtype: `Batch`
+
+        """
+        return Batch(self)
+
+    def close (self):
+        """Closes use of this topic map instance.
+
+        If the topic map was opened read-only, the results cached for
+        it are discarded, and it may be modified again.
+
+        """
+        close_read_only(self)
+
     def create_association (self, association_type, scope=None,
                             proxy=Association):
         """Creates an `Association` in this topic map with the
@@ -66,20 +104,115 @@ class TopicMap (BaseConstructFields, Reifiable):
         """
         if association_type is None:
             raise ModelConstraintException(self, 'The type may not be None')
-        if self != association_type.topic_map:
+        if self.id != association_type.topic_map_id:
             raise ModelConstraintException(
                 self, 'The type is not from this topic map')
+        scope = prepare_scope(self, self.id, scope)
         association = proxy(type=association_type, topic_map=self)
         association.save()
-        if scope is None:
-            scope = []
-        for topic in scope:
-            if self != topic.topic_map:
-                raise ModelConstraintException(
-                    self, 'The theme is not from this topic map')
-            association.scope.add(topic)
+        add_scopes([association], [scope])
         return association
 
+    def create_associations (self, specs, dedupe=False, proxy=Association):
+        """Creates an `Association`, with its `Role`s, in this topic
+        map for each of the specified (`association_type`, `scope`,
+        `roles`) tuples, where `roles` is a list of (`role_type`,
+        `player`) tuples.
+
+        All of the topics are validated (with a single query) before
+        anything is created, and the associations, roles and scopes
+        are then inserted in bulk in a single transaction.
+
+        If `dedupe` is True, no association is created for a tuple
+        that has the same signature (type, scope and roles) as an
+        existing association in this topic map, or as an earlier
+        tuple; the existing association is returned in its place.
+
+        :param specs: the type, scope (or None) and roles of each
+          association to be created
+        :type specs: list of tuples
+        :param dedupe: whether to reuse existing associations with the
+          same signature
+        :type dedupe: boolean
+        :param proxy: Django proxy model class
+        :type proxy: class
+        :rtype: list of `Association`s
+
+        """
+        specs = [self._prepare_association_spec(association_type, scope,
+                                                roles)
+                 for association_type, scope, roles in specs]
+        topic_ids = set()
+        for association_type, scope, roles in specs:
+            topic_ids.add(association_type.pk)
+            topic_ids.update([theme.pk for theme in scope])
+            for role_type, player in roles:
+                topic_ids.add(role_type.pk)
+                topic_ids.add(player.pk)
+        topic_ids = list(topic_ids)
+        found = 0
+        for start in range(0, len(topic_ids), CHUNK_SIZE):
+            found += self.topic_constructs.filter(
+                pk__in=topic_ids[start:start+CHUNK_SIZE]).count()
+        if found != len(topic_ids):
+            raise ModelConstraintException(
+                self, 'A type, theme or player is not from this topic map')
+        results = [None] * len(specs)
+        with self.batch():
+            signatures = {}
+            if dedupe:
+                signatures = self._get_association_signatures(
+                    set([spec[0].pk for spec in specs]))
+            new = []
+            for index, spec in enumerate(specs):
+                signature = None
+                if dedupe:
+                    signature = self._get_spec_signature(spec)
+                    existing = signatures.get(signature)
+                    if existing is not None:
+                        results[index] = existing
+                        continue
+                association = proxy(type=spec[0], topic_map=self)
+                results[index] = association
+                if signature is not None:
+                    signatures[signature] = association
+                new.append((association, spec))
+            role_count = sum([len(spec[2]) for association, spec in new])
+            identifier_ids = create_identifiers(self.id,
+                                                len(new) + role_count)
+            identifier_ids.reverse()
+            for association, spec in new:
+                association.identifier_id = identifier_ids.pop()
+            bulk_insert(Association, [association for association, spec
+                                      in new])
+            pks = {}
+            association_identifier_ids = [association.identifier_id for
+                                          association, spec in new]
+            for start in range(0, len(new), CHUNK_SIZE):
+                pks.update(Association.objects.filter(
+                        identifier__in=association_identifier_ids[
+                            start:start+CHUNK_SIZE]).values_list(
+                        'identifier', 'pk'))
+            roles = []
+            for association, spec in new:
+                association.pk = pks[association.identifier_id]
+                association._state.adding = False
+                association._state.db = DEFAULT_DB_ALIAS
+                for role_type, player in spec[2]:
+                    roles.append(Role(association_id=association.pk,
+                                      type=role_type, player=player,
+                                      topic_map=self,
+                                      identifier_id=identifier_ids.pop()))
+            bulk_insert(Role, roles)
+            add_scopes([association for association, spec in new],
+                       [spec[1] for association, spec in new])
+            invalidate_topic_map(self.pk)
+            record_changes(self.pk, [
+                    (association.identifier_id, 'association', CREATE)
+                    for association, spec in new] + [
+                    (role.identifier_id, 'role', CREATE) for role in roles])
+        return results
+
     def create_empty_topic (self):
         """Returns a `Topic` instance with no other information.
 
@@ -124,7 +257,7 @@ class TopicMap (BaseConstructFields, Reifiable):
             (Site.objects.get_current().domain, topic.id)
         ii = ItemIdentifier(address=address, containing_topic_map=self)
         ii.save()
-        topic.item_identifiers.add(ii)
+        add_m2m(topic, 'item_identifiers', [ii])
         return topic
 
     def create_topic_by_item_identifier (self, item_identifier):
@@ -150,22 +283,9 @@ class TopicMap (BaseConstructFields, Reifiable):
         if item_identifier is None:
             raise ModelConstraintException(
                 self, 'The item identifier may not be None')
-        reference = item_identifier.to_external_form()
-        try:
-            topic = self.topic_constructs.get(
-                item_identifiers__address=reference)
-        except Topic.DoesNotExist:
-            try:
-                topic = self.topic_constructs.get(
-                    subject_identifiers__address=reference)
-            except Topic.DoesNotExist:
-                topic = Topic(topic_map=self)
-                topic.save()
-            ii = ItemIdentifier(address=reference, containing_topic_map=self)
-            ii.save()
-            topic.item_identifiers.add(ii)
-        return topic            
-    
+        return retry_on_conflict(
+            self._get_or_create_topic_by_item_identifier, item_identifier)
+
     def create_topic_by_subject_identifier (self, subject_identifier):
         """Returns a `Topic` instance with the specified subject identifier.
 
@@ -190,22 +310,9 @@ class TopicMap (BaseConstructFields, Reifiable):
         if subject_identifier is None:
             raise ModelConstraintException(
                 self, 'The subject identifier may not be None')
-        reference = subject_identifier.to_external_form()
-        try:
-            topic = self.topic_constructs.get(
-                subject_identifiers__address=reference)
-        except Topic.DoesNotExist:
-            try:
-                topic = self.topic_constructs.get(
-                    item_identifiers__address=reference)
-            except Topic.DoesNotExist:
-                topic = Topic(topic_map=self)
-                topic.save()
-            si = SubjectIdentifier(topic=topic, address=reference,
-                                   containing_topic_map=self)
-            si.save()
-            topic.subject_identifiers.add(si)
-        return topic
+        return retry_on_conflict(
+            self._get_or_create_topic_by_subject_identifier,
+            subject_identifier)
 
     def create_topic_by_subject_locator (self, subject_locator):
         """Returns a `Topic` instance with the specified subject locator.
@@ -222,18 +329,8 @@ class TopicMap (BaseConstructFields, Reifiable):
         if subject_locator is None:
             raise ModelConstraintException(
                 self, 'The subject locator may not be None')
-        reference = subject_locator.to_external_form()
-        try:
-            topic = self.topic_constructs.get(
-                subject_locators__address=reference)
-        except Topic.DoesNotExist:
-            topic = Topic(topic_map=self)
-            topic.save()
-            sl = SubjectLocator(topic=topic, address=reference,
-                                containing_topic_map=self)
-            sl.save()
-            topic.subject_locators.add(sl)
-        return topic
+        return retry_on_conflict(
+            self._get_or_create_topic_by_subject_locator, subject_locator)
 
     def get_associations (self):
         """Returns all `Association`s contained in this topic map.
@@ -243,6 +340,33 @@ class TopicMap (BaseConstructFields, Reifiable):
         """
         return self.association_constructs.all()
 
+    def get_change_sequence (self):
+        """Returns the sequence number of the latest entry in the
+        change journal of this topic map, or 0 if there is none.
+
+        A consumer of the journal may take this as the point from
+        which to read subsequent changes (see `get_changes()`).
+
+        :rtype: integer
+
+        """
+        return get_last_sequence(self)
+
+    def get_changes (self, since=0):
+        """Returns the entries in the change journal of this topic
+        map with sequence numbers greater than `since`, in order.
+
+        Changes are recorded only when the TMAPI_JOURNAL setting is
+        True; see `tmapi.models.journal`.
+
+        :param since: the sequence number after which to start
+        :type since: integer
+        :rtype: iterator over `ChangeEntry`s
+
+        """
+        return get_changes(self, since)
+
+    @cached
     def get_construct_by_id (self, id, proxy=None):
         """Returns a `Construct` by its (system specific) identifier.
 
@@ -256,13 +380,13 @@ class TopicMap (BaseConstructFields, Reifiable):
         try:
             identifier = Identifier.objects.get(pk=int(id),
                                                 containing_topic_map=self)
-            construct = identifier.get_construct()
-            if proxy is not None and construct is not None:
-                construct = proxy.objects.get(pk=construct.id)
+            construct = cast(identifier.get_construct(), proxy)
         except Identifier.DoesNotExist:
             construct = None
         return construct
     
+    @cached
+    @shared
     def get_construct_by_item_identifier (self, item_identifier):
         """Returns a `Construct` by its item identifier.
 
@@ -324,6 +448,8 @@ class TopicMap (BaseConstructFields, Reifiable):
         """
         return self.topic_constructs.all()
 
+    @cached
+    @shared
     def get_topic_by_subject_identifier (self, subject_identifier):
         """Returns a topic by its subject identifier.
 
@@ -338,12 +464,14 @@ class TopicMap (BaseConstructFields, Reifiable):
         """
         reference = subject_identifier.to_external_form()
         try:
-            topic = self.topic_constructs.get(
-                subject_identifiers__address=reference)
+            topic = self._get_topic_by_address('subject_identifiers',
+                                               reference)
         except Topic.DoesNotExist:
             topic = None
         return topic
 
+    @cached
+    @shared
     def get_topic_by_subject_locator (self, subject_locator):
         """Returns a topic by its subject locator.
 
@@ -358,12 +486,277 @@ class TopicMap (BaseConstructFields, Reifiable):
         """
         reference = subject_locator.to_external_form()
         try:
-            topic = self.topic_constructs.get(
-                subject_locators__address=reference)
+            topic = self._get_topic_by_address('subject_locators',
+                                               reference)
         except Topic.DoesNotExist:
             topic = None
         return topic
+
+    def import_topics (self, specs, processes=1, partitions=None):
+        """Returns a `Topic` in this topic map for each of the
+        specified (`item_identifiers`, `subject_identifiers`,
+        `subject_locators`) tuples, where each item is a list of IRI
+        references or `Locator`s, creating and merging topics as
+        necessary.
+
+        The identities are normalised, and the topics written, by a
+        pool of `processes` processes, each with its own database
+        connection; see `tmapi.models.import_utils`.
+
+        :param specs: the identities of each topic to be imported
+        :type specs: list of tuples
+        :param processes: the number of processes to use
+        :type processes: integer
+        :param partitions: the number of partitions the topics are
+          divided into (defaults to the number of processes)
+        :type partitions: integer
+        :rtype: list of `Topic`s
+
+        """
+        check_writable(self)
+        return import_topics(self, specs, processes, partitions)
+
+    def iter_associations (self, batch_size=CHUNK_SIZE, after_id=None):
+        """Yields the `Association`s in this topic map in order of
+        identifier (see `Construct.get_id`), reading `batch_size` at
+        a time with keyset pagination, so that all of the
+        associations of a large topic map may be iterated over in
+        constant memory.
+
+        The item identifiers of each batch of associations are
+        prefetched.
+
+        :param batch_size: the number of associations to read at a time
+        :type batch_size: integer
+        :param after_id: the identifier of the association after
+          which to start (eg, that of the last one yielded by an
+          earlier iteration)
+        :type after_id: integer
+        :rtype: generator of `Association`s
+
+        """
+        return iterate_keyset(self.association_constructs.all(), batch_size,
+                              after_id, ('item_identifiers',))
+
+    def iter_topics (self, batch_size=CHUNK_SIZE, after_id=None):
+        """Yields the `Topic`s in this topic map in order of
+        identifier (see `Construct.get_id`), reading `batch_size` at
+        a time with keyset pagination, so that all of the topics of a
+        large topic map may be iterated over in constant memory.
+
+        The item identifiers, subject identifiers and subject locators
+        of each batch of topics are prefetched.
+
+        :param batch_size: the number of topics to read at a time
+        :type batch_size: integer
+        :param after_id: the identifier of the topic after which to
+          start (eg, that of the last one yielded by an earlier
+          iteration)
+        :type after_id: integer
+        :rtype: generator of `Topic`s
+
+        """
+        return iterate_keyset(self.topic_constructs.all(), batch_size,
+                              after_id, ('item_identifiers',
+                                         'subject_identifiers',
+                                         'subject_locators'))
     
+    @cached
+    def resolve_identity (self, locator):
+        """Returns the topic in this topic map with `locator` as a
+        subject identifier, and the construct with `locator` as an
+        item identifier.
+
+        Both are found with a single query (save where the item
+        identifier belongs to a construct other than a topic).
+
+        :param locator: the locator to resolve
+        :type locator: `Locator`
+        :rtype: tuple of `Topic` or None, and `Construct` or None
+
+        """
+        return self.resolve_identities([locator])[
+            locator.to_external_form()]
+
+    def resolve_identities (self, locators):
+        """Returns the topics in this topic map with each of
+        `locators` as a subject identifier, and the constructs with
+        each as an item identifier.
+
+        The returned dictionary is keyed by the external form of each
+        locator, and has as values pairs as returned by
+        `resolve_identity`. A single query is made for every
+        CHUNK_SIZE locators, save that retrieving a construct other
+        than a topic by its item identifier takes further queries.
+
+        :param locators: the locators to resolve
+        :type locators: list of `Locator`s
+        :rtype: dictionary
+
+        """
+        flush_batches()
+        matches = {}
+        for locator in locators:
+            matches[locator.to_external_form()] = [None, None]
+        addresses = matches.keys()
+        other_addresses = []
+        sql = self._get_resolution_sql()
+        for start in range(0, len(addresses), CHUNK_SIZE):
+            chunk = addresses[start:start+CHUNK_SIZE]
+            placeholders = ', '.join(['%s'] * len(chunk))
+            params = [self.pk] + chunk + [self.pk] + chunk
+            for topic in Topic.objects.raw(
+                sql % (placeholders, placeholders), params):
+                if topic.pk is None:
+                    other_addresses.append(topic.matched_address)
+                else:
+                    matches[topic.matched_address][topic.matched_by] = topic
+        for address in other_addresses:
+            matches[address][1] = ItemIdentifier.objects.get(
+                address=address, containing_topic_map=self).get_construct()
+        return dict([(address, tuple(match)) for address, match
+                     in matches.items()])
+
+    def _get_or_create_topic_by_item_identifier (self, item_identifier):
+        """Returns the topic with `item_identifier`, creating it if
+        necessary; see `create_topic_by_item_identifier`.
+
+        :param item_identifier: the item identifier the topic should contain
+        :type item_identifier: `Locator`
+        :rtype: `Topic`
+
+        """
+        reference = item_identifier.to_external_form()
+        topic, construct = self.resolve_identity(item_identifier)
+        if construct is not None:
+            if not isinstance(construct, Topic):
+                raise IdentityConstraintException(
+                    self, construct, item_identifier,
+                    'This item identifier is already associated with another non-Topic construct')
+            return construct
+        if topic is None:
+            topic = Topic(topic_map=self)
+            topic.save()
+        ii = ItemIdentifier(address=reference, containing_topic_map=self)
+        ii.save()
+        add_m2m(topic, 'item_identifiers', [ii])
+        return topic
+
+    def _get_or_create_topic_by_subject_identifier (self,
+                                                    subject_identifier):
+        """Returns the topic with `subject_identifier`, creating it if
+        necessary; see `create_topic_by_subject_identifier`.
+
+        :param subject_identifier: the subject identifier the topic
+          should contain
+        :type subject_identifier: `Locator`
+        :rtype: `Topic`
+
+        """
+        reference = subject_identifier.to_external_form()
+        topic, construct = self.resolve_identity(subject_identifier)
+        if topic is not None:
+            return topic
+        if isinstance(construct, Topic):
+            topic = construct
+        else:
+            topic = Topic(topic_map=self)
+            topic.save()
+        si = SubjectIdentifier(topic=topic, address=reference,
+                               containing_topic_map=self)
+        si.save()
+        return topic
+
+    def _get_or_create_topic_by_subject_locator (self, subject_locator):
+        """Returns the topic with `subject_locator`, creating it if
+        necessary; see `create_topic_by_subject_locator`.
+
+        :param subject_locator: the subject locator the topic should
+          contain
+        :type subject_locator: `Locator`
+        :rtype: `Topic`
+
+        """
+        reference = subject_locator.to_external_form()
+        try:
+            topic = self._get_topic_by_address('subject_locators',
+                                               reference)
+        except Topic.DoesNotExist:
+            topic = Topic(topic_map=self)
+            topic.save()
+            sl = SubjectLocator(topic=topic, address=reference,
+                                containing_topic_map=self)
+            sl.save()
+        return topic
+
+    def _get_resolution_sql (self):
+        """Returns the SQL of the query used by `resolve_identities`,
+        with placeholders for the addresses to be substituted.
+
+        Each row of the query is a topic with the address it was
+        matched by, and the relation it was matched through (0 for a
+        subject identifier, 1 for an item identifier). Item
+        identifiers belonging to constructs other than topics give a
+        row with a NULL topic.
+
+        :rtype: string
+
+        """
+        qn = connection.ops.quote_name
+        columns = ', '.join(['t.%s' % qn(field.column) for field
+                             in Topic._meta.local_fields])
+        si_opts = SubjectIdentifier._meta
+        ii_opts = ItemIdentifier._meta
+        ii_field = Topic._meta.get_field('item_identifiers')
+        return (
+            'SELECT %(columns)s, 0 AS matched_by, '
+            's.%(address)s AS matched_address '
+            'FROM %(si_table)s s INNER JOIN %(topic_table)s t '
+            'ON t.%(topic_pk)s = s.%(si_topic)s '
+            'WHERE s.%(si_tm)s = %%%%s AND s.%(address)s IN (%%s) '
+            'UNION ALL '
+            'SELECT %(columns)s, 1, i.%(address)s '
+            'FROM %(ii_table)s i LEFT OUTER JOIN %(join_table)s j '
+            'ON j.%(join_ii)s = i.%(ii_pk)s '
+            'LEFT OUTER JOIN %(topic_table)s t '
+            'ON t.%(topic_pk)s = j.%(join_topic)s '
+            'WHERE i.%(ii_tm)s = %%%%s AND i.%(address)s IN (%%s)') % {
+            'columns': columns,
+            'address': qn('address'),
+            'topic_table': qn(Topic._meta.db_table),
+            'topic_pk': qn(Topic._meta.pk.column),
+            'si_table': qn(si_opts.db_table),
+            'si_topic': qn(si_opts.get_field('topic').column),
+            'si_tm': qn(si_opts.get_field('containing_topic_map').column),
+            'ii_table': qn(ii_opts.db_table),
+            'ii_pk': qn(ii_opts.pk.column),
+            'ii_tm': qn(ii_opts.get_field('containing_topic_map').column),
+            'join_table': qn(ii_field.m2m_db_table()),
+            'join_ii': qn(ii_field.m2m_reverse_name()),
+            'join_topic': qn(ii_field.m2m_column_name()),
+            }
+
+    def _get_topic_by_address (self, relation, address):
+        """Returns the topic in this topic map with the identifier
+        `address` in its `relation` (one of 'item_identifiers',
+        'subject_identifiers' and 'subject_locators').
+
+        The lookup is restricted to identifiers within this topic map,
+        so that it is answered by the unique index on the address and
+        topic map of the identifiers' table.
+
+        :param relation: the name of the topic's identifier relation
+        :type relation: string
+        :param address: external form of a locator
+        :type address: string
+        :rtype: `Topic`
+        :raises `Topic.DoesNotExist`: if there is no such topic
+
+        """
+        return self.topic_constructs.get(**{
+                '%s__address' % relation: address,
+                '%s__containing_topic_map' % relation: self})
+
     def get_topic_map (self):
         """Returns self.
 
@@ -372,6 +765,58 @@ class TopicMap (BaseConstructFields, Reifiable):
         """
         return self
 
+    def merge_by_topic_name (self):
+        """Merges all topics in this topic map that have a name with
+        the same value, type and scope, returning the number of
+        topics merged into another.
+
+        This is done whether or not the feature "mergeByTopicName" is
+        enabled, and with a GROUP BY query to find the names shared
+        by topics; see `tmapi.models.name_merge_utils`.
+
+        :rtype: integer
+
+        """
+        check_writable(self)
+        return len(merge_all_by_name(self))
+
+    def merge_changes_in (self, other, since=0):
+        """Merges the changes made to the topic map `other` after the
+        change journal sequence number `since` into this topic map.
+
+        The `Topic`s and `Association`s in `other` that have been
+        created or modified since then, or whose names, occurrences,
+        variants or roles have been, are merged into this topic map
+        as by `merge_in()`. The work done is proportional to the
+        number of changes rather than to the size of `other`.
+
+        Removals are not propagated, since merging only ever adds to
+        this topic map. Changes to `other` are recorded only when the
+        TMAPI_JOURNAL setting is True; see `tmapi.models.journal`.
+
+        Returns the sequence number of the last change merged, to be
+        passed as `since` to the next call.
+
+        :param other: the topic map whose changes are to be merged
+        :type other: `TopicMap`
+        :param since: the sequence number after which to start
+        :type since: integer
+        :rtype: integer
+
+        """
+        if other is None:
+            raise ModelConstraintException(
+                self, 'The topic map to merge in may not be None')
+        check_writable(self)
+        sequence = other.get_change_sequence()
+        if sequence <= since:
+            return since
+        topic_ids, association_ids = get_changed_containers(other, since,
+                                                            sequence)
+        with self.batch():
+            copy_changes(other, self, topic_ids, association_ids)
+        return sequence
+
     def merge_in (self, other):
         """Merges the topic map `other` into this topic map.
 
@@ -395,11 +840,149 @@ class TopicMap (BaseConstructFields, Reifiable):
         if other is None:
             raise ModelConstraintException(
                 self, 'The topic map to merge in may not be None')
+        check_writable(self)
         copy(other, self)
 
+    def plan_merge (self, other):
+        """Returns the plan of merging the topic map `other` into this
+        topic map, without making any change.
+
+        The plan gives the topics that would be merged and the
+        constructs that would be duplicates, and may be executed in
+        place of `merge_in`; see `tmapi.models.merge_plan`.
+
+        :param other: the topic map to be merged with this topic map
+        :type other: `TopicMap`
+        :rtype: `MergePlan`
+
+        """
+        if other is None:
+            raise ModelConstraintException(
+                self, 'The topic map to merge in may not be None')
+        return MergePlan(self, source=other)
+
+    def plan_subject_identifiers (self, additions):
+        """Returns the plan of adding subject identifiers to topics in
+        this topic map, without making any change.
+
+        The plan gives the topics that would be merged and the
+        constructs that would be duplicates, and may be executed in
+        place of the calls of `Topic.add_subject_identifier`; see
+        `tmapi.models.merge_plan`.
+
+        :param additions: the topics and the subject identifiers to
+          be added to them
+        :type additions: list of (`Topic`, `Locator`) tuples
+        :rtype: `MergePlan`
+
+        """
+        for topic, locator in additions:
+            if locator is None:
+                raise ModelConstraintException(
+                    topic, 'The subject identifier may not be None')
+        return MergePlan(self, additions=additions)
+
     def remove (self):
+        check_writable(self)
+        flush_batches()
         self.delete()
 
+    def _get_association_signatures (self, type_ids):
+        """Returns a dictionary of the signatures of the associations
+        in this topic map whose type is one of `type_ids`, mapped to
+        those associations.
+
+        The signatures are those generated by `_get_spec_signature()`.
+
+        :param type_ids: the database IDs of the association types
+        :type type_ids: set of integers
+        :rtype: dictionary
+
+        """
+        type_ids = list(type_ids)
+        associations = {}
+        scopes = {}
+        roles = {}
+        scope_field = Association._meta.get_field('scope')
+        scope_through = scope_field.rel.through
+        association_name = scope_field.m2m_field_name()
+        theme_name = scope_field.m2m_reverse_field_name()
+        for start in range(0, len(type_ids), CHUNK_SIZE):
+            chunk = type_ids[start:start+CHUNK_SIZE]
+            for association in self.association_constructs.filter(
+                type__in=chunk):
+                associations[association.pk] = association
+                scopes[association.pk] = set()
+                roles[association.pk] = set()
+            rows = scope_through.objects.filter(**{
+                    '%s__topic_map' % association_name: self,
+                    '%s__type__in' % association_name: chunk}).values_list(
+                association_name, theme_name)
+            for association_id, theme_id in rows:
+                scopes[association_id].add(theme_id)
+            rows = Role.objects.filter(
+                association__topic_map=self,
+                association__type__in=chunk).values_list(
+                'association', 'type', 'player')
+            for association_id, role_type_id, player_id in rows:
+                roles[association_id].add((role_type_id, player_id))
+        signatures = {}
+        for pk, association in associations.items():
+            signature = (association.type_id, frozenset(scopes[pk]),
+                         frozenset(roles[pk]))
+            signatures[signature] = association
+        return signatures
+
+    def _get_spec_signature (self, spec):
+        """Returns the signature of the association specified by
+        `spec`, in terms of database IDs.
+
+        :param spec: the type, scope and roles of an association
+        :type spec: tuple
+        :rtype: tuple
+
+        """
+        association_type, scope, roles = spec
+        return (association_type.pk,
+                frozenset([theme.pk for theme in scope]),
+                frozenset([(role_type.pk, player.pk) for role_type, player
+                           in roles]))
+
+    def _prepare_association_spec (self, association_type, scope, roles):
+        """Returns the validated components of an association
+        specification.
+
+        :param association_type: the association type
+        :type association_type: `Topic`
+        :param scope: scope
+        :type scope: list of `Topic`s or None
+        :param roles: the role types and players
+        :type roles: list of tuples
+        :rtype: tuple
+
+        """
+        if association_type is None:
+            raise ModelConstraintException(self, 'The type may not be None')
+        if self.id != association_type.topic_map_id:
+            raise ModelConstraintException(
+                self, 'The type is not from this topic map')
+        scope = prepare_scope(self, self.id, scope)
+        roles = list(roles or [])
+        for role_type, player in roles:
+            if role_type is None:
+                raise ModelConstraintException(
+                    self, 'The role type may not be None')
+            if player is None:
+                raise ModelConstraintException(
+                    self, 'The player may not be None')
+            if self.id != role_type.topic_map_id:
+                raise ModelConstraintException(
+                    self, 'The role type is not from this topic map')
+            if self.id != player.topic_map_id:
+                raise ModelConstraintException(
+                    self, 'The player is not from this topic map')
+        return association_type, scope, roles
+
     def __eq__ (self, other):
         if isinstance(other, TopicMap) and self.id == other.id:
             return True
@@ -14,9 +14,11 @@
 
 from django.db import models
 
+from tmapi.constants import READ_ONLY_FEATURE_STRING
 from tmapi.exceptions import TopicMapExistsException, \
-    FeatureNotRecognizedException
+    FeatureNotRecognizedException, UnsupportedOperationException
 from locator import Locator
+from read_only import open_read_only
 from tmapi_feature import TMAPIFeature
 from topic_map import TopicMap
 
@@ -50,6 +52,9 @@ class TopicMapSystem (models.Model):
         :rtype: `TopicMap`
 
         """
+        if self.get_feature(READ_ONLY_FEATURE_STRING):
+            raise UnsupportedOperationException(
+                'A read-only system cannot create topic maps')
         if not isinstance(iri, Locator):
             iri = self.create_locator(iri)
         if self.get_topic_map(iri) is not None:
@@ -73,11 +78,15 @@ class TopicMapSystem (models.Model):
         :rtype: Boolean
 
         """
-        try:
-            feature = self.features.get(feature_string=feature_name)
-        except TMAPIFeature.DoesNotExist:
-            raise FeatureNotRecognizedException
-        return feature.value
+        # The features cannot change, so their values are kept.
+        values = self.__dict__.setdefault('_feature_values', {})
+        if feature_name not in values:
+            try:
+                feature = self.features.get(feature_string=feature_name)
+            except TMAPIFeature.DoesNotExist:
+                raise FeatureNotRecognizedException
+            values[feature_name] = feature.value
+        return values[feature_name]
 
     def get_locators (self):
         """Returns all storage addresses of `TopicMap` instances known
@@ -117,6 +126,10 @@ class TopicMapSystem (models.Model):
         """Retrieves a `TopicMap` managed by this system with the
         specified storage address `iri`.
 
+        If the readOnly feature of this system is enabled, the
+        returned instance is opened read-only; the topic map remains
+        writable through other systems. See `tmapi.models.read_only`.
+
         :param iri: the storage address to retrieve the `TopicMap` from
         :type iri: `Locator` or String
         :rtype: `TopicMap` or None
@@ -129,5 +142,7 @@ class TopicMapSystem (models.Model):
             tm = TopicMap.objects.get(iri=iri)
         except TopicMap.DoesNotExist:
             tm = None
+        if tm is not None and self.get_feature(READ_ONLY_FEATURE_STRING):
+            open_read_only(tm)
         return tm
         
@@ -13,11 +13,12 @@
 # limitations under the License.
 
 from tmapi.constants import AUTOMERGE_FEATURE_STRING, \
+    BACKEND_PROPERTY_STRING, DATABASE_BACKEND, MEMORY_BACKEND, \
     MERGE_BY_TOPIC_NAME_FEATURE_STRING, READ_ONLY_FEATURE_STRING, \
     TYPE_INSTANCE_ASSOCIATIONS_FEATURE_STRING
 
 from tmapi.exceptions import FeatureNotRecognizedException, \
-    FeatureNotSupportedException
+    FeatureNotSupportedException, IllegalArgumentException
 
 from tmapi_feature import TMAPIFeature
 from topic_map_system import TopicMapSystem
@@ -33,18 +34,44 @@ class TopicMapSystemFactory (object):
     `set_feature(string, boolean)` and/or `set_property(string,
     object)` methods prior to invoking `new_topic_map_system()`.
 
+    Enabling the readOnly feature (READ_ONLY_FEATURE_STRING) gives a
+    system whose topic maps are opened read-only, and which cannot
+    create topic maps; see `tmapi.models.read_only`. It is not
+    supported by the memory backend.
+
+    Enabling the mergeByTopicName feature
+    (MERGE_BY_TOPIC_NAME_FEATURE_STRING) merges topics that have a
+    name with the same value, type and scope; see
+    `tmapi.models.name_merge_utils`. It is not supported by the
+    memory backend.
+
+    The BACKEND_PROPERTY_STRING property selects where the topic maps
+    of the new system are held: DATABASE_BACKEND (the default) stores
+    them in the database, while MEMORY_BACKEND holds them in memory
+    only, using the implementation in `tmapi.memory`.
+
     """
 
     # Dictionary of recognised feature strings, specifying their state
     # (enabled/disabled) and whether they are supported.
     _features = {
         AUTOMERGE_FEATURE_STRING: [True, True],
-        MERGE_BY_TOPIC_NAME_FEATURE_STRING: [False, False],
-        READ_ONLY_FEATURE_STRING: [False, False],
+        MERGE_BY_TOPIC_NAME_FEATURE_STRING: [False, True],
+        READ_ONLY_FEATURE_STRING: [False, True],
         TYPE_INSTANCE_ASSOCIATIONS_FEATURE_STRING: [False, False],
         }
     _properties = {}
-    
+
+    # Values recognised for the BACKEND_PROPERTY_STRING property.
+    _backends = (DATABASE_BACKEND, MEMORY_BACKEND)
+
+    def __init__ (self):
+        # Copy the class defaults, so that changes made to one factory
+        # do not affect any other.
+        self._features = dict([(name, list(values)) for name, values
+                               in self._features.items()])
+        self._properties = dict(self._properties)
+
     def get_feature (self, feature_name):
         """Returns the particular feature requested for in the
         underlying implementation of `TopicMapSystem`.
@@ -121,6 +148,19 @@ class TopicMapSystemFactory (object):
         :rtype: `TopicMapSystem`
 
         """
+        if self._properties.get(BACKEND_PROPERTY_STRING) == MEMORY_BACKEND:
+            # Imported here, since the memory backend itself uses
+            # these models.
+            from tmapi.memory import TopicMapSystem as MemoryTopicMapSystem
+            if self._features[READ_ONLY_FEATURE_STRING][0]:
+                # A read-only system held in memory could never
+                # contain anything.
+                raise FeatureNotSupportedException
+            if self._features[MERGE_BY_TOPIC_NAME_FEATURE_STRING][0]:
+                raise FeatureNotSupportedException
+            features = dict([(name, values[0]) for name, values
+                             in self._features.items()])
+            return MemoryTopicMapSystem(features, dict(self._properties))
         tms = TopicMapSystem()
         tms.save()
         for feature_string, values in self._features.items():
@@ -171,5 +211,12 @@ class TopicMapSystemFactory (object):
         :type value: object or None to remove the property
 
         """
-        raise Exception('Not yet implemented')
+        if value is None:
+            self._properties.pop(property_name, None)
+            return
+        if property_name == BACKEND_PROPERTY_STRING and \
+                value not in self._backends:
+            raise IllegalArgumentException(
+                'Unknown backend: %s' % value)
+        self._properties[property_name] = value
 
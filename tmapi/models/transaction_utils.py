@@ -0,0 +1,81 @@
+# Copyright 2011 Jamie Norrish (jamie@artefact.org.nz)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module containing utility functions for making changes that may
+conflict with those of concurrent writers.
+
+Identity-based creation of topics checks for an existing topic and
+inserts one if there is none. Two processes doing so at once may both
+find nothing; the unique indices on the address and topic map of the
+identifier tables ensure that only one insert succeeds. The other is
+rolled back and retried, at which point it finds the winner's topic.
+
+"""
+
+from django.db import IntegrityError, transaction
+
+
+# The number of times a change is attempted before a conflict is
+# reported.
+CONFLICT_ATTEMPTS = 3
+
+
+def retry_on_conflict (function, *args):
+    """Returns the result of calling `function` with `args`,
+    atomically.
+
+    If `function` violates a uniqueness constraint, its changes are
+    rolled back and it is called again, up to CONFLICT_ATTEMPTS times
+    in all. `function` must therefore check for the existing data it
+    conflicts with before making any change.
+
+    Within a transaction the changes are isolated with a savepoint,
+    leaving the rest of the transaction intact. On databases that do
+    not support savepoints (eg, SQLite), a change made by `function`
+    before the conflicting one is not rolled back; such databases do
+    not support concurrent writers in any case.
+
+    :param function: the function making the change
+    :type function: callable
+    :raises `IntegrityError`: if the last attempt conflicts
+
+    """
+    for attempt in range(1, CONFLICT_ATTEMPTS + 1):
+        try:
+            return _call_atomically(function, args)
+        except IntegrityError:
+            if attempt == CONFLICT_ATTEMPTS:
+                raise
+
+def _call_atomically (function, args):
+    """Returns the result of calling `function` with `args`, rolling
+    back its changes if it raises an `IntegrityError`.
+
+    :param function: the function to call
+    :type function: callable
+    :param args: the arguments to call `function` with
+    :type args: tuple
+
+    """
+    if not transaction.is_managed():
+        with transaction.commit_on_success():
+            return function(*args)
+    sid = transaction.savepoint()
+    try:
+        result = function(*args)
+    except IntegrityError:
+        transaction.savepoint_rollback(sid)
+        raise
+    transaction.savepoint_commit(sid)
+    return result
@@ -17,6 +17,8 @@ from django.db import models
 from tmapi.exceptions import ModelConstraintException
 
 from construct import Construct
+from proxy_utils import cast_related
+from request_scope import load_related
 
 
 class Typed (Construct, models.Model):
@@ -38,10 +40,8 @@ class Typed (Construct, models.Model):
         :rtype: the `Topic` that represents the type
 
         """
-        construct_type = self.type
-        if proxy is not None:
-            construct_type = proxy.objects.get(pk=construct_type.pk)
-        return construct_type
+        load_related(self, 'type')
+        return cast_related(self, 'type', proxy)
 
     def set_type (self, construct_type):
         """Sets the type of this construct. Any previous type is overridden.
@@ -14,4 +14,6 @@
 
 from models import *
 from indices import *
+from formats import *
+from memory import *
 
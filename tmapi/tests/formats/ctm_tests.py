@@ -0,0 +1,320 @@
+# Copyright 2011 Jamie Norrish (jamie@artefact.org.nz)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module containing tests for reading and writing CTM documents."""
+
+from StringIO import StringIO
+
+from tmapi.constants import SUBTYPE, SUPERTYPE, SUPERTYPE_SUBTYPE, XSD, \
+    XSD_ANY_URI, XSD_DATE, XSD_DATE_TIME, XSD_DECIMAL, XSD_INTEGER, \
+    XSD_STRING
+from tmapi.exceptions import ParseException
+from tmapi.formats import CTMParser, CTMWriter, TopicMapHandler
+
+from tmapi.tests.models.tmapi_test_case import TMAPITestCase, database_only
+
+
+BASE = 'http://www.example.org/map.ctm'
+PREFIX = 'http://psi.example.org/'
+
+
+class CTMParserTest (TMAPITestCase):
+
+    def _get_topic (self, reference):
+        return self.tm.get_topic_by_subject_identifier(
+            self.create_locator(PREFIX + reference))
+
+    def _parse (self, document):
+        handler = TopicMapHandler(self.tm)
+        CTMParser(handler, BASE).parse(
+            '%%prefix ex <%s>\n%s' % (PREFIX, document))
+
+    def test_identities (self):
+        self._parse('''
+            person .
+            ex:jane <http://www.example.org/jane> ; = <http://jane.example.org/> ;
+                ^ <http://www.example.org/ii#jane> .
+            ''')
+        self.assertNotEqual(None, self.tm.get_construct_by_item_identifier(
+                self.create_locator(BASE + '#person')))
+        jane = self._get_topic('jane')
+        self.assertEqual(set([PREFIX + 'jane', 'http://www.example.org/jane']),
+                         set([locator.to_external_form() for locator in
+                              jane.get_subject_identifiers()]))
+        self.assertEqual(jane, self.tm.get_topic_by_subject_locator(
+                self.create_locator('http://jane.example.org/')))
+        self.assertEqual(jane, self.tm.get_construct_by_item_identifier(
+                self.create_locator('http://www.example.org/ii#jane')))
+        self.assertEqual(2, self.tm.get_topics().count())
+
+    def test_merging_identities (self):
+        self._parse('''
+            ex:jane - "Jane" .
+            ex:janet - "Janet" .
+            ex:jane ex:janet .
+            ''')
+        self.assertEqual(self._get_topic('jane'), self._get_topic('janet'))
+        self.assertEqual(set(['Jane', 'Janet']), set(
+                [name.get_value() for name in
+                 self._get_topic('jane').get_names()]))
+
+    def test_names (self):
+        self._parse('''
+            ex:jane isa ex:person ;
+                - "Jane Doe" @ex:formal ~ ex:reifier
+                    ("JD" @ex:abbreviation)
+                    ("<b>Jane</b>"^^ex:html @ex:markup) ;
+                - ex:nickname: """Plain "Jane\\"""" .
+            ''')
+        jane = self._get_topic('jane')
+        self.assertEqual([self._get_topic('person')], list(jane.get_types()))
+        name = jane.get_names(self._get_topic('nickname'))[0]
+        self.assertEqual(u'Plain "Jane"', name.get_value())
+        name = [name for name in jane.get_names()
+                if name.get_value() == 'Jane Doe'][0]
+        self.assertEqual([self._get_topic('formal')], list(name.get_scope()))
+        self.assertEqual(self._get_topic('reifier'), name.get_reifier())
+        variants = dict([(variant.get_value(), variant) for variant in
+                         name.get_variants()])
+        self.assertEqual(set(['JD', '<b>Jane</b>']), set(variants))
+        self.assertEqual(PREFIX + 'html', variants['<b>Jane</b>'].get_datatype(
+                ).to_external_form())
+        self.assertEqual(XSD_STRING, variants['JD'].get_datatype(
+                ).to_external_form())
+
+    def test_xsd_prefix (self):
+        self._parse('ex:jane ex:born: "1970-01-01"^^xsd:date .')
+        occurrence = self._get_topic('jane').get_occurrences()[0]
+        self.assertEqual(XSD + 'date',
+                         occurrence.get_datatype().to_external_form())
+
+    def test_unbracketed_iris (self):
+        self._parse('''
+            %prefix wiki http://en.wikipedia.org/wiki/
+            http://psi.example.org/jane - "Jane" ;
+                ex:homepage: http://jane.example.org/ ;
+                = http://jane.example.org/index.html.
+            ex:knows(http://psi.example.org/knower: ex:jane, ex:known: wiki:John_Doe)
+            ''')
+        jane = self._get_topic('jane')
+        self.assertEqual('Jane', jane.get_names()[0].get_value())
+        homepage = jane.get_occurrences()[0]
+        self.assertEqual(('http://jane.example.org/', XSD_ANY_URI), (
+                homepage.get_value(),
+                homepage.get_datatype().to_external_form()))
+        self.assertEqual(jane, self.tm.get_topic_by_subject_locator(
+                self.create_locator('http://jane.example.org/index.html')))
+        john = self.tm.get_topic_by_subject_identifier(
+            self.create_locator('http://en.wikipedia.org/wiki/John_Doe'))
+        role = jane.get_roles_played()[0]
+        self.assertEqual(self._get_topic('knower'), role.get_type())
+        self.assertEqual([john], [other.get_player() for other in
+                                  role.get_parent().get_roles()
+                                  if other != role])
+
+    def test_date_literals (self):
+        self._parse('''
+            ex:jane ex:born: 1970-01-01 ;
+                ex:registered: 2011-03-04T05:06:07.5Z ;
+                ex:updated: 2011-03-04T05:06:07+12:00 ;
+                ex:age: 41 .
+            ''')
+        jane = self._get_topic('jane')
+        occurrences = dict([(occurrence.get_type(), occurrence) for
+                            occurrence in jane.get_occurrences()])
+        for reference, value, datatype in (
+            ('born', '1970-01-01', XSD_DATE),
+            ('registered', '2011-03-04T05:06:07.5Z', XSD_DATE_TIME),
+            ('updated', '2011-03-04T05:06:07+12:00', XSD_DATE_TIME),
+            ('age', '41', XSD_INTEGER)):
+            occurrence = occurrences[self._get_topic(reference)]
+            self.assertEqual((value, datatype), (
+                    occurrence.get_value(),
+                    occurrence.get_datatype().to_external_form()))
+
+    def test_occurrences (self):
+        self._parse('''
+            ex:jane
+                ex:age: 42 ;
+                ex:height: 1.75 @ex:metric ;
+                ex:homepage: <http://jane.example.org/> ;
+                ex:note: "A \\u00e9l\\u00e8ve\\nof note" ~ ex:reifier .
+            ''')
+        jane = self._get_topic('jane')
+        occurrences = dict([(occurrence.get_type(), occurrence) for
+                            occurrence in jane.get_occurrences()])
+        self.assertEqual(4, len(occurrences))
+        age = occurrences[self._get_topic('age')]
+        self.assertEqual(('42', XSD_INTEGER), (
+                age.get_value(), age.get_datatype().to_external_form()))
+        height = occurrences[self._get_topic('height')]
+        self.assertEqual(('1.75', XSD_DECIMAL), (
+                height.get_value(), height.get_datatype().to_external_form()))
+        self.assertEqual([self._get_topic('metric')],
+                         list(height.get_scope()))
+        homepage = occurrences[self._get_topic('homepage')]
+        self.assertEqual(('http://jane.example.org/', XSD_ANY_URI), (
+                homepage.get_value(),
+                homepage.get_datatype().to_external_form()))
+        note = occurrences[self._get_topic('note')]
+        self.assertEqual(u'A \xe9l\xe8ve\nof note', note.get_value())
+        self.assertEqual(self._get_topic('reifier'), note.get_reifier())
+
+    def test_associations (self):
+        self._parse('''
+            ex:employment(ex:employee: ex:jane ~ ex:role-reifier,
+                          ex:employer: ex:acme) @ex:past ~ ex:reifier
+            ''')
+        association = self.tm.get_associations()[0]
+        self.assertEqual(self._get_topic('employment'),
+                         association.get_type())
+        self.assertEqual([self._get_topic('past')],
+                         list(association.get_scope()))
+        self.assertEqual(self._get_topic('reifier'),
+                         association.get_reifier())
+        role = association.get_roles(self._get_topic('employee'))[0]
+        self.assertEqual(self._get_topic('jane'), role.get_player())
+        self.assertEqual(self._get_topic('role-reifier'), role.get_reifier())
+        role = association.get_roles(self._get_topic('employer'))[0]
+        self.assertEqual(self._get_topic('acme'), role.get_player())
+
+    def test_supertype (self):
+        self._parse('ex:employee ako ex:person .')
+        association = self.tm.get_associations()[0]
+        self.assertEqual(SUPERTYPE_SUBTYPE, association.get_type(
+                ).get_subject_identifiers()[0].to_external_form())
+        get_player = lambda psi: association.get_roles(
+            self.tm.get_topic_by_subject_identifier(
+                self.create_locator(psi)))[0].get_player()
+        self.assertEqual(self._get_topic('employee'), get_player(SUBTYPE))
+        self.assertEqual(self._get_topic('person'), get_player(SUPERTYPE))
+
+    def test_topic_map_reifier (self):
+        self._parse('~ ex:map\nex:map - "The map" .')
+        self.assertEqual(self._get_topic('map'), self.tm.get_reifier())
+
+    def test_wildcards (self):
+        self._parse('''
+            ex:knows(ex:knower: ?jane, ex:known: ?)
+            ?jane - "Jane" .
+            ex:likes(ex:liker: [ - "Anonymous" ], ex:liked: ?jane)
+            ''')
+        topics = [topic for topic in self.tm.get_topics()
+                  if topic.get_names().count()]
+        self.assertEqual(set(['Jane', 'Anonymous']), set(
+                [topic.get_names()[0].get_value() for topic in topics]))
+        jane = [topic for topic in topics
+                if topic.get_names()[0].get_value() == 'Jane'][0]
+        self.assertEqual(2, jane.get_roles_played().count())
+
+    def test_templates (self):
+        self._parse('''
+            def works-for($person, $employer)
+                ex:employment(ex:employee: $person, ex:employer: $employer)
+                ?tenure - "Tenure" .
+                $person ex:tenure: "long" .
+            end
+            works-for(ex:jane, ex:acme)
+            ex:john works-for(ex:acme) .
+            works-for([ - "Anonymous" ], ex:acme)
+            ''')
+        employment = self._get_topic('employment')
+        self.assertEqual(3, len([association for association in
+                                 self.tm.get_associations() if
+                                 association.get_type() == employment]))
+        for reference in ('jane', 'john'):
+            self.assertEqual(1, self._get_topic(reference).get_occurrences(
+                    ).count())
+        # Each invocation has its own named wildcard.
+        self.assertEqual(3, len([topic for topic in self.tm.get_topics()
+                                 if topic.get_names().count() and
+                                 topic.get_names()[0].get_value() ==
+                                 'Tenure']))
+
+    def test_file (self):
+        handler = TopicMapHandler(self.tm)
+        CTMParser(handler, BASE).parse(StringIO(
+                '%encoding "UTF-8"\n%version 1.0\n'
+                '<http://psi.example.org/jane> - "J\xc3\xa9" .'))
+        self.assertEqual(u'J\xe9', self._get_topic('jane').get_names()[0]
+                         .get_value())
+
+    def test_errors (self):
+        documents = (
+            ('ex:jane - "Jane"', 1),
+            ('ex:jane\n- "Jane" . ex:john ex:age: .', 2),
+            ('other:jane .', 1),
+            ('def t($a)\nex:a($a: $b)\nend\nt(ex:jane)', 2),
+            ('%version 2.0', 1),
+            ('%include <http://www.example.org/other.ctm>', 1),
+            ('"value" .', 1),
+            ('ex:jane - "\\q" .', 1),
+            )
+        for document, line in documents:
+            try:
+                self._parse(document)
+            except ParseException, e:
+                # The prefix declaration occupies the first line.
+                self.assertEqual(line + 1, e.get_line(), document)
+            else:
+                self.fail('No ParseException raised for %r' % document)
+
+
+@database_only
+class CTMWriterTest (TMAPITestCase):
+
+    def _write (self, topic_map):
+        stream = StringIO()
+        CTMWriter(topic_map, stream).write()
+        return stream.getvalue()
+
+    def test_round_trip (self):
+        document = '''
+            %prefix ex <http://psi.example.org/>
+            ~ ex:map
+            ex:jane isa ex:person ; = <http://jane.example.org/> ;
+                - "Jane \\"JD\\" Doe" @ex:formal ~ ex:name-reifier
+                    ("JD" @ex:abbreviation) ;
+                - ex:nickname: "Plain\\tJane" ;
+                ex:age: 42 ; ex:height: 1.75 ;
+                ex:homepage: <http://jane.example.org/> ;
+                ex:born: "1970-01-01"^^xsd:date @ex:registry .
+            ex:employment(ex:employee: ex:jane ~ ex:role-reifier,
+                          ex:employer: [ - "Acme" ]) @ex:past
+            ex:employee ako ex:person .
+            '''
+        CTMParser(TopicMapHandler(self.tm), BASE).parse(document)
+        output = self._write(self.tm)
+        copy = self.tms.create_topic_map('http://www.example.org/copy')
+        CTMParser(TopicMapHandler(copy), BASE).parse(output)
+        self.assertEqual(self.tm.get_topics().count(),
+                         copy.get_topics().count())
+        self.assertEqual(self.tm.get_associations().count(),
+                         copy.get_associations().count())
+        # Topics are created in a different order in the copy, but
+        # each is written the same.
+        self.assertEqual(set(output.split('\n\n')),
+                         set(self._write(copy).split('\n\n')))
+
+    def test_literals (self):
+        topic = self.tm.create_topic_by_subject_identifier(
+            self.create_locator(PREFIX + 'jane'))
+        occurrence_type = self.tm.create_topic_by_subject_identifier(
+            self.create_locator(PREFIX + 'value'))
+        for value, datatype in (('12x', XSD_INTEGER), ('relative', XSD_ANY_URI)):
+            topic.create_occurrence(occurrence_type, value,
+                                    datatype=self.create_locator(datatype))
+        output = self._write(self.tm).decode('utf-8')
+        self.assertTrue(u'"12x"^^<%s>' % XSD_INTEGER in output)
+        self.assertTrue(u'"relative"^^<%s>' % XSD_ANY_URI in output)
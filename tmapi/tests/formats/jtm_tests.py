@@ -0,0 +1,202 @@
+# Copyright 2011 Jamie Norrish (jamie@artefact.org.nz)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module containing tests for reading JTM fragments."""
+
+from StringIO import StringIO
+
+from django.db import connection
+from django.utils import simplejson
+
+from tmapi.constants import DEFAULT_NAME_TYPE, XSD, XSD_STRING
+from tmapi.exceptions import ParseException
+from tmapi.formats import JTMReader
+from tmapi.models import Identifier
+
+from tmapi.tests.models.tmapi_test_case import TMAPITestCase, database_only
+
+
+PREFIX = 'http://psi.example.org/'
+
+
+@database_only
+class JTMReaderTest (TMAPITestCase):
+
+    def _get_topic (self, reference):
+        return self.tm.get_topic_by_subject_identifier(
+            self.create_locator(PREFIX + reference))
+
+    def _topic (self, reference, **properties):
+        properties.update({'version': '1.1', 'item_type': 'topic',
+                           'prefixes': {'ex': PREFIX},
+                           'subject_identifiers': ['[ex:%s]' % reference]})
+        return properties
+
+    def test_topic (self):
+        fragment = self._topic(
+            'jane', subject_locators=['http://jane.example.org/'],
+            item_identifiers=['#jane'], instance_of=['si:[ex:person]'],
+            names=[{'value': 'Jane Doe', 'scope': ['si:[ex:formal]'],
+                    'reifier': 'si:[ex:name-reifier]',
+                    'item_identifiers': ['#jane-name'],
+                    'variants': [{'value': 'JD',
+                                  'scope': ['si:[ex:abbreviation]']}]},
+                   {'value': 'Plain Jane', 'type': 'si:[ex:nickname]'}],
+            occurrences=[{'value': '1970-01-01', 'type': 'si:[ex:born]',
+                          'datatype': '[xsd:date]'},
+                         {'value': 'Jane', 'type': 'si:[ex:note]',
+                          'scope': ['si:[ex:formal]']}])
+        fragment['prefixes']['xsd'] = XSD
+        references = JTMReader(self.tm).read([simplejson.dumps(fragment)])
+        jane = self._get_topic('jane')
+        self.assertEqual(jane, self.tm.get_topic_by_subject_locator(
+                self.create_locator('http://jane.example.org/')))
+        self.assertEqual(jane, self.tm.get_construct_by_item_identifier(
+                self.create_locator(self.DEFAULT_ADDRESS + '#jane')))
+        self.assertEqual([self._get_topic('person')], list(jane.get_types()))
+        self.assertEqual(jane.get_id(), references['si:%sjane' % PREFIX])
+        self.assertEqual(jane.get_id(), references[
+                'ii:%s#jane' % self.DEFAULT_ADDRESS])
+        default_name_type = self.tm.get_topic_by_subject_identifier(
+            self.create_locator(DEFAULT_NAME_TYPE))
+        name = jane.get_names(default_name_type)[0]
+        self.assertEqual('Jane Doe', name.get_value())
+        self.assertEqual([self._get_topic('formal')], list(name.get_scope()))
+        self.assertEqual(self._get_topic('name-reifier'), name.get_reifier())
+        self.assertEqual(name.get_id(), references[
+                'ii:%s#jane-name' % self.DEFAULT_ADDRESS])
+        variant = name.get_variants()[0]
+        self.assertEqual(('JD', XSD_STRING), (
+                variant.get_value(), variant.get_datatype().to_external_form()))
+        self.assertEqual(set([self._get_topic('formal'),
+                              self._get_topic('abbreviation')]),
+                         set(variant.get_scope()))
+        self.assertEqual('Plain Jane', jane.get_names(
+                self._get_topic('nickname'))[0].get_value())
+        born = jane.get_occurrences(self._get_topic('born'))[0]
+        self.assertEqual(('1970-01-01', XSD + 'date'), (
+                born.get_value(), born.get_datatype().to_external_form()))
+        note = jane.get_occurrences(self._get_topic('note'))[0]
+        self.assertEqual([self._get_topic('formal')], list(note.get_scope()))
+
+    def test_association (self):
+        fragment = {
+            'version': '1.0', 'item_type': 'association',
+            'type': 'si:%semployment' % PREFIX,
+            'scope': ['si:%spast' % PREFIX],
+            'reifier': 'si:%sreifier' % PREFIX,
+            'roles': [{'type': 'si:%semployee' % PREFIX,
+                       'player': 'si:%sjane' % PREFIX,
+                       'reifier': 'si:%srole-reifier' % PREFIX},
+                      {'type': 'si:%semployer' % PREFIX,
+                       'player': 'si:%sacme' % PREFIX}]}
+        JTMReader(self.tm).read([fragment])
+        association = self.tm.get_associations()[0]
+        self.assertEqual(self._get_topic('employment'),
+                         association.get_type())
+        self.assertEqual([self._get_topic('past')],
+                         list(association.get_scope()))
+        self.assertEqual(self._get_topic('reifier'),
+                         association.get_reifier())
+        role = association.get_roles(self._get_topic('employee'))[0]
+        self.assertEqual(self._get_topic('jane'), role.get_player())
+        self.assertEqual(self._get_topic('role-reifier'), role.get_reifier())
+
+    def test_name_and_occurrence_fragments (self):
+        fragments = [
+            {'version': '1.0', 'item_type': 'name', 'value': 'Jane',
+             'parent': ['si:%sjane' % PREFIX]},
+            StringIO(simplejson.dumps(
+                    {'version': '1.0', 'item_type': 'occurrence',
+                     'value': 'note', 'type': 'si:%snote' % PREFIX,
+                     'parent': ['si:%sjane' % PREFIX]}))]
+        JTMReader(self.tm).read(fragments)
+        jane = self._get_topic('jane')
+        self.assertEqual('Jane', jane.get_names()[0].get_value())
+        self.assertEqual('note', jane.get_occurrences()[0].get_value())
+
+    def test_merging (self):
+        self.tm.create_topic_by_subject_identifier(
+            self.create_locator(PREFIX + 'jane'))
+        fragments = [
+            self._topic('jane', names=[{'value': 'Jane'}],
+                        item_identifiers=['#jane']),
+            self._topic('janet', names=[{'value': 'Janet'}],
+                        item_identifiers=['#jane']),
+            self._topic('jane-doe', item_identifiers=['#jane'])]
+        references = JTMReader(self.tm, batch_size=2).read(fragments)
+        topic = self._get_topic('jane')
+        self.assertEqual(topic, self._get_topic('janet'))
+        self.assertEqual(topic, self._get_topic('jane-doe'))
+        self.assertEqual(set(['Jane', 'Janet']), set(
+                [name.get_value() for name in topic.get_names()]))
+        self.assertEqual(topic.get_id(), references[
+                'si:%sjane-doe' % PREFIX])
+
+    def test_topic_map (self):
+        fragment = {
+            'version': '1.1', 'item_type': 'topicmap',
+            'prefixes': {'ex': PREFIX}, 'reifier': 'si:[ex:map]',
+            'topics': [self._topic('jane')],
+            'associations': [{'type': 'si:[ex:knows]',
+                              'roles': [{'type': 'si:[ex:knower]',
+                                         'player': 'si:[ex:jane]'}]}]}
+        JTMReader(self.tm).read([fragment])
+        self.assertEqual(self._get_topic('map'), self.tm.get_reifier())
+        self.assertEqual(1, self._get_topic('jane').get_roles_played().count())
+
+    def test_queries (self):
+        fragments = [self._topic(
+                'topic%d' % i, instance_of=['si:[ex:person]'],
+                names=[{'value': 'Topic %d' % i}],
+                occurrences=[{'value': str(i), 'type': 'si:[ex:number]'}])
+                     for i in range(20)]
+        JTMReader(self.tm).read(fragments[:1])
+        # Save for the creation of identifiers, which is made a row at
+        # a time on databases other than PostgreSQL, the number of
+        # queries does not grow with the number of fragments.
+        self.assertEqual(self._count_queries(fragments[1:2]),
+                         self._count_queries(fragments[2:]))
+
+    def _count_queries (self, fragments):
+        identifier_table = connection.ops.quote_name(
+            Identifier._meta.db_table)
+        use_debug_cursor = connection.use_debug_cursor
+        connection.use_debug_cursor = True
+        start = len(connection.queries)
+        try:
+            JTMReader(self.tm).read(fragments)
+        finally:
+            connection.use_debug_cursor = use_debug_cursor
+        return len([query for query in connection.queries[start:] if
+                    identifier_table not in query['sql']])
+
+    def test_errors (self):
+        fragments = (
+            '{"version": "1.1", "item_type": "topic"',
+            {'version': '2.0', 'item_type': 'topic'},
+            {'version': '1.0', 'item_type': 'variant'},
+            {'version': '1.0', 'item_type': 'topic', 'names': [
+                    {'value': 'Jane'}]},
+            {'version': '1.0', 'item_type': 'topic',
+             'subject_identifiers': [PREFIX + 'jane'],
+             'instance_of': ['person']},
+            {'version': '1.1', 'item_type': 'topic',
+             'subject_identifiers': ['[ex:jane]']},
+            {'version': '1.0', 'item_type': 'association',
+             'type': 'si:%sknows' % PREFIX},
+            )
+        for fragment in fragments:
+            self.assertRaises(ParseException, JTMReader(self.tm).read,
+                              [fragment])
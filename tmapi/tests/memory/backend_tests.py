@@ -0,0 +1,52 @@
+# Copyright 2011 Jamie Norrish (jamie@artefact.org.nz)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module running the TMAPI tests against the in-memory backend.
+
+For each test case in `tmapi.tests.models`, `tmapi.tests.indices` and
+`tmapi.tests.formats` a subclass is defined here that runs the same
+tests with the MEMORY_BACKEND, save for those marked as
+`database_only`.
+
+"""
+
+import inspect
+
+from tmapi.constants import MEMORY_BACKEND
+from tmapi.tests import formats, indices, models
+from tmapi.tests.models.tmapi_test_case import TMAPITestCase
+
+
+def _create_memory_test_cases (modules):
+    """Returns memory backend versions of the test cases in `modules`.
+
+    :param modules: the modules containing test cases
+    :type modules: list of modules
+    :rtype: dictionary of classes keyed by name
+
+    """
+    test_cases = {}
+    for module in modules:
+        for name, test_case in inspect.getmembers(module, inspect.isclass):
+            if not issubclass(test_case, TMAPITestCase) or \
+                    getattr(test_case, 'database_only', False):
+                continue
+            name = 'Memory%s' % name
+            test_cases[name] = type(name, (test_case,),
+                                    {'backend': MEMORY_BACKEND,
+                                     '__module__': __name__})
+    return test_cases
+
+
+globals().update(_create_memory_test_cases([models, indices, formats]))
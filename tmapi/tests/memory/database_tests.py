@@ -0,0 +1,164 @@
+# Copyright 2011 Jamie Norrish (jamie@artefact.org.nz)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module containing tests for moving topic maps between the database
+and memory."""
+
+from tmapi.constants import BACKEND_PROPERTY_STRING, MEMORY_BACKEND, \
+    XSD_INT
+from tmapi.exceptions import IllegalArgumentException
+from tmapi.memory import load_topic_map, save_topic_map
+
+from tmapi.tests.models.tmapi_test_case import TMAPITestCase
+
+
+class DatabaseTest (TMAPITestCase):
+
+    def _populate (self, tm):
+        """Creates one of each kind of construct in `tm`, returning
+        the topic playing a role and having names and occurrences.
+
+        :rtype: `Topic`
+
+        """
+        topic = tm.create_topic_by_subject_identifier(
+            tm.create_locator('http://www.example.org/topic'))
+        topic.add_subject_locator(tm.create_locator('http://www.example.org/'))
+        topic.add_type(tm.create_topic())
+        theme = tm.create_topic()
+        name = topic.create_name('Name', tm.create_topic(), [theme])
+        name.create_variant('Variant', [tm.create_topic()])
+        occurrence = topic.create_occurrence(
+            tm.create_topic(), '5', datatype=tm.create_locator(XSD_INT))
+        occurrence.add_item_identifier(
+            tm.create_locator('http://www.example.org/occurrence'))
+        association = tm.create_association(tm.create_topic(), [theme])
+        association.create_role(tm.create_topic(), topic)
+        association.set_reifier(tm.create_topic())
+        return topic
+
+    def test_load (self):
+        topic = self._populate(self.tm)
+        memory_tm = load_topic_map(self.tm)
+        self.assertEqual(self.tm.get_id(), memory_tm.get_id())
+        self.assertEqual(self.tm.get_topics().count(),
+                         memory_tm.get_topics().count())
+        memory_topic = memory_tm.get_construct_by_id(topic.get_id())
+        self.assertEqual(memory_topic, memory_tm.get_topic_by_subject_locator(
+                self.tm.create_locator('http://www.example.org/')))
+        self.assertEqual(list(topic.get_subject_identifiers()),
+                         list(memory_topic.get_subject_identifiers()))
+        self.assertEqual([type.get_id() for type in topic.get_types()],
+                         [type.get_id() for type in memory_topic.get_types()])
+        name = topic.get_names()[0]
+        memory_name = memory_topic.get_names()[0]
+        self.assertEqual(name.get_id(), memory_name.get_id())
+        self.assertEqual(u'Name', memory_name.get_value())
+        self.assertEqual([theme.get_id() for theme in name.get_scope()],
+                         [theme.get_id() for theme in memory_name.get_scope()])
+        self.assertEqual(2, memory_name.get_variants()[0].get_scope().count())
+        memory_occurrence = memory_topic.get_occurrences()[0]
+        self.assertEqual(5, memory_occurrence.get_value())
+        self.assertEqual(memory_occurrence,
+                         memory_tm.get_construct_by_item_identifier(
+                self.tm.create_locator('http://www.example.org/occurrence')))
+        memory_role = memory_topic.get_roles_played()[0]
+        association = self.tm.get_associations()[0]
+        self.assertEqual(association.get_id(),
+                         memory_role.get_parent().get_id())
+        self.assertEqual(association.get_reifier().get_id(),
+                         memory_role.get_parent().get_reifier().get_id())
+
+    def test_load_query_count (self):
+        self._populate(self.tm)
+        with self.assertNumQueries(21):
+            load_topic_map(self.tm)
+        self._populate(self.create_topic_map('http://www.example.org/map'))
+        for i in range(5):
+            self.create_role()
+            self.create_occurrence()
+            self.create_variant().add_theme(self.create_topic())
+        with self.assertNumQueries(21):
+            load_topic_map(self.tm)
+
+    def test_save_unchanged (self):
+        self._populate(self.tm)
+        memory_tm = load_topic_map(self.tm)
+        with self.assertNumQueries(0):
+            save_topic_map(memory_tm)
+
+    def test_save_changes (self):
+        topic = self._populate(self.tm)
+        memory_tm = load_topic_map(self.tm)
+        memory_topic = memory_tm.get_construct_by_id(topic.get_id())
+        new_topic = memory_tm.create_topic_by_subject_identifier(
+            memory_tm.create_locator('http://www.example.org/new'))
+        new_name = new_topic.create_name('New', memory_tm.create_topic())
+        new_name.set_reifier(memory_tm.create_topic())
+        memory_topic.get_occurrences()[0].set_value('Changed')
+        memory_topic.get_names()[0].remove()
+        memory_topic.merge_in(new_topic)
+        save_topic_map(memory_tm)
+        self.assertEqual(memory_tm.get_topics().count(),
+                         self.tm.get_topics().count())
+        self.assertEqual(topic, self.tm.get_topic_by_subject_identifier(
+                self.tm.create_locator('http://www.example.org/new')))
+        self.assertEqual([u'New'],
+                         [name.get_value() for name in topic.get_names()])
+        name = topic.get_names()[0]
+        self.assertEqual(name.get_id(), memory_topic.get_names()[0].get_id())
+        self.assertEqual(name.get_reifier().get_id(),
+                         memory_topic.get_names()[0].get_reifier().get_id())
+        self.assertEqual(u'Changed', topic.get_occurrences()[0].get_value())
+        with self.assertNumQueries(0):
+            save_topic_map(memory_tm)
+
+    def test_save_name_keys (self):
+        self.create_topic().create_name('Name')
+        name = self.create_topic().create_name('Other')
+        typed_name = self.create_topic().create_name(
+            'Name', self.create_topic())
+        memory_tm = load_topic_map(self.tm)
+        memory_tm.get_construct_by_id(name.get_id()).set_value('Name')
+        memory_tm.get_construct_by_id(typed_name.get_id()).set_type(
+            memory_tm.get_construct_by_id(name.get_type().get_id()))
+        save_topic_map(memory_tm)
+        # The names' keys were updated, so that all three are found
+        # to be the same.
+        self.assertEqual(2, self.tm.merge_by_topic_name())
+
+    def test_save_removals (self):
+        topic = self._populate(self.tm)
+        memory_tm = load_topic_map(self.tm)
+        memory_topic = memory_tm.get_construct_by_id(topic.get_id())
+        memory_role = memory_topic.get_roles_played()[0]
+        memory_association = memory_role.get_parent()
+        memory_association.remove()
+        memory_topic.get_occurrences()[0].remove_item_identifier(
+            memory_tm.create_locator('http://www.example.org/occurrence'))
+        memory_topic.remove_subject_locator(
+            memory_tm.create_locator('http://www.example.org/'))
+        save_topic_map(memory_tm)
+        self.assertEqual(0, self.tm.get_associations().count())
+        self.assertEqual(0, topic.get_roles_played().count())
+        self.assertEqual(0, topic.get_subject_locators().count())
+        self.assertEqual(None, self.tm.get_construct_by_item_identifier(
+                self.tm.create_locator('http://www.example.org/occurrence')))
+
+    def test_save_not_loaded (self):
+        factory = self.create_factory()
+        factory.set_property(BACKEND_PROPERTY_STRING, MEMORY_BACKEND)
+        memory_tm = factory.new_topic_map_system().create_topic_map(
+            self.DEFAULT_ADDRESS)
+        self.assertRaises(IllegalArgumentException, save_topic_map, memory_tm)
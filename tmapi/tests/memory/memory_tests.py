@@ -0,0 +1,87 @@
+# Copyright 2011 Jamie Norrish (jamie@artefact.org.nz)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module containing tests specific to the in-memory backend."""
+
+from django.test import TestCase
+
+from tmapi.constants import BACKEND_PROPERTY_STRING, MEMORY_BACKEND
+from tmapi.exceptions import IllegalArgumentException
+from tmapi.indices.type_instance_index import TypeInstanceIndex
+from tmapi.memory import TopicMapSystem
+from tmapi.models import TopicMapSystemFactory
+
+
+class MemoryBackendTest (TestCase):
+
+    def setUp (self):
+        factory = TopicMapSystemFactory.new_instance()
+        factory.set_property(BACKEND_PROPERTY_STRING, MEMORY_BACKEND)
+        self.tms = factory.new_topic_map_system()
+        self.tm = self.tms.create_topic_map('http://www.tmapi.org/tmapi2.0')
+
+    def test_factory_property (self):
+        self.assertTrue(isinstance(self.tms, TopicMapSystem))
+        self.assertEqual(MEMORY_BACKEND,
+                         self.tms.get_property(BACKEND_PROPERTY_STRING))
+        factory = TopicMapSystemFactory.new_instance()
+        self.assertEqual(None, factory.get_property(BACKEND_PROPERTY_STRING))
+        self.assertRaises(IllegalArgumentException, factory.set_property,
+                          BACKEND_PROPERTY_STRING, 'bogus')
+        factory.set_property(BACKEND_PROPERTY_STRING, MEMORY_BACKEND)
+        factory.set_property(BACKEND_PROPERTY_STRING, None)
+        self.assertEqual(None, factory.get_property(BACKEND_PROPERTY_STRING))
+
+    def test_no_database_queries (self):
+        # The current Site, used for automatic item identifiers, is
+        # cached by Django after its first retrieval.
+        self.tm.create_topic()
+        with self.assertNumQueries(0):
+            topic = self.tm.create_topic_by_subject_identifier(
+                self.tm.create_locator('http://www.example.org/topic'))
+            name = topic.create_name('Name', self.tm.create_topic())
+            association = self.tm.create_association(self.tm.create_topic(),
+                                                     [self.tm.create_topic()])
+            association.create_role(self.tm.create_topic(), topic)
+            self.assertEqual([name], list(topic.get_names()))
+            self.assertEqual(1, topic.get_roles_played().count())
+
+    def test_constructs_have_no_dict (self):
+        topic = self.tm.create_topic()
+        name = topic.create_name('Name')
+        variant = name.create_variant('Variant', [self.tm.create_topic()])
+        for construct in (self.tm, topic, name, variant):
+            self.assertFalse(hasattr(construct, '__dict__'))
+
+    def test_locators_interned (self):
+        reference = 'http://www.example.org/shared'
+        topic = self.tm.create_topic_by_subject_identifier(
+            self.tm.create_locator(reference))
+        occurrence = topic.create_occurrence(self.tm.create_topic(), 'value')
+        occurrence.add_item_identifier(self.tm.create_locator(reference))
+        self.assertTrue(list(topic.get_subject_identifiers())[0] is
+                        list(occurrence.get_item_identifiers())[0])
+
+    def test_merge_replaces_type (self):
+        topic_type1 = self.tm.create_topic()
+        topic_type2 = self.tm.create_topic()
+        instance = self.tm.create_topic()
+        instance.add_type(topic_type2)
+        association = self.tm.create_association(topic_type2, [topic_type2])
+        topic_type1.merge_in(topic_type2)
+        self.assertEqual([topic_type1], list(instance.get_types()))
+        self.assertEqual(topic_type1, association.get_type())
+        self.assertEqual([topic_type1], list(association.get_scope()))
+        index = self.tm.get_index(TypeInstanceIndex)
+        self.assertEqual([instance], list(index.get_topics(topic_type1)))
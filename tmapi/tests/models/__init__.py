@@ -13,17 +13,30 @@
 # limitations under the License.
 
 from association_tests import *
+from batch_tests import *
+from benchmark_tests import *
 from construct_tests import *
+from deferred_tests import *
 from feature_strings_tests import *
+from instrumentation_tests import *
 from item_identifier_constraint_tests import *
+from journal_tests import *
 from locator_tests import *
+from merge_by_topic_name_tests import *
+from merge_plan_tests import *
 from name_tests import *
 from occurrence_tests import *
+from proxy_tests import *
+from read_only_tests import *
 from reifiable_tests import *
+from request_scope_tests import *
 from rfc3986_tests import *
 from role_tests import *
 from same_topic_map_tests import *
 from scoped_tests import *
+from shared_cache_tests import *
+from topic_map_changes_merge_tests import *
+from topic_map_iteration_tests import *
 from topic_map_merge_tests import *
 from topic_map_system_tests import *
 from topic_map_tests import *
@@ -130,3 +130,64 @@ class AssociationTest (TMAPITestCase):
         self.assertEqual(0, association.get_roles().count())
         self.assertRaises(ModelConstraintException, association.create_role,
                           None, self.create_topic())
+
+    def test_create_associations (self):
+        association_type = self.create_topic()
+        role_type1 = self.create_topic()
+        role_type2 = self.create_topic()
+        player1 = self.create_topic()
+        player2 = self.create_topic()
+        theme = self.create_topic()
+        associations = self.tm.create_associations(
+            [(association_type, None, [(role_type1, player1),
+                                       (role_type2, player2)]),
+             (association_type, [theme], [(role_type1, player2)]),
+             (association_type, None, [])])
+        self.assertEqual(3, len(associations))
+        self.assertEqual(3, self.tm.get_associations().count())
+        first, second, third = associations
+        self.assertEqual(association_type, first.get_type())
+        self.assertEqual(0, first.get_scope().count())
+        self.assertEqual(set([(role_type1, player1), (role_type2, player2)]),
+                         set([(role.get_type(), role.get_player()) for role
+                              in first.get_roles()]))
+        self.assertEqual([theme], list(second.get_scope()))
+        role = second.get_roles()[0]
+        self.assertEqual(player2, role.get_player())
+        self.assertTrue(role in player2.get_roles_played())
+        self.assertNotEqual(role.get_id(), first.get_roles()[0].get_id())
+        self.assertEqual(third, self.tm.get_construct_by_id(third.get_id()))
+        self.assertEqual(0, third.get_roles().count())
+
+    def test_create_associations_dedupe (self):
+        association_type = self.create_topic()
+        role_type = self.create_topic()
+        player = self.create_topic()
+        theme = self.create_topic()
+        existing = self.tm.create_association(association_type, [theme])
+        existing.create_role(role_type, player)
+        associations = self.tm.create_associations(
+            [(association_type, [theme], [(role_type, player)]),
+             (association_type, None, [(role_type, player)]),
+             (association_type, None, [(role_type, player)])], dedupe=True)
+        self.assertEqual(existing, associations[0])
+        self.assertEqual(associations[1], associations[2])
+        self.assertNotEqual(existing, associations[1])
+        self.assertEqual(2, self.tm.get_associations().count())
+
+    def test_create_associations_illegal (self):
+        association_type = self.create_topic()
+        other_map = self.create_topic_map('http://www.example.org/map')
+        self.assertRaises(ModelConstraintException,
+                          self.tm.create_associations,
+                          [(association_type, None, []), (None, None, [])])
+        self.assertRaises(ModelConstraintException,
+                          self.tm.create_associations,
+                          [(association_type, None,
+                            [(self.create_topic(), other_map.create_topic())])])
+        removed = self.create_topic()
+        removed.remove()
+        self.assertRaises(ModelConstraintException,
+                          self.tm.create_associations,
+                          [(association_type, None, [(removed, removed)])])
+        self.assertEqual(0, self.tm.get_associations().count())
@@ -0,0 +1,127 @@
+# Copyright 2011 Jamie Norrish (jamie@artefact.org.nz)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module containing tests for batched modification of a topic map."""
+
+from django.test import TransactionTestCase
+
+from tmapi.exceptions import IdentityConstraintException
+from tmapi.models import Topic, TopicMapSystemFactory
+
+from tmapi_test_case import TMAPITestCase, database_only
+
+
+@database_only
+class BatchTest (TMAPITestCase):
+
+    def test_scope_coalesced (self):
+        topic = self.create_topic()
+        themes = [self.create_topic() for i in range(5)]
+        name_type = self.create_topic()
+        with self.tm.batch():
+            name = topic.create_name('Name', name_type)
+            with self.assertNumQueries(0):
+                for theme in themes:
+                    name.add_theme(theme)
+                    name.add_theme(theme)
+            self.assertEqual(5, name.get_scope().count())
+            with self.assertNumQueries(1):
+                self.assertEqual(5, name.get_scope().count())
+        self.assertEqual(set(themes), set(name.get_scope()))
+
+    def test_values_flush (self):
+        topic = self.create_topic()
+        topic_type = self.create_topic()
+        with self.tm.batch():
+            topic.add_type(topic_type)
+            self.assertEqual([topic_type.pk], list(
+                    Topic.objects.filter(pk=topic.pk).values_list(
+                        'types', flat=True)))
+        with self.tm.batch():
+            topic.add_type(self.create_topic())
+            self.assertEqual(2, Topic.objects.filter(pk=topic.pk).values(
+                    'types').count())
+            self.assertEqual(2, len(Topic.objects.filter(pk=topic.pk).values(
+                        'types').values_list('types')))
+
+    def test_flush_on_exit (self):
+        topic = self.create_topic()
+        type1 = self.create_topic()
+        type2 = self.create_topic()
+        with self.tm.batch() as batch:
+            topic.add_type(type1)
+            topic.add_type(type2)
+            with self.assertNumQueries(2):
+                batch.flush()
+        self.assertEqual(set([type1, type2]), set(topic.get_types()))
+
+    def test_existing_rows_skipped (self):
+        topic = self.create_topic()
+        topic_type = self.create_topic()
+        topic.add_type(topic_type)
+        with self.tm.batch():
+            topic.add_type(topic_type)
+        self.assertEqual(1, topic.get_types().count())
+
+    def test_item_identifier_identity (self):
+        locator = self.create_locator('http://www.example.org/')
+        with self.tm.batch():
+            association = self.create_association()
+            association.add_item_identifier(locator)
+            self.assertEqual(association,
+                             self.tm.get_construct_by_item_identifier(locator))
+            name = self.create_name()
+            self.assertRaises(IdentityConstraintException,
+                              name.add_item_identifier, locator)
+        self.assertEqual([locator], list(association.get_item_identifiers()))
+
+    def test_remove_in_batch (self):
+        topic = self.create_topic()
+        theme = self.create_topic()
+        occurrence = topic.create_occurrence(self.create_topic(), 'value')
+        with self.tm.batch():
+            occurrence.add_theme(theme)
+            occurrence.remove_theme(theme)
+            theme.remove()
+        self.assertEqual(0, occurrence.get_scope().count())
+        self.assertEqual(None, self.tm.get_construct_by_id(theme.get_id()))
+
+    def test_nested (self):
+        topic = self.create_topic()
+        topic_type = self.create_topic()
+        with self.tm.batch() as outer:
+            with self.tm.batch() as inner:
+                self.assertTrue(inner is outer)
+                topic.add_type(topic_type)
+        self.assertEqual([topic_type], list(topic.get_types()))
+
+
+class BatchTransactionTest (TransactionTestCase):
+
+    def setUp (self):
+        factory = TopicMapSystemFactory.new_instance()
+        self.tms = factory.new_topic_map_system()
+        self.tm = self.tms.create_topic_map('http://www.tmapi.org/tmapi2.0')
+
+    def test_rollback (self):
+        topic = self.tm.create_topic()
+        try:
+            with self.tm.batch():
+                topic.add_type(self.tm.create_topic())
+                self.tm.create_topic()
+                raise ValueError
+        except ValueError:
+            pass
+        self.assertEqual(1, self.tm.get_topics().count())
+        self.assertEqual(0, Topic.objects.get(pk=topic.pk).get_types().count())
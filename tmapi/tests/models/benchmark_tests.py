@@ -0,0 +1,57 @@
+# Copyright 2011 Jamie Norrish (jamie@artefact.org.nz)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module containing tests for the benchmark of TMAPI operations."""
+
+from django.test import TestCase
+
+from tmapi.benchmark import INDEX_METHODS, compare_results, format_results, \
+    run_benchmarks
+from tmapi.constants import MEMORY_BACKEND
+
+
+class BenchmarkTest (TestCase):
+
+    def _test_run (self, **parameters):
+        results = run_benchmarks(topics=6, operations=2, fan_out=3,
+                                 **parameters)
+        for index_class, methods in INDEX_METHODS:
+            for name, argument in methods:
+                self.assertEqual(2, results['%s.%s' % (
+                            index_class.__name__, name)]['calls'])
+        for name in ('TopicMap.create_topic', 'Topic.remove',
+                     'Topic.merge_in'):
+            self.assertEqual(2, results[name]['calls'])
+        self.assertEqual(1, results['TopicMap.merge_in']['calls'])
+        self.assertEqual(len(results), len(format_results(results)))
+        return results
+
+    def test_run (self):
+        results = self._test_run()
+        self.assertTrue(results['TopicMap.create_topic']['queries'] > 0)
+
+    def test_run_memory (self):
+        results = self._test_run(backend=MEMORY_BACKEND)
+        self.assertEqual(0, results['Topic.merge_in']['queries'])
+
+    def test_compare_results (self):
+        baseline = {'a': {'calls': 2, 'time': 1.0, 'queries': 4},
+                    'b': {'calls': 1, 'time': 1.0, 'queries': 1}}
+        results = {'a': {'calls': 2, 'time': 1.2, 'queries': 4},
+                   'b': {'calls': 1, 'time': 2.0, 'queries': 2},
+                   'c': {'calls': 1, 'time': 9.0, 'queries': 9}}
+        regressions = compare_results(results, baseline, 0.25)
+        self.assertEqual(2, len(regressions))
+        self.assertTrue(regressions[0].startswith('b: 2.0 queries'))
+        self.assertEqual([], compare_results(results, baseline, 1.0)[1:])
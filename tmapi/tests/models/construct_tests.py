@@ -20,7 +20,6 @@ that come with the TMAPI 2.0 distribution (http://www.tmapi.org/2.0/).
 """
 
 from tmapi.exceptions import ModelConstraintException
-from tmapi.models import TopicMap
 
 from tmapi_test_case import TMAPITestCase
 
@@ -55,7 +54,7 @@ class ConstructTest (TMAPITestCase):
                          'unassigned')
         self.assertRaises(ModelConstraintException,
                           construct.add_item_identifier, None)
-        if isinstance(construct, TopicMap):
+        if construct is tm:
             self.assertEqual(None, construct.get_parent())
         else:
             self.assertFalse(None, construct.get_parent())
@@ -0,0 +1,135 @@
+# Copyright 2011 Jamie Norrish (jamie@artefact.org.nz)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module containing tests for the deferred facade."""
+
+from tmapi.deferred import Deferred, DeferredTopicMap, Loader
+from tmapi.indices.scoped_index import ScopedIndex
+
+from tmapi_test_case import TMAPITestCase, database_only
+
+
+class DeferredTest (TMAPITestCase):
+
+    def setUp (self):
+        super(DeferredTest, self).setUp()
+        self.dtm = DeferredTopicMap(self.tm)
+
+    def test_deferred_function (self):
+        deferred = Deferred(lambda: 1)
+        self.assertFalse(deferred.is_resolved())
+        self.assertEqual(1, deferred.result())
+        self.assertTrue(deferred.is_resolved())
+        self.assertEqual(2, deferred.then(lambda result: result + 1).result())
+
+    def test_deferred_exception (self):
+        def fail ():
+            raise ValueError
+        deferred = Deferred(fail)
+        self.assertRaises(ValueError, deferred.result)
+        self.assertRaises(ValueError, deferred.result)
+
+    def test_loader (self):
+        calls = []
+        def load (keys):
+            calls.append(sorted(keys))
+            return dict([(key, key * 2) for key in keys if key != 3])
+        loader = Loader(load)
+        deferreds = [loader.load(key) for key in (1, 2, 1, 3)]
+        self.assertTrue(deferreds[0] is deferreds[2])
+        self.assertEqual([2, 4, 2, None],
+                         [deferred.result() for deferred in deferreds])
+        self.assertEqual([[1, 2, 3]], calls)
+
+    def test_topic_by_subject_identifier (self):
+        sid1 = self.create_locator('http://www.example.org/1')
+        sid2 = self.create_locator('http://www.example.org/2')
+        topic = self.tm.create_topic_by_subject_identifier(sid1)
+        deferred1 = self.dtm.aget_topic_by_subject_identifier(sid1)
+        deferred2 = self.dtm.aget_topic_by_subject_identifier(sid2)
+        self.assertEqual(topic, deferred1.result())
+        self.assertEqual(None, deferred2.result())
+
+    def test_construct_by_item_identifier (self):
+        iid = self.create_locator('http://www.example.org/name')
+        name = self.create_name()
+        name.add_item_identifier(iid)
+        self.assertEqual(name, self.dtm.aget_construct_by_item_identifier(
+                iid).result())
+
+    def test_topic_by_subject_locator (self):
+        slo = self.create_locator('http://www.example.org/')
+        topic = self.tm.create_topic_by_subject_locator(slo)
+        self.assertEqual(topic, self.dtm.aget_topic_by_subject_locator(
+                slo).result())
+        self.assertEqual(None, self.dtm.aget_topic_by_subject_locator(
+                self.create_locator('http://www.example.org/x')).result())
+
+    def test_topic_characteristics (self):
+        topic = self.create_topic()
+        topic_type = self.create_topic()
+        topic.add_type(topic_type)
+        name = topic.create_name('Name')
+        occurrence = topic.create_occurrence(topic_type, 'Value')
+        dtopic = self.dtm.get_topic(topic)
+        names = dtopic.aget_names()
+        occurrences = dtopic.aget_occurrences()
+        types = dtopic.aget_types()
+        self.assertEqual([name], list(names.result()))
+        self.assertEqual([occurrence], list(occurrences.result()))
+        self.assertEqual([topic_type], list(types.result()))
+        self.assertEqual([occurrence], list(dtopic.aget_occurrences(
+                    topic_type).result()))
+
+    def test_generic_methods (self):
+        theme = self.create_topic()
+        association = self.create_association()
+        association.add_theme(theme)
+        index = self.dtm.get_index(ScopedIndex)
+        self.assertTrue(index is self.dtm.get_index(ScopedIndex))
+        deferred = index.aget_associations(theme)
+        self.assertEqual([association], deferred.result())
+        self.assertEqual(2, len(self.dtm.aget_topics().result()))
+
+    @database_only
+    def test_batched_identity_lookups (self):
+        sids = [self.create_locator('http://www.example.org/%d' % i)
+                for i in range(10)]
+        topics = [self.tm.create_topic_by_subject_identifier(sid)
+                  for sid in sids]
+        iid = self.create_locator('http://www.example.org/iid')
+        topics[0].add_item_identifier(iid)
+        deferreds = [self.dtm.aget_topic_by_subject_identifier(sid)
+                     for sid in sids]
+        construct = self.dtm.aget_construct_by_item_identifier(iid)
+        with self.assertNumQueries(1):
+            self.assertEqual(topics, [deferred.result() for deferred in
+                                      deferreds])
+            self.assertEqual(topics[0], construct.result())
+
+    @database_only
+    def test_batched_characteristics (self):
+        topics = [self.create_topic() for i in range(5)]
+        topic_type = self.create_topic()
+        for topic in topics:
+            topic.create_name('Name')
+            topic.add_type(topic_type)
+        dtopics = [self.dtm.get_topic(topic) for topic in topics]
+        names = [dtopic.aget_names() for dtopic in dtopics]
+        types = [dtopic.aget_types() for dtopic in dtopics]
+        with self.assertNumQueries(3):
+            for deferred in names:
+                self.assertEqual(1, len(deferred.result()))
+            for deferred in types:
+                self.assertEqual([topic_type], deferred.result())
@@ -0,0 +1,138 @@
+# Copyright 2011 Jamie Norrish (jamie@artefact.org.nz)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module containing tests for the instrumentation of TMAPI
+operations."""
+
+import logging
+import threading
+
+from django.db import DatabaseError, connection
+
+from tmapi import instrumentation
+from tmapi.models import Topic
+
+from tmapi_test_case import TMAPITestCase, database_only
+
+
+class InstrumentationTest (TMAPITestCase):
+
+    def tearDown (self):
+        instrumentation.disable()
+        instrumentation.reset_stats()
+        super(InstrumentationTest, self).tearDown()
+
+    def test_disabled (self):
+        create_name = Topic.__dict__['create_name']
+        instrumentation.enable()
+        self.assertTrue(instrumentation.is_enabled())
+        self.assertFalse(create_name is Topic.__dict__['create_name'])
+        instrumentation.disable()
+        self.assertFalse(instrumentation.is_enabled())
+        self.assertTrue(create_name is Topic.__dict__['create_name'])
+        self.tm.create_topic()
+        self.assertEqual({}, instrumentation.get_stats())
+
+    def test_stats (self):
+        instrumentation.enable()
+        topic = self.tm.create_topic()
+        topic.create_name('Name')
+        topic.create_name('Other name')
+        stats = instrumentation.get_stats()
+        self.assertEqual(1, stats['TopicMap.create_topic']['calls'])
+        self.assertEqual(2, stats['%s.create_name' %
+                                  topic.__class__.__name__]['calls'])
+        for method_stats in stats.values():
+            self.assertTrue(method_stats['time'] >= 0)
+            self.assertTrue(method_stats['queries'] >= 0)
+        instrumentation.reset_stats()
+        self.assertEqual({}, instrumentation.get_stats())
+
+    @database_only
+    def test_query_counts (self):
+        topic = self.tm.create_topic()
+        instrumentation.enable()
+        with self.assertNumQueries(1):
+            topic.get_types().count()
+        stats = instrumentation.get_stats()
+        self.assertEqual(0, stats['Topic.get_types']['queries'])
+        topic.get_types().count()
+        topic.create_name('Name')
+        stats = instrumentation.get_stats()
+        self.assertTrue(stats['Topic.create_name']['queries'] > 0)
+        self.assertTrue(stats['Topic.create_name']['query_time'] >= 0)
+
+    @database_only
+    def test_other_thread (self):
+        instrumentation.enable()
+        locator = self.create_locator('http://www.example.org/thread')
+        called = threading.Event()
+        disabled = threading.Event()
+        settings = []
+        def make_calls ():
+            # The attributes of the connection are local to this
+            # thread.
+            try:
+                self.tm.get_topic_by_subject_identifier(locator)
+            except DatabaseError:
+                # An in-memory test database is not shared with other
+                # threads, but the query is recorded all the same.
+                pass
+            settings.append((connection.use_debug_cursor,
+                             len(connection.queries)))
+            called.set()
+            disabled.wait()
+            settings.append((connection.use_debug_cursor,
+                             len(connection.queries)))
+            connection.close()
+        thread = threading.Thread(target=make_calls)
+        thread.start()
+        called.wait()
+        instrumentation.disable()
+        disabled.set()
+        thread.join()
+        stats = instrumentation.get_stats()
+        self.assertTrue(
+            stats['TopicMap.get_topic_by_subject_identifier']['queries'] > 0)
+        self.assertEqual([(True, 0), (None, 0)], settings)
+
+    def test_callback (self):
+        calls = []
+        def callback (name, elapsed, queries, query_time):
+            calls.append(name)
+        instrumentation.add_callback(callback)
+        try:
+            instrumentation.enable()
+            self.tm.create_topic()
+            instrumentation.remove_callback(callback)
+            self.tm.create_topic()
+        finally:
+            instrumentation.remove_callback(callback)
+        self.assertEqual(['TopicMap.create_topic'], calls)
+
+    def test_log_stats (self):
+        records = []
+        handler = logging.Handler()
+        handler.emit = records.append
+        logger = logging.getLogger('tmapi.instrumentation')
+        logger.addHandler(handler)
+        try:
+            instrumentation.enable()
+            self.tm.create_topic()
+            instrumentation.log_stats(logging.WARNING)
+        finally:
+            logger.removeHandler(handler)
+        self.assertEqual(1, len(records))
+        self.assertTrue(records[0].getMessage().startswith(
+                'TopicMap.create_topic: 1 calls'))
@@ -20,7 +20,6 @@ that come with the TMAPI 2.0 distribution (http://www.tmapi.org/2.0/).
 """
 
 from tmapi.exceptions import IdentityConstraintException
-from tmapi.models import TopicMap
 
 from tmapi_test_case import TMAPITestCase
 
@@ -48,7 +47,7 @@ class ItemIdentifierConstraintTest (TMAPITestCase):
         self.assertFalse(iid in association.get_item_identifiers())
         tmo.add_item_identifier(iid)
         self.assertTrue(iid in tmo.get_item_identifiers())
-        if not isinstance(tmo, TopicMap):
+        if tmo is not self.tm:
             tmo.remove()
             association.add_item_identifier(iid)
             self.assertTrue(iid in association.get_item_identifiers())
@@ -0,0 +1,140 @@
+# Copyright 2011 Jamie Norrish (jamie@artefact.org.nz)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module containing tests for the change journal."""
+
+from django.conf import settings
+
+from tmapi.models.journal import CREATE, MERGE, REMOVE, UPDATE
+
+from tmapi_test_case import TMAPITestCase, database_only
+
+
+@database_only
+class JournalTest (TMAPITestCase):
+
+    def setUp (self):
+        self._journal = getattr(settings, 'TMAPI_JOURNAL', False)
+        settings.TMAPI_JOURNAL = True
+        super(JournalTest, self).setUp()
+        self.start = self.tm.get_change_sequence()
+
+    def tearDown (self):
+        settings.TMAPI_JOURNAL = self._journal
+
+    def _get_changes (self):
+        return [(entry.get_construct_id(), entry.get_kind(),
+                 entry.get_operation())
+                for entry in self.tm.get_changes(self.start)]
+
+    def test_disabled (self):
+        settings.TMAPI_JOURNAL = False
+        self.create_topic().create_name('Name')
+        self.assertEqual([], self._get_changes())
+
+    def test_create (self):
+        topic = self.create_topic()
+        name = topic.create_name('Name')
+        variant = name.create_variant('Variant', [self.create_topic()])
+        changes = self._get_changes()
+        self.assertTrue((self.tm.get_id(), 'topicmap', CREATE) not in changes)
+        for construct, kind in ((topic, 'topic'), (name, 'name'),
+                                (variant, 'variant')):
+            self.assertTrue((construct.get_id(), kind, CREATE) in changes)
+
+    def test_update (self):
+        name = self.create_name()
+        self.start = self.tm.get_change_sequence()
+        theme = self.create_topic()
+        name.set_value('Changed')
+        name.add_theme(theme)
+        name.remove_theme(theme)
+        name.set_reifier(self.create_topic())
+        name.add_item_identifier(self.create_locator('http://example.org/'))
+        self.assertEqual(5, self._get_changes().count(
+                (name.get_id(), 'name', UPDATE)))
+
+    def test_topic_identities (self):
+        topic = self.create_topic()
+        topic_type = self.create_topic()
+        self.start = self.tm.get_change_sequence()
+        locator = self.create_locator('http://example.org/')
+        topic.add_subject_identifier(locator)
+        topic.remove_subject_identifier(locator)
+        topic.add_subject_locator(locator)
+        topic.add_type(topic_type)
+        topic.remove_type(topic_type)
+        self.assertEqual([(topic.get_id(), 'topic', UPDATE)] * 5,
+                         self._get_changes())
+
+    def test_remove (self):
+        topic = self.create_topic()
+        name = topic.create_name('Name')
+        variant = name.create_variant('Variant', [self.create_topic()])
+        occurrence = topic.create_occurrence(self.create_topic(), 'Value')
+        expected = set([(topic.get_id(), 'topic', REMOVE),
+                        (name.get_id(), 'name', REMOVE),
+                        (variant.get_id(), 'variant', REMOVE),
+                        (occurrence.get_id(), 'occurrence', REMOVE)])
+        self.start = self.tm.get_change_sequence()
+        topic.remove()
+        self.assertEqual(expected, set(self._get_changes()))
+
+    def test_merge (self):
+        topic1 = self.create_topic()
+        topic2 = self.create_topic()
+        name = topic2.create_name('Name')
+        self.start = self.tm.get_change_sequence()
+        topic1.merge_in(topic2)
+        changes = self._get_changes()
+        self.assertTrue((name.get_id(), 'name', UPDATE) in changes)
+        self.assertEqual([(topic2.get_id(), 'topic', REMOVE),
+                          (topic1.get_id(), 'topic', MERGE)], changes[-2:])
+
+    def test_bulk_operations (self):
+        association_type = self.create_topic()
+        role_type = self.create_topic()
+        player = self.create_topic()
+        self.start = self.tm.get_change_sequence()
+        association = self.tm.create_associations(
+            [(association_type, None, [(role_type, player)])])[0]
+        topics = self.tm.import_topics([(['http://example.org/new'], [], [])])
+        changes = self._get_changes()
+        role = association.get_roles()[0]
+        self.assertEqual([(association.get_id(), 'association', CREATE),
+                          (role.get_id(), 'role', CREATE),
+                          (topics[0].get_id(), 'topic', CREATE)],
+                         changes)
+
+    def test_batch (self):
+        topic = self.create_topic()
+        topic_type = self.create_topic()
+        with self.tm.batch() as batch:
+            self.start = self.tm.get_change_sequence()
+            topic.add_type(topic_type)
+            self.assertEqual(self.start, self.tm.get_change_sequence())
+            batch.flush()
+            self.assertEqual([(topic.get_id(), 'topic', UPDATE)],
+                             self._get_changes())
+
+    def test_since (self):
+        topics = [self.create_topic() for i in range(3)]
+        entries = list(self.tm.get_changes(self.start))
+        self.assertEqual([topic.get_id() for topic in topics],
+                         [entry.get_construct_id() for entry in entries])
+        self.assertEqual(entries[-1].get_sequence(),
+                         self.tm.get_change_sequence())
+        self.assertEqual([topics[2].get_id()], [
+                entry.get_construct_id() for entry in
+                self.tm.get_changes(entries[1].get_sequence())])
@@ -20,8 +20,10 @@ that come with the TMAPI 2.0 distribution (http://www.tmapi.org/2.0/).
 """
 
 from tmapi.exceptions import MalformedIRIException
+from tmapi.models import ItemIdentifier, Locator
+from tmapi.models.locator import LocatorBase, LRUCache, _forms_cache
 
-from tmapi_test_case import TMAPITestCase
+from tmapi_test_case import TMAPITestCase, database_only
 
 
 class LocatorTest (TMAPITestCase):
@@ -87,3 +89,117 @@ class LocatorTest (TMAPITestCase):
         reference = 'http://www.tmapi.org/x#'
         self.assertEqual(reference,
                          self.tm.create_locator(reference).to_external_form())
+
+    @database_only
+    def test_normalisation_cached (self):
+        calls = []
+        normalise = LocatorBase.normalise
+        def counting_normalise (locator, reference):
+            calls.append(reference)
+            return normalise(locator, reference)
+        LocatorBase.normalise = counting_normalise
+        try:
+            reference = 'http://www.example.org/cached%20locator'
+            locator = Locator(reference)
+            locator2 = Locator(reference)
+            self.assertEqual(1, len(calls))
+            self.assertEqual(locator, locator2)
+            self.assertEqual(locator.get_reference(), locator2.get_reference())
+            topic = self.create_topic()
+            topic.add_item_identifier(Locator('http://www.example.org/ii'))
+            del calls[:]
+            for item_identifier in ItemIdentifier.objects.all():
+                self.assertEqual(item_identifier.address,
+                                 item_identifier.to_external_form())
+            self.assertEqual(0, len(calls))
+        finally:
+            LocatorBase.normalise = normalise
+
+    def test_normalisation_cached_by_type (self):
+        reference = 'http://www.example.org/caf%C3%A9'
+        expected = {}
+        for value in (reference, unicode(reference)):
+            _forms_cache.clear()
+            locator = Locator(value)
+            expected[type(value)] = (locator.get_reference(),
+                                     locator.to_external_form())
+        for values in ((reference, unicode(reference)),
+                       (unicode(reference), reference)):
+            _forms_cache.clear()
+            for value in values:
+                locator = Locator(value)
+                self.assertEqual(expected[type(value)],
+                                 (locator.get_reference(),
+                                  locator.to_external_form()))
+
+    @database_only
+    def test_loaded_identifier_forms (self):
+        reference = 'http://www.example.org/test me/'
+        topic = self.create_topic()
+        topic.add_item_identifier(self.create_locator(reference))
+        item_identifier = ItemIdentifier.objects.get(
+            address='http://www.example.org/test%20me/')
+        self.assertEqual(reference, item_identifier.get_reference())
+        self.assertEqual(self.create_locator(reference), item_identifier)
+
+    @database_only
+    def test_lazy_identifier_forms (self):
+        topic = self.create_topic()
+        topic.add_item_identifier(self.create_locator(
+                'http://www.example.org/lazy'))
+        item_identifier = ItemIdentifier.objects.get(
+            address='http://www.example.org/lazy')
+        self.assertFalse(hasattr(item_identifier, '_external'))
+        self.assertEqual('http://www.example.org/lazy',
+                         item_identifier.to_external_form())
+        self.assertTrue(hasattr(item_identifier, '_external'))
+
+    @database_only
+    def test_address_stored_in_external_form (self):
+        item_identifier = ItemIdentifier(
+            address='http://www.example.org/a%20b',
+            containing_topic_map=self.tm)
+        item_identifier.save()
+        self.assertEqual('http://www.example.org/a%20b',
+                         item_identifier.address)
+        self.assertEqual('http://www.example.org/a b',
+                         item_identifier.get_reference())
+        item_identifier.address = 'http://www.example.org/c%20d'
+        item_identifier.save()
+        self.assertEqual('http://www.example.org/c%20d',
+                         item_identifier.to_external_form())
+        self.assertEqual('http://www.example.org/c d',
+                         item_identifier.get_reference())
+
+    def test_non_ascii_identifier (self):
+        reference = u'http://www.example.org/caf\xe9'
+        locator = self.create_locator(reference)
+        topic = self.tm.create_topic_by_subject_identifier(locator)
+        self.assertEqual(u'http://www.example.org/caf%C3%A9',
+                         locator.to_external_form())
+        self.assertEqual(topic, self.tm.get_topic_by_subject_identifier(
+                self.create_locator(reference)))
+        subject_identifier = topic.get_subject_identifiers()[0]
+        self.assertEqual(locator.to_external_form(),
+                         subject_identifier.to_external_form())
+        self.assertEqual(locator.get_reference(),
+                         subject_identifier.get_reference())
+        self.assertEqual(locator, subject_identifier)
+
+    def test_lru_cache (self):
+        cache = LRUCache(2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        self.assertEqual(1, cache.get('a'))
+        cache.set('c', 3)
+        self.assertEqual(2, len(cache))
+        self.assertEqual(None, cache.get('b'))
+        self.assertEqual(1, cache.get('a'))
+        self.assertEqual(3, cache.get('c'))
+        cache.set('a', 4)
+        cache.set('d', 5)
+        self.assertEqual(None, cache.get('c'))
+        self.assertEqual(4, cache.get('a'))
+        cache.clear()
+        self.assertEqual(0, len(cache))
+        self.assertEqual(None, cache.get('a'))
@@ -0,0 +1,157 @@
+# Copyright 2011 Jamie Norrish (jamie@artefact.org.nz)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module containing tests for the merging of topics by name."""
+
+from django.utils import simplejson
+
+from tmapi.constants import BACKEND_PROPERTY_STRING, MEMORY_BACKEND, \
+    MERGE_BY_TOPIC_NAME_FEATURE_STRING
+from tmapi.exceptions import FeatureNotSupportedException
+from tmapi.formats import JTMReader
+from tmapi.models import Name, TopicMapSystemFactory
+
+from tmapi_test_case import TMAPITestCase, database_only
+
+
+PREFIX = 'http://psi.example.org/'
+
+
+@database_only
+class MergeByTopicNameTest (TMAPITestCase):
+
+    def create_factory (self):
+        factory = super(MergeByTopicNameTest, self).create_factory()
+        factory.set_feature(MERGE_BY_TOPIC_NAME_FEATURE_STRING, True)
+        return factory
+
+    def test_create_name (self):
+        sid = self.create_locator('http://www.example.org/topic')
+        topic1 = self.tm.create_topic_by_subject_identifier(sid)
+        topic2 = self.create_topic()
+        topic1.create_name('Name')
+        # The topics include the default name type.
+        self.assertEqual(3, self.tm.get_topics().count())
+        name = topic2.create_name('Name')
+        self.assertEqual(2, self.tm.get_topics().count())
+        self.assertEqual(topic2, self.tm.get_topic_by_subject_identifier(sid))
+        self.assertEqual(topic2, name.get_parent())
+        self.assertEqual(1, len(topic2.get_names()))
+
+    def test_different_scope (self):
+        theme = self.create_topic()
+        topic1 = self.create_topic()
+        topic2 = self.create_topic()
+        topic1.create_name('Name')
+        name = topic2.create_name('Name', scope=[theme])
+        self.assertEqual(4, self.tm.get_topics().count())
+        name.remove_theme(theme)
+        self.assertEqual(3, self.tm.get_topics().count())
+        self.assertEqual(topic2, name.get_parent())
+        self.assertEqual(1, len(topic2.get_names()))
+
+    def test_different_type (self):
+        name_type = self.create_topic()
+        topic1 = self.create_topic()
+        topic2 = self.create_topic()
+        topic1.create_name('Name')
+        name = topic2.create_name('Name', name_type=name_type)
+        self.assertEqual(4, self.tm.get_topics().count())
+        name.set_type(topic1.get_names()[0].get_type())
+        self.assertEqual(3, self.tm.get_topics().count())
+        self.assertEqual(topic2, name.get_parent())
+
+    def test_set_value (self):
+        topic1 = self.create_topic()
+        topic2 = self.create_topic()
+        topic1.create_name('Name')
+        name = topic2.create_name('Other')
+        self.assertEqual(3, self.tm.get_topics().count())
+        name.set_value('Name')
+        self.assertEqual(2, self.tm.get_topics().count())
+        self.assertEqual(topic2, name.get_parent())
+
+    def test_copy (self):
+        topic = self.create_topic()
+        topic.create_name('Name')
+        # Names changed with an update are not merged when written.
+        self.create_topic().create_name('Other')
+        other = self.create_topic().create_name('Different')
+        Name.objects.filter(pk=other.pk).update(value='Other')
+        factory = TopicMapSystemFactory.new_instance()
+        source = factory.new_topic_map_system().create_topic_map(
+            'http://www.example.org/tm-2')
+        source.create_topic().create_name('Name')
+        self.tm.merge_in(source)
+        # Only the names written by the copy are merged.
+        self.assertEqual(4, self.tm.get_topics().count())
+        self.assertEqual(1, len(topic.get_names()))
+        self.assertEqual(1, self.tm.merge_by_topic_name())
+
+    def test_merge_plan (self):
+        topic = self.create_topic()
+        topic.create_name('Name')
+        factory = TopicMapSystemFactory.new_instance()
+        source = factory.new_topic_map_system().create_topic_map(
+            'http://www.example.org/tm-2')
+        source_topic = source.create_topic()
+        source_topic.create_name('Name')
+        # Merged with each other by name only once they are copied.
+        source.create_topic().create_name('Other')
+        source.create_topic().create_name('Other')
+        plan = self.tm.plan_merge(source)
+        classes = [set(topic_class) for topic_class in
+                   plan.get_topic_classes()]
+        self.assertTrue(set([topic, source_topic]) in classes)
+        # The default name types, the topics named 'Name' and the
+        # topics named 'Other'.
+        self.assertEqual(3, plan.get_merge_count())
+        count = self.tm.get_topics().count() + source.get_topics().count()
+        plan.execute()
+        self.assertEqual(count - plan.get_merge_count(),
+                         self.tm.get_topics().count())
+        self.assertEqual(1, len(topic.get_names()))
+
+    def test_jtm_import (self):
+        topic = self.tm.create_topic_by_subject_identifier(
+            self.create_locator(PREFIX + 'jane'))
+        topic.create_name('Jane Doe')
+        fragment = {'version': '1.1', 'item_type': 'topic',
+                    'subject_identifiers': [PREFIX + 'doe'],
+                    'names': [{'value': 'Jane Doe'}]}
+        references = JTMReader(self.tm).read([simplejson.dumps(fragment)])
+        doe = self.tm.get_topic_by_subject_identifier(
+            self.create_locator(PREFIX + 'doe'))
+        self.assertEqual(doe, self.tm.get_topic_by_subject_identifier(
+                self.create_locator(PREFIX + 'jane')))
+        self.assertEqual(doe.get_id(), references['si:%sdoe' % PREFIX])
+        self.assertEqual(1, len(doe.get_names()))
+
+    def test_merge_by_topic_name (self):
+        factory = TopicMapSystemFactory.new_instance()
+        tms = factory.new_topic_map_system()
+        tm = tms.create_topic_map('http://www.example.org/tm-2')
+        for value in ('Name', 'Name', 'Name', 'Other', 'Other', 'Single'):
+            tm.create_topic().create_name(value)
+        self.assertEqual(7, tm.get_topics().count())
+        self.assertEqual(3, tm.merge_by_topic_name())
+        self.assertEqual(4, tm.get_topics().count())
+        self.assertEqual(0, tm.merge_by_topic_name())
+
+    def test_memory_backend (self):
+        factory = TopicMapSystemFactory.new_instance()
+        factory.set_property(BACKEND_PROPERTY_STRING, MEMORY_BACKEND)
+        factory.set_feature(MERGE_BY_TOPIC_NAME_FEATURE_STRING, True)
+        self.assertRaises(FeatureNotSupportedException,
+                          factory.new_topic_map_system)
@@ -0,0 +1,159 @@
+# Copyright 2011 Jamie Norrish (jamie@artefact.org.nz)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module containing tests for merge plans."""
+
+from django.conf import settings
+
+from tmapi.exceptions import ModelConstraintException
+
+from tmapi_test_case import TMAPITestCase, database_only
+
+
+@database_only
+class MergePlanTest (TMAPITestCase):
+
+    TM2_BASE = 'http://www.example.org/tm-2'
+
+    def setUp (self):
+        super(MergePlanTest, self).setUp()
+        self.tm2 = self.create_topic_map(self.TM2_BASE)
+        self.type = self.create_locator('http://www.example.org/type')
+
+    def _create_topic (self, topic_map, reference):
+        return topic_map.create_topic_by_subject_identifier(
+            self.create_locator(reference))
+
+    def test_no_merges (self):
+        self._create_topic(self.tm, 'http://www.example.org/a')
+        self._create_topic(self.tm2, 'http://www.example.org/b')
+        plan = self.tm.plan_merge(self.tm2)
+        self.assertEqual(0, plan.get_merge_count())
+        self.assertEqual([], plan.get_topic_classes())
+        self.assertEqual([], plan.get_duplicate_names())
+        plan.execute()
+        self.assertEqual(2, self.tm.get_topics().count())
+
+    def test_none (self):
+        self.assertRaises(ModelConstraintException, self.tm.plan_merge, None)
+
+    def test_topic_classes (self):
+        topic1 = self._create_topic(self.tm, 'http://www.example.org/a')
+        topic2 = self._create_topic(self.tm, 'http://www.example.org/b')
+        other = self._create_topic(self.tm2, 'http://www.example.org/a')
+        other.add_item_identifier(self.create_locator(
+                'http://www.example.org/b'))
+        self._create_topic(self.tm2, 'http://www.example.org/c')
+        plan = self.tm.plan_merge(self.tm2)
+        self.assertEqual(2, plan.get_merge_count())
+        self.assertEqual([[topic1, topic2, other]], plan.get_topic_classes())
+        # Nothing has been changed.
+        self.assertEqual(2, self.tm.get_topics().count())
+        self.assertEqual(2, self.tm2.get_topics().count())
+        plan.execute()
+        self.assertEqual(2, self.tm.get_topics().count())
+        topic = self.tm.get_topic_by_subject_identifier(
+            self.create_locator('http://www.example.org/a'))
+        self.assertEqual(topic, self.tm.get_topic_by_subject_identifier(
+                self.create_locator('http://www.example.org/b')))
+        self.assertEqual(2, self.tm2.get_topics().count())
+
+    def test_duplicate_characteristics (self):
+        topic = self._create_topic(self.tm, 'http://www.example.org/a')
+        other = self._create_topic(self.tm2, 'http://www.example.org/a')
+        name_type = self.tm.create_topic_by_subject_identifier(self.type)
+        other_name_type = self.tm2.create_topic_by_subject_identifier(
+            self.type)
+        name = topic.create_name('Name', name_type)
+        other_name = other.create_name('Name', other_name_type)
+        other.create_name('Other', other_name_type)
+        occurrence = topic.create_occurrence(name_type, 'Value')
+        other_occurrence = other.create_occurrence(other_name_type, 'Value')
+        other.create_occurrence(other_name_type, 'Other')
+        plan = self.tm.plan_merge(self.tm2)
+        self.assertEqual([[name, other_name]], plan.get_duplicate_names())
+        self.assertEqual([[occurrence, other_occurrence]],
+                         plan.get_duplicate_occurrences())
+        plan.execute()
+        self.assertEqual(2, topic.get_names().count())
+        self.assertEqual(2, topic.get_occurrences().count())
+
+    def test_duplicate_associations (self):
+        player = self._create_topic(self.tm, 'http://www.example.org/a')
+        association_type = self.tm.create_topic_by_subject_identifier(
+            self.type)
+        association = self.tm.create_association(association_type)
+        association.create_role(association_type, player)
+        other_player = self._create_topic(self.tm2, 'http://www.example.org/a')
+        other_type = self.tm2.create_topic_by_subject_identifier(self.type)
+        other = self.tm2.create_association(other_type)
+        other.create_role(other_type, other_player)
+        new_player = self._create_topic(self.tm2, 'http://www.example.org/b')
+        self.tm2.create_association(other_type).create_role(other_type,
+                                                            new_player)
+        plan = self.tm.plan_merge(self.tm2)
+        self.assertEqual([[association, other]],
+                         plan.get_duplicate_associations())
+        plan.execute()
+        self.assertEqual(2, self.tm.get_associations().count())
+
+    def test_subject_identifiers (self):
+        topic1 = self._create_topic(self.tm, 'http://www.example.org/a')
+        topic2 = self._create_topic(self.tm, 'http://www.example.org/b')
+        topic3 = self.create_topic()
+        name1 = topic1.create_name('Name')
+        name2 = topic2.create_name('Name')
+        locator = self.create_locator('http://www.example.org/b')
+        plan = self.tm.plan_subject_identifiers([(topic1, locator)])
+        self.assertEqual(1, plan.get_merge_count())
+        self.assertEqual([[topic1, topic2]], plan.get_topic_classes())
+        self.assertEqual([[name1, name2]], plan.get_duplicate_names())
+        self.assertEqual(4, self.tm.get_topics().count())
+        plan.execute()
+        self.assertEqual(3, self.tm.get_topics().count())
+        self.assertEqual(topic1, self.tm.get_topic_by_subject_identifier(
+                locator))
+        self.assertEqual(1, topic1.get_names().count())
+
+    def test_merged_types (self):
+        topic = self.create_topic()
+        type1 = self.create_topic()
+        type2 = self.create_topic()
+        name1 = topic.create_name('Name', type1)
+        name2 = topic.create_name('Name', type2)
+        occurrence1 = topic.create_occurrence(type1, 'Value')
+        occurrence2 = topic.create_occurrence(type2, 'Value')
+        locator = self.create_locator('http://www.example.org/type')
+        plan = self.tm.plan_subject_identifiers([(type1, locator),
+                                                 (type2, locator)])
+        self.assertEqual([[type1, type2]], plan.get_topic_classes())
+        self.assertEqual([[name1, name2]], plan.get_duplicate_names())
+        self.assertEqual([[occurrence1, occurrence2]],
+                         plan.get_duplicate_occurrences())
+
+    def test_stale_plan (self):
+        journal = getattr(settings, 'TMAPI_JOURNAL', False)
+        settings.TMAPI_JOURNAL = True
+        try:
+            self._create_topic(self.tm, 'http://www.example.org/a')
+            self._create_topic(self.tm2, 'http://www.example.org/a')
+            plan = self.tm.plan_merge(self.tm2)
+            self.assertTrue(plan.is_current())
+            self._create_topic(self.tm2, 'http://www.example.org/b')
+            self._create_topic(self.tm, 'http://www.example.org/b')
+            self.assertFalse(plan.is_current())
+            plan.execute()
+            self.assertEqual(2, self.tm.get_topics().count())
+        finally:
+            settings.TMAPI_JOURNAL = journal
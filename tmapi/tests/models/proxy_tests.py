@@ -0,0 +1,111 @@
+# Copyright 2011 Jamie Norrish (jamie@artefact.org.nz)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module containing tests for the use of Django proxy models."""
+
+from tmapi.models import Association, Name, Role, Topic, TopicMap
+
+from tmapi_test_case import TMAPITestCase, database_only
+
+
+class ProxyAssociation (Association):
+
+    class Meta:
+        app_label = 'tmapi'
+        proxy = True
+
+
+class ProxyName (Name):
+
+    class Meta:
+        app_label = 'tmapi'
+        proxy = True
+
+
+class ProxyTopic (Topic):
+
+    class Meta:
+        app_label = 'tmapi'
+        proxy = True
+
+
+class ProxyTopicMap (TopicMap):
+
+    class Meta:
+        app_label = 'tmapi'
+        proxy = True
+
+
+@database_only
+class ProxyTest (TMAPITestCase):
+
+    def test_get_player_cached (self):
+        player = self.create_topic()
+        role = self.create_association().create_role(self.create_topic(),
+                                                     player)
+        role.get_player()
+        with self.assertNumQueries(0):
+            proxy_player = role.get_player(proxy=ProxyTopic)
+        self.assertTrue(isinstance(proxy_player, ProxyTopic))
+        self.assertEqual(player.pk, proxy_player.pk)
+        self.assertFalse(isinstance(role.get_player(), ProxyTopic),
+                         'Casting must not change the cached player')
+
+    def test_get_parent_uncached (self):
+        role = self.create_role()
+        role = Role.objects.get(pk=role.pk)
+        with self.assertNumQueries(1):
+            parent = role.get_parent(proxy=ProxyAssociation)
+        self.assertTrue(isinstance(parent, ProxyAssociation))
+        with self.assertNumQueries(0):
+            self.assertEqual(parent, role.get_parent())
+
+    def test_get_type (self):
+        name = self.create_name()
+        name = Name.objects.get(pk=name.pk)
+        with self.assertNumQueries(1):
+            name_type = name.get_type(proxy=ProxyTopic)
+        self.assertTrue(isinstance(name_type, ProxyTopic))
+        with self.assertNumQueries(0):
+            name.get_type(proxy=ProxyTopic)
+
+    def test_get_topic_map (self):
+        topic = self.create_topic()
+        topic.get_topic_map()
+        with self.assertNumQueries(0):
+            topic_map = topic.get_topic_map(proxy=ProxyTopicMap)
+        self.assertTrue(isinstance(topic_map, ProxyTopicMap))
+        self.assertEqual(self.tm.pk, topic_map.pk)
+
+    def test_get_construct_by_id (self):
+        topic = self.create_topic()
+        construct = self.tm.get_construct_by_id(topic.get_id(),
+                                                proxy=ProxyTopic)
+        self.assertTrue(isinstance(construct, ProxyTopic))
+        self.assertEqual(topic.pk, construct.pk)
+
+    def test_as_proxy (self):
+        topic = self.create_topic()
+        topic.create_name('Name 1')
+        topic.create_name('Name 2')
+        names = topic.get_names().as_proxy(ProxyName)
+        self.assertEqual(2, len(names))
+        for name in names:
+            self.assertTrue(isinstance(name, ProxyName))
+        topics = Topic.objects.as_proxy(ProxyTopic).filter(pk=topic.pk)
+        self.assertTrue(isinstance(topics[0], ProxyTopic))
+
+    def test_as_proxy_illegal (self):
+        topic = self.create_topic()
+        self.assertRaises(TypeError, topic.get_names().as_proxy, ProxyTopic)
@@ -0,0 +1,150 @@
+# Copyright 2011 Jamie Norrish (jamie@artefact.org.nz)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module containing tests for topic maps opened read-only."""
+
+from tmapi.constants import BACKEND_PROPERTY_STRING, MEMORY_BACKEND, \
+    READ_ONLY_FEATURE_STRING
+from tmapi.exceptions import FeatureNotSupportedException, \
+    UnsupportedOperationException
+from tmapi.indices.type_instance_index import TypeInstanceIndex
+from tmapi.models import Topic, TopicMapSystemFactory
+from tmapi.models.read_only import ReadOnlyDescriptor
+
+from tmapi_test_case import TMAPITestCase, database_only
+
+
+@database_only
+class ReadOnlyTest (TMAPITestCase):
+
+    def setUp (self):
+        super(ReadOnlyTest, self).setUp()
+        self.sid = self.create_locator('http://www.example.org/topic')
+        topic = self.tm.create_topic_by_subject_identifier(self.sid)
+        self.topic_type = self.create_topic()
+        topic.add_type(self.topic_type)
+        topic.create_name('Name')
+        factory = TopicMapSystemFactory.new_instance()
+        factory.set_feature(READ_ONLY_FEATURE_STRING, True)
+        self.read_only_tms = factory.new_topic_map_system()
+        self.read_only_tm = self.read_only_tms.get_topic_map(
+            self.default_locator)
+
+    def tearDown (self):
+        self.read_only_tm.close()
+
+    def test_create_topic_map (self):
+        self.assertRaises(UnsupportedOperationException,
+                          self.read_only_tms.create_topic_map,
+                          'http://www.example.org/tm')
+
+    def test_modifications_refused (self):
+        topic = self.read_only_tm.get_topic_by_subject_identifier(self.sid)
+        name = topic.get_names()[0]
+        locator = self.create_locator('http://www.example.org/other')
+        self.assertRaises(UnsupportedOperationException,
+                          self.read_only_tm.create_topic)
+        self.assertRaises(UnsupportedOperationException,
+                          self.read_only_tm.create_topic_by_subject_identifier,
+                          locator)
+        self.assertRaises(UnsupportedOperationException,
+                          topic.add_subject_identifier, locator)
+        self.assertRaises(UnsupportedOperationException,
+                          topic.add_item_identifier, locator)
+        self.assertRaises(UnsupportedOperationException, topic.add_type,
+                          topic)
+        self.assertRaises(UnsupportedOperationException, topic.remove_type,
+                          self.topic_type)
+        self.assertRaises(UnsupportedOperationException, name.set_value,
+                          'Other')
+        self.assertRaises(UnsupportedOperationException, name.add_theme,
+                          self.topic_type)
+        self.assertRaises(UnsupportedOperationException, name.remove)
+        self.assertRaises(UnsupportedOperationException,
+                          self.read_only_tm.batch().__enter__)
+        self.assertEqual(1, topic.get_types().count())
+        self.assertEqual('Name', topic.get_names()[0].get_value())
+
+    def test_lookups_cached (self):
+        missing = self.create_locator('http://www.example.org/missing')
+        topic = self.read_only_tm.get_topic_by_subject_identifier(self.sid)
+        self.read_only_tm.get_topic_by_subject_identifier(missing)
+        with self.assertNumQueries(0):
+            self.assertEqual(topic, self.read_only_tm.\
+                                 get_topic_by_subject_identifier(self.sid))
+            self.assertEqual(None, self.read_only_tm.\
+                                 get_topic_by_subject_identifier(missing))
+
+    def test_index_snapshot (self):
+        index = self.read_only_tm.get_index(TypeInstanceIndex)
+        index.open()
+        self.assertFalse(index.is_auto_updated())
+        topics = index.get_topics(self.topic_type)
+        with self.assertNumQueries(0):
+            self.assertEqual(1, index.get_topics(self.topic_type).count())
+            self.assertTrue(topics is index.get_topics(self.topic_type))
+            self.assertEqual(list(topics),
+                             list(index.get_topics(self.topic_type)))
+        index.reindex()
+        with self.assertNumQueries(1):
+            self.assertEqual(1, len(index.get_topics(self.topic_type)))
+
+    def test_close (self):
+        index = self.read_only_tm.get_index(TypeInstanceIndex)
+        self.assertFalse(index.is_auto_updated())
+        self.read_only_tm.close()
+        self.assertTrue(index.is_auto_updated())
+        self.read_only_tm.create_topic()
+
+    def test_other_systems_writable (self):
+        self.assertTrue(self.tm.get_index(TypeInstanceIndex).is_auto_updated())
+        topic = self.tm.get_topic_by_subject_identifier(self.sid)
+        topic.get_names()[0].set_value('Other')
+        topic.add_type(self.tm.create_topic())
+        with self.tm.batch():
+            self.tm.create_topic()
+        self.assertEqual(5, self.tm.get_topics().count())
+
+    def test_related_constructs_read_only (self):
+        index = self.read_only_tm.get_index(TypeInstanceIndex)
+        index.open()
+        topic = index.get_topics(self.topic_type)[0]
+        name = topic.get_names()[0]
+        self.assertRaises(UnsupportedOperationException, name.set_value,
+                          'Other')
+        self.assertRaises(UnsupportedOperationException,
+                          name.get_type().add_type, self.topic_type)
+        self.assertRaises(UnsupportedOperationException,
+                          name.get_parent().create_name, 'Other')
+        topic_type = self.read_only_tm.get_topics().get(pk=self.topic_type.pk)
+        self.assertRaises(UnsupportedOperationException,
+                          topic_type.create_name, 'Other')
+        self.assertRaises(UnsupportedOperationException,
+                          list(topic.get_types())[0].add_subject_identifier,
+                          self.create_locator('http://www.example.org/type'))
+        self.assertEqual('Name', topic.get_names()[0].get_value())
+
+    def test_descriptors_wrapped_once (self):
+        self.read_only_tms.get_topic_map(self.default_locator).close()
+        descriptor = Topic.__dict__['topic_map']
+        self.assertTrue(isinstance(descriptor, ReadOnlyDescriptor))
+        self.assertFalse(isinstance(descriptor._descriptor,
+                                    ReadOnlyDescriptor))
+
+    def test_memory_backend (self):
+        factory = TopicMapSystemFactory.new_instance()
+        factory.set_property(BACKEND_PROPERTY_STRING, MEMORY_BACKEND)
+        factory.set_feature(READ_ONLY_FEATURE_STRING, True)
+        self.assertRaises(FeatureNotSupportedException,
+                          factory.new_topic_map_system)
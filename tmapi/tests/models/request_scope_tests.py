@@ -0,0 +1,127 @@
+# Copyright 2011 Jamie Norrish (jamie@artefact.org.nz)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module containing tests for request scopes."""
+
+import gc
+
+from tmapi.middleware import RequestScopeMiddleware
+from tmapi.models import Role
+from tmapi.models.request_scope import RequestScope, get_request_scope
+
+from tmapi_test_case import TMAPITestCase, database_only
+
+
+@database_only
+class RequestScopeTest (TMAPITestCase):
+
+    def setUp (self):
+        super(RequestScopeTest, self).setUp()
+        self.association = self.create_association()
+        self.players = []
+        for i in range(5):
+            player = self.create_topic()
+            self.association.create_role(self.create_topic(), player)
+            self.players.append(player)
+
+    def _get_roles (self):
+        return list(Role.objects.filter(association=self.association))
+
+    def test_players_loaded_together (self):
+        with RequestScope():
+            roles = self._get_roles()
+            with self.assertNumQueries(2):
+                players = [role.get_player() for role in roles]
+                types = [role.get_type() for role in roles]
+        self.assertEqual(set(self.players), set(players))
+        self.assertEqual(5, len(set(types)))
+
+    def test_outside_scope (self):
+        roles = self._get_roles()
+        with self.assertNumQueries(5):
+            for role in roles:
+                role.get_player()
+
+    def test_reifiers_loaded_together (self):
+        reifiers = []
+        for role in self._get_roles():
+            reifier = self.create_topic()
+            role.set_reifier(reifier)
+            reifiers.append(reifier)
+        with RequestScope():
+            roles = self._get_roles()
+            with self.assertNumQueries(1):
+                self.assertEqual(set(reifiers), set(
+                        [role.get_reifier() for role in roles]))
+
+    def test_scopes_loaded_together (self):
+        topic = self.create_topic()
+        theme = self.create_topic()
+        for i in range(3):
+            topic.create_name('Name %d' % i, scope=[theme])
+        with RequestScope():
+            names = list(topic.get_names())
+            with self.assertNumQueries(1):
+                for name in names:
+                    self.assertEqual([theme], list(name.get_scope()))
+                    self.assertEqual(1, name.get_scope().count())
+            other_theme = self.create_topic()
+            names[0].add_theme(other_theme)
+            self.assertEqual(set([theme, other_theme]),
+                             set(names[0].get_scope()))
+            # Any change discards the loaded scopes.
+            names[1].remove_theme(theme)
+            self.assertEqual([], list(names[1].get_scope()))
+            self.assertEqual([theme], list(names[2].get_scope()))
+
+    def test_constructs_released (self):
+        with RequestScope() as scope:
+            roles = self._get_roles()
+            self.assertEqual(5, len(scope._constructs[Role]))
+            del roles
+            gc.collect()
+            self.assertEqual(0, len(scope._constructs[Role]))
+
+    def test_reloaded_constructs (self):
+        with RequestScope():
+            roles = self._get_roles()
+            with self.assertNumQueries(1):
+                for role in roles:
+                    role.get_player()
+            reloaded = self._get_roles()
+            with self.assertNumQueries(1):
+                players = [role.get_player() for role in reloaded]
+            with self.assertNumQueries(0):
+                for role in roles:
+                    role.get_player()
+        self.assertEqual(set(self.players), set(players))
+
+    def test_reentrant (self):
+        with RequestScope() as outer:
+            with RequestScope() as inner:
+                self.assertTrue(inner is outer)
+            self.assertTrue(get_request_scope() is outer)
+        self.assertEqual(None, get_request_scope())
+
+    def test_middleware (self):
+        class Request (object):
+            pass
+        request = Request()
+        middleware = RequestScopeMiddleware()
+        middleware.process_request(request)
+        self.assertNotEqual(None, get_request_scope())
+        response = object()
+        self.assertTrue(response is middleware.process_response(
+                request, response))
+        self.assertEqual(None, get_request_scope())
@@ -20,23 +20,21 @@ that come with the TMAPI 2.0 distribution (http://www.tmapi.org/2.0/).
 """
 
 from tmapi.exceptions import ModelConstraintException
-from tmapi.models import Variant
 
-from tmapi_test_case import TMAPITestCase
+from tmapi_test_case import TMAPITestCase, database_only
 
 
 class ScopedTest (TMAPITestCase):
 
-    def _test_scoped (self, scoped):
+    def _test_scoped (self, scoped, scope_size=0):
         """Tests addding/removing themes.
 
         :param scoped: the scoped Topic Maps construct to test
         :type scoped: `Scoped`
+        :param scope_size: the initial size of the scope of `scoped`
+        :type scope_size: integer
 
         """
-        scope_size = 0
-        if isinstance(scoped, Variant):
-            scope_size = scoped.get_scope().count()
         self.assertEqual(scope_size, scoped.get_scope().count())
         theme1 = self.create_topic()
         scoped.add_theme(theme1)
@@ -74,4 +72,25 @@ class ScopedTest (TMAPITestCase):
 
     def test_variant (self):
         """Scoped tests against a variant."""
-        self._test_scoped(self.create_variant())
+        variant = self.create_variant()
+        self._test_scoped(variant, variant.get_scope().count())
+
+    @database_only
+    def test_creation_scope_bulk (self):
+        """Tests that the scope of a new construct is added with a
+        single insert."""
+        themes = [self.create_topic() for i in range(4)]
+        association_type = self.create_topic()
+        with self.assertNumQueries(3):
+            association = self.tm.create_association(association_type,
+                                                     themes)
+        self.assertEqual(set(themes), set(association.get_scope()))
+
+    def test_creation_illegal_scope_nothing_created (self):
+        topic = self.create_topic()
+        occurrence_type = self.create_topic()
+        other_map = self.create_topic_map('http://www.example.org/map')
+        themes = [self.create_topic(), other_map.create_topic()]
+        self.assertRaises(ModelConstraintException, topic.create_occurrence,
+                          occurrence_type, 'value', themes)
+        self.assertEqual(0, topic.get_occurrences().count())
@@ -0,0 +1,148 @@
+# Copyright 2011 Jamie Norrish (jamie@artefact.org.nz)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module containing tests for the shared cache of lookups."""
+
+from django.conf import settings
+
+from tmapi.indices.type_instance_index import TypeInstanceIndex
+from tmapi.models.cache_utils import MAX_CACHED_RESULTS, \
+    get_shared_cache, shared
+
+from proxy_tests import ProxyTopic
+from tmapi_test_case import TMAPITestCase, database_only
+
+
+class TopicLookup (object):
+
+    def __init__ (self, topic_map):
+        self.topic_map = topic_map
+
+    @shared
+    def get_topics (self):
+        return ProxyTopic.objects.filter(
+            topic_map=self.topic_map).order_by('-pk')
+
+
+@database_only
+class SharedCacheTest (TMAPITestCase):
+
+    def setUp (self):
+        self._cache = getattr(settings, 'TMAPI_CACHE', None)
+        settings.TMAPI_CACHE = 'default'
+        get_shared_cache().clear()
+        super(SharedCacheTest, self).setUp()
+        self.sid = self.create_locator('http://www.example.org/topic')
+
+    def tearDown (self):
+        settings.TMAPI_CACHE = self._cache
+
+    def test_disabled (self):
+        settings.TMAPI_CACHE = None
+        self.assertEqual(None, get_shared_cache())
+        self.tm.get_topic_by_subject_identifier(self.sid)
+        with self.assertNumQueries(1):
+            self.tm.get_topic_by_subject_identifier(self.sid)
+
+    def test_construct_cached (self):
+        topic = self.tm.create_topic_by_subject_identifier(self.sid)
+        self.assertEqual(topic, self.tm.get_topic_by_subject_identifier(
+                self.sid))
+        # The cached database ID is loaded by primary key.
+        with self.assertNumQueries(1):
+            self.assertEqual(topic, self.tm.get_topic_by_subject_identifier(
+                    self.sid))
+        name = topic.create_name('Name')
+        iid = self.create_locator('http://www.example.org/name')
+        name.add_item_identifier(iid)
+        self.assertEqual(name, self.tm.get_construct_by_item_identifier(iid))
+        with self.assertNumQueries(1):
+            self.assertEqual(name,
+                             self.tm.get_construct_by_item_identifier(iid))
+
+    def test_none_cached (self):
+        self.assertEqual(None, self.tm.get_topic_by_subject_identifier(
+                self.sid))
+        with self.assertNumQueries(0):
+            self.assertEqual(None, self.tm.get_topic_by_subject_identifier(
+                    self.sid))
+
+    def test_invalidated_by_change (self):
+        self.assertEqual(None, self.tm.get_topic_by_subject_identifier(
+                self.sid))
+        topic = self.create_topic()
+        topic.add_subject_identifier(self.sid)
+        self.assertEqual(topic, self.tm.get_topic_by_subject_identifier(
+                self.sid))
+        topic.remove_subject_identifier(self.sid)
+        self.assertEqual(None, self.tm.get_topic_by_subject_identifier(
+                self.sid))
+
+    def test_index_results (self):
+        topic_type = self.create_topic()
+        instance = self.create_topic()
+        instance.add_type(topic_type)
+        index = self.tm.get_index(TypeInstanceIndex)
+        index.open()
+        self.assertEqual([instance], list(index.get_topics(topic_type)))
+        with self.assertNumQueries(1):
+            self.assertEqual([instance], list(index.get_topics(topic_type)))
+        other = self.create_topic()
+        other.add_type(topic_type)
+        self.assertEqual(set([instance, other]),
+                         set(index.get_topics(topic_type)))
+
+    def test_batch (self):
+        self.assertEqual(None, self.tm.get_topic_by_subject_identifier(
+                self.sid))
+        with self.tm.batch():
+            topic = self.tm.create_topic_by_subject_identifier(self.sid)
+            self.assertEqual(topic, self.tm.get_topic_by_subject_identifier(
+                    self.sid))
+        self.assertEqual(topic, self.tm.get_topic_by_subject_identifier(
+                self.sid))
+
+    def test_topic_maps_separate (self):
+        tm2 = self.create_topic_map('http://www.example.org/tm2')
+        topic = tm2.create_topic_by_subject_identifier(self.sid)
+        self.assertEqual(None, self.tm.get_topic_by_subject_identifier(
+                self.sid))
+        self.assertEqual(topic, tm2.get_topic_by_subject_identifier(self.sid))
+        self.tm.create_topic()
+        with self.assertNumQueries(1):
+            self.assertEqual(topic, tm2.get_topic_by_subject_identifier(
+                    self.sid))
+
+    def test_order_and_proxy_kept (self):
+        for i in range(3):
+            self.create_topic()
+        lookup = TopicLookup(self.tm)
+        topics = list(lookup.get_topics())
+        with self.assertNumQueries(1):
+            cached = lookup.get_topics()
+            self.assertEqual(topics, list(cached))
+            self.assertEqual(len(topics), cached.count())
+        for topic in cached:
+            self.assertTrue(isinstance(topic, ProxyTopic))
+
+    def test_large_result_not_cached (self):
+        for i in range(MAX_CACHED_RESULTS + 1 - self.tm.get_topics().count()):
+            self.create_topic()
+        lookup = TopicLookup(self.tm)
+        list(lookup.get_topics())
+        with self.assertNumQueries(2):
+            # The topics are queried afresh, as are their IDs, which
+            # are again too many to cache.
+            self.assertEqual(MAX_CACHED_RESULTS + 1,
+                             len(list(lookup.get_topics())))
@@ -21,19 +21,53 @@ that come with the TMAPI 2.0 distribution (http://www.tmapi.org/2.0/).
 
 from django.test import TestCase
 
+from tmapi.constants import BACKEND_PROPERTY_STRING
 from tmapi.models import TopicMapSystemFactory
 
 
+def database_only (test):
+    """Marks `test` (a test method or class) as applying only to the
+    database backend.
+
+    :param test: the test method or class to mark
+    :type test: function or class
+    :rtype: function or class
+
+    """
+    test.database_only = True
+    return test
+
+
 class TMAPITestCase (TestCase):
 
     DEFAULT_ADDRESS = 'http://www.tmapi.org/tmapi2.0'
+
+    # The backend the tests are run against, or None for the default
+    # (database) backend.
+    backend = None
     
     def setUp (self):
-        factory = TopicMapSystemFactory.new_instance()
+        if self.backend is not None:
+            test = getattr(self, self._testMethodName)
+            if getattr(test, 'database_only', False):
+                self.skipTest('Applies only to the database backend')
+        factory = self.create_factory()
         self.tms = factory.new_topic_map_system()
         self.default_locator = self.tms.create_locator(self.DEFAULT_ADDRESS)
         self.tm = self.tms.create_topic_map(self.default_locator)
 
+    def create_factory (self):
+        """Creates a `TopicMapSystemFactory` configured for the
+        backend under test.
+
+        :rtype: `TopicMapSystemFactory`
+
+        """
+        factory = TopicMapSystemFactory.new_instance()
+        if self.backend is not None:
+            factory.set_property(BACKEND_PROPERTY_STRING, self.backend)
+        return factory
+
     def create_topic (self):
         """Creates a topic with a random item identifier.
 
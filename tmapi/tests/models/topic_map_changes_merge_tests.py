@@ -0,0 +1,133 @@
+# Copyright 2011 Jamie Norrish (jamie@artefact.org.nz)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module containing tests for merging the changes made to a topic map
+into another."""
+
+from django.conf import settings
+
+from tmapi_test_case import TMAPITestCase, database_only
+
+
+@database_only
+class TopicMapChangesMergeTest (TMAPITestCase):
+
+    TM2_BASE = 'http://www.example.org/tm-2'
+
+    def setUp (self):
+        self._journal = getattr(settings, 'TMAPI_JOURNAL', False)
+        settings.TMAPI_JOURNAL = True
+        super(TopicMapChangesMergeTest, self).setUp()
+        self.tm2 = self.create_topic_map(self.TM2_BASE)
+
+    def tearDown (self):
+        settings.TMAPI_JOURNAL = self._journal
+
+    def _get_topic (self, topic_map, reference):
+        return topic_map.get_topic_by_subject_identifier(
+            self.create_locator(reference))
+
+    def _create_topic (self, topic_map, reference):
+        return topic_map.create_topic_by_subject_identifier(
+            self.create_locator(reference))
+
+    def test_no_changes (self):
+        self._create_topic(self.tm2, 'http://www.example.org/a')
+        since = self.tm2.get_change_sequence()
+        self.assertEqual(since, self.tm.merge_changes_in(self.tm2, since))
+        self.assertEqual(0, self.tm.get_topics().count())
+
+    def test_new_topic (self):
+        topic = self._create_topic(self.tm2, 'http://www.example.org/a')
+        name_type = self._create_topic(self.tm2, 'http://www.example.org/nt')
+        topic.create_name('Name', name_type)
+        sequence = self.tm.merge_changes_in(self.tm2)
+        self.assertEqual(self.tm2.get_change_sequence(), sequence)
+        target = self._get_topic(self.tm, 'http://www.example.org/a')
+        self.assertEqual(['Name'], [name.get_value() for name in
+                                    target.get_names()])
+        self.assertEqual(self._get_topic(self.tm, 'http://www.example.org/nt'),
+                         target.get_names()[0].get_type())
+        self.assertEqual(2, self.tm.get_topics().count())
+
+    def test_only_changes (self):
+        self._create_topic(self.tm2, 'http://www.example.org/a')
+        since = self.tm2.get_change_sequence()
+        self._create_topic(self.tm2, 'http://www.example.org/b')
+        self.tm.merge_changes_in(self.tm2, since)
+        self.assertEqual(None, self._get_topic(self.tm,
+                                               'http://www.example.org/a'))
+        self.assertNotEqual(None, self._get_topic(self.tm,
+                                                  'http://www.example.org/b'))
+        self.assertEqual(1, self.tm.get_topics().count())
+
+    def test_merge_into_existing (self):
+        target = self._create_topic(self.tm, 'http://www.example.org/a')
+        occurrence_type = self._create_topic(self.tm,
+                                             'http://www.example.org/ot')
+        topic = self._create_topic(self.tm2, 'http://www.example.org/a')
+        source_type = self._create_topic(self.tm2, 'http://www.example.org/ot')
+        since = self.tm2.get_change_sequence()
+        variant_theme = self.tm2.create_topic()
+        name = topic.create_name('Name')
+        occurrence = topic.create_occurrence(source_type, 'Value')
+        since2 = self.tm.merge_changes_in(self.tm2, since)
+        self.assertEqual(2 + 2, self.tm.get_topics().count())
+        self.assertEqual(1, target.get_occurrences().count())
+        self.assertEqual(occurrence_type,
+                         target.get_occurrences()[0].get_type())
+        # A later change to a variant brings in the name's topic,
+        # which is merged without duplicating its characteristics.
+        name.create_variant('Variant', [variant_theme])
+        self.tm.merge_changes_in(self.tm2, since2)
+        self.assertEqual(1, target.get_names().count())
+        self.assertEqual(1, target.get_occurrences().count())
+        self.assertEqual(['Variant'], [variant.get_value() for variant in
+                                       target.get_names()[0].get_variants()])
+
+    def test_association (self):
+        player = self._create_topic(self.tm2, 'http://www.example.org/p')
+        association_type = self._create_topic(self.tm2,
+                                              'http://www.example.org/at')
+        role_type = self._create_topic(self.tm2, 'http://www.example.org/rt')
+        since = self.tm2.get_change_sequence()
+        association = self.tm2.create_association(association_type)
+        role = association.create_role(role_type, player)
+        iid = self.create_locator('http://www.example.org/role')
+        role.add_item_identifier(iid)
+        reifier = self.tm2.create_topic()
+        association.set_reifier(reifier)
+        self.tm.merge_changes_in(self.tm2, since)
+        self.assertEqual(1, self.tm.get_associations().count())
+        target_association = self.tm.get_associations()[0]
+        self.assertEqual(self._get_topic(self.tm, 'http://www.example.org/at'),
+                         target_association.get_type())
+        self.assertNotEqual(None, target_association.get_reifier())
+        target_role = self.tm.get_construct_by_item_identifier(iid)
+        self.assertEqual(target_association, target_role.get_parent())
+        self.assertEqual(self._get_topic(self.tm, 'http://www.example.org/p'),
+                         target_role.get_player())
+        # Merging the same changes again does not duplicate the
+        # association.
+        self.tm.merge_changes_in(self.tm2, since)
+        self.assertEqual(1, self.tm.get_associations().count())
+        self.assertEqual(1, target_association.get_roles().count())
+
+    def test_removed_construct (self):
+        topic = self._create_topic(self.tm2, 'http://www.example.org/a')
+        topic.add_subject_identifier(
+            self.create_locator('http://www.example.org/b'))
+        topic.remove()
+        self.tm.merge_changes_in(self.tm2)
+        self.assertEqual(0, self.tm.get_topics().count())
@@ -0,0 +1,107 @@
+# Copyright 2011 Jamie Norrish (jamie@artefact.org.nz)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module containing tests for the iteration over the topics and
+associations of a topic map."""
+
+from tmapi.indices.type_instance_index import TypeInstanceIndex
+from tmapi.models.request_scope import RequestScope
+
+from tmapi_test_case import TMAPITestCase, database_only
+
+
+class TopicMapIterationTest (TMAPITestCase):
+
+    def test_iter_topics (self):
+        topics = [self.create_topic() for i in range(7)]
+        self.assertEqual(topics, list(self.tm.iter_topics(3)))
+        self.assertEqual(topics[3:], list(self.tm.iter_topics(
+                    3, after_id=topics[2].get_id())))
+        self.assertEqual([], list(self.tm.iter_topics(
+                    3, after_id=topics[-1].get_id())))
+
+    def test_iter_associations (self):
+        associations = [self.create_association() for i in range(5)]
+        self.assertEqual(associations, list(self.tm.iter_associations(2)))
+        self.assertEqual(associations[1:], list(self.tm.iter_associations(
+                    2, after_id=associations[0].get_id())))
+
+    def test_resume (self):
+        # Other constructs are created between the topics, so that
+        # their identifiers are not consecutive.
+        for i in range(6):
+            self.create_topic().create_name('Name')
+        topics = list(self.tm.iter_topics())
+        self.assertEqual(7, len(topics))
+        for index, topic in enumerate(topics):
+            self.assertEqual(topics[index+1:], list(self.tm.iter_topics(
+                        2, after_id=topic.get_id())))
+
+    @database_only
+    def test_batches (self):
+        for i in range(7):
+            self.create_topic()
+        iterator = self.tm.iter_topics(3)
+        # Each batch of topics, and its prefetched identifiers.
+        with self.assertNumQueries(4):
+            iterator.next()
+        with self.assertNumQueries(0):
+            iterator.next()
+            iterator.next()
+        with self.assertNumQueries(8):
+            self.assertEqual(4, len(list(iterator)))
+
+    @database_only
+    def test_prefetched_identifiers (self):
+        sid = self.create_locator('http://www.example.org/sid')
+        slo = self.create_locator('http://www.example.org/slo')
+        iid = self.create_locator('http://www.example.org/iid')
+        topic = self.tm.create_topic_by_subject_identifier(sid)
+        topic.add_subject_locator(slo)
+        topic.add_item_identifier(iid)
+        self.create_topic()
+        topics = list(self.tm.iter_topics())
+        with self.assertNumQueries(0):
+            self.assertEqual([sid], list(topics[0].get_subject_identifiers()))
+            self.assertEqual([slo], list(topics[0].get_subject_locators()))
+            self.assertEqual([iid], list(topics[0].get_item_identifiers()))
+            self.assertEqual(1, topics[1].get_item_identifiers().count())
+        # Any change discards the prefetched identifiers.
+        topics[0].remove_subject_identifier(sid)
+        self.assertEqual([], list(topics[0].get_subject_identifiers()))
+
+    @database_only
+    def test_index_results (self):
+        topic_type = self.create_topic()
+        topics = [self.create_topic() for i in range(5)]
+        for topic in topics:
+            topic.add_type(topic_type)
+        results = self.tm.get_index(TypeInstanceIndex).get_topics(topic_type)
+        self.assertEqual(topics, list(results.keyset_iterator(2)))
+        self.assertEqual(topics[2:], list(results.keyset_iterator(
+                    2, after_id=topics[1].get_id())))
+
+    @database_only
+    def test_request_scope (self):
+        topics = [self.create_topic() for i in range(7)]
+        with RequestScope() as scope:
+            self.assertEqual(topics, list(self.tm.iter_topics(3)))
+            self.assertEqual(0, self._get_scope_size(scope))
+            loaded = list(self.tm.get_topics())
+            self.assertEqual(7, self._get_scope_size(scope))
+
+    def _get_scope_size (self, scope):
+        return sum([len(constructs) for constructs in
+                    scope._constructs.values()])
+
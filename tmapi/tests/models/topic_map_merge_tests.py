@@ -221,3 +221,27 @@ class TopicMapMergeTest (TMAPITestCase):
         self.assertEqual(locB, new_topic.get_item_identifiers()[0])
         self.assertEqual(0, new_topic.get_subject_identifiers().count())
         self.assertEqual(0, new_topic.get_subject_locators().count())
+
+    def test_add_topics_used_as_type_and_theme (self):
+        """Tests that a topic used as a type and as a theme in the
+        other map is copied only once."""
+        topic = self.tm2.create_topic_by_subject_identifier(
+            self.tm2.create_locator('http://www.tmapi.org/#topic'))
+        topic_type = self.tm2.create_topic_by_subject_identifier(
+            self.tm2.create_locator('http://www.tmapi.org/#type'))
+        theme = self.tm2.create_topic_by_subject_identifier(
+            self.tm2.create_locator('http://www.tmapi.org/#theme'))
+        topic.add_type(topic_type)
+        topic.create_name('Name', scope=[theme])
+        self.tm.merge_in(self.tm2)
+        # The fourth topic is the default name type.
+        self.assertEqual(4, self.tm.get_topics().count())
+        new_topic = self.tm.get_topic_by_subject_identifier(
+            self.tm.create_locator('http://www.tmapi.org/#topic'))
+        new_type = self.tm.get_topic_by_subject_identifier(
+            self.tm.create_locator('http://www.tmapi.org/#type'))
+        new_theme = self.tm.get_topic_by_subject_identifier(
+            self.tm.create_locator('http://www.tmapi.org/#theme'))
+        self.assertEqual([new_type], list(new_topic.get_types()))
+        self.assertEqual([new_theme],
+                         list(new_topic.get_names()[0].get_scope()))
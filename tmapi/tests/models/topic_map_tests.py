@@ -19,10 +19,12 @@ that come with the TMAPI 2.0 distribution (http://www.tmapi.org/2.0/).
 
 """
 
-from tmapi.exceptions import ModelConstraintException, \
-    UnsupportedOperationException
+from tmapi.constants import AUTOMERGE_FEATURE_STRING
+from tmapi.exceptions import IdentityConstraintException, \
+    ModelConstraintException, UnsupportedOperationException
+from tmapi.models import Topic
 
-from tmapi_test_case import TMAPITestCase
+from tmapi_test_case import TMAPITestCase, database_only
 
 
 class TopicMapTest (TMAPITestCase):
@@ -202,6 +204,163 @@ class TopicMapTest (TMAPITestCase):
         self.assertEqual(0, topic.get_subject_locators().count())
         self.assertEqual(topic, t)
 
+    def test_resolve_identities (self):
+        sid = self.create_locator('http://www.example.org/sid')
+        iid = self.create_locator('http://www.example.org/iid')
+        shared = self.create_locator('http://www.example.org/shared')
+        other = self.create_locator('http://www.example.org/other')
+        unknown = self.create_locator('http://www.example.org/unknown')
+        topic1 = self.tm.create_topic_by_subject_identifier(sid)
+        topic1.add_subject_identifier(shared)
+        topic2 = self.tm.create_topic_by_item_identifier(iid)
+        association = self.create_association()
+        association.add_item_identifier(other)
+        resolved = self.tm.resolve_identities([sid, iid, shared, other,
+                                               unknown])
+        self.assertEqual(5, len(resolved))
+        self.assertEqual((topic1, None), resolved[sid.to_external_form()])
+        self.assertEqual((None, topic2), resolved[iid.to_external_form()])
+        self.assertEqual((topic1, None), resolved[shared.to_external_form()])
+        self.assertEqual((None, association),
+                         resolved[other.to_external_form()])
+        self.assertEqual((None, None), resolved[unknown.to_external_form()])
+        self.assertEqual((None, topic2), self.tm.resolve_identity(iid))
+
+    @database_only
+    def test_resolve_identities_single_query (self):
+        locators = []
+        for i in range(10):
+            locator = self.create_locator('http://www.example.org/%d' % i)
+            locators.append(locator)
+            if i % 2:
+                self.tm.create_topic_by_subject_identifier(locator)
+            else:
+                self.tm.create_topic_by_item_identifier(locator)
+        with self.assertNumQueries(1):
+            resolved = self.tm.resolve_identities(locators)
+        self.assertEqual(10, len(resolved))
+
+    @database_only
+    def test_create_topic_conflict_retried (self):
+        """Verify that identity-based topic creation returns the topic
+        created by a concurrent writer after this one looked for it."""
+        methods = ('create_topic_by_item_identifier',
+                   'create_topic_by_subject_identifier',
+                   'create_topic_by_subject_locator')
+        existing = []
+        for i, method in enumerate(methods):
+            locator = self.create_locator('http://www.example.org/%d' % i)
+            existing.append((method, locator,
+                             getattr(self.tm, method)(locator)))
+        resolve_identity = self.tm.resolve_identity
+        get_topic_by_address = self.tm._get_topic_by_address
+        calls = []
+        def stale_resolve_identity (locator):
+            calls.append(locator)
+            if len(calls) == 1:
+                return None, None
+            return resolve_identity(locator)
+        def stale_get_topic_by_address (relation, address):
+            calls.append(address)
+            if len(calls) == 1:
+                raise Topic.DoesNotExist
+            return get_topic_by_address(relation, address)
+        self.tm.resolve_identity = stale_resolve_identity
+        self.tm._get_topic_by_address = stale_get_topic_by_address
+        for method, locator, topic in existing:
+            del calls[:]
+            self.assertEqual(topic, getattr(self.tm, method)(locator))
+            self.assertEqual(2, len(calls))
+
+    def test_create_topic_by_item_identifier_illegal (self):
+        """Verify that create_topic_by_item_identifier reports an item
+        identifier belonging to a construct other than a topic."""
+        locator = self.create_locator('http://www.example.org/')
+        association = self.create_association()
+        association.add_item_identifier(locator)
+        self.assertRaises(IdentityConstraintException,
+                          self.tm.create_topic_by_item_identifier, locator)
+
+    def test_import_topics (self):
+        base = 'http://www.example.org/'
+        existing = self.tm.create_topic_by_subject_identifier(
+            self.create_locator(base + 'existing'))
+        specs = [([base + 'a'], [base + 'b'], []),
+                 ([], [base + 'c'], [base + 'sl']),
+                 ([base + 'c'], [base + 'a'], []),
+                 ([self.create_locator(base + 'existing')], [], []),
+                 ([], [base + 'd'], [base + 'sl'])]
+        for partitions in (1, 3):
+            topics = self.tm.import_topics(specs, partitions=partitions)
+            self.assertEqual(5, len(topics))
+            topic = topics[0]
+            for other in (topics[1], topics[2], topics[4]):
+                self.assertEqual(topic, other)
+            self.assertEqual(existing, topics[3])
+            self.assertEqual(2, self.tm.get_topics().count())
+            self.assertEqual(
+                set([base + 'b', base + 'c', base + 'a', base + 'd']),
+                set([locator.to_external_form() for locator
+                     in topic.get_subject_identifiers()]))
+            self.assertEqual(
+                set([base + 'a', base + 'c']),
+                set([locator.to_external_form() for locator
+                     in topic.get_item_identifiers()]))
+            self.assertEqual(1, topic.get_subject_locators().count())
+            self.assertEqual(1, existing.get_item_identifiers().count())
+            topic.remove()
+
+    def test_import_topics_non_ascii (self):
+        reference = u'http://www.example.org/caf\xe9'
+        specs = [([reference], [reference], [reference])]
+        topic = self.tm.import_topics(specs)[0]
+        for partitions in (1, 3):
+            self.assertEqual([topic], self.tm.import_topics(
+                    specs, partitions=partitions))
+        self.assertEqual(1, self.tm.get_topics().count())
+        self.assertEqual(topic, self.tm.get_topic_by_subject_identifier(
+                self.create_locator(reference)))
+        self.assertEqual(topic, self.tm.get_topic_by_subject_locator(
+                self.create_locator(reference)))
+        self.assertEqual(topic, self.tm.get_construct_by_item_identifier(
+                self.create_locator(reference)))
+
+    def test_import_topics_illegal (self):
+        locator = self.create_locator('http://www.example.org/')
+        association = self.create_association()
+        association.add_item_identifier(locator)
+        self.assertRaises(ModelConstraintException, self.tm.import_topics,
+                          [([], [], [])])
+        self.assertRaises(IdentityConstraintException, self.tm.import_topics,
+                          [([locator], [], [])])
+
+    @database_only
+    def test_import_topics_without_automerge (self):
+        factory = self.create_factory()
+        factory.set_feature(AUTOMERGE_FEATURE_STRING, False)
+        tm = factory.new_topic_map_system().create_topic_map(
+            self.create_locator('http://www.example.org/map'))
+        base = 'http://www.example.org/'
+        existing = tm.create_topic_by_subject_identifier(
+            tm.create_locator(base + 'existing'))
+        specs = [([], [base + 'a'], []),
+                 ([], [base + 'b'], []),
+                 ([], [base + 'a', base + 'b'], [])]
+        for partitions in (1, 2, 3, 5):
+            self.assertRaises(IdentityConstraintException, tm.import_topics,
+                              specs, partitions=partitions)
+            self.assertEqual(1, tm.get_topics().count())
+        # A spec that joins no topics created separately requires no
+        # merging, whatever the partitions its identities hash to.
+        specs = [([], [base + 'a', base + 'b'], []),
+                 ([], [base + 'a'], []),
+                 ([], [base + 'b', base + 'existing'], [])]
+        for partitions in (1, 2, 3, 5):
+            topics = tm.import_topics(specs, partitions=partitions)
+            self.assertEqual([existing] * 3, topics)
+            self.assertEqual(1, tm.get_topics().count())
+            self.assertEqual(3, existing.get_subject_identifiers().count())
+
     def test_get_index (self):
         self.assertRaises(UnsupportedOperationException, self.tm.get_index,
                           BogusIndex)
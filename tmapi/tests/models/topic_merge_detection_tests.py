@@ -20,7 +20,6 @@ that come with the TMAPI 2.0 distribution (http://www.tmapi.org/2.0/).
 """
 
 from tmapi.exceptions import IdentityConstraintException
-from tmapi.models import TopicMapSystemFactory
 
 from tmapi_test_case import TMAPITestCase
 
@@ -32,12 +31,11 @@ class TopicMergeDetectionTestCase (TMAPITestCase):
     
     def setUp (self):
         self.automerge = self.get_automerge_enabled()
-        factory = TopicMapSystemFactory.new_instance()
+        factory = self.create_factory()
         if self.automerge is not None:
             factory.set_feature('http://tmapi.org/features/automerge',
                                 self.automerge)
         self.tms = factory.new_topic_map_system()
-        self.tms.save()
         self.default_locator = self.tms.create_locator(self.DEFAULT_ADDRESS)
         self.tm = self.tms.create_topic_map(self.default_locator)
 
@@ -19,9 +19,12 @@ that come with the TMAPI 2.0 distribution (http://www.tmapi.org/2.0/).
 
 """
 
+from django.db import IntegrityError
+
 from tmapi.exceptions import ModelConstraintException
+from tmapi.models import SubjectIdentifier, SubjectLocator
 
-from tmapi_test_case import TMAPITestCase
+from tmapi_test_case import TMAPITestCase, database_only
 
 
 class TopicTest (TMAPITestCase):
@@ -508,3 +511,61 @@ class TopicTest (TMAPITestCase):
     def test_name_creation_default_type_illegal_scope_collection (self):
         # This test is not applicable to this implementation.
         pass
+
+    def test_create_names (self):
+        topic = self.create_topic()
+        name_type = self.create_topic()
+        theme1 = self.create_topic()
+        theme2 = self.create_topic()
+        names = topic.create_names([('Name 1', None, None),
+                                    ('Name 2', name_type, theme1),
+                                    ('Name 3', None, [theme1, theme2])])
+        self.assertEqual(3, len(names))
+        self.assertEqual(3, topic.get_names().count())
+        self.assertEqual(names[0].get_type(), names[2].get_type())
+        self.assertEqual(name_type, names[1].get_type())
+        self.assertEqual([theme1], list(names[1].get_scope()))
+        self.assertEqual(set([theme1, theme2]), set(names[2].get_scope()))
+        self.assertEqual(0, names[0].get_scope().count())
+
+    def test_create_names_illegal (self):
+        topic = self.create_topic()
+        self.assertRaises(ModelConstraintException, topic.create_names,
+                          [('Name', None, None), (None, None, None)])
+        self.assertRaises(ModelConstraintException, topic.create_names,
+                          [('Name', None, [None])])
+        self.assertEqual(0, topic.get_names().count())
+
+    def test_identifiers_kept_on_merge (self):
+        """Tests that a subject identifier or item identifier that
+        causes a merge with a topic having it as the other kind of
+        identifier is added."""
+        locator1 = self.create_locator('http://www.example.org/1')
+        locator2 = self.create_locator('http://www.example.org/2')
+        topic1 = self.tm.create_topic_by_item_identifier(locator1)
+        topic2 = self.create_topic()
+        topic2.add_subject_identifier(locator1)
+        self.assertEqual(1, self.tm.get_topics().count())
+        self.assertTrue(locator1 in topic2.get_subject_identifiers())
+        self.assertTrue(locator1 in topic2.get_item_identifiers())
+        topic3 = self.tm.create_topic_by_subject_identifier(locator2)
+        topic2.add_item_identifier(locator2)
+        self.assertEqual(1, self.tm.get_topics().count())
+        self.assertTrue(locator2 in topic2.get_subject_identifiers())
+        self.assertTrue(locator2 in topic2.get_item_identifiers())
+
+    @database_only
+    def test_subject_identity_unique (self):
+        """Tests that an address is stored as a subject identifier or
+        subject locator only once in a topic map."""
+        address = 'http://www.example.org/'
+        locator = self.create_locator(address)
+        other_tm = self.create_topic_map('http://www.example.org/map')
+        for model, create in (
+            (SubjectIdentifier, 'create_topic_by_subject_identifier'),
+            (SubjectLocator, 'create_topic_by_subject_locator')):
+            getattr(self.tm, create)(locator)
+            getattr(other_tm, create)(locator)
+            duplicate = model(topic=self.create_topic(), address=address,
+                              containing_topic_map=self.tm)
+            self.assertRaises(IntegrityError, duplicate.save)